@@ -0,0 +1,113 @@
+"""
+异步健康检查引擎基准测试：吞吐量随设备数的变化（10 ~ 5000 台模拟设备）
+模拟设备在进程内用 asyncio 实现：登录耗时 --login，每条命令往返 --rtt + 执行 --exec
+对照组为原来的 batch_health_check 模型：5个线程，每台设备登录后逐条执行命令（同样的时延用 time.sleep 模拟），
+对照组耗时随设备数线性增长，设备多时只跑到 --baseline-max 台为止
+
+用法：
+    python benchmarks/bench_async_health.py --sizes 10 100 1000 5000 --global-limit 500 --site-limit 100
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.health_check.health_checker_async import AsyncHealthChecker
+from core.health_check.health_checker_optimized import HEALTH_CHECK_COMMAND_TYPES
+
+INTERFACE_OUTPUT = "\r\n".join(
+    ["Interface            IP Address      Physical Protocol"]
+    + [f"GE1/0/{i:<14}unassigned      {'UP' if i % 3 else 'DOWN':<9}{'UP' if i % 3 else 'DOWN'}" for i in range(1, 49)]
+)
+OUTPUTS = {
+    "display interface brief": INTERFACE_OUTPUT,
+    "display cpu-usage": "Slot 1 CPU 0 CPU usage:\r\n      14% in last 5 seconds\r\n      12% in last 1 minute",
+    "display memory": "              Total      Used      Free\r\nMem:        382808    291956     90852   23.8%",
+    "display version": "H3C Comware Software, Version 7.1.075, Alpha 7571\r\nH3C S6850 uptime is 0 weeks, 1 day",
+}
+
+
+class SimulatedShell:
+    def __init__(self, rtt, exec_time):
+        self.rtt = rtt
+        self.exec_time = exec_time
+        self.queue = asyncio.Queue()
+        self.queue.put_nowait("\r\n<SW1>")
+        self.busy_until = 0.0
+
+    def write(self, data):
+        loop = asyncio.get_running_loop()
+        arrive = loop.time() + self.rtt / 2
+        for command in data.split("\n")[:-1]:
+            self.busy_until = max(self.busy_until, arrive) + self.exec_time
+            output = OUTPUTS.get(command, "")
+            text = f"{command}\r\n{output}\r\n<SW1>" if output else f"{command}\r\n<SW1>"
+            loop.call_at(self.busy_until + self.rtt / 2, self.queue.put_nowait, text)
+
+    async def read(self, n):
+        return await self.queue.get()
+
+
+def simulated_opener(login, rtt, exec_time):
+    @asynccontextmanager
+    async def open_shell(device_info, config):
+        await asyncio.sleep(login)
+        shell = SimulatedShell(rtt, exec_time)
+        yield shell, shell
+    return open_shell
+
+
+def run_thread_baseline(count, login, rtt, exec_time, workers=5):
+    """原来的模型：每台设备登录 + 逐条命令一个往返，线程数固定"""
+    commands = len(HEALTH_CHECK_COMMAND_TYPES)
+
+    def check(_):
+        time.sleep(login + commands * (rtt + exec_time))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(check, range(count)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="异步健康检查引擎基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000], help="模拟设备数")
+    parser.add_argument("--login", type=float, default=0.5, help="登录耗时（秒）")
+    parser.add_argument("--rtt", type=float, default=0.03, help="网络往返时延（秒）")
+    parser.add_argument("--exec", dest="exec_time", type=float, default=0.02, help="设备执行每条命令的耗时（秒）")
+    parser.add_argument("--global-limit", type=int, default=500)
+    parser.add_argument("--site-limit", type=int, default=100)
+    parser.add_argument("--sites", type=int, default=10, help="设备平均分布的站点数")
+    parser.add_argument("--baseline-max", type=int, default=100, help="线程池对照组最多跑多少台设备")
+    args = parser.parse_args()
+
+    print(f"登录{args.login * 1000:.0f}ms，往返{args.rtt * 1000:.0f}ms，单条执行{args.exec_time * 1000:.0f}ms，"
+          f"全局并发{args.global_limit}，站点并发{args.site_limit}，站点数{args.sites}")
+    print(f"{'设备数':>8}{'线程池(5)':>14}{'异步引擎':>14}{'异步 台/秒':>14}")
+    print("-" * 56)
+    for count in args.sizes:
+        devices = [{"device_name": f"SW{i}", "host": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+                    "vendor": "h3c", "site": f"site{i % args.sites}"} for i in range(count)]
+
+        baseline = "-"
+        if count <= args.baseline_max:
+            start = time.perf_counter()
+            run_thread_baseline(count, args.login, args.rtt, args.exec_time)
+            baseline = f"{time.perf_counter() - start:.2f}s"
+
+        checker = AsyncHealthChecker(open_shell=simulated_opener(args.login, args.rtt, args.exec_time),
+                                     persist=False, global_limit=args.global_limit, per_site_limit=args.site_limit)
+        start = time.perf_counter()
+        results = asyncio.run(checker.run(devices))
+        async_s = time.perf_counter() - start
+        assert all(result["check_status"] == "成功" for result in results)
+        print(f"{count:>8}{baseline:>14}{async_s:>13.2f}s{count / async_s:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
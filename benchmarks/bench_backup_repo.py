@@ -0,0 +1,130 @@
+"""
+备份仓库磁盘节省评估：模拟一年的每晚备份，对比原来每次写一份未压缩文本和现在去重+压缩的备份仓库
+每台设备生成一份配置文本，每晚按 --change-rate 的概率改几行（改接口描述/加删ACL），其余晚上内容完全不变
+备份记录写进临时数据库，最后用 DatabaseManager.get_backup_savings() 出报告（线上库也能直接用 --report-db 看）
+
+用法：
+    python benchmarks/bench_backup_repo.py --devices 100 --days 365 --change-rate 0.05
+    python benchmarks/bench_backup_repo.py --report-db netdevops.db --days 365   # 只看线上库的统计
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.backup.repository import BackupRepository
+from db.database import DatabaseManager
+
+
+def quiet_console(level=logging.ERROR):
+    """每条备份记录都会打 INFO，压测时控制台只留错误（日志文件照常写）"""
+    for logger in logging.Logger.manager.loggerDict.values():
+        for handler in getattr(logger, "handlers", []):
+            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+                handler.setLevel(level)
+
+
+def make_config(rng, index, interfaces):
+    lines = [f"sysname SW-{index:05d}", "#", "clock timezone BJ add 08:00:00", "#"]
+    for vlan in range(1, 40):
+        lines += [f"vlan {vlan}", f" description vlan-{vlan}-segment", "#"]
+    for port in range(1, interfaces + 1):
+        lines += [
+            f"interface GigabitEthernet1/0/{port}",
+            f" description link-to-{rng.choice(['AP', 'PC', 'SRV', 'UPLINK'])}-{rng.randint(1, 999)}",
+            " port link-type access",
+            f" port access vlan {rng.randint(1, 39)}",
+            " stp edged-port",
+            "#",
+        ]
+    lines += [f"acl number 3000 rule {i * 5} permit ip source 10.{i}.0.0 0.0.255.255" for i in range(60)]
+    lines += ["#", "return"]
+    return lines
+
+
+def change_config(rng, lines):
+    """改几行：接口描述 / ACL 规则"""
+    lines = list(lines)
+    for _ in range(rng.randint(1, 4)):
+        index = rng.randrange(len(lines))
+        if lines[index].startswith(" description"):
+            lines[index] = f" description changed-{rng.randint(1, 99999)}"
+        else:
+            lines.insert(index, f"acl number 3000 rule {rng.randint(400, 9999)} deny ip source 172.16.0.0 0.0.255.255")
+    return lines
+
+
+def human(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f}{unit}" if unit != "B" else f"{size}B"
+        size /= 1024
+
+
+def print_savings(savings, title):
+    print(title)
+    print(f"  备份次数：{savings['backups']}，去重命中：{savings['dedup_hits']}")
+    print(f"  原方式占用（每次一份未压缩文本）：{human(savings['raw_bytes'])}")
+    print(f"  备份仓库占用：{human(savings['stored_bytes'])}")
+    print(f"  节省：{human(savings['saved_bytes'])}（{savings['saved_pct']}%）")
+
+
+def simulate(args):
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="backup-repo-")
+    repository = BackupRepository(root=os.path.join(workdir, "repo"), codec=args.codec)
+    db = DatabaseManager(db_path=os.path.join(workdir, "backup.db"))
+    configs = {index: make_config(rng, index, rng.randint(24, args.max_interfaces)) for index in range(args.devices)}
+    print(f"{args.devices}台设备，{args.days}晚，每晚配置变化概率{args.change_rate}，压缩算法{repository.codec}，目录 {workdir}")
+
+    started = time.perf_counter()
+    first_night = datetime.now() - timedelta(days=args.days - 1)
+    for day in range(args.days):
+        night = (first_night + timedelta(days=day)).replace(hour=2, minute=0, second=0, microsecond=0)
+        for index, lines in configs.items():
+            if day and rng.random() < args.change_rate:
+                lines = configs[index] = change_config(rng, lines)
+            host = f"10.{index // 250}.{index % 250}.1"
+            stored = repository.store(host, "\n".join(lines), timestamp=night)
+            db.log_backup(hostname=f"SW-{index:05d}", backup_path=stored.backup_path, status="success",
+                          start_time=night, end_time=night, backup_size=stored.raw_size,
+                          checksum=stored.checksum, dedup=stored.dedup, stored_size=stored.stored_size)
+    elapsed = time.perf_counter() - started
+
+    on_disk = sum(os.path.getsize(os.path.join(folder, name))
+                  for folder, _, names in os.walk(repository.objects_dir) for name in names)
+    savings = db.get_backup_savings(days=args.days)
+    print_savings(savings, f"模拟完成：{elapsed:.1f}s（{savings['backups'] / elapsed:.0f}次备份/秒）")
+    print(f"  objects 目录实际占用：{human(on_disk)}")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="备份仓库磁盘节省评估")
+    parser.add_argument("--devices", type=int, default=50, help="设备数")
+    parser.add_argument("--days", type=int, default=365, help="模拟多少晚的备份")
+    parser.add_argument("--change-rate", type=float, default=0.05, help="每台设备每晚配置发生变化的概率")
+    parser.add_argument("--max-interfaces", type=int, default=52, help="每台设备的最大接口数")
+    parser.add_argument("--codec", choices=["zlib", "zstd"], help="压缩算法，默认按 BACKUP_REPO_CONFIG")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--report-db", help="不做模拟，直接统计这个数据库里的备份记录")
+    args = parser.parse_args()
+    quiet_console()
+
+    if args.report_db:
+        db = DatabaseManager(db_path=args.report_db)
+        print_savings(db.get_backup_savings(days=args.days), f"{args.report_db} 最近{args.days}天的备份：")
+        db.close()
+        return
+    simulate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+数据库并发读写基准测试：旧的单连接模式 vs 按线程连接池（WAL）
+模拟 Flask 请求线程 + 线程池 + Nornir 并发线程同时写健康检查记录、读历史记录的场景
+
+用法：
+    python benchmarks/bench_db_pool.py --threads 20 --ops 300 --write-ratio 0.7
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from db.database import DatabaseManager
+
+
+def make_record(i):
+    return {
+        "host": f"10.0.{i % 250}.{i % 200 + 1}",
+        "device_name": f"SW{i % 500}",
+        "version": "7.1.075",
+        "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "status": "healthy",
+        "check_status": "成功",
+        "up_interface": 20,
+        "down_interface": 4,
+        "total_interface": 24,
+        "CPU_usage": f"{random.randint(1, 99)}%",
+        "memory_usage": f"{random.randint(1, 99)}.0%",
+        "error_message": "",
+        "device_health_issues": "无",
+        "reachable": "可达",
+    }
+
+
+def run_workload(db, threads, ops, write_ratio):
+    """多线程混合读写，返回 (总耗时, 写成功数, 读成功数, 错误数)"""
+    counters = {"write": 0, "read": 0, "error": 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(worker_id):
+        barrier.wait()
+        for n in range(ops):
+            kind = "write" if random.random() < write_ratio else "read"
+            try:
+                if kind == "write":
+                    ok = db.log_check_device(make_record(worker_id * ops + n))
+                    if not ok:
+                        raise RuntimeError("写入失败")
+                else:
+                    db.get_health_check_history(device_name=f"SW{random.randint(0, 499)}", limit=20)
+                with lock:
+                    counters[kind] += 1
+            except Exception:
+                with lock:
+                    counters["error"] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, counters["write"], counters["read"], counters["error"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库连接池并发读写基准测试")
+    parser.add_argument("--threads", type=int, default=20, help="并发线程数")
+    parser.add_argument("--ops", type=int, default=300, help="每个线程的操作次数")
+    parser.add_argument("--write-ratio", type=float, default=0.7, help="写操作占比")
+    args = parser.parse_args()
+
+    print(f"并发线程：{args.threads}，每线程操作：{args.ops}，写占比：{args.write_ratio}")
+    print("-" * 72)
+    print(f"{'模式':<16}{'耗时(s)':>10}{'写/秒':>12}{'读/秒':>12}{'总ops/秒':>12}{'错误数':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, use_pool in (("单连接(旧)", False), ("连接池+WAL", True)):
+            db = DatabaseManager(db_path=os.path.join(tmp, f"bench_{use_pool}.db"), use_pool=use_pool)
+            elapsed, writes, reads, errors = run_workload(db, args.threads, args.ops, args.write_ratio)
+            db.close()
+            print(
+                f"{label:<16}{elapsed:>10.2f}{writes / elapsed:>12.0f}{reads / elapsed:>12.0f}"
+                f"{(writes + reads) / elapsed:>12.0f}{errors:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
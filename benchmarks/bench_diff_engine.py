@@ -0,0 +1,95 @@
+"""
+行级差异对比基准测试：diff_engine vs 旧的列表成员判断 / difflib.unified_diff
+输入是合成的 display ip routing-table 输出，两次之间随机改动 1% 的路由（替换、删除、新增）
+
+用法：
+    python benchmarks/bench_diff_engine.py --sizes 1000 10000 100000 --change-ratio 0.01
+"""
+
+import os
+import sys
+import time
+import random
+import difflib
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.diff_engine import diff_lines
+
+# 旧的列表成员判断是 O(n·m)，超过这个行数就不跑了（10万行要几分钟）
+MEMBERSHIP_MAX_LINES = 20000
+
+
+def make_route(rng):
+    prefix = f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.0/24"
+    return f"{prefix:<20}OSPF    10   {rng.randint(2, 200):<5}D   10.0.{rng.randint(0, 255)}.1    Vlanif{rng.randint(1, 4000)}"
+
+
+def make_tables(size, change_ratio, rng):
+    header = ["Route Flags: R - relay, D - download to fib", "Routing Tables: Public",
+              f"         Destinations : {size}        Routes : {size}", ""]
+    before = header + [make_route(rng) for _ in range(size)]
+    after = list(before)
+    for _ in range(max(1, int(size * change_ratio))):
+        pos = rng.randrange(len(header), len(after))
+        action = rng.random()
+        if action < 0.4:
+            after[pos] = make_route(rng)
+        elif action < 0.7:
+            del after[pos]
+        else:
+            after.insert(pos, make_route(rng))
+    return before, after
+
+
+def old_membership(lines1, lines2):
+    added = [line for line in lines2 if line not in lines1]
+    removed = [line for line in lines1 if line not in lines2]
+    return added, removed
+
+
+def old_unified(lines1, lines2):
+    added, removed = [], []
+    for line in difflib.unified_diff(lines1, lines2, lineterm=''):
+        if line.startswith('+') and not line.startswith('+++'):
+            added.append(line[1:])
+        elif line.startswith('-') and not line.startswith('---'):
+            removed.append(line[1:])
+    return added, removed
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行级差异对比基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="路由条数")
+    parser.add_argument("--change-ratio", type=float, default=0.01, help="两次输出之间改动的比例")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'行数':>8}{'列表成员判断(ms)':>18}{'difflib(ms)':>14}{'diff_engine(ms)':>18}{'新增/删除':>12}")
+    for size in args.sizes:
+        before, after = make_tables(size, args.change_ratio, rng)
+        if size <= MEMBERSHIP_MAX_LINES:
+            membership_ms = f"{timed(old_membership, before, after)[0]:.1f}"
+        else:
+            membership_ms = "跳过"
+        unified_ms, (added, removed) = timed(old_unified, before, after)
+        engine_ms, result = timed(diff_lines, before, after)
+        assert sorted(result["added"]) == sorted(added) and sorted(result["removed"]) == sorted(removed)
+        print(f"{size:>8}{membership_ms:>18}{unified_ms:>14.1f}{engine_ms:>18.1f}"
+              f"{len(result['added']):>6}/{len(result['removed'])}")
+
+    # 完全相同的输出：整行相等直接返回
+    before, _ = make_tables(args.sizes[-1], args.change_ratio, rng)
+    same_ms, _ = timed(diff_lines, before, list(before))
+    print(f"完全相同的{args.sizes[-1]}行输出：{same_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
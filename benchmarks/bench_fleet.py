@@ -0,0 +1,86 @@
+"""
+合成集群端到端基准测试：N 台模拟设备走真实的会话池、批量取命令、解析、批量入库、告警，按轮输出吞吐和时延
+用来做容量规划：看 1万台设备一轮检查要多久、时间花在哪个阶段、表项增长后解析和入库怎么变化
+
+用法：
+    python benchmarks/bench_fleet.py --sizes 100 1000 10000 --workers 100 --rounds 3 --time-scale 0.1
+    python benchmarks/bench_fleet.py --sizes 1000 --time-scale 0 --json reports/fleet.json   # 只测本机开销
+默认写到临时目录的单独数据库，不会动 netdevops.db
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.simulator import FleetProfile, SyntheticFleet, format_report, run_fleet_round
+from db.database import DatabaseManager
+import core.alert.alert_engine  # noqa: F401  先建好各模块的 logger，quiet_console 才能调到
+import core.health_check.health_checker_optimized  # noqa: F401
+
+
+def quiet_console(level=logging.ERROR):
+    """每台设备都会打几行 INFO，压测时控制台只留错误（日志文件照常写）"""
+    for logger in logging.Logger.manager.loggerDict.values():
+        for handler in getattr(logger, "handlers", []):
+            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+                handler.setLevel(level)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成集群端到端基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="模拟设备数")
+    parser.add_argument("--rounds", type=int, default=2, help="每个规模跑几轮（第二轮起复用会话，表项按 --growth 增长）")
+    parser.add_argument("--workers", type=int, default=50, help="检查线程数")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="时延缩放系数，0 表示不模拟时延")
+    parser.add_argument("--login", type=float, default=1.5, help="登录耗时中位数（秒，缩放前）")
+    parser.add_argument("--rtt", type=float, default=0.02, help="网络往返（秒，缩放前）")
+    parser.add_argument("--login-failure", type=float, default=0.01, help="登录失败比例")
+    parser.add_argument("--drop", type=float, default=0.005, help="批量执行时会话断开的概率")
+    parser.add_argument("--slow", type=float, default=0.05, help="慢设备比例")
+    parser.add_argument("--routes", type=int, default=200, help="路由表规模中位数")
+    parser.add_argument("--large-tables", type=float, default=0.01, help="全量路由大表设备比例")
+    parser.add_argument("--growth", type=float, default=0.1, help="每轮表项增长比例")
+    parser.add_argument("--no-alerts", action="store_true", help="不跑告警规则")
+    parser.add_argument("--db", help="写入的数据库路径，默认临时目录")
+    parser.add_argument("--json", help="报告另存为 JSON")
+    parser.add_argument("--verbose", action="store_true", help="控制台显示每台设备的日志")
+    args = parser.parse_args()
+    if not args.verbose:
+        quiet_console()
+
+    reports = []
+    for size in args.sizes:
+        db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="fleet-"), "fleet.db")
+        db = DatabaseManager(db_path=db_path)
+        profile = FleetProfile(size=size, time_scale=args.time_scale, login=args.login, rtt=args.rtt,
+                               login_failure_rate=args.login_failure, drop_rate=args.drop, slow_rate=args.slow,
+                               routes=args.routes, large_table_rate=args.large_tables, growth=args.growth)
+        started = time.perf_counter()
+        fleet = SyntheticFleet(profile)
+        if not args.no_alerts:
+            fleet.install_alert_rules(db)
+        print(f"生成{size}台模拟设备：{time.perf_counter() - started:.2f}s，数据库 {db_path}")
+        print("-" * 72)
+        with fleet.installed():
+            for _ in range(args.rounds):
+                report = run_fleet_round(fleet, workers=args.workers, db=db, alerts=not args.no_alerts)
+                print(format_report(report))
+                reports.append(report)
+                fleet.advance()
+        print()
+        db.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"报告已保存：{args.json}")
+
+
+if __name__ == "__main__":
+    main()
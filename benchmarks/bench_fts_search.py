@@ -0,0 +1,105 @@
+"""
+全网全文检索基准测试：FTS5索引 vs 把所有配置/命令输出读进Python逐个查找（旧做法）
+生成一个合成的设备语料：每台设备一份配置（部分设备带 snmp-agent community read public）
+和一份 display mac-address 输出，然后对比几类典型查询的耗时
+
+用法：
+    python benchmarks/bench_fts_search.py --devices 5000 --interfaces 48 --macs 40
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from db.database import DatabaseManager
+from db.search import FTS5_AVAILABLE
+
+
+def make_config(n, interfaces, rng):
+    parts = [f"sysname SW{n}\n#\n"]
+    if n % 50 == 0:
+        parts.append("snmp-agent community read public\n#\n")
+    else:
+        parts.append(f"snmp-agent community read cipher %^%#{rng.getrandbits(64):x}%^%#\n#\n")
+    for i in range(interfaces):
+        parts.append(
+            f"interface GigabitEthernet1/0/{i}\n description to-{rng.randint(0, 99999)}\n"
+            f" port link-type access\n port default vlan {rng.randint(2, 4000)}\n#\n"
+        )
+    parts.append("return\n")
+    return "".join(parts)
+
+
+def make_mac_table(n, macs, rng):
+    lines = ["MAC Address    VLAN/VSI   Learned-From   Type\n"]
+    for i in range(macs):
+        lines.append(f"{rng.getrandbits(16):04x}-{rng.getrandbits(16):04x}-{n * macs + i:04x} "
+                     f"{rng.randint(2, 4000)}        GE1/0/{i % 48}    dynamic\n")
+    return "".join(lines)
+
+
+def python_scan(db, needle):
+    """旧做法：把每台设备最新配置和所有命令输出读出来，在Python里逐个查找"""
+    hits = []
+    for row in db.conn.execute("SELECT hostname, MAX(id) AS id FROM config_versions GROUP BY hostname").fetchall():
+        if needle in (db.get_config_content(row["id"]) or ""):
+            hits.append(row["hostname"])
+    for row in db.conn.execute("SELECT device_name, result FROM command_history"):
+        if needle in row["result"]:
+            hits.append(row["device_name"])
+    return hits
+
+
+def timed(func, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全网全文检索基准测试")
+    parser.add_argument("--devices", type=int, default=5000, help="设备数")
+    parser.add_argument("--interfaces", type=int, default=48, help="每份配置的接口数")
+    parser.add_argument("--macs", type=int, default=40, help="每台设备MAC表条数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"FTS5可用：{FTS5_AVAILABLE}，设备数：{args.devices}")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(db_path=os.path.join(tmp, "bench_search.db"))
+        start = time.perf_counter()
+        for n in range(args.devices):
+            db.save_config_version(f"SW{n}", make_config(n, args.interfaces, rng))
+            db.save_command_history(f"SW{n}", f"10.{n // 250}.{n % 250}.1", "display mac-address",
+                                    "system", make_mac_table(n, args.macs, rng))
+        load_s = time.perf_counter() - start
+        target_mac = db.conn.execute(
+            "SELECT result FROM command_history WHERE device_name = ?", (f"SW{args.devices // 2}",)
+        ).fetchone()["result"].splitlines()[5].split()[0]
+        print(f"写入耗时（含索引同步）：{load_s:.1f}s，数据库大小：{os.path.getsize(db.path) / 1024 / 1024:.1f}MB")
+        print("-" * 72)
+        print(f"{'查询':<40}{'FTS5(ms)':>10}{'Python扫描(ms)':>16}{'命中':>6}")
+        for label, needle in (
+            ("snmp-agent community read public", "snmp-agent community read public"),
+            (f"MAC {target_mac}", target_mac),
+            ("不存在的内容", "no-such-thing-anywhere"),
+        ):
+            fts_ms, fts_hits = timed(lambda: db.search(needle, limit=1000))
+            scan_ms, scan_hits = timed(lambda: python_scan(db, needle), repeat=1)
+            assert sorted(r["device_name"] for r in fts_hits) == sorted(scan_hits), f"{label} 结果不一致"
+            print(f"{label:<40}{fts_ms:>10.2f}{scan_ms:>16.1f}{len(fts_hits):>6}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
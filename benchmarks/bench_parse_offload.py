@@ -0,0 +1,78 @@
+"""
+解析下放基准测试：几个线程同时解析大路由表时，其它线程（模拟驱动SSH会话的线程）被GIL卡住多久
+一个心跳线程每 1ms 醒一次，记录实际唤醒延迟；解析线程分别在当前进程解析 / 下放到进程池，
+比较总耗时、心跳延迟的 p99/最大值，以及 ParseOffloader 统计的GIL回收时间
+
+用法：
+    python benchmarks/bench_parse_offload.py --lines 200000 --tables 8 --workers 4
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.parsers.offload import ParseOffloader
+from benchmarks.bench_parsers import make_routes
+
+
+def heartbeat(stop, delays, interval=0.001):
+    """每 interval 秒醒一次，记录比预期晚了多少（拿不到GIL时会明显变大）"""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        time.sleep(interval)
+        delays.append(max(0.0, time.perf_counter() - expected))
+
+
+def run(offloader, outputs, threads):
+    stop = threading.Event()
+    delays = []
+    beat = threading.Thread(target=heartbeat, args=(stop, delays), daemon=True)
+    beat.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        counts = list(executor.map(lambda item: offloader.summarize(item[0], "routing", item[1])[0], outputs))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    beat.join()
+    delays.sort()
+    p99 = delays[int(len(delays) * 0.99) - 1] if delays else 0.0
+    return elapsed, p99, (delays[-1] if delays else 0.0), sum(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解析下放基准测试")
+    parser.add_argument("--lines", type=int, default=200000, help="每张路由表的行数")
+    parser.add_argument("--tables", type=int, default=8, help="同时解析的路由表数量")
+    parser.add_argument("--threads", type=int, default=8, help="解析线程数（模拟 batch_health_check 的线程）")
+    parser.add_argument("--workers", type=int, default=4, help="解析进程池大小")
+    args = parser.parse_args()
+
+    vendors = ("h3c", "huawei", "cisco")
+    outputs = [(vendors[i % 3], make_routes(vendors[i % 3], args.lines)) for i in range(args.tables)]
+    size_mb = sum(len(output) for _, output in outputs) / 1024 / 1024
+    print(f"{args.tables} 张路由表 × {args.lines} 行，共 {size_mb:.1f} MB，{args.threads} 个解析线程")
+
+    inline = ParseOffloader(workers=0)
+    offload = ParseOffloader(threshold_bytes=512 * 1024, workers=args.workers)
+    offload.summarize("h3c", "routing", make_routes("h3c", 20000))  # 预热：拉起进程池
+    warm = offload.stats()
+
+    print(f"{'方式':<12}{'总耗时(s)':>12}{'心跳p99(ms)':>14}{'心跳最大(ms)':>14}{'路由条目':>12}")
+    for name, offloader in (("当前线程", inline), ("进程池", offload)):
+        elapsed, p99, worst, count = run(offloader, outputs, args.threads)
+        print(f"{name:<12}{elapsed:>12.2f}{p99 * 1000:>14.1f}{worst * 1000:>14.1f}{count:>12}")
+
+    stats = offload.stats()
+    worker = stats["worker_seconds"] - warm["worker_seconds"]
+    caller = stats["caller_seconds"] - warm["caller_seconds"]
+    print(f"进程池解析耗时 {worker:.2f}s，调用方线程CPU开销 {caller:.2f}s，少占用GIL {max(0.0, worker - caller):.2f}s")
+    offload.shutdown()
+
+
+if __name__ == "__main__":
+    main()
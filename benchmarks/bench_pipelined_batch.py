@@ -0,0 +1,87 @@
+"""
+流水线批量执行基准测试：健康检查命令逐条 send_command vs run_batch 一次写入
+用一个进程内的假设备模拟网络往返时延（--rtt）和设备执行每条命令的耗时（--exec）：
+逐条执行每条命令都要付一次往返，流水线只付一次往返 + 各命令执行时间之和
+
+用法：
+    python benchmarks/bench_pipelined_batch.py --rtt 0.05 --exec 0.02
+"""
+
+import os
+import sys
+import time
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.connection.command_runner import LatencyProfiles, run_batch, run_command
+from core.health_check.health_checker import HEALTH_CHECK_COMMAND_TYPES, get_vendor_command
+
+
+class SimulatedDevice:
+    """假设备：写入的命令排队执行，输出在 (到达时间 + 执行耗时 + 回程时间) 之后才能读到"""
+
+    host = "10.0.0.1"
+    base_prompt = "SW1"
+    RETURN = "\n"
+
+    def __init__(self, rtt, exec_time):
+        self.rtt = rtt
+        self.exec_time = exec_time
+        self.scheduled = []  # [(可读时间, 文本)]
+        self.busy_until = 0.0
+
+    def write_channel(self, data):
+        arrive = time.monotonic() + self.rtt / 2
+        for command in data.split(self.RETURN)[:-1]:
+            self.busy_until = max(self.busy_until, arrive) + self.exec_time
+            output = f"{command}\r\n" + "\r\n".join(f"line {i} of {command}" for i in range(20)) + "\r\n<SW1>"
+            self.scheduled.append((self.busy_until + self.rtt / 2, output))
+
+    def read_channel(self):
+        now = time.monotonic()
+        ready = [text for at, text in self.scheduled if at <= now]
+        self.scheduled = [(at, text) for at, text in self.scheduled if at > now]
+        return "".join(ready)
+
+    def clear_buffer(self):
+        self.scheduled.clear()
+
+    def send_command(self, command, expect_string=None, read_timeout=10.0):
+        self.write_channel(command + self.RETURN)
+        while self.scheduled:
+            wait = self.scheduled[0][0] - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self.read_channel()
+        return command
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流水线批量执行基准测试")
+    parser.add_argument("--rtt", type=float, default=0.05, help="网络往返时延（秒）")
+    parser.add_argument("--exec", dest="exec_time", type=float, default=0.02, help="设备执行每条命令的耗时（秒）")
+    args = parser.parse_args()
+
+    commands = [get_vendor_command(None, command_type) for command_type in HEALTH_CHECK_COMMAND_TYPES]
+    print(f"命令数{len(commands)}，往返时延{args.rtt * 1000:.0f}ms，单条执行{args.exec_time * 1000:.0f}ms")
+    print("-" * 48)
+
+    device = SimulatedDevice(args.rtt, args.exec_time)
+    start = time.perf_counter()
+    for command in commands:
+        run_command(device, command, profiles=LatencyProfiles())
+    sequential_s = time.perf_counter() - start
+    print(f"{'逐条执行':<16}{sequential_s * 1000:>10.0f} ms")
+
+    device = SimulatedDevice(args.rtt, args.exec_time)
+    start = time.perf_counter()
+    outputs = run_batch(device, commands, vendor="h3c", profiles=LatencyProfiles())
+    pipelined_s = time.perf_counter() - start
+    assert len(outputs) == len(commands)
+    print(f"{'流水线批量执行':<16}{pipelined_s * 1000:>10.0f} ms")
+    print(f"加速比：{sequential_s / pipelined_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
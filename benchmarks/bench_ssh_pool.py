@@ -0,0 +1,165 @@
+"""
+SSH会话池基准测试：每次操作新建 Netmiko 连接（旧做法） vs 从 SSHSessionPool 借用会话
+本机起一个假的SSH设备（paramiko 服务端），登录时 sleep --login-delay 秒模拟 H3C/华为设备的慢登录，
+收到任意命令都回显一段固定输出和 <SW1> 提示符
+
+命令用 send_command（按提示符判断结束），不用 send_command_timing：后者每条命令固定等待输出静止，会掩盖登录开销
+
+用法：
+    python benchmarks/bench_ssh_pool.py --ops 20 --workers 4 --login-delay 2
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+from netmiko import ConnectHandler
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.connection.session_pool import SSHSessionPool
+
+PROMPT = "<SW1>"
+VERSION_OUTPUT = (
+    "H3C Comware Software, Version 7.1.075, Alpha 7571\r\n"
+    "Copyright (c) 2004-2026 New H3C Technologies Co., Ltd. All rights reserved.\r\n"
+    "H3C S6850 uptime is 0 weeks, 1 day, 2 hours, 3 minutes\r\n"
+)
+
+
+class FakeDeviceServer(paramiko.ServerInterface):
+    """假设备的SSH服务端：任意账号密码都能登录，但每次登录耗时 login_delay 秒"""
+
+    def __init__(self, login_delay):
+        self.login_delay = login_delay
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        time.sleep(self.login_delay)
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        return True
+
+
+def serve_client(sock, host_key, login_delay, stats):
+    transport = paramiko.Transport(sock)
+    transport.add_server_key(host_key)
+    try:
+        transport.start_server(server=FakeDeviceServer(login_delay))
+        channel = transport.accept(30)
+        if channel is None:
+            return
+        stats["logins"] += 1
+        channel.send(f"\r\n{PROMPT}")
+        buffer = ""
+        while True:
+            data = channel.recv(4096)
+            if not data:
+                break
+            # is_alive 探测会发一个 \x00，忽略
+            buffer += data.decode("utf-8", errors="ignore").replace("\x00", "")
+            while "\n" in buffer or "\r" in buffer:
+                cut = min(i for i in (buffer.find("\n"), buffer.find("\r")) if i >= 0)
+                line, buffer = buffer[:cut].strip(), buffer[cut + 1:].lstrip("\r\n")
+                if not line:
+                    channel.send(f"\r\n{PROMPT}")
+                    continue
+                stats["commands"] += 1
+                output = VERSION_OUTPUT if line.startswith("display") else ""
+                channel.send(f"{line}\r\n{output}{PROMPT}")
+    except (EOFError, OSError, paramiko.SSHException):
+        pass
+    finally:
+        transport.close()
+
+
+def start_fake_device(login_delay):
+    """在本机随机端口启动假设备，返回 (端口, 统计字典)"""
+    host_key = paramiko.RSAKey.generate(2048)
+    stats = {"logins": 0, "commands": 0}
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(100)
+
+    def accept_loop():
+        while True:
+            sock, _ = listener.accept()
+            threading.Thread(target=serve_client, args=(sock, host_key, login_delay, stats), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return listener.getsockname()[1], stats
+
+
+def run_direct(params, ops, workers):
+    """旧做法：每次操作新建连接，用完断开"""
+    def one(_):
+        conn = ConnectHandler(**params)
+        try:
+            return conn.send_command("display version", expect_string=PROMPT)
+        finally:
+            conn.disconnect()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one, range(ops)))
+
+
+def run_pooled(pool, params, ops, workers):
+    """会话池：同一台设备的会话登录一次后反复借用"""
+    def one(_):
+        with pool.session(params) as conn:
+            return conn.send_command("display version", expect_string=PROMPT)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one, range(ops)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSH会话池基准测试")
+    parser.add_argument("--ops", type=int, default=20, help="操作次数（每次执行一条 display version）")
+    parser.add_argument("--workers", type=int, default=4, help="并发线程数")
+    parser.add_argument("--login-delay", type=float, default=2.0, help="假设备每次登录耗时（秒）")
+    parser.add_argument("--max-per-device", type=int, default=2, help="会话池每台设备最多会话数")
+    args = parser.parse_args()
+
+    port, stats = start_fake_device(args.login_delay)
+    params = {"device_type": "huawei", "host": "127.0.0.1", "port": port,
+              "username": "admin", "password": "admin", "fast_cli": False}
+    print(f"假设备：127.0.0.1:{port}，登录耗时{args.login_delay}s，操作{args.ops}次，并发{args.workers}")
+    print("-" * 64)
+
+    start = time.perf_counter()
+    run_direct(params, args.ops, args.workers)
+    direct_s = time.perf_counter() - start
+    direct_logins = stats["logins"]
+    print(f"{'每次新建连接':<20}{direct_s:>8.2f}s{args.ops / direct_s:>10.2f} ops/s   登录{direct_logins}次")
+
+    pool = SSHSessionPool(max_per_device=args.max_per_device)
+    start = time.perf_counter()
+    run_pooled(pool, params, args.ops, args.workers)
+    pooled_s = time.perf_counter() - start
+    pool_stats = pool.stats()
+    print(f"{'会话池':<20}{pooled_s:>8.2f}s{args.ops / pooled_s:>10.2f} ops/s   登录{stats['logins'] - direct_logins}次"
+          f"（复用{pool_stats['reused']}次）")
+    print(f"加速比：{direct_s / pooled_s:.1f}x")
+    pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
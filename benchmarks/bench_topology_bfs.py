@@ -0,0 +1,91 @@
+"""
+多层拓扑扫描基准测试：本机起几百个 SNMP agent，走真实的 SNMPCollector，对比逐台串行采集和按层并发采集的耗时
+
+用法：
+    python benchmarks/bench_topology_bfs.py --fanout 1 4 8 8 --latency 0.05 --concurrency 1 4 16 32
+    python benchmarks/bench_topology_bfs.py --unreachable 5 --device-timeout 3   # 部分设备不可达，看超时的影响
+concurrency=1 相当于原来的逐台串行扫描。需要 pysnmp，agent 监听 127.1.x.y（Linux 上本机地址）
+agent 的报文编解码和扫描端在同一台机器上抢 CPU，单核机器上并发到 4 左右就到了 CPU 上限，多核机器或真实设备上加速比更高
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.simulator.snmp_agents import DEFAULT_PORT, CampusTopology, SnmpAgentFarm
+from core.topology.topology_builder import TopologyBuilder
+import core.topology.snmp_collector  # noqa: F401  先建好各模块的 logger，quiet_console 才能调到
+
+
+def quiet_console(level=logging.ERROR):
+    """每台设备都会打几行 INFO，压测时控制台只留错误（日志文件照常写）"""
+    for logger in logging.Logger.manager.loggerDict.values():
+        for handler in getattr(logger, "handlers", []):
+            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+                handler.setLevel(level)
+
+
+def run_scan(campus, farm, args, concurrency):
+    builder = TopologyBuilder()
+    requests = farm.requests
+    started = time.perf_counter()
+    collected = asyncio.run(builder.build_topology_bfs(
+        campus.seed_ip, max_depth=args.depth, concurrency=concurrency, device_timeout=args.device_timeout,
+        collector_factory=farm.collector_factory(timeout=args.snmp_timeout),
+    ))
+    return {
+        "concurrency": concurrency,
+        "elapsed": time.perf_counter() - started,
+        "devices": len(collected),
+        "nodes": len(builder.nodes),
+        "links": len(builder.links),
+        "requests": farm.requests - requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多层拓扑扫描基准测试")
+    parser.add_argument("--fanout", type=int, nargs="+", default=[1, 4, 8, 8], help="每层扇出（第一项是核心设备数）")
+    parser.add_argument("--redundancy", type=float, default=0.3, help="双上联比例")
+    parser.add_argument("--arps", type=int, default=20, help="接入层每台设备的 ARP 表项数")
+    parser.add_argument("--latency", type=float, default=0.05, help="agent 每个请求的应答延迟（秒）")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32], help="要对比的并发数")
+    parser.add_argument("--depth", type=int, help="最大扫描深度，默认扫完所有层")
+    parser.add_argument("--unreachable", type=int, default=0, help="不应答的设备数（不含种子设备）")
+    parser.add_argument("--device-timeout", type=float, default=10, help="单台设备采集超时（秒）")
+    parser.add_argument("--snmp-timeout", type=float, default=3.0, help="单个 SNMP 请求超时（秒）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="agent 监听的 UDP 端口")
+    parser.add_argument("--verbose", action="store_true", help="控制台显示每台设备的日志")
+    args = parser.parse_args()
+    if not args.verbose:
+        quiet_console()
+    args.depth = args.depth or len(args.fanout)
+
+    started = time.perf_counter()
+    campus = CampusTopology(fanout=args.fanout, redundancy=args.redundancy, arps=args.arps)
+    others = [ip for ip in campus.devices if ip != campus.seed_ip]
+    unreachable = random.Random(1).sample(others, min(args.unreachable, len(others)))
+    reachable = campus.reachable_within(args.depth)
+    print(f"生成园区网：{len(campus.devices)}台设备（{args.depth}层内{reachable}台），"
+          f"{len(unreachable)}台不可达，应答延迟{args.latency * 1000:.1f}ms，{time.perf_counter() - started:.2f}s")
+    print("-" * 72)
+    print(f"{'并发':>6} {'耗时(s)':>10} {'采集设备':>8} {'节点':>6} {'链路':>6} {'SNMP请求':>9} {'设备/秒':>9} {'加速比':>7}")
+
+    baseline = None
+    with SnmpAgentFarm(campus, port=args.port, latency=args.latency, unreachable=unreachable) as farm:
+        for concurrency in args.concurrency:
+            result = run_scan(campus, farm, args, concurrency)
+            baseline = baseline or result["elapsed"]
+            print(f"{result['concurrency']:>6} {result['elapsed']:>10.2f} {result['devices']:>8} {result['nodes']:>6} "
+                  f"{result['links']:>6} {result['requests']:>9} {result['devices'] / result['elapsed']:>9.1f} "
+                  f"{baseline / result['elapsed']:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -247,16 +247,23 @@ class ReportGenerator:
 
     def get_deepseek_all_device_health_weekly(self, days=7):
         logger.info(f"正在分析所有设备近{days}天的健康状态，生成AI运维报告...")
-        all_health_record = self.db.get_health_check_history(days=days)
-        if not all_health_record:
+        # 周报只需要汇总数字：从时序汇总表按设备合并，不再把几天的原始记录全部读出来塞进Prompt
+        device_summary = self.db.get_health_summary(days=days)
+        if not device_summary:
             return f"近{days}天全网无设备健康检查记录，无法生成健康周报"
+        issue_counts = self.db.get_health_issue_counts(days=days)
+        all_health_record = {
+            "device_summary": device_summary,
+            "issue_counts": [{"issue": issue, "times": times} for issue, times in issue_counts],
+        }
 
         # 全设备周报专属Prompt - 精简聚焦全网汇总、分层、高频问题、全局建议
         prompt = f"""
         你是10年+资深网络运维架构师，擅长全网设备健康状态汇总分析与运维周报编写，报告专业简洁、数据支撑充分、建议落地可执行。
-        请根据以下【全网所有设备近{days}天健康检查原始记录（JSON格式）】，生成一份全网设备健康运维周报，贴合企业运维定期汇报场景，内容聚焦全局概况、问题汇总、优化建议。
+        请根据以下【全网所有设备近{days}天健康检查汇总（JSON格式）】，生成一份全网设备健康运维周报，贴合企业运维定期汇报场景，内容聚焦全局概况、问题汇总、优化建议。
+        说明：device_summary 按设备汇总，samples=检查次数，healthy_ratio=健康率，reachability_ratio=可达率，cpu/mem为使用率(%)均值和峰值；issue_counts 为健康问题出现次数。
 
-        【全网设备 - 近{days}天健康检查原始记录】:
+        【全网设备 - 近{days}天健康检查汇总】:
         {json.dumps(all_health_record, indent=2, ensure_ascii=False)}
 
         # 核心分析要求（全网汇总，必覆盖）
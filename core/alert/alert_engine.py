@@ -32,7 +32,11 @@ class AlertEngine:
     定时检查设备状态，超过阈值时触发告警
     """
 
-    def __init__(self):
+    def __init__(self, db=None):
+        """
+        :param db: 读取告警规则、设备指标和写告警历史的数据库，默认进程共享的 db_manager（压测时用单独的库）
+        """
+        self.db = db if db is not None else db_manager
         self.is_running = False
         self.check_thread = None
         self.check_interval = 60  # 检查间隔（秒）
@@ -69,18 +73,20 @@ class AlertEngine:
             time.sleep(self.check_interval)
 
     def check_all_rules(self):
-        """检查所有启用的告警规则"""
-        rules = db_manager.get_alert_rules(is_enabled=1)
+        """检查所有启用的告警规则，返回触发的告警条数"""
+        rules = self.db.get_alert_rules(is_enabled=1)
         if not rules:
-            return
+            return 0
 
         logger.info(f"开始检查 {len(rules)} 条告警规则")
 
+        triggered = 0
         for rule in rules:
             try:
-                self._check_single_rule(rule)
+                triggered += bool(self._check_single_rule(rule))
             except Exception as e:
                 logger.error(f"检查规则 {rule['id']} 失败：{e}")
+        return triggered
 
     def _check_single_rule(self, rule):
         """检查单条告警规则"""
@@ -94,10 +100,10 @@ class AlertEngine:
         severity = rule['severity']
 
         # 获取设备当前指标值
-        current_value = self._get_device_metric(device_ip or device_name, metric_type, metric_field)
+        current_value = self._get_device_metric(device_name, device_ip, metric_type, metric_field)
 
         if current_value is None:
-            return
+            return False
 
         # 比较是否超过阈值
         is_triggered = self._compare_value(current_value, operator, threshold)
@@ -109,8 +115,9 @@ class AlertEngine:
                 message += f"（{metric_field}）"
             message += f" 当前值 {current_value}，{operator} 阈值 {threshold}"
 
-            # 保存告警历史
-            alert_id = db_manager.add_alert_history(
+            # 保存告警历史（需要发邮件时要拿到告警ID标记已发送，所以同步写入）
+            need_email = bool(rule.get('enable_email_alert') and rule.get('email_recipients'))
+            alert_id = self.db.add_alert_history(
                 rule_id=rule_id,
                 device_name=device_name or '未知',
                 device_ip=device_ip or '',
@@ -119,33 +126,32 @@ class AlertEngine:
                 threshold_value=threshold,
                 severity=severity,
                 message=message,
+                sync=need_email,
             )
 
             logger.warning(f"告警触发：{message}")
 
             # 发送邮件
-            if rule.get('enable_email_alert') and rule.get('email_recipients'):
+            if need_email:
                 self._send_alert_email(rule, message, current_value)
-                db_manager.mark_alert_email_sent(alert_id)
+                self.db.mark_alert_email_sent(alert_id)
+        return is_triggered
 
-    def _get_device_metric(self, device_id, metric_type, metric_field):
+    def _get_device_metric(self, device_name, device_ip, metric_type, metric_field):
         """
         获取设备指标值
         这里简化处理，实际应该通过SNMP查询
         """
-        # 从最新的健康检查记录中获取
+        # 从最新的健康检查记录中获取（数值列，N/A 为None，不会触发告警）
         try:
-            # 查询最新的健康检查记录
-            records = db_manager.get_health_check_records(device_name=device_id, limit=1)
-            if not records:
+            record = self.db.get_latest_device_metrics(device_name=device_name, host=device_ip)
+            if not record:
                 return None
 
-            record = records[0]
-
             if metric_type == 'cpu':
-                return record.get('cpu_usage')
+                return record.get('cpu_pct')
             elif metric_type == 'memory':
-                return record.get('memory_usage')
+                return record.get('mem_pct')
             elif metric_type == 'interface':
                 # 接口状态检查
                 interfaces = record.get('interfaces', [])
@@ -208,14 +214,14 @@ class AlertEngine:
 
             # 获取收件人（从邮箱列表中获取所有邮箱）
             recipients = []
-            emails_setting = db_manager.get_setting('receive_emails', '[]')
+            emails_setting = self.db.get_setting('receive_emails', '[]')
             email_list = json.loads(emails_setting)
             if email_list:
                 recipients = [item['email'] for item in email_list]
 
             # 如果邮箱列表为空，使用旧的单邮箱配置
             if not recipients:
-                receive_email = db_manager.get_setting('receive_email', '')
+                receive_email = self.db.get_setting('receive_email', '')
                 if receive_email:
                     recipients.append(receive_email)
 
@@ -0,0 +1,330 @@
+"""
+备份集打包下载：把选中的一批备份打成 zip / tar / tar.gz 边生成边返回
+原来 /api/v1/backup/download 一次只能下载一个文件，拉一晚 800 台设备的备份要 800 次请求。这里：
+1. 只把备份记录（元数据）读进内存，备份内容逐个从备份仓库边解压边写进归档，不落临时文件、不在内存里拼完整归档
+2. zip 用 STORED（不压缩，备份仓库里已经压缩过了）+ 数据描述符（CRC 写在内容后面，边读边算），
+   tar 的每个条目长度也是确定的，所以两种格式在生成之前就能算出总长度，支持 HTTP Range 断点续传：
+   续传时整段跳过的条目不读内容（zip 中央目录需要的 CRC 按需补算并缓存）
+3. tar.gz 的压缩后长度事先不知道，只能整包流式返回，不支持续传
+4. ETag 由条目清单（文件名、大小、校验和）算出，备份集变了续传时 If-Range 对不上就整包重新下载
+
+用法：
+    archive = BackupArchive(records, fmt="zip")
+    archive.length, archive.etag
+    for chunk in archive.iter_bytes(start, end): ...
+"""
+
+import os
+import sys
+import zlib
+import struct
+import hashlib
+import tarfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+from core.backup.repository import get_backup_repository
+
+logger = setup_logger("netdevops_backup", "backup.log")
+
+ARCHIVE_FORMATS = {
+    "zip": "application/zip",
+    "tar": "application/x-tar",
+    "tar.gz": "application/gzip",
+}
+# 支持 Range 续传的格式（总长度可以事先算出）
+RESUMABLE_FORMATS = ("zip", "tar")
+
+CHUNK_SIZE = 64 * 1024
+# 不做 zip64：条目数和偏移量超过 zip32 上限时请缩小范围或改用 tar
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_MAX_ENTRIES = 0xFFFF
+ZIP_FLAGS = 0x0808  # bit3：CRC 写在数据描述符里；bit11：文件名是 UTF-8
+
+# 备份内容不会变（按内容寻址），CRC 按 checksum / 文件路径缓存
+_crc_cache = OrderedDict()
+_crc_lock = threading.Lock()
+CRC_CACHE_SIZE = 4096
+
+
+class ArchiveEntry:
+    """归档里的一个文件：备份仓库里的对象（checksum）或者 backupN1/ 下的老备份文件（path）"""
+
+    def __init__(self, name, size, mtime, checksum=None, path=None):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.checksum = checksum
+        self.path = path
+        self.crc = None
+
+    @property
+    def key(self):
+        return self.checksum or self.path
+
+
+def _parse_time(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except (TypeError, ValueError):
+        return datetime.now()
+
+
+def build_entries(records, repository=None):
+    """
+    备份记录 -> 归档条目，文件名为 <设备名>/<备份文件名>；内容已经找不到的记录跳过
+    :param records: backup_records 行（dict）
+    :return: ArchiveEntry 列表
+    """
+    repository = repository or get_backup_repository()
+    entries, names = [], set()
+    root = os.path.realpath(ROOT_DIR) + os.sep
+    for record in records:
+        backup_path = record.get("backup_path") or ""
+        checksum = record.get("checksum")
+        path = None
+        if checksum and repository.exists(checksum):
+            size = record.get("backup_size") or 0
+        else:
+            checksum = None
+            # 老备份文件：规范化后必须还在项目目录下（防 ../ 和绝对路径读到项目外的文件）
+            path = os.path.realpath(os.path.join(ROOT_DIR, backup_path))
+            if not backup_path or not path.startswith(root) or not os.path.isfile(path):
+                logger.warning(f"备份记录{record.get('id')}的内容已不存在，打包时跳过：{backup_path}")
+                continue
+            size = os.path.getsize(path)
+        name = f"{record['hostname']}/{os.path.basename(backup_path)}"
+        if name in names:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}-{record['id']}{ext}"
+        names.add(name)
+        entries.append(ArchiveEntry(name, size, _parse_time(record.get("start_time")), checksum=checksum, path=path))
+    return entries
+
+
+class BackupArchive:
+    """按条目清单流式生成归档，zip / tar 支持从任意字节偏移开始生成"""
+
+    def __init__(self, entries, fmt="zip", repository=None, chunk_size=CHUNK_SIZE):
+        """
+        :param entries: ArchiveEntry 列表（build_entries 的结果）
+        :param fmt: zip / tar / tar.gz
+        :param repository: 备份仓库，默认进程内共享的仓库
+        :param chunk_size: 读取备份内容的块大小
+        """
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"不支持的归档格式：{fmt}")
+        self.entries = entries
+        self.fmt = fmt
+        self.repository = repository or get_backup_repository()
+        self.chunk_size = chunk_size
+        self.mimetype = ARCHIVE_FORMATS[fmt]
+        self.resumable = fmt in RESUMABLE_FORMATS
+        self._segments = self._zip_segments() if fmt == "zip" else self._tar_segments()
+        self.length = sum(size for size, _ in self._segments) if self.resumable else None
+        if fmt == "zip" and (self.length > ZIP32_LIMIT or len(entries) >= ZIP32_MAX_ENTRIES):
+            raise ValueError("备份集超过 zip 格式上限（4GB / 65535个文件），请缩小范围或改用 tar")
+
+    @property
+    def etag(self):
+        digest = hashlib.sha256(self.fmt.encode())
+        for entry in self.entries:
+            digest.update(f"{entry.name}\0{entry.size}\0{entry.key}\n".encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    def iter_bytes(self, start=0, end=None):
+        """
+        生成 [start, end] 区间（闭区间）的归档字节，不传 end 生成到结尾
+        整段落在区间之前的条目不读取内容
+        """
+        if start and not self.resumable:
+            raise ValueError(f"{self.fmt} 格式不支持从中间开始生成")
+        if self.fmt == "tar.gz":
+            yield from self._gzip(self._iter_segments(0, None))
+            return
+        yield from self._iter_segments(start, end)
+
+    def _iter_segments(self, start, end):
+        offset = 0
+        for size, produce in self._segments:
+            if end is not None and offset > end:
+                break
+            if size is not None and offset + size <= start:
+                offset += size
+                continue
+            position = offset
+            for chunk in produce():
+                chunk_end = position + len(chunk)
+                if chunk_end > start and (end is None or position <= end):
+                    low = max(start - position, 0)
+                    high = len(chunk) if end is None else min(len(chunk), end + 1 - position)
+                    yield chunk[low:high]
+                position = chunk_end
+                if end is not None and position > end:
+                    break
+            offset = position
+
+    def _gzip(self, chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31：gzip 格式
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    # ------------------------------------------------------------
+    # 条目内容
+    # ------------------------------------------------------------
+
+    def _read(self, entry):
+        """逐块读取条目内容，边读边算 CRC，长度和清单对不上时中止（避免生成损坏的归档）"""
+        if entry.checksum:
+            chunks = self.repository.open_stream(entry.checksum)
+        else:
+            chunks = _read_file(entry.path, self.chunk_size)
+        crc, total = 0, 0
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            total += len(chunk)
+            yield chunk
+        if total != entry.size:
+            raise IOError(f"备份内容长度和记录不一致：{entry.name}（记录{entry.size}字节，实际{total}字节）")
+        entry.crc = crc
+        _remember_crc(entry.key, crc)
+
+    def _crc(self, entry):
+        """条目的 CRC：生成过内容就直接用，续传时跳过的条目从缓存取或补读一遍"""
+        if entry.crc is None:
+            entry.crc = _cached_crc(entry.key)
+        if entry.crc is None:
+            for _ in self._read(entry):
+                pass
+        return entry.crc
+
+    # ------------------------------------------------------------
+    # zip
+    # ------------------------------------------------------------
+
+    def _zip_segments(self):
+        segments, offset, offsets = [], 0, []
+        for entry in self.entries:
+            header = _zip_local_header(entry)
+            offsets.append(offset)
+            segments.append((len(header), _constant(header)))
+            segments.append((entry.size, lambda entry=entry: self._read(entry)))
+            segments.append((16, lambda entry=entry: iter([_zip_descriptor(entry, self._crc(entry))])))
+            offset += len(header) + entry.size + 16
+        directory_size = sum(46 + len(entry.name.encode("utf-8")) for entry in self.entries)
+
+        def central_directory():
+            for entry, local_offset in zip(self.entries, offsets):
+                yield _zip_central_header(entry, self._crc(entry), local_offset)
+            yield struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(self.entries), len(self.entries),
+                              directory_size, offset, 0)
+
+        segments.append((directory_size + 22, central_directory))
+        return segments
+
+    # ------------------------------------------------------------
+    # tar
+    # ------------------------------------------------------------
+
+    def _tar_segments(self):
+        segments = []
+        for entry in self.entries:
+            info = tarfile.TarInfo(entry.name)
+            info.size = entry.size
+            info.mtime = int(entry.mtime.timestamp())
+            info.mode = 0o644
+            header = info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8")
+            padding = b"\0" * (-entry.size % tarfile.BLOCKSIZE)
+            segments.append((len(header), _constant(header)))
+            segments.append((entry.size, lambda entry=entry: self._read(entry)))
+            if padding:
+                segments.append((len(padding), _constant(padding)))
+        end = b"\0" * (tarfile.BLOCKSIZE * 2)
+        segments.append((len(end), _constant(end)))
+        return segments
+
+
+def _constant(data):
+    return lambda: iter([data])
+
+
+def _read_file(path, chunk_size):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _cached_crc(key):
+    with _crc_lock:
+        crc = _crc_cache.get(key)
+        if crc is not None:
+            _crc_cache.move_to_end(key)
+        return crc
+
+
+def _remember_crc(key, crc):
+    with _crc_lock:
+        _crc_cache[key] = crc
+        _crc_cache.move_to_end(key)
+        while len(_crc_cache) > CRC_CACHE_SIZE:
+            _crc_cache.popitem(last=False)
+
+
+def _dos_time(moment):
+    moment = max(moment, datetime(1980, 1, 1))
+    return (moment.hour << 11) | (moment.minute << 5) | (moment.second // 2), \
+        ((moment.year - 1980) << 9) | (moment.month << 5) | moment.day
+
+
+def _zip_local_header(entry):
+    name = entry.name.encode("utf-8")
+    dos_time, dos_date = _dos_time(entry.mtime)
+    # 大小已知，直接写进本地头（流式解压工具可以据此跳过 STORED 内容）；CRC 在数据描述符里
+    return struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, ZIP_FLAGS, 0, dos_time, dos_date,
+                       0, entry.size, entry.size, len(name), 0) + name
+
+
+def _zip_descriptor(entry, crc):
+    return struct.pack("<IIII", 0x08074B50, crc, entry.size, entry.size)
+
+
+def _zip_central_header(entry, crc, local_offset):
+    name = entry.name.encode("utf-8")
+    dos_time, dos_date = _dos_time(entry.mtime)
+    return struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 20, 20, ZIP_FLAGS, 0, dos_time, dos_date,
+                       crc, entry.size, entry.size, len(name), 0, 0, 0, 0, 0o100644 << 16, local_offset) + name
+
+
+def parse_range(header, length):
+    """
+    解析单个 Range 头（bytes=start-end / bytes=start- / bytes=-suffix）
+    :return: (start, end)；没有或不支持（多段）返回 None；超出范围返回 False
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                return False
+            return max(length - suffix, 0), length - 1
+        start = int(first)
+        end = int(last) if last else length - 1
+    except ValueError:
+        return None
+    if start >= length or end < start:
+        return False
+    return start, min(end, length - 1)
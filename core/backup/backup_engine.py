@@ -0,0 +1,290 @@
+"""
+并发备份引擎
+原来 backup_handler.main() 逐台串行备份，失败时 @ssh_retry 在循环里 sleep 2秒、4秒，一台不可达的设备拖住整轮备份；
+web 端 /api/backup/all 又是另一份串行循环。现在命令行和 web 端都走这里：
+1. 全局并发上限 global_limit + 每个站点 per_site_limit + 每个厂商 per_vendor_limit（站点/厂商取设备信息里的 site / vendor，
+   没填的设备不受对应的限制，只受全局上限）
+2. 失败的设备放进重试队列，到了退避时间再重新派发，等待期间不占用线程和并发名额
+3. 每台设备完成后更新进度（总数/完成/成功/失败/执行中/等待重试），可以传回调，也可以随时调用 progress() 查询
+4. 每台设备的最终结果写 backup_records（重试过程中的失败不重复写）
+
+用法：
+    engine = BackupEngine(global_limit=20, per_site_limit=5)
+    results = engine.run(devices)
+"""
+
+import os
+import sys
+import time
+import heapq
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+from core.backup.repository import StoredBackup
+
+logger = setup_logger("netdevops_backup", "backup.log")
+
+# 备份引擎配置，可用环境变量覆盖
+BACKUP_ENGINE_CONFIG = {
+    "global_limit": int(os.getenv("NETDEVOPS_BACKUP_CONCURRENCY", "20")),  # 同时备份的设备总数
+    "per_site_limit": int(os.getenv("NETDEVOPS_BACKUP_SITE_LIMIT", "5")),  # 每个站点同时备份的设备数
+    "per_vendor_limit": int(os.getenv("NETDEVOPS_BACKUP_VENDOR_LIMIT", "10")),  # 每个厂商同时备份的设备数
+    "max_retries": 2,  # 失败后最多重试几次（不含第一次）
+    "retry_delay": 2.0,  # 第一次重试前等待的秒数
+    "backoff": 2.0,  # 之后每次重试等待时间的倍数
+}
+
+# 设备信息里不是连接参数的字段，交给会话池前去掉
+NON_CONNECTION_FIELDS = ("device_name", "vendor", "site")
+
+
+def _has_slot(running, key, limit):
+    """站点/厂商还有并发名额（没填站点/厂商的设备不受限制）"""
+    return key is None or running.get(key, 0) < limit
+
+
+class BackupJob:
+    """一台设备的备份任务"""
+
+    def __init__(self, index, device):
+        self.index = index
+        self.device = device
+        self.name = device.get("device_name") or device.get("host", "未知设备")
+        # 没填站点/厂商时为 None，不受对应的并发限制（设备清单大多没有这两个字段，不能都算成同一个站点）
+        self.site = device.get("site") or None
+        self.vendor = device.get("vendor") or None
+        self.attempts = 0
+        self.started_at = None  # 第一次开始备份的时间
+        self.error = None
+        self.stored = None  # 备份函数返回的 StoredBackup（存进备份仓库时）
+
+    def connection_params(self):
+        return {k: v for k, v in self.device.items() if k not in NON_CONNECTION_FIELDS}
+
+
+class BackupEngine:
+    """带全局/站点/厂商并发限制和重试队列的批量备份"""
+
+    def __init__(self, backup_func=None, global_limit=None, per_site_limit=None, per_vendor_limit=None,
+                 max_retries=None, retry_delay=None, backoff=None, db=None, record=True, on_progress=None):
+        """
+        :param backup_func: 备份一台设备的函数，参数为连接参数，返回 StoredBackup 或备份文件的相对路径，失败抛异常（不能自带重试）
+                            默认 backup_handler.backup_device
+        :param global_limit: 同时备份的设备总数
+        :param per_site_limit: 每个站点同时备份的设备数
+        :param per_vendor_limit: 每个厂商同时备份的设备数
+        :param max_retries: 失败后最多重试几次
+        :param retry_delay: 第一次重试前的等待秒数，之后按 backoff 倍增
+        :param db: 备份记录写入的数据库，默认 db_manager
+        :param record: 是否把每台设备的最终结果写入 backup_records
+        :param on_progress: 每台设备完成（成功、失败或进入重试队列）后调用，参数为 progress() 的结果
+        """
+        config = BACKUP_ENGINE_CONFIG
+        self.backup_func = backup_func
+        self.global_limit = global_limit or config["global_limit"]
+        self.per_site_limit = per_site_limit or config["per_site_limit"]
+        self.per_vendor_limit = per_vendor_limit or config["per_vendor_limit"]
+        self.max_retries = config["max_retries"] if max_retries is None else max_retries
+        self.retry_delay = config["retry_delay"] if retry_delay is None else retry_delay
+        self.backoff = backoff or config["backoff"]
+        self.db = db
+        self.record = record
+        self.on_progress = on_progress
+
+        self._cond = threading.Condition()
+        self._ready = deque()  # 可以立即派发的任务
+        self._retry = []  # (可以重试的时间, 序号, 任务)
+        self._running_sites = {}
+        self._running_vendors = {}
+        self._running = 0
+        self._results = {}
+        self._progress = {}
+        self._started = None
+
+    # ------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------
+
+    def run(self, devices):
+        """
+        备份一组设备，全部完成（成功或重试耗尽）后返回
+        :param devices: 设备信息列表（连接参数 + 可选的 device_name / vendor / site）
+        :return: 按输入顺序的结果列表：device_name/host/status(成功/失败)/backup_path/attempts/duration/error
+        """
+        backup_func = self.backup_func or _default_backup_func()
+        jobs = [BackupJob(i, device) for i, device in enumerate(devices)]
+        with self._cond:
+            self._ready = deque(jobs)
+            self._retry = []
+            self._results = {}
+            self._started = time.monotonic()
+            self._progress = {"total": len(jobs), "succeeded": 0, "failed": 0, "retries": 0}
+        logger.info(f"开始批量备份{len(jobs)}台设备：全局并发{self.global_limit}，"
+                    f"每站点{self.per_site_limit}，每厂商{self.per_vendor_limit}")
+
+        with ThreadPoolExecutor(max_workers=self.global_limit, thread_name_prefix="backup") as executor:
+            while True:
+                with self._cond:
+                    job = self._next_job()
+                    if job is None:
+                        if len(self._results) == len(jobs):
+                            break
+                        self._cond.wait(self._wait_time())
+                        continue
+                    self._acquire(job)
+                executor.submit(self._execute, job, backup_func)
+
+        progress = self.progress()
+        logger.info(f"批量备份完成：成功{progress['succeeded']}/{progress['total']}，失败{progress['failed']}，"
+                    f"重试{progress['retries']}次，耗时{progress['elapsed']}秒")
+        return [self._results[job.index] for job in jobs]
+
+    def progress(self):
+        """当前进度：total/done/succeeded/failed/running/retry_pending/retries/elapsed"""
+        with self._cond:
+            progress = dict(self._progress)
+            progress["done"] = progress.get("succeeded", 0) + progress.get("failed", 0)
+            progress["running"] = self._running
+            progress["queued"] = len(self._ready)
+            progress["retry_pending"] = len(self._retry)
+            progress["elapsed"] = round(time.monotonic() - self._started, 2) if self._started else 0.0
+        return progress
+
+    # ------------------------------------------------------------
+    # 调度（调用方持有 self._cond）
+    # ------------------------------------------------------------
+
+    def _next_job(self):
+        """到期的重试任务放回待派发队列，再按顺序找第一个站点/厂商都还有名额的任务"""
+        now = time.monotonic()
+        while self._retry and self._retry[0][0] <= now:
+            self._ready.append(heapq.heappop(self._retry)[2])
+        if self._running >= self.global_limit:
+            return None
+        for job in self._ready:
+            if (_has_slot(self._running_sites, job.site, self.per_site_limit)
+                    and _has_slot(self._running_vendors, job.vendor, self.per_vendor_limit)):
+                self._ready.remove(job)
+                return job
+        return None
+
+    def _wait_time(self):
+        if self._retry:
+            return max(0.0, self._retry[0][0] - time.monotonic())
+        return None
+
+    def _acquire(self, job):
+        self._running += 1
+        if job.site is not None:
+            self._running_sites[job.site] = self._running_sites.get(job.site, 0) + 1
+        if job.vendor is not None:
+            self._running_vendors[job.vendor] = self._running_vendors.get(job.vendor, 0) + 1
+
+    def _release(self, job):
+        self._running -= 1
+        if job.site is not None:
+            self._running_sites[job.site] -= 1
+        if job.vendor is not None:
+            self._running_vendors[job.vendor] -= 1
+
+    # ------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------
+
+    def _execute(self, job, backup_func):
+        job.attempts += 1
+        job.started_at = job.started_at or datetime.now()
+        backup_path, error = None, None
+        try:
+            backup_path = backup_func(job.connection_params())
+            if isinstance(backup_path, StoredBackup):
+                job.stored = backup_path
+                backup_path = backup_path.backup_path
+            if not isinstance(backup_path, str):
+                raise Exception("备份函数未返回有效路径")
+        except Exception as e:
+            error = str(e)
+
+        result = None
+        with self._cond:
+            self._release(job)
+            if error is None:
+                result = self._finish(job, "成功", backup_path)
+            elif job.attempts <= self.max_retries:
+                delay = self.retry_delay * self.backoff ** (job.attempts - 1)
+                heapq.heappush(self._retry, (time.monotonic() + delay, job.index, job))
+                self._progress["retries"] += 1
+                logger.warning(f"设备{job.name}第{job.attempts}次备份失败，{delay:.1f}秒后重试：{error[:80]}")
+            else:
+                job.error = error
+                result = self._finish(job, "失败", None)
+                logger.warning(f"设备{job.name}重试{self.max_retries}次后仍备份失败，跳过该设备：{error[:80]}")
+            self._cond.notify_all()
+
+        if result is not None and self.record:
+            self._record(job, result)
+        self._report_progress()
+
+    def _finish(self, job, status, backup_path):
+        ended = datetime.now()
+        result = {
+            "device_name": job.name,
+            "host": job.device.get("host", ""),
+            "status": status,
+            "backup_path": backup_path or "N/A",
+            "attempts": job.attempts,
+            "duration": round((ended - job.started_at).total_seconds(), 2),
+            "error": (job.error or "")[:100],
+            "start_time": job.started_at,
+            "end_time": ended,
+        }
+        self._results[job.index] = result
+        self._progress["succeeded" if status == "成功" else "failed"] += 1
+        return result
+
+    def _record(self, job, result):
+        db = self.db
+        if db is None:
+            from db.database import db_manager as db
+        try:
+            if result["status"] == "成功" and job.stored is not None:
+                stored = job.stored
+                db.log_backup(hostname=job.name, backup_path=stored.backup_path, status="success",
+                              start_time=result["start_time"], end_time=result["end_time"], backup_size=stored.raw_size,
+                              checksum=stored.checksum, dedup=stored.dedup, stored_size=stored.stored_size)
+            elif result["status"] == "成功":
+                path = os.path.join(ROOT_DIR, result["backup_path"])
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                db.log_backup(hostname=job.name, backup_path=result["backup_path"], status="success",
+                              start_time=result["start_time"], end_time=result["end_time"], backup_size=size)
+            else:
+                db.log_backup(hostname=job.name, backup_path="N/A", status="failed",
+                              error_message=result["error"], start_time=result["start_time"])
+        except Exception as e:
+            logger.error(f"设备{job.name}的备份记录写库失败：{str(e)[:100]}")
+
+    def _report_progress(self):
+        progress = self.progress()
+        logger.info(f"备份进度：{progress['done']}/{progress['total']}（成功{progress['succeeded']}，"
+                    f"失败{progress['failed']}，执行中{progress['running']}，等待重试{progress['retry_pending']}）")
+        if self.on_progress is not None:
+            try:
+                self.on_progress(progress)
+            except Exception as e:
+                logger.warning(f"备份进度回调出错：{str(e)[:100]}")
+
+
+def _default_backup_func():
+    from core.backup.backup_handler import backup_device
+
+    return backup_device
+
+
+def backup_devices(devices, **kwargs):
+    """用默认配置批量备份一组设备（参数同 BackupEngine）"""
+    return BackupEngine(**kwargs).run(devices)
@@ -1,7 +1,5 @@
-import time
 import os
 import argparse
-from netmiko import ConnectHandler
 import yaml
 import sys
 
@@ -12,6 +10,10 @@ BACKUP_DIR = os.path.join(
 )
 from utils.log_setup import setup_logger
 from utils.retry_decorator import ssh_retry
+from core.connection.session_pool import session_pool
+from core.connection.command_runner import run_command
+from core.backup.backup_engine import BackupEngine
+from core.backup.repository import get_backup_repository
 
 
 CONFIG_PATH = os.path.join(ROOT_DIR, "config", "devices.yaml")
@@ -46,36 +48,34 @@ def read_devices_yml(filename):
         return device_list
 
 
-# 第二步：对单个设备进行备份
-@ssh_retry
-def backup_single_device(device_info):
+# 第二步：对单个设备进行备份（不带重试，批量备份时由 BackupEngine 的重试队列负责重试）
+# 返回 StoredBackup（逻辑路径、校验和、去重是否命中、新增磁盘占用）
+def backup_device(device_info):
     logger.info(f"正在尝试连接{device_info['host']}......")
-    connections = None
+    lease = None  # 从会话池借出的会话
+    broken = False
     try:
         # 添加兼容HCL模拟器的参数
-        device_info["global_delay_factor"] = 2
+        # 命令按提示符判断结束（run_command），不再需要 global_delay_factor=2 拉长每条命令的等待
         device_info["timeout"] = 30
         device_info["conn_timeout"] = 10
         device_info["fast_cli"] = False
         
-        connections = ConnectHandler(**device_info)
+        lease = session_pool.acquire(device_info)
+        connections = lease.connection
         logger.info("连接成功！")
         logger.info(f"正在开始备份设备{device_info['host']}........请稍后....")
         
-        # 使用send_command_timing替代send_command，避免提示符匹配问题
-        output = connections.send_command_timing("display interface brief", delay_factor=2)
-        backup_dir = os.path.join(ROOT_DIR, "backupN1")  # "backupN1"  # N1的意思是创建第一个文件夹，以后若有需要可以该
-        os.makedirs(backup_dir, exist_ok=True)
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        filename = os.path.join(backup_dir, f"{device_info['host']}__配置__{timestamp}.txt")
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(output)
+        # 读到提示符就返回，提示符匹配不上的设备会自动改用定时读取
+        output = run_command(connections, "display interface brief")
+        # 存进去重压缩的备份仓库：内容和以前某次备份相同就不再重复占用磁盘
+        stored = get_backup_repository().store(device_info["host"], output)
         logger.info(f"设备{device_info['host']}备份成功！")
-        logger.info(f"备份之后的路径\文件名为：{filename}")
-        # 返回相对路径给调用者
-        relative_path = f"backupN1/{os.path.basename(filename)}"
-        return relative_path
+        logger.info(f"备份路径：{stored.backup_path}，校验和：{stored.checksum[:12]}，"
+                    + ("内容未变化，复用已有备份对象" if stored.dedup else f"压缩后{stored.stored_size}字节"))
+        return stored
     except Exception as e:
+        broken = True  # 出错的会话不放回池里，重试时重新登录
         error_msg = str(e)
         logger.error("连接失败！")
         if "Authentication" in error_msg:
@@ -89,11 +89,12 @@ def backup_single_device(device_info):
         raise  # 这里不可以反回FLase，因为如果返回的话，在装饰器里面是判定该语句执行成功，这样就不会触发重试机制
     # 谁调用它，他就把错误抛给谁，现在他把错误抛给了装饰器，而且装饰器也有raise，装饰器把异常抛给了，调用装饰器的主函数
     finally:
-        if connections:
-            try:
-                connections.disconnect()
-            except:
-                pass
+        if lease:
+            session_pool.release(lease, discard=broken)
+
+
+# 单台设备备份（失败时原地退避重试），web 端单台备份接口用
+backup_single_device = ssh_retry(backup_device)
 
 
 # 第三步：写主函数并且调用其他函数
@@ -124,14 +125,11 @@ def main():
     else:
         logger.info("请输入有效命令，--help查看帮助")
         parse.print_help()
-    success = 0
-    for device in target_devices:
-        logger.info(f"正在准备备份设备{device['host']}......")
-        try:
-            if backup_single_device(device):
-                success += 1
-        except Exception as e:  # 他最后收到别人抛出来的异常！优雅的解决异常！
-            logger.warning(f"设备{device['host']} 重试耗尽后仍连接失败，跳过该设备")
+    if not target_devices:
+        return
+    # 并发备份，失败的设备进重试队列，不在主流程里 sleep
+    results = BackupEngine().run(target_devices)
+    success = sum(1 for result in results if result["status"] == "成功")
     logger.info("=" * 60)
     logger.info(f"\n成功备份设备/已经读取的设备：{success}/{len(devices)}")
     logger.info("\n记得查看备份之后的文件哦！")
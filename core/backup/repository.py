@@ -0,0 +1,250 @@
+"""
+去重压缩的备份仓库
+原来每次备份都在 backupN1/ 下新写一份未压缩的 <ip>__配置__<时间戳>.txt，内容和上次一字不差也照样再存一份，
+backup_records.checksum 也一直是空的。现在备份内容按内容寻址存进仓库（类似 git 的 objects 目录）：
+1. 边写边算 sha256、边压缩（装了 zstandard 用 zstd，否则用 zlib），先写临时文件，写完原子地改名成
+   objects/<哈希前两位>/<哈希>，同一份内容只存一次，已经存在就丢掉临时文件（记为去重命中）
+2. 备份记录仍然用原来的逻辑路径 backupN1/<ip>__配置__<时间戳>.txt，另外记录 checksum、是否去重命中、
+   本次新增的磁盘占用，下载时按逻辑路径查到 checksum，边读边解压
+3. 对象文件按开头的魔数区分 zstd / zlib，切换压缩算法后老对象照样能读
+
+用法：
+    stored = backup_repository.store(host, output)
+    for chunk in backup_repository.open_stream(stored.checksum): ...
+"""
+
+import os
+import sys
+import time
+import zlib
+import hashlib
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+
+try:
+    import zstandard
+except ImportError:  # zstd 是可选依赖，没装就用 zlib
+    zstandard = None
+
+logger = setup_logger("netdevops_backup", "backup.log")
+
+# 备份仓库配置，可用环境变量覆盖
+BACKUP_REPO_CONFIG = {
+    "root": os.getenv("NETDEVOPS_BACKUP_REPO", os.path.join(ROOT_DIR, "backup_repo")),  # 仓库根目录
+    "codec": os.getenv("NETDEVOPS_BACKUP_CODEC", "zstd" if zstandard else "zlib"),  # zstd / zlib
+    "level": int(os.getenv("NETDEVOPS_BACKUP_LEVEL", "6")),  # 压缩级别
+    "chunk_size": 64 * 1024,  # 读写的块大小
+}
+
+# 备份记录里的逻辑路径，沿用原来 backupN1/ 下的文件名，下载链接和页面展示都不用改
+BACKUP_DIR_NAME = "backupN1"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+@dataclass
+class StoredBackup:
+    """一次备份存进仓库的结果"""
+
+    backup_path: str  # 逻辑路径 backupN1/<ip>__配置__<时间戳>.txt
+    checksum: str  # 内容的 sha256
+    raw_size: int  # 原始字节数
+    stored_size: int  # 本次新增的磁盘占用（去重命中时为0）
+    dedup: bool  # 内容是否已经在仓库里
+
+
+def backup_filename(host, timestamp=None):
+    """备份的逻辑路径（和原来写到 backupN1/ 下的文件名一致）"""
+    timestamp = timestamp or datetime.now()
+    return f"{BACKUP_DIR_NAME}/{host}__配置__{timestamp.strftime('%Y%m%d-%H%M%S')}.txt"
+
+
+def iter_bytes(data, chunk_size):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+class BackupRepository:
+    """按内容寻址的备份对象仓库（objects/<前两位>/<sha256>）"""
+
+    def __init__(self, root=None, codec=None, level=None, chunk_size=None):
+        """
+        :param root: 仓库根目录，默认 BACKUP_REPO_CONFIG["root"]
+        :param codec: 新对象的压缩算法 zstd / zlib（没装 zstandard 时 zstd 退回 zlib）
+        :param level: 压缩级别
+        :param chunk_size: 读写的块大小
+        """
+        config = BACKUP_REPO_CONFIG
+        self.root = root or config["root"]
+        codec = codec or config["codec"]
+        if codec == "zstd" and zstandard is None:
+            logger.warning("未安装 zstandard，备份仓库改用 zlib 压缩")
+            codec = "zlib"
+        self.codec = codec
+        self.level = config["level"] if level is None else level
+        self.chunk_size = chunk_size or config["chunk_size"]
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        self._lock = threading.Lock()
+        self._stats = {"stored": 0, "dedup": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    # ------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------
+
+    def store(self, host, output, timestamp=None):
+        """
+        保存一台设备的备份内容
+        :param host: 设备IP（逻辑路径里的文件名用）
+        :param output: 备份内容（str 或 bytes）
+        :param timestamp: 备份时间，默认现在
+        :return: StoredBackup
+        """
+        data = output.encode("utf-8") if isinstance(output, str) else output
+        checksum, raw_size, stored_size, dedup = self.put_stream(iter_bytes(data, self.chunk_size))
+        return StoredBackup(backup_filename(host, timestamp), checksum, raw_size, stored_size, dedup)
+
+    def put_stream(self, chunks):
+        """
+        边读边算哈希、边压缩写临时文件，写完按哈希改名；内容已存在时丢掉临时文件
+        :param chunks: bytes 块的可迭代对象
+        :return: (checksum, raw_size, stored_size, dedup)
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        digest = hashlib.sha256()
+        compressor = self._compressor()
+        raw_size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    raw_size += len(chunk)
+                    f.write(compressor.compress(chunk))
+                f.write(compressor.flush())
+                f.flush()
+                os.fsync(f.fileno())
+            checksum = digest.hexdigest()
+            path = self.object_path(checksum)
+            # 和 delete() 互斥：去重命中的对象刷新修改时间，保留策略在宽限期内不会回收它
+            with self._lock:
+                if os.path.exists(path):
+                    os.remove(tmp_path)
+                    os.utime(path)
+                    stored_size, dedup = 0, True
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    stored_size = os.path.getsize(tmp_path)
+                    os.replace(tmp_path, path)
+                    dedup = False
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._stats["dedup" if dedup else "stored"] += 1
+            self._stats["raw_bytes"] += raw_size
+            self._stats["stored_bytes"] += stored_size
+        logger.debug(f"备份对象{checksum[:12]}：原始{raw_size}字节，"
+                      + ("内容已存在，去重命中" if dedup else f"压缩后{stored_size}字节"))
+        return checksum, raw_size, stored_size, dedup
+
+    def _compressor(self):
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compressobj()
+        return zlib.compressobj(self.level)
+
+    # ------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------
+
+    def object_path(self, checksum):
+        return os.path.join(self.objects_dir, checksum[:2], checksum)
+
+    def exists(self, checksum):
+        return bool(checksum) and os.path.isfile(self.object_path(checksum))
+
+    def open_stream(self, checksum):
+        """
+        边读边解压，逐块返回原始内容
+        :param checksum: 对象的 sha256
+        :return: bytes 块的生成器；对象不存在时抛 FileNotFoundError
+        """
+        path = self.object_path(checksum)
+        f = open(path, "rb")  # 在生成器外打开：对象不存在时调用方马上就能拿到异常
+        return self._decompress(f)
+
+    def _decompress(self, f):
+        with f:
+            head = f.read(self.chunk_size)
+            if head.startswith(ZSTD_MAGIC):
+                if zstandard is None:
+                    raise RuntimeError("备份对象是 zstd 压缩的，需要安装 zstandard 才能读取")
+                decompressor = zstandard.ZstdDecompressor().decompressobj()
+            else:
+                decompressor = zlib.decompressobj()
+            chunk = head
+            while chunk:
+                data = decompressor.decompress(chunk)
+                if data:
+                    yield data
+                chunk = f.read(self.chunk_size)
+            if hasattr(decompressor, "flush"):
+                data = decompressor.flush()
+                if data:
+                    yield data
+
+    def read(self, checksum):
+        """读出完整内容（bytes）"""
+        return b"".join(self.open_stream(checksum))
+
+    # ------------------------------------------------------------
+    # 维护
+    # ------------------------------------------------------------
+
+    def object_size(self, checksum):
+        """对象占用的磁盘字节数，不存在返回0"""
+        try:
+            return os.path.getsize(self.object_path(checksum))
+        except OSError:
+            return 0
+
+    def delete(self, checksum, grace_seconds=0):
+        """
+        删除一个对象（调用方负责确认已经没有备份记录引用它）
+        :param grace_seconds: 最近这么多秒内写入或去重命中过的对象不删（可能有备份记录还没落库）
+        :return: 释放的字节数
+        """
+        path = self.object_path(checksum)
+        with self._lock:
+            try:
+                if grace_seconds and time.time() - os.path.getmtime(path) < grace_seconds:
+                    return 0
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                return 0
+        return size
+
+    def stats(self):
+        """本进程写入的统计：stored/dedup 次数、原始字节、新增磁盘占用"""
+        with self._lock:
+            return dict(self._stats)
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_backup_repository():
+    """进程内共享的备份仓库"""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = BackupRepository()
+        return _repository
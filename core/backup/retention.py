@@ -0,0 +1,302 @@
+"""
+备份保留策略与垃圾回收
+backup_records 和备份文件只增不减，这里按分级策略清理旧备份：
+1. 最近 keep_all_days（7）天的备份全部保留
+2. keep_all_days ~ daily_days（90）天内，每台设备每天只保留当天最后一次备份
+3. 更早的备份每台设备每月只保留当月最后一次
+4. 无论多旧，每台设备最新的一次备份、最近一次内容发生变化的备份（校验和和上一次不同）始终保留
+5. 失败的备份记录超过 failed_days 天直接删除
+删除备份记录后，备份仓库里已经没有任何记录引用的对象（同一内容可能被多台设备/多次备份共用）、
+backupN1/ 下已经没有记录引用的老备份文件一起删除，统计释放的磁盘空间。
+备份记录按设备逐台读取、分批删除（每批单独提交），dry_run 只出报告不删除。
+
+定时任务每天凌晨执行一次，也可以手动执行：
+    python core/backup/retention.py --dry-run
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import itertools
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+from core.backup.repository import BACKUP_DIR_NAME, get_backup_repository
+
+logger = setup_logger("netdevops_backup", "backup.log")
+
+# 保留策略配置，可用环境变量覆盖
+RETENTION_CONFIG = {
+    "keep_all_days": int(os.getenv("NETDEVOPS_BACKUP_KEEP_ALL_DAYS", "7")),  # 全部保留的天数
+    "daily_days": int(os.getenv("NETDEVOPS_BACKUP_DAILY_DAYS", "90")),  # 每天保留一份的天数，更早的每月保留一份
+    "failed_days": int(os.getenv("NETDEVOPS_BACKUP_FAILED_DAYS", "90")),  # 失败记录保留天数
+    "batch_size": 500,  # 每批删除的记录数
+    "grace_seconds": 3600,  # 最近这么久内写入/去重命中过的对象不删（可能有备份记录还没落库）
+    "hour": 3,  # 定时任务执行时间
+    "minute": 30,
+}
+
+# 保留原因（报告里按原因统计）
+TIER_ALL = "all"
+TIER_DAILY = "daily"
+TIER_MONTHLY = "monthly"
+TIER_LATEST = "latest"
+TIER_CHANGED = "changed"
+
+
+@dataclass
+class RetentionPolicy:
+    keep_all_days: int = RETENTION_CONFIG["keep_all_days"]
+    daily_days: int = RETENTION_CONFIG["daily_days"]
+    failed_days: int = RETENTION_CONFIG["failed_days"]
+
+
+def _parse_time(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _content_key(record):
+    """判断内容是否变化用的键：备份仓库里的校验和，老备份文件没有校验和时每个文件都算不同内容"""
+    return record.get("checksum") or record.get("backup_path")
+
+
+def plan_device(records, now, policy):
+    """
+    给一台设备的备份记录分出保留/删除
+    :param records: 这台设备的记录（按 start_time, id 升序），带 id/status/start_time/checksum/backup_path
+    :param now: 当前时间
+    :param policy: RetentionPolicy
+    :return: (keep, delete)：keep 为 {记录ID: 保留原因}，delete 为要删除的记录列表
+    """
+    keep, delete = {}, []
+    success = [record for record in records if record["status"] == "success"]
+    for record in records:
+        if record["status"] != "success" and now - _parse_time(record["start_time"]) > timedelta(days=policy.failed_days):
+            delete.append(record)
+
+    buckets = {}  # 时间桶 -> 桶里最后一条记录（记录按时间升序，后面的覆盖前面的）
+    previous_key, changed = None, None
+    for record in success:
+        key = _content_key(record)
+        if key != previous_key:
+            changed = record
+        previous_key = key
+        started = _parse_time(record["start_time"])
+        age = now - started
+        if age <= timedelta(days=policy.keep_all_days):
+            keep[record["id"]] = TIER_ALL
+        elif age <= timedelta(days=policy.daily_days):
+            buckets[(TIER_DAILY, started.date())] = record
+        else:
+            buckets[(TIER_MONTHLY, started.year, started.month)] = record
+    for bucket, record in buckets.items():
+        keep.setdefault(record["id"], bucket[0])
+    if success:
+        keep[success[-1]["id"]] = keep.get(success[-1]["id"], TIER_LATEST)
+        keep.setdefault(changed["id"], TIER_CHANGED)
+    delete += [record for record in success if record["id"] not in keep]
+    return keep, delete
+
+
+class BackupRetention:
+    """按保留策略清理备份记录、备份仓库对象和老备份文件"""
+
+    def __init__(self, db=None, repository=None, policy=None, batch_size=None, grace_seconds=None):
+        """
+        :param db: DatabaseManager，默认 db_manager
+        :param repository: 备份仓库，默认进程内共享的仓库
+        :param policy: RetentionPolicy，默认 RETENTION_CONFIG
+        :param batch_size: 每批删除的记录数
+        :param grace_seconds: 最近这么多秒内写入/去重命中过的对象不删
+        """
+        if db is None:
+            from db.database import db_manager as db
+        self.db = db
+        self.repository = repository or get_backup_repository()
+        self.policy = policy or RetentionPolicy()
+        self.batch_size = batch_size or RETENTION_CONFIG["batch_size"]
+        self.grace_seconds = RETENTION_CONFIG["grace_seconds"] if grace_seconds is None else grace_seconds
+
+    def run(self, dry_run=False, now=None):
+        """
+        执行一轮清理
+        :param dry_run: 只统计会删除什么、能释放多少空间，不实际删除
+        :param now: 当前时间，测试时可注入
+        :return: 报告 dict：scanned/kept/kept_by_tier/deleted_records/deleted_failed/deleted_objects/
+                 deleted_files/reclaimed_bytes/dry_run/elapsed
+        """
+        started = time.perf_counter()
+        now = now or datetime.now()
+        self.db.flush_writes()  # 写回队列里还没入库的备份记录先落盘，避免误删它们引用的对象
+        report = {
+            "dry_run": dry_run, "devices": 0, "scanned": 0, "kept": 0,
+            "kept_by_tier": {tier: 0 for tier in (TIER_ALL, TIER_DAILY, TIER_MONTHLY, TIER_LATEST, TIER_CHANGED)},
+            "deleted_records": 0, "deleted_failed": 0, "deleted_objects": 0, "deleted_files": 0, "reclaimed_bytes": 0,
+        }
+        doomed = []
+        for _, group in itertools.groupby(self._iter_records(), key=lambda record: record["hostname"]):
+            records = list(group)
+            keep, delete = plan_device(records, now, self.policy)
+            report["devices"] += 1
+            report["scanned"] += len(records)
+            report["kept"] += len(keep)
+            for tier in keep.values():
+                report["kept_by_tier"][tier] += 1
+            doomed += delete
+
+        report["deleted_records"] = len(doomed)
+        report["deleted_failed"] = sum(1 for record in doomed if record["status"] != "success")
+        candidates = self._release_counts(doomed)
+        if not dry_run:
+            self._delete_records([record["id"] for record in doomed])
+        self._collect(candidates, report, dry_run)
+        if not dry_run:
+            self._sweep_tmp()
+        report["elapsed"] = round(time.perf_counter() - started, 2)
+        logger.info(
+            f"备份保留策略{'（演练，未删除）' if dry_run else ''}：{report['devices']}台设备，扫描{report['scanned']}条记录，"
+            f"保留{report['kept']}条，删除{report['deleted_records']}条（失败记录{report['deleted_failed']}条），"
+            f"删除对象{report['deleted_objects']}个、老备份文件{report['deleted_files']}个，"
+            f"释放{report['reclaimed_bytes']}字节，耗时{report['elapsed']}秒"
+        )
+        return report
+
+    # ------------------------------------------------------------
+    # 记录
+    # ------------------------------------------------------------
+
+    def _iter_records(self):
+        """按设备、时间顺序逐批读取备份记录（只读元数据）"""
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            """
+            SELECT id, hostname, backup_path, status, start_time, checksum FROM backup_records
+            ORDER BY hostname, start_time, id
+            """
+        )
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+
+    def _delete_records(self, ids):
+        """分批删除，每批单独提交，避免一次大删除长时间锁库"""
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            try:
+                with self.db.transaction() as conn:
+                    conn.execute(f"DELETE FROM backup_records WHERE id IN ({','.join('?' * len(batch))})", batch)
+            except sqlite3.Error as e:
+                logger.error(f"删除备份记录失败：{str(e)[:100]}")
+                raise
+
+    # ------------------------------------------------------------
+    # 对象 / 文件回收
+    # ------------------------------------------------------------
+
+    def _release_counts(self, doomed):
+        """要删除的记录按引用的对象（checksum）/ 老备份文件（路径）分组计数"""
+        counts = {}
+        for record in doomed:
+            if record["status"] != "success":
+                continue
+            if record.get("checksum"):
+                key = ("checksum", record["checksum"])
+            else:
+                key = ("backup_path", record["backup_path"])
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def _references(self, column, value):
+        row = self.db.conn.execute(f"SELECT COUNT(*) FROM backup_records WHERE {column} = ?", (value,)).fetchone()
+        return row[0]
+
+    def _collect(self, candidates, report, dry_run):
+        """
+        没有记录再引用的对象/文件删除（dry_run 时按删除后的引用数估算）
+        实际删除时记录已经删掉，引用数为0才删；最近写入或去重命中过的对象跳过
+        """
+        for (column, value), released in candidates.items():
+            remaining = self._references(column, value) - (released if dry_run else 0)
+            if remaining > 0:
+                continue
+            if column == "checksum":
+                if dry_run:
+                    path = self.repository.object_path(value)
+                    size = 0 if self._recently_used(path) else self.repository.object_size(value)
+                else:
+                    size = self.repository.delete(value, grace_seconds=self.grace_seconds)
+                if size:
+                    report["deleted_objects"] += 1
+                    report["reclaimed_bytes"] += size
+            else:
+                path = self._legacy_path(value)
+                if path is None or not os.path.isfile(path):
+                    continue
+                size = os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+                report["deleted_files"] += 1
+                report["reclaimed_bytes"] += size
+
+    def _recently_used(self, path):
+        try:
+            return time.time() - os.path.getmtime(path) < self.grace_seconds
+        except OSError:
+            return False
+
+    @staticmethod
+    def _legacy_path(backup_path):
+        """只处理 backupN1/ 下的老备份文件，防止记录里的异常路径删到别处"""
+        if not backup_path or ".." in backup_path or os.path.isabs(backup_path):
+            return None
+        if not backup_path.startswith(f"{BACKUP_DIR_NAME}/"):
+            return None
+        return os.path.join(ROOT_DIR, backup_path)
+
+    def _sweep_tmp(self):
+        """清理写入中途异常退出留下的临时文件"""
+        if not os.path.isdir(self.repository.tmp_dir):
+            return
+        for name in os.listdir(self.repository.tmp_dir):
+            path = os.path.join(self.repository.tmp_dir, name)
+            if not self._recently_used(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def run_backup_retention(dry_run=False):
+    """定时任务入口：按默认策略清理一轮，出错只记日志"""
+    try:
+        return BackupRetention().run(dry_run=dry_run)
+    except Exception as e:
+        logger.error(f"备份保留策略执行失败：{str(e)[:200]}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按保留策略清理旧备份")
+    parser.add_argument("--dry-run", action="store_true", help="只统计会删除什么、能释放多少空间，不实际删除")
+    parser.add_argument("--keep-all-days", type=int, default=RETENTION_CONFIG["keep_all_days"])
+    parser.add_argument("--daily-days", type=int, default=RETENTION_CONFIG["daily_days"])
+    parser.add_argument("--failed-days", type=int, default=RETENTION_CONFIG["failed_days"])
+    args = parser.parse_args()
+    policy = RetentionPolicy(keep_all_days=args.keep_all_days, daily_days=args.daily_days, failed_days=args.failed_days)
+    report = BackupRetention(policy=policy).run(dry_run=args.dry_run)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
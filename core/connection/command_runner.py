@@ -0,0 +1,420 @@
+"""
+按提示符判断命令结束的执行层 + 每台设备的自适应超时
+原来各处都用 send_command_timing(..., delay_factor=2~5)：不管设备多快返回，都要等输出“静止”一段固定时间才算结束，
+一次7条命令的健康检查要几十秒，其实设备几百毫秒就回完了。这里改成：
+1. 用 send_command 读到设备提示符就立即返回（Netmiko 4.x 的 read_timeout 控制最长等待）
+2. 每台设备、每条命令记录响应耗时的指数加权均值/偏差（和TCP RTO一样的算法，RFC 6298），
+   超时时间 = 倍数 × (均值 + 4 × 偏差)，限制在 [min_timeout, max_timeout] 之间；没有样本时用 default_timeout
+3. 提示符一直匹配不上的设备（如部分HCL模拟器），连续失败 prompt_failures_before_timing 次后，
+   一段时间内直接走 send_command_timing，不再每条命令白等一个超时
+
+批量执行（prefetch_commands）：一次健康检查要跑的多条命令拼成一次写入（流水线），设备依次执行，
+整段输出按提示符切回每条命令各自的输出，检查函数通过 run_command 直接拿到缓存的结果，同一条命令只取一次
+
+用法：
+    output = run_command(connection, "display version")
+    session = prefetch_commands(connection, ["display version", "display cpu-usage"], vendor="h3c")
+    output = run_command(session, "display cpu-usage")  # 直接返回批量取回的输出
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+
+logger = setup_logger("command_runner", "command_runner.log")
+
+# 等提示符超时的异常类型：Netmiko 的 ReadTimeout，以及底层socket的超时
+try:
+    from netmiko.exceptions import ReadTimeout
+
+    PROMPT_TIMEOUT_ERRORS = (ReadTimeout, TimeoutError)
+except ImportError:
+    PROMPT_TIMEOUT_ERRORS = (TimeoutError,)
+
+# 命令执行时间配置（秒）
+COMMAND_TIMING_CONFIG = {
+    "default_timeout": 30.0,  # 没有历史样本时等待提示符的时间
+    "min_timeout": 5.0,  # 自适应超时的下限
+    "max_timeout": 120.0,  # 自适应超时的上限
+    "timeout_multiplier": 3.0,  # 超时 = 倍数 × (均值 + 4 × 偏差)
+    "prompt_failures_before_timing": 2,  # 连续几次等不到提示符后改用 send_command_timing
+    "timing_mode_ttl": 300.0,  # 改用 send_command_timing 多少秒后重新尝试按提示符执行
+    "fallback_delay_factor": 2,  # send_command_timing 兜底时的 delay_factor
+}
+
+# 指数加权系数（RFC 6298）
+EWMA_ALPHA = 0.125
+EWMA_BETA = 0.25
+
+
+class LatencyStats:
+    """一组响应耗时的指数加权均值(srtt)和平均偏差(rttvar)"""
+
+    __slots__ = ("srtt", "rttvar", "samples", "timeouts", "last", "max")
+
+    def __init__(self):
+        self.srtt = 0.0
+        self.rttvar = 0.0
+        self.samples = 0
+        self.timeouts = 0
+        self.last = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if self.samples == 0:
+            self.srtt = seconds
+            self.rttvar = seconds / 2
+        else:
+            self.rttvar = (1 - EWMA_BETA) * self.rttvar + EWMA_BETA * abs(self.srtt - seconds)
+            self.srtt = (1 - EWMA_ALPHA) * self.srtt + EWMA_ALPHA * seconds
+        self.samples += 1
+        self.last = seconds
+        self.max = max(self.max, seconds)
+
+    def timeout(self, config=COMMAND_TIMING_CONFIG):
+        """按历史样本算出的等待时间，没有样本返回 default_timeout"""
+        if self.samples == 0:
+            return config["default_timeout"]
+        timeout = config["timeout_multiplier"] * (self.srtt + 4 * self.rttvar)
+        return min(config["max_timeout"], max(config["min_timeout"], timeout))
+
+    def to_dict(self):
+        return {
+            "srtt": round(self.srtt, 4),
+            "rttvar": round(self.rttvar, 4),
+            "samples": self.samples,
+            "timeouts": self.timeouts,
+            "last": round(self.last, 4),
+            "max": round(self.max, 4),
+        }
+
+
+class DeviceLatencyProfile:
+    """单台设备的时延档案：整体 + 按命令"""
+
+    def __init__(self):
+        self.overall = LatencyStats()
+        self.commands = {}  # command -> LatencyStats
+        self.prompt_failures = 0  # 连续等不到提示符的次数
+        self.timing_until = 0.0  # 在这个时间点之前直接走 send_command_timing
+
+
+class LatencyProfiles:
+    """所有设备的时延档案（线程安全）"""
+
+    def __init__(self, config=None):
+        self.config = dict(COMMAND_TIMING_CONFIG, **(config or {}))
+        self._lock = threading.Lock()
+        self._devices = {}  # device -> DeviceLatencyProfile
+
+    def _profile(self, device):
+        profile = self._devices.get(device)
+        if profile is None:
+            profile = self._devices[device] = DeviceLatencyProfile()
+        return profile
+
+    def read_timeout(self, device, command):
+        """
+        等待提示符的时间：优先用这条命令的历史样本，其次用设备整体样本
+        :param device: 设备标识（一般是IP）
+        :param command: 命令
+        """
+        with self._lock:
+            profile = self._devices.get(device)
+            if profile is None:
+                return self.config["default_timeout"]
+            stats = profile.commands.get(command)
+            if stats is None or stats.samples == 0:
+                stats = profile.overall
+            return stats.timeout(self.config)
+
+    def record(self, device, command, seconds):
+        """记录一次按提示符成功返回的耗时"""
+        with self._lock:
+            profile = self._profile(device)
+            profile.overall.record(seconds)
+            profile.commands.setdefault(command, LatencyStats()).record(seconds)
+            profile.prompt_failures = 0
+
+    def record_timeout(self, device, command):
+        """记录一次等不到提示符，返回这台设备接下来是否改用 send_command_timing"""
+        with self._lock:
+            profile = self._profile(device)
+            profile.overall.timeouts += 1
+            profile.commands.setdefault(command, LatencyStats()).timeouts += 1
+            profile.prompt_failures += 1
+            if profile.prompt_failures >= self.config["prompt_failures_before_timing"]:
+                profile.timing_until = time.monotonic() + self.config["timing_mode_ttl"]
+                profile.prompt_failures = 0
+                return True
+            return False
+
+    def last(self, device, command):
+        """这台设备上这条命令最近一次的耗时（秒），没有样本返回 None"""
+        with self._lock:
+            profile = self._devices.get(device)
+            stats = profile.commands.get(command) if profile is not None else None
+            return stats.last if stats is not None and stats.samples else None
+
+    def use_timing(self, device):
+        """这台设备当前是否直接走 send_command_timing"""
+        with self._lock:
+            profile = self._devices.get(device)
+            return profile is not None and time.monotonic() < profile.timing_until
+
+    def snapshot(self):
+        """所有设备的时延档案：{device: {"overall": {...}, "timing_mode": bool, "commands": {command: {...}}}}"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                device: {
+                    "overall": profile.overall.to_dict(),
+                    "timing_mode": now < profile.timing_until,
+                    "commands": {command: stats.to_dict() for command, stats in profile.commands.items()},
+                }
+                for device, profile in self._devices.items()
+            }
+
+    def command_summary(self):
+        """按命令汇总（所有设备的样本数加权平均srtt），监控指标用，避免按设备×命令展开"""
+        summary = {}
+        with self._lock:
+            for profile in self._devices.values():
+                for command, stats in profile.commands.items():
+                    if stats.samples == 0:
+                        continue
+                    item = summary.setdefault(command, {"samples": 0, "weighted": 0.0, "max": 0.0})
+                    item["samples"] += stats.samples
+                    item["weighted"] += stats.srtt * stats.samples
+                    item["max"] = max(item["max"], stats.max)
+        return {
+            command: {"srtt": round(item["weighted"] / item["samples"], 4), "samples": item["samples"],
+                      "max": round(item["max"], 4)}
+            for command, item in summary.items()
+        }
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+
+
+def run_command(connection, command, device=None, expect_string=None, profiles=None):
+    """
+    执行一条命令，读到设备提示符就返回
+    :param connection: Netmiko 连接（或池化会话），也可以是 prefetch_commands 返回的 PrefetchedSession
+    :param command: 命令
+    :param device: 设备标识，不传用连接的 host
+    :param expect_string: 自定义结束标志（正则），不传用 Netmiko 识别到的提示符
+    :param profiles: 时延档案，不传用进程内共享的 latency_profiles
+    :return: 命令输出
+    """
+    if isinstance(connection, PrefetchedSession):
+        cached = connection.outputs.get(command)
+        if cached is not None:
+            return cached
+        device = device or connection.device
+        connection = connection.connection
+    profiles = profiles or latency_profiles
+    device = device or getattr(connection, "host", None) or "unknown"
+
+    if not profiles.use_timing(device):
+        read_timeout = profiles.read_timeout(device, command)
+        start = time.monotonic()
+        try:
+            output = connection.send_command(command, expect_string=expect_string, read_timeout=read_timeout)
+        except PROMPT_TIMEOUT_ERRORS as e:
+            switched = profiles.record_timeout(device, command)
+            logger.warning(f"设备{device}执行[{command}]等待提示符超时（{read_timeout:.1f}秒），改用定时读取："
+                           f"{str(e)[:80]}")
+            if switched:
+                logger.warning(f"设备{device}连续等不到提示符，{profiles.config['timing_mode_ttl']:.0f}秒内改用定时读取")
+            # 通道里可能还留着上一条命令的输出，清掉再重新执行
+            connection.clear_buffer()
+        else:
+            profiles.record(device, command, time.monotonic() - start)
+            return output
+
+    return connection.send_command_timing(command, delay_factor=profiles.config["fallback_delay_factor"])
+
+
+# ============================================================
+# 批量（流水线）执行
+# ============================================================
+
+# 各厂商关闭分页的命令，批量执行时放在最前面，避免长输出停在 ---- More ---- 上
+VENDOR_PAGING_COMMANDS = {
+    "h3c": "screen-length disable",
+    "huawei": "screen-length 0 temporary",
+    "cisco": "terminal length 0",
+    "default": "screen-length disable",
+}
+
+
+class PrefetchedSession:
+    """批量取回的命令输出 + 底层连接：run_command 遇到已取回的命令直接返回缓存，其他命令照常在底层连接上执行"""
+
+    def __init__(self, connection, outputs, device=None):
+        self.connection = connection
+        self.outputs = outputs  # command -> output
+        self.device = device
+
+
+def prompt_line_pattern(base_prompt):
+    """
+    匹配“提示符 + 回显的命令”这一行：<SW1>display version、[SW1-GigabitEthernet1/0/1]、SW1(config)#show version
+    设备名后面只允许跟视图后缀（-xxx / (xxx)），<SW10> 这类别的设备名不算
+    :param base_prompt: Netmiko 识别的设备名部分（SW1）
+    """
+    return re.compile(
+        rf"^[<\[]?{re.escape(base_prompt)}(?:[-(][^\n<>#\[\]]*)?[>#\]][ \t]*(?P<echo>[^\n]*)$", re.MULTILINE
+    )
+
+
+def _same_command(echo, command):
+    return " ".join(echo.split()) == " ".join(command.split())
+
+
+def split_pipelined_output(buffer, commands, pattern):
+    """
+    把流水线执行的整段输出按提示符行切回每条命令的输出
+    第一条命令的回显在输出的第一行（发送前的提示符已经被读走），之后每条命令的回显跟在上一条结束时的提示符后面
+    :param buffer: 整段输出（换行已统一为 \n）
+    :param commands: 按发送顺序的命令
+    :param pattern: prompt_line_pattern 的结果
+    :return: {command: output}，只包含回显能对上的命令（从第一条对不上的开始丢弃）
+    """
+    first_newline = buffer.find("\n")
+    if first_newline < 0:
+        return {}
+    # (回显, 输出开始位置, 输出结束位置)
+    segments = []
+    echo, body_start = buffer[:first_newline], first_newline + 1
+    for match in pattern.finditer(buffer, body_start):
+        segments.append((echo, body_start, match.start()))
+        echo, body_start = match.group("echo"), match.end() + 1
+    outputs = {}
+    for command, (echo, start, end) in zip(commands, segments):
+        if not _same_command(echo, command):
+            break
+        outputs[command] = buffer[start:end].strip("\n")
+    return outputs
+
+
+def run_batch(connection, commands, device=None, vendor=None, profiles=None):
+    """
+    一次写入多条命令（流水线），读到每条命令结束的提示符后按提示符切分输出
+    回显对不上、等提示符超时等情况下，没有切出来的命令逐条用 run_command 补执行，结果和逐条执行一致
+    :param connection: Netmiko 连接
+    :param commands: 命令列表（重复的只执行一次）
+    :param device: 设备标识，不传用连接的 host
+    :param vendor: 厂商（h3c/huawei/cisco），用来选择关闭分页的命令，不传不发送
+    :param profiles: 时延档案，不传用进程内共享的 latency_profiles
+    :return: {command: output}
+    """
+    profiles = profiles or latency_profiles
+    device = device or getattr(connection, "host", None) or "unknown"
+    commands = list(dict.fromkeys(commands))
+    batch = list(commands)
+    if vendor:
+        paging = VENDOR_PAGING_COMMANDS.get(vendor.lower(), VENDOR_PAGING_COMMANDS["default"])
+        batch.insert(0, paging)
+
+    outputs = {}
+    base_prompt = getattr(connection, "base_prompt", None)
+    if base_prompt and not profiles.use_timing(device):
+        try:
+            outputs = _read_pipelined(connection, batch, device, base_prompt, profiles)
+        except Exception as e:
+            logger.warning(f"设备{device}批量执行命令失败，改为逐条执行：{str(e)[:80]}")
+            connection.clear_buffer()
+
+    missing = [command for command in commands if command not in outputs]
+    if missing and len(missing) < len(commands):
+        logger.info(f"设备{device}批量执行有{len(missing)}条命令未能切分，逐条补执行")
+    for command in missing:
+        outputs[command] = run_command(connection, command, device=device, profiles=profiles)
+    return {command: outputs[command] for command in commands}
+
+
+class PromptTracker:
+    """
+    增量接收流水线执行的输出，数出已经出现了几个提示符（每个提示符代表一条命令执行完）
+    同步（Netmiko）和异步（asyncssh）执行共用
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.buffer = ""
+        self.prompts = 0
+        self.finished_at = []  # 每个提示符出现的时间
+        self._scan_from = 0  # 已经确认扫描过的位置，避免每次从头扫描
+
+    def feed(self, chunk):
+        self.buffer += chunk.replace("\r\n", "\n").replace("\r", "\n")
+        for match in self.pattern.finditer(self.buffer, self._scan_from):
+            self.prompts += 1
+            self.finished_at.append(time.monotonic())
+            self._scan_from = match.end()
+        # 最后一行可能还没收完，下次从行首重新扫描
+        line_start = self.buffer.rfind("\n", self._scan_from) + 1
+        self._scan_from = max(self._scan_from, line_start)
+
+    def done(self, expected):
+        """已经出现 expected 个提示符，且最后一个提示符后面没有新的回显"""
+        return self.prompts >= expected and not self.buffer[self._scan_from:].strip()
+
+    def split(self, commands, profiles=None, device=None, started_at=None):
+        """按提示符切分输出；传入 profiles 时按相邻两个提示符的间隔记录每条命令的耗时"""
+        outputs = split_pipelined_output(self.buffer, commands, self.pattern)
+        if profiles is not None:
+            previous = started_at
+            for command, finished in zip(commands, self.finished_at):
+                if command in outputs:
+                    profiles.record(device, command, finished - previous)
+                previous = finished
+        return outputs
+
+
+def _read_pipelined(connection, batch, device, base_prompt, profiles):
+    tracker = PromptTracker(prompt_line_pattern(base_prompt))
+    read_timeout = sum(profiles.read_timeout(device, command) for command in batch)
+    connection.clear_buffer()
+    start = time.monotonic()
+    connection.write_channel("".join(command + connection.RETURN for command in batch))
+
+    while not tracker.done(len(batch)):
+        chunk = connection.read_channel()
+        if chunk:
+            tracker.feed(chunk)
+        elif time.monotonic() - start > read_timeout:
+            profiles.record_timeout(device, batch[-1])
+            raise TimeoutError(f"{read_timeout:.1f}秒内只等到{tracker.prompts}/{len(batch)}个提示符")
+        else:
+            time.sleep(0.01)
+    return tracker.split(batch, profiles=profiles, device=device, started_at=start)
+
+
+def prefetch_commands(connection, commands, device=None, vendor=None, profiles=None):
+    """
+    批量取回一组命令的输出，返回 PrefetchedSession：把它当作连接传给 run_command，取回过的命令不会再发给设备
+    参数同 run_batch；connection 已经是 PrefetchedSession 时只补取没有取回过的命令，合并到同一个会话里
+    """
+    if isinstance(connection, PrefetchedSession):
+        missing = [command for command in commands if command not in connection.outputs]
+        if missing:
+            connection.outputs.update(run_batch(connection.connection, missing, device=device or connection.device,
+                                                vendor=vendor, profiles=profiles))
+        return connection
+    device = device or getattr(connection, "host", None) or "unknown"
+    outputs = run_batch(connection, commands, device=device, vendor=vendor, profiles=profiles)
+    return PrefetchedSession(connection, outputs, device=device)
+
+
+# 进程内共享的时延档案
+latency_profiles = LatencyProfiles()
@@ -0,0 +1,302 @@
+"""
+设备SSH会话池（进程内共享）
+原来健康检查、备份、批量执行命令、设备状态检测、监控任务每次都新建一个 Netmiko ConnectHandler，用完就断开，
+H3C/华为设备一次SSH登录要 2~6 秒，远远超过命令本身的耗时。这里按设备复用已经登录的会话：
+1. 以 (device_type, host, port, username) 为键，每台设备最多 max_per_device 个会话，用满了等待其他调用方归还
+2. 借出前如果会话已经空闲超过 probe_after 秒，先探测一次（is_alive），断了就透明地重新登录
+3. 空闲超过 idle_timeout 秒的会话由后台线程关闭，设备侧的 VTY 不会被长期占用
+4. 调用方在使用过程中抛出异常时，会话直接丢弃（不知道通道处于什么状态），下次借用重新登录
+
+用法：
+    with session_pool.session(device_params, timeout=10) as conn:
+        output = run_command(conn, "display version")
+timeout、global_delay_factor 等参数只在新建会话时生效，不参与会话的匹配
+"""
+
+import os
+import sys
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+
+logger = setup_logger("session_pool", "session_pool.log")
+
+# 会话池配置，可用环境变量覆盖
+SESSION_POOL_CONFIG = {
+    "max_per_device": int(os.getenv("NETDEVOPS_SSH_POOL_MAX_PER_DEVICE", "2")),  # 每台设备最多同时保持的会话数
+    "idle_timeout": float(os.getenv("NETDEVOPS_SSH_POOL_IDLE_TIMEOUT", "300")),  # 空闲多少秒后关闭会话
+    "probe_after": 30.0,  # 空闲超过多少秒的会话借出前先探测
+    "acquire_timeout": 60.0,  # 会话用满时最多等待多少秒
+    "reap_interval": 30.0,  # 后台清理空闲会话的间隔
+}
+
+# 不参与会话匹配的参数：只影响新建连接
+SESSION_KEY_FIELDS = ("device_type", "host", "port", "username")
+
+
+def netmiko_connect(**params):
+    """默认的会话工厂：Netmiko ConnectHandler（用到时才导入）"""
+    from netmiko import ConnectHandler
+
+    return ConnectHandler(**params)
+
+
+def session_key(device_params):
+    """设备参数 -> 会话池的键；兼容 host / ip 两种写法，端口默认22"""
+    params = dict(device_params)
+    params.setdefault("host", params.get("ip"))
+    params["port"] = int(params.get("port") or 22)
+    return tuple(params.get(field) for field in SESSION_KEY_FIELDS)
+
+
+class PooledSession:
+    """池中的一个会话：底层连接 + 使用统计"""
+
+    def __init__(self, key, connection):
+        self.key = key
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+
+class SSHSessionPool:
+    """按设备复用SSH会话的连接池"""
+
+    def __init__(self, max_per_device=None, idle_timeout=None, probe_after=None,
+                 acquire_timeout=None, reap_interval=None, connect_factory=None):
+        """
+        :param max_per_device: 每台设备最多的会话数
+        :param idle_timeout: 空闲会话的最长保留时间（秒），<=0 表示不主动关闭
+        :param probe_after: 空闲超过这个秒数的会话借出前先探测存活
+        :param acquire_timeout: 会话用满时的最长等待时间（秒）
+        :param reap_interval: 后台清理线程的运行间隔（秒）
+        :param connect_factory: 新建会话的函数，参数为连接参数，默认 Netmiko ConnectHandler（测试/基准测试可替换）
+        """
+        self.max_per_device = max_per_device or SESSION_POOL_CONFIG["max_per_device"]
+        self.idle_timeout = SESSION_POOL_CONFIG["idle_timeout"] if idle_timeout is None else idle_timeout
+        self.probe_after = SESSION_POOL_CONFIG["probe_after"] if probe_after is None else probe_after
+        self.acquire_timeout = acquire_timeout or SESSION_POOL_CONFIG["acquire_timeout"]
+        self.reap_interval = reap_interval or SESSION_POOL_CONFIG["reap_interval"]
+        self.connect_factory = connect_factory or netmiko_connect
+
+        self._cond = threading.Condition()
+        self._idle = {}  # key -> [PooledSession, ...]，最近归还的在末尾
+        self._total = {}  # key -> 已建立（含借出中和正在登录）的会话数
+        self._closed = False
+        self._reaper = None
+        self._stop = threading.Event()
+        self._stats = {"created": 0, "reused": 0, "reconnects": 0, "evicted": 0, "discarded": 0, "waits": 0}
+
+    # ------------------------------------------------------------
+    # 借出 / 归还
+    # ------------------------------------------------------------
+
+    def acquire(self, device_params, probe=False, **connect_overrides):
+        """
+        借出一个会话（用完必须调用 release 归还）
+        :param device_params: 设备连接参数（device_type/host/port/username/password...）
+        :param probe: True 时无论空闲多久都先探测存活（设备在线检测用）
+        :param connect_overrides: 只在新建会话时使用的额外参数（timeout、global_delay_factor 等）
+        :return: PooledSession，底层连接为 .connection
+        """
+        key = session_key(device_params)
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("SSH会话池已关闭")
+                idle = self._idle.get(key)
+                if idle:
+                    pooled = idle.pop()
+                    break
+                if self._total.get(key, 0) < self.max_per_device:
+                    self._total[key] = self._total.get(key, 0) + 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"等待设备{key[1]}的SSH会话超时（已有{self.max_per_device}个会话在使用）")
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+        if pooled is not None:
+            idle_for = time.monotonic() - pooled.last_used
+            if (probe or idle_for > self.probe_after) and not self._is_alive(pooled):
+                logger.info(f"设备{key[1]}的池化会话已失效（空闲{idle_for:.0f}秒），重新登录")
+                self._close_connection(pooled)
+                pooled = None
+                with self._cond:
+                    self._stats["reconnects"] += 1
+            else:
+                with self._cond:
+                    self._stats["reused"] += 1
+
+        if pooled is None:
+            pooled = self._open(key, device_params, connect_overrides)
+        pooled.uses += 1
+        return pooled
+
+    def release(self, pooled, discard=False):
+        """
+        归还会话
+        :param discard: True 时关闭会话而不放回池中（使用中出错、通道状态未知时）
+        """
+        if discard or self._closed:
+            self._close_connection(pooled)
+            with self._cond:
+                self._total[pooled.key] = max(0, self._total.get(pooled.key, 0) - 1)
+                self._stats["discarded"] += 1
+                self._cond.notify_all()
+            return
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.setdefault(pooled.key, []).append(pooled)
+            self._cond.notify_all()
+
+    @contextmanager
+    def session(self, device_params, probe=False, **connect_overrides):
+        """借出会话的上下文：正常退出归还，异常时丢弃会话并继续抛出异常"""
+        pooled = self.acquire(device_params, probe=probe, **connect_overrides)
+        try:
+            yield pooled.connection
+        except BaseException:
+            self.release(pooled, discard=True)
+            raise
+        self.release(pooled)
+
+    def check_alive(self, device_params, **connect_overrides):
+        """设备在线检测：借一个会话（必要时登录）并探测存活，返回 True/False"""
+        try:
+            with self.session(device_params, probe=True, **connect_overrides):
+                return True
+        except Exception as e:
+            logger.debug(f"设备{device_params.get('host') or device_params.get('ip')}在线检测失败：{str(e)[:100]}")
+            return False
+
+    # ------------------------------------------------------------
+    # 会话生命周期
+    # ------------------------------------------------------------
+
+    def _open(self, key, device_params, connect_overrides):
+        params = {k: v for k, v in device_params.items() if k not in ("device_name", "vendor")}
+        params.update(connect_overrides)
+        start = time.monotonic()
+        try:
+            connection = self.connect_factory(**params)
+        except BaseException:
+            with self._cond:
+                self._total[key] = max(0, self._total.get(key, 0) - 1)
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        self._ensure_reaper()
+        logger.info(f"新建SSH会话：{key[1]}:{key[2]}，登录耗时{time.monotonic() - start:.2f}秒")
+        return PooledSession(key, connection)
+
+    @staticmethod
+    def _is_alive(pooled):
+        try:
+            return bool(pooled.connection.is_alive())
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_connection(pooled):
+        try:
+            pooled.connection.disconnect()
+        except Exception as e:
+            logger.debug(f"关闭SSH会话出错（忽略）：{str(e)[:100]}")
+
+    def evict_idle(self):
+        """关闭空闲超过 idle_timeout 的会话，返回关闭的数量"""
+        if self.idle_timeout <= 0:
+            return 0
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            for key, idle in self._idle.items():
+                keep = [p for p in idle if now - p.last_used <= self.idle_timeout]
+                if len(keep) != len(idle):
+                    expired.extend(p for p in idle if now - p.last_used > self.idle_timeout)
+                    self._idle[key] = keep
+                    self._total[key] = max(0, self._total.get(key, 0) - (len(idle) - len(keep)))
+            self._stats["evicted"] += len(expired)
+            if expired:
+                self._cond.notify_all()
+        for pooled in expired:
+            self._close_connection(pooled)
+        if expired:
+            logger.info(f"关闭{len(expired)}个空闲SSH会话")
+        return len(expired)
+
+    def close_idle(self, hosts=None):
+        """
+        立即关闭空闲会话（不管空闲了多久），借出中的会话不受影响
+        :param hosts: 只关闭这些设备IP的会话，不传关闭全部
+        :return: 关闭的数量
+        """
+        hosts = set(hosts) if hosts is not None else None
+        closed = []
+        with self._cond:
+            for key, idle in self._idle.items():
+                if hosts is None or key[1] in hosts:
+                    closed.extend(idle)
+                    self._total[key] = max(0, self._total.get(key, 0) - len(idle))
+                    self._idle[key] = []
+            if closed:
+                self._cond.notify_all()
+        for pooled in closed:
+            self._close_connection(pooled)
+        return len(closed)
+
+    def _ensure_reaper(self):
+        if self.idle_timeout <= 0:
+            return
+        with self._cond:
+            if self._reaper is not None or self._closed:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="ssh-session-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"清理空闲SSH会话失败：{str(e)[:100]}")
+
+    def close_all(self):
+        """关闭池中所有空闲会话，之后归还的会话也会直接关闭"""
+        self._stop.set()
+        with self._cond:
+            self._closed = True
+            idle = [p for sessions in self._idle.values() for p in sessions]
+            for key, sessions in self._idle.items():
+                self._total[key] = max(0, self._total.get(key, 0) - len(sessions))
+            self._idle.clear()
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_connection(pooled)
+        if idle:
+            logger.info(f"SSH会话池已关闭，断开{len(idle)}个会话")
+
+    def stats(self):
+        """会话池统计：新建/复用/重连/空闲淘汰/丢弃次数，当前空闲和借出中的会话数"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["idle"] = sum(len(sessions) for sessions in self._idle.values())
+            stats["in_use"] = sum(self._total.values()) - stats["idle"]
+            stats["devices"] = len([k for k, n in self._total.items() if n > 0])
+        return stats
+
+
+# 进程内共享的会话池
+session_pool = SSHSessionPool()
+atexit.register(session_pool.close_all)
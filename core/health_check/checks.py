@@ -0,0 +1,410 @@
+"""
+健康检查插件
+每项检查声明自己要执行的命令类型、解析函数、开销等级和超时预算，注册到 CHECK_PLUGINS；
+线程池 / asyncio / Nornir 三种执行方式只负责取回命令输出，按插件解析的事交给 core.health_check.engine
+
+新增一项检查：
+    register_check(CheckPlugin("ntp", ("ntp",), parse_ntp, cost=COST_CHEAP, timeout=10, description="NTP状态"))
+解析函数签名为 parser(vendor, outputs) -> 结果字典，outputs 为 命令类型 -> 输出（命令执行失败为 None）
+"""
+
+import os
+import sys
+import copy
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+
+from utils.log_setup import setup_logger
+from core.parsers import normalize_vendor, parse, parse_offloader
+
+logger = setup_logger("netdevops_health_check", "health_check.log")
+
+# 开销等级：cheap 为几行输出的状态命令，expensive 为输出随表项规模增长的命令（路由/ARP/MAC表等）
+COST_CHEAP = "cheap"
+COST_EXPENSIVE = "expensive"
+
+# 温度告警阈值（摄氏度）
+TEMP_WARNING_THRESHOLD = 60
+TEMP_DANGER_THRESHOLD = 80
+
+# ============================================================
+# 多厂商命令映射
+# ============================================================
+
+VENDOR_COMMANDS = {
+    "h3c": {
+        "interface": "display interface brief",
+        "cpu": "display cpu-usage",
+        "memory": "display memory",
+        "version": "display version",
+        "routing": "display ip routing-table",
+        "arp": "display arp",
+        "mac": "display mac-address",
+        "vlan": "display vlan brief",
+        "ospf": "display ospf peer brief",
+        "bgp": "display bgp peer",
+        "environment": "display environment",
+        "power": "display power",
+        "fan": "display fan",
+        "stp": "display stp brief",
+        "link_agg": "display link-aggregation summary",
+        "config": "display current-configuration",
+        "routing_summary": "display ip routing-table statistics",
+        "arp_summary": "display arp count",
+        "config_changes": "display archive configuration",
+    },
+    "cisco": {
+        "interface": "show ip interface brief",
+        "cpu": "show processes cpu",
+        "memory": "show memory",
+        "version": "show version",
+        "routing": "show ip route",
+        "arp": "show arp",
+        "mac": "show mac address-table",
+        "vlan": "show vlan brief",
+        "ospf": "show ip ospf neighbor",
+        "bgp": "show ip bgp summary",
+        "environment": "show environment all",
+        "power": "show power",
+        "fan": "show fans",
+        "stp": "show spanning-tree",
+        "link_agg": "show etherchannel summary",
+        "config": "show running-config",
+        "routing_summary": "show ip route summary",
+        "arp_summary": "show ip arp summary",
+        "config_changes": "show running-config | include Last configuration change",
+    },
+    "huawei": {
+        "interface": "display interface brief",
+        "cpu": "display cpu-usage",
+        "memory": "display memory",
+        "version": "display version",
+        "routing": "display ip routing-table",
+        "arp": "display arp",
+        "mac": "display mac-address",
+        "vlan": "display vlan brief",
+        "ospf": "display ospf peer brief",
+        "bgp": "display bgp peer",
+        "environment": "display environment",
+        "power": "display power",
+        "fan": "display fan",
+        "stp": "display stp brief",
+        "link_agg": "display link-aggregation summary",
+        "config": "display current-configuration",
+        "routing_summary": "display ip routing-table statistics",
+        "arp_summary": "display arp statistics all",
+        "config_changes": "display configuration commit changes",
+    },
+    "default": {
+        "interface": "display interface brief",
+        "cpu": "display cpu-usage",
+        "memory": "display memory",
+        "version": "display version",
+        "routing": "display ip routing-table",
+        "arp": "display arp",
+        "mac": "display mac-address",
+        "vlan": "display vlan brief",
+        "ospf": "display ospf peer brief",
+        "bgp": "display bgp peer",
+        "environment": "display environment",
+        "power": "display power",
+        "fan": "display fan",
+        "stp": "display stp brief",
+        "link_agg": "display link-aggregation summary",
+        "config": "display current-configuration",
+        "routing_summary": "display ip routing-table statistics",
+        "arp_summary": "display arp count",
+        "config_changes": "display archive configuration",
+    },
+}
+
+
+def get_vendor_command(vendor: str, command_type: str) -> str:
+    """
+    根据厂商类型获取对应命令
+
+    Args:
+        vendor: 厂商类型 (h3c/cisco/huawei，别名见 core.parsers.VENDOR_ALIASES，没给时用 default)
+        command_type: 命令类型 (interface/cpu/memory/...)
+
+    Returns:
+        对应的CLI命令
+    """
+    vendor = normalize_vendor(vendor) if vendor else "default"
+    return VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS["default"]).get(command_type, "")
+
+
+# ============================================================
+# 检查插件
+# ============================================================
+
+@dataclass(frozen=True)
+class CheckPlugin:
+    """一项健康检查"""
+
+    name: str  # 检查名（result["checks"] 的键）
+    command_types: Tuple[str, ...]  # 要执行的命令类型（见 VENDOR_COMMANDS）
+    parser: Callable[[str, Dict[str, Optional[str]]], Dict]  # parser(vendor, outputs) -> 结果字典
+    cost: str = COST_CHEAP  # 开销等级
+    timeout: float = 30.0  # 取输出 + 解析的耗时预算（秒），超出时引擎记录告警
+    description: str = ""  # 中文名称，用于错误信息
+    error_result: Dict = field(default_factory=dict)  # 命令执行失败时结果里的默认字段
+    partial: bool = False  # True 时部分命令失败也交给 parser（缺的输出为 None），否则直接返回错误结果
+
+    def failed(self, message: str) -> Dict:
+        """检查失败时的结果：默认字段 + status=error + message"""
+        return dict(copy.deepcopy(self.error_result), status="error", message=message)
+
+    def run(self, vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+        """用取回的命令输出执行检查"""
+        if not self.partial and any(outputs.get(command_type) is None for command_type in self.command_types):
+            return self.failed(f"获取{self.description or self.name}失败")
+        return self.parser(vendor, outputs)
+
+
+# 检查名 -> 插件（注册顺序即 result["checks"] 的顺序）
+CHECK_PLUGINS: Dict[str, CheckPlugin] = {}
+
+
+def register_check(plugin: CheckPlugin) -> CheckPlugin:
+    """注册（或替换同名的）检查插件"""
+    CHECK_PLUGINS[plugin.name] = plugin
+    return plugin
+
+
+def get_check(name: str) -> CheckPlugin:
+    """按检查名取插件，没有注册时抛 KeyError"""
+    return CHECK_PLUGINS[name]
+
+
+def select_checks(names: Optional[List[str]] = None, cost: Optional[str] = None) -> List[CheckPlugin]:
+    """
+    按检查名 / 开销等级挑选插件
+
+    Args:
+        names: 检查名列表，默认全部已注册的检查
+        cost: 只要这个开销等级的检查
+
+    Returns:
+        插件列表（按 names 的顺序，没给 names 时按注册顺序）
+    """
+    plugins = [CHECK_PLUGINS[name] for name in names] if names is not None else list(CHECK_PLUGINS.values())
+    return [plugin for plugin in plugins if cost is None or plugin.cost == cost]
+
+
+def command_types_for(plugins: List[CheckPlugin]) -> List[str]:
+    """一组检查要执行的命令类型（去重，保持顺序），连接后一次批量取回"""
+    return list(dict.fromkeys(command_type for plugin in plugins for command_type in plugin.command_types))
+
+
+# ============================================================
+# 默认检查的解析函数
+# ============================================================
+
+def parse_interface_status(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    """按厂商模板解析接口行，统计 UP/DOWN 数量"""
+    interfaces = [
+        {"name": record.name, "ip": record.ip, "status": "up" if record.is_up else "down",
+         "link": record.link, "protocol": record.protocol}
+        for record in parse(vendor, "interface", outputs["interface"])
+    ]
+    up_count = sum(1 for interface in interfaces if interface["status"] == "up")
+    return {
+        "status": "success",
+        "total": len(interfaces),
+        "up": up_count,
+        "down": len(interfaces) - up_count,
+        "interfaces": interfaces
+    }
+
+
+def parse_cpu_usage(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    """解析CPU使用率（最近5秒），取不到时 usage 为 None"""
+    cpu = parse(vendor, "cpu", outputs["cpu"])
+    return {
+        "status": "success",
+        "usage": cpu.five_seconds if cpu is not None else None,
+        "raw": outputs["cpu"][:200]  # 只保留前200字符
+    }
+
+
+def parse_memory_usage(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    """解析内存使用率，取不到时 usage 为 None"""
+    memory = parse(vendor, "memory", outputs["memory"])
+    return {
+        "status": "success",
+        "usage": round(memory.usage_pct, 1) if memory is not None else None,
+        "raw": outputs["memory"][:200]
+    }
+
+
+def parse_device_version(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    """解析版本信息（H3C/华为 "Version 7.1.075"，Cisco "Version 15.2(4)M"）"""
+    record = parse(vendor, "version", outputs["version"])
+    return {
+        "status": "success",
+        "version": record.version if record is not None else "未知",
+        "raw": outputs["version"][:200]
+    }
+
+
+def parse_routing_table(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    """统计路由数量，等价路由每个下一跳算一条；全量路由表很大时下放到解析进程池"""
+    route_count, samples = parse_offloader.summarize(vendor, "routing", outputs["routing"])
+    return {
+        "status": "success",
+        "route_count": route_count,
+        "routes": [asdict(record) for record in samples],  # 只保留前5条示例
+        "raw": outputs["routing"][:500]
+    }
+
+
+def parse_arp_table(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    """统计ARP条目数量"""
+    arp_count, samples = parse_offloader.summarize(vendor, "arp", outputs["arp"])
+    return {
+        "status": "success",
+        "arp_count": arp_count,
+        "entries": [asdict(record) for record in samples],
+        "raw": outputs["arp"][:500]
+    }
+
+
+def parse_mac_table(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    """统计MAC地址表条目数量"""
+    mac_count, samples = parse_offloader.summarize(vendor, "mac", outputs["mac"])
+    return {
+        "status": "success",
+        "mac_count": mac_count,
+        "entries": [asdict(record) for record in samples],
+        "raw": outputs["mac"][:500]
+    }
+
+
+def _component_status(vendor: str, command_type: str, output: Optional[str]) -> Dict:
+    """电源/风扇：统计状态正常的部件数"""
+    if not output:
+        return {"status": "unknown", "count": 0}
+    count = sum(1 for component in parse(vendor, command_type, output) if component.ok)
+    return {"status": "normal" if count > 0 else "abnormal", "count": count}
+
+
+def parse_environment_info(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    """温度（多个传感器取最高）、电源、风扇，某个命令失败只影响对应部分"""
+    result = {
+        "temperature": {"status": "unknown", "value": "N/A", "alert": ""},
+        "power": {"status": "unknown", "count": 0},
+        "fan": {"status": "unknown", "count": 0},
+    }
+    try:
+        sensors = parse(vendor, "environment", outputs.get("environment") or "")
+        if sensors:
+            temp_value = max(sensor.celsius for sensor in sensors)
+            result["temperature"]["value"] = f"{temp_value}°C"
+            if temp_value >= TEMP_DANGER_THRESHOLD:
+                result["temperature"].update(status="danger", alert="温度过高！")
+            elif temp_value >= TEMP_WARNING_THRESHOLD:
+                result["temperature"].update(status="warning", alert="温度偏高")
+            else:
+                result["temperature"].update(status="normal", alert="正常")
+    except Exception as e:
+        logger.warning(f"检查温度失败: {str(e)}")
+    for command_type in ("power", "fan"):
+        try:
+            result[command_type] = _component_status(vendor, command_type, outputs.get(command_type))
+        except Exception as e:
+            logger.warning(f"检查{'电源' if command_type == 'power' else '风扇'}失败: {str(e)}")
+    return result
+
+
+def _line_scan(output: str, skip_prefixes: Tuple[str, ...], keywords: Tuple[str, ...], keep: int, width: int):
+    """
+    按关键字逐行统计（VLAN/OSPF/BGP/链路聚合这几类输出还没有厂商模板）
+
+    Returns:
+        (匹配行数, 前 keep 行示例)
+    """
+    count = 0
+    samples = []
+    for line in output.split("\n"):
+        line = line.strip()
+        if not line or line.startswith(skip_prefixes) or not any(keyword in line for keyword in keywords):
+            continue
+        count += 1
+        if len(samples) < keep:
+            samples.append(line[:width])
+    return count, samples
+
+
+def parse_vlan_info(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    """VLAN条目以VLAN ID开头"""
+    count = 0
+    vlans = []
+    for line in outputs["vlan"].split("\n"):
+        line = line.strip()
+        if line and line[0] in "12345":
+            count += 1
+            if len(vlans) < 10:
+                vlans.append(line[:80])
+    return {"status": "success", "vlan_count": count, "vlans": vlans}
+
+
+def parse_ospf_neighbors(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    count, neighbors = _line_scan(outputs["ospf"], ("Area", "---", "Total"), ("Full", "2-Way", "Init"), 5, 100)
+    return {"status": "success", "ospf_count": count, "neighbors": neighbors}
+
+
+def parse_bgp_neighbors(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    count, neighbors = _line_scan(outputs["bgp"], ("Peer", "---", "Total"),
+                                  ("Established", "Active", "Connect", "Idle"), 5, 100)
+    return {"status": "success", "bgp_count": count, "neighbors": neighbors}
+
+
+def parse_stp_status(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    stp_status = "未知"
+    root_bridge = "N/A"
+    for line in outputs["stp"].split("\n"):
+        if "Root Bridge" in line or "根桥" in line:
+            root_bridge = line.strip()[:80]
+        if "CIST" in line or "MSTP" in line or "STP" in line:
+            stp_status = "运行中"
+    return {"status": "success", "stp_status": stp_status, "root_bridge": root_bridge}
+
+
+def parse_link_aggregation(vendor: str, outputs: Dict[str, Optional[str]]) -> Dict:
+    count, groups = _line_scan(outputs["link_agg"], ("Aggregation", "---", "Total"), ("Selected", "Unselected"),
+                               5, 100)
+    return {"status": "success", "agg_count": count, "agg_groups": groups}
+
+
+# ============================================================
+# 注册默认检查
+# ============================================================
+
+register_check(CheckPlugin("interface", ("interface",), parse_interface_status, COST_CHEAP, 15, "接口状态",
+                           {"total": 0, "up": 0, "down": 0, "interfaces": []}))
+register_check(CheckPlugin("cpu", ("cpu",), parse_cpu_usage, COST_CHEAP, 10, "CPU使用率", {"usage": None}))
+register_check(CheckPlugin("memory", ("memory",), parse_memory_usage, COST_CHEAP, 10, "内存使用率", {"usage": None}))
+register_check(CheckPlugin("version", ("version",), parse_device_version, COST_CHEAP, 10, "设备版本",
+                           {"version": "未知"}))
+register_check(CheckPlugin("routing", ("routing",), parse_routing_table, COST_EXPENSIVE, 60, "路由表",
+                           {"route_count": 0}))
+register_check(CheckPlugin("arp", ("arp",), parse_arp_table, COST_EXPENSIVE, 30, "ARP表", {"arp_count": 0}))
+register_check(CheckPlugin("environment", ("environment", "power", "fan"), parse_environment_info, COST_CHEAP, 20,
+                           "环境信息", partial=True))
+register_check(CheckPlugin("mac", ("mac",), parse_mac_table, COST_EXPENSIVE, 60, "MAC地址表", {"mac_count": 0}))
+register_check(CheckPlugin("vlan", ("vlan",), parse_vlan_info, COST_CHEAP, 15, "VLAN信息", {"vlan_count": 0}))
+register_check(CheckPlugin("ospf", ("ospf",), parse_ospf_neighbors, COST_CHEAP, 15, "OSPF邻居", {"ospf_count": 0}))
+register_check(CheckPlugin("bgp", ("bgp",), parse_bgp_neighbors, COST_CHEAP, 15, "BGP邻居", {"bgp_count": 0}))
+register_check(CheckPlugin("stp", ("stp",), parse_stp_status, COST_CHEAP, 15, "STP状态",
+                           {"stp_status": "未知", "root_bridge": "N/A"}))
+register_check(CheckPlugin("link_agg", ("link_agg",), parse_link_aggregation, COST_CHEAP, 15, "链路聚合",
+                           {"agg_count": 0}))
+
+# 默认执行的检查（check_single_device / AsyncHealthChecker / Nornir 任务）
+DEFAULT_CHECKS = ["interface", "cpu", "memory", "version", "routing", "arp", "environment"]
+# 扩展检查：原 health_checker.check_single_device 额外执行的二层/路由协议检查
+EXTENDED_CHECKS = DEFAULT_CHECKS + ["mac", "vlan", "ospf", "bgp", "stp", "link_agg"]
@@ -0,0 +1,370 @@
+"""
+统一健康检查引擎
+原来健康检查有三份实现（health_checker / health_checker_optimized / nornir_tasks），结果字段、健康判定、入库方式各不相同，
+optimized 版入库还调用了不存在的 db_manager.save_health_check。现在三种执行方式共用这里的几段：
+1. 检查插件（core.health_check.checks）：每项检查声明命令类型、解析函数、开销等级和超时预算
+2. HealthCheckEngine.evaluate：按插件取输出、解析，记录每项检查 collect（取输出）/ parse（解析）两个阶段的耗时
+3. normalize_result：统一结果结构，补齐 health_check_records 表和档案卡要的扁平字段，按同一套规则判定健康问题
+4. ResultSink：批量入库，一轮检查的健康检查历史一个事务 executemany，档案卡走 CardUpdateBuffer
+
+执行器只负责连接设备、把命令输出取回来：
+    线程池   health_checker_optimized.check_single_device / batch_health_check（health_checker.check_single_device 也走这里）
+    asyncio  health_checker_async.AsyncHealthChecker
+    Nornir   nornir_tasks.check_devices_health
+"""
+
+import os
+import sys
+import time
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+
+from utils.log_setup import setup_logger
+from utils.models import get_global_physical_cards, CardUpdateBuffer
+from core.connection.command_runner import latency_profiles
+from core.health_check.checks import (CHECK_PLUGINS, DEFAULT_CHECKS, CheckPlugin, command_types_for,
+                                      get_vendor_command)
+from db.database import db_manager
+
+logger = setup_logger("netdevops_health_check", "health_check.log")
+
+# 关键端口列表（可配置），出现在接口输出里且 DOWN 时判定为健康问题
+CRITICAL_PORTS = ["GE1/0/1", "GE1/0/2", "GigabitEthernet0/0/1"]
+
+# 健康判定阈值
+HEALTH_THRESHOLDS = {
+    "cpu": 88,  # CPU使用率超过多少（%）
+    "memory": 88,  # 内存使用率超过多少（%）
+    "down_ratio": 0.3,  # DOWN端口占比超过多少
+}
+
+
+class FetchedOutputs:
+    """已经取回的命令输出，提供和 DeviceConnection 一样的 execute_command，供引擎按插件解析"""
+
+    def __init__(self, outputs: Dict[str, str]):
+        self.outputs = outputs
+
+    def execute_command(self, command: str):
+        if command in self.outputs:
+            return True, self.outputs[command]
+        return False, "命令输出未取回"
+
+
+# ============================================================
+# 结果归一化
+# ============================================================
+
+def new_result(device_name: str, host: str, vendor: str, mode: str) -> Dict:
+    """各执行器共用的初始结果，检查完由 normalize_result 补齐其余字段"""
+    return {
+        "device_name": device_name,
+        "host": host,
+        "vendor": vendor,
+        "mode": mode,
+        "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "duration": 0,
+        "checks": {},
+        "timings": {"checks": {}},
+    }
+
+
+def _succeeded(check: Optional[Dict]) -> Dict:
+    """检查成功时返回检查结果，失败 / 没执行返回空字典"""
+    return check if check and check.get("status") != "error" else {}
+
+
+def evaluate_health(checks: Dict) -> List[str]:
+    """
+    按统一规则判定健康问题：关键端口DOWN、DOWN端口占比过高、CPU/内存过高、温度、电源、风扇
+
+    Args:
+        checks: result["checks"]
+
+    Returns:
+        健康问题列表，空列表表示健康
+    """
+    issues = []
+    interface = _succeeded(checks.get("interface"))
+    if interface:
+        down_ports = {item["name"].upper() for item in interface.get("interfaces", []) if item["status"] == "down"}
+        if any(port.upper() in down_ports for port in CRITICAL_PORTS):
+            issues.append("关键端口DOWN")
+        total, down = interface.get("total", 0), interface.get("down", 0)
+        if total > 0 and down / total > HEALTH_THRESHOLDS["down_ratio"]:
+            issues.append(f"过多端口down ({down}/{total})")
+    for name, label in (("cpu", "CPU"), ("memory", "内存")):
+        usage = _succeeded(checks.get(name)).get("usage")
+        if usage is not None and usage > HEALTH_THRESHOLDS[name]:
+            issues.append(f"{label}使用率过高，已经超过{HEALTH_THRESHOLDS[name]}%")
+    environment = checks.get("environment") or {}
+    temperature = environment.get("temperature", {}).get("status")
+    if temperature == "danger":
+        issues.append("设备温度过高")
+    elif temperature == "warning":
+        issues.append("设备温度偏高")
+    if environment.get("power", {}).get("status") == "abnormal":
+        issues.append("电源异常")
+    if environment.get("fan", {}).get("status") == "abnormal":
+        issues.append("风扇异常")
+    return issues
+
+
+def normalize_result(result: Dict, error: Optional[str] = None) -> Dict:
+    """
+    补齐统一结果结构（原地修改并返回）：
+    status: healthy/degraded/failed，check_status: 成功/失败，reachable，version，up/down/total_interface，
+    CPU_usage / memory_usage（"14%"，取不到为 "N/A"），device_health_issues（列表），error_message
+
+    Args:
+        result: new_result 创建、已填好 checks 的结果
+        error: 连接 / 取输出失败的原因，传入时整台设备判为 failed
+
+    Returns:
+        result
+    """
+    checks = result.setdefault("checks", {})
+    result.setdefault("timings", {"checks": {}})
+    interface = _succeeded(checks.get("interface"))
+    cpu = _succeeded(checks.get("cpu")).get("usage")
+    memory = _succeeded(checks.get("memory")).get("usage")
+    result.update({
+        "version": _succeeded(checks.get("version")).get("version", "未知"),
+        "up_interface": interface.get("up", 0),
+        "down_interface": interface.get("down", 0),
+        "total_interface": interface.get("total", 0),
+        "CPU_usage": f"{cpu}%" if cpu is not None else "N/A",
+        "memory_usage": f"{memory}%" if memory is not None else "N/A",
+        "reachable": error is None,
+    })
+    failures = [check.get("message", name) for name, check in checks.items() if check.get("status") == "error"]
+    if error is not None:
+        result.update(status="failed", check_status="失败", device_health_issues=[], error_message=error)
+    elif checks and len(failures) == len(checks):
+        result.update(status="failed", check_status="失败", device_health_issues=[],
+                      error_message="；".join(failures))
+    else:
+        issues = evaluate_health(checks)
+        result.update(status="degraded" if issues else "healthy", check_status="成功",
+                      device_health_issues=issues, error_message="；".join(failures))
+    return result
+
+
+def to_db_record(result: Dict) -> Dict:
+    """统一结果 -> health_check_records 表的一行（列表拼成分号分隔的字符串，可达性转成文本）"""
+    return {
+        "host": result.get("host", ""),
+        "device_name": result.get("device_name", "未知设备"),
+        "version": str(result.get("version", "未知"))[:100],
+        "check_time": result.get("check_time") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "status": result.get("status", "unknown"),
+        "check_status": result.get("check_status", "失败"),
+        "up_interface": int(result.get("up_interface") or 0),
+        "down_interface": int(result.get("down_interface") or 0),
+        "total_interface": int(result.get("total_interface") or 0),
+        "CPU_usage": result.get("CPU_usage", "N/A"),
+        "memory_usage": result.get("memory_usage", "N/A"),
+        "error_message": result.get("error_message", ""),
+        "device_health_issues": ";".join(result.get("device_health_issues") or []) or "无",
+        "reachable": "可达" if result.get("reachable") else "不可达",
+    }
+
+
+# ============================================================
+# 批量入库
+# ============================================================
+
+def find_card(device_name: Optional[str] = None, host: Optional[str] = None):
+    """按设备名匹配档案卡，匹配不到再按IP匹配"""
+    cards = get_global_physical_cards() or []
+    card = next((card for card in cards if device_name and card.name == device_name), None)
+    return card or next((card for card in cards if host and card.ip_address == host), None)
+
+
+class ResultSink:
+    """
+    检查结果的批量入库：add() 只把健康检查记录放进缓冲区、档案卡放进 CardUpdateBuffer，
+    flush() 时健康检查历史一个事务 executemany，档案卡一个事务批量更新（多个检查线程可以同时 add）
+    """
+
+    def __init__(self, card_buffer: Optional[CardUpdateBuffer] = None, update_cards: bool = True, db=None):
+        """
+        Args:
+            card_buffer: 档案卡更新缓冲区，默认新建一个
+            update_cards: 是否更新档案卡
+            db: 健康检查历史写入的数据库，默认进程共享的 db_manager（压测时写到单独的库）
+        """
+        self.card_buffer = card_buffer if card_buffer is not None else CardUpdateBuffer()
+        self.update_cards = update_cards
+        self.db = db
+        self._records = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+    def add(self, result: Dict) -> Dict:
+        """
+        缓冲一台设备的检查结果
+
+        Returns:
+            适配过数据库字段的记录
+        """
+        record = to_db_record(result)
+        with self._lock:
+            self._records.append(record)
+        if self.update_cards:
+            try:
+                card = find_card(result.get("device_name"), result.get("host"))
+                if card is not None:
+                    card.update(record, card_buffer=self.card_buffer)
+                else:
+                    logger.warning(f"未匹配到设备 {record['device_name']}({record['host']}) 的档案卡，跳过更新")
+            except Exception as e:
+                logger.warning(f"更新设备档案卡失败: {str(e)}")
+        return record
+
+    def flush(self) -> int:
+        """
+        写库：健康检查历史 + 档案卡；历史写库失败时记录放回缓冲区、档案卡照常写库，异常抛给调用方
+
+        Returns:
+            写入的健康检查记录条数
+        """
+        with self._lock:
+            records, self._records = self._records, []
+        try:
+            written = (self.db if self.db is not None else db_manager).batch_log_check_devices(records)
+        except Exception:
+            with self._lock:
+                self._records = records + self._records
+            raise
+        finally:
+            # 历史记录写库失败时档案卡照样写，不跟着一起丢
+            self.card_buffer.flush()
+        return written
+
+
+# ============================================================
+# 引擎
+# ============================================================
+
+class HealthCheckEngine:
+    """按插件执行检查、记录各阶段耗时的引擎（执行器共用一个实例）"""
+
+    def __init__(self, checks: Optional[List[str]] = None, profiles=None):
+        """
+        Args:
+            checks: 默认执行的检查名，默认 DEFAULT_CHECKS
+            profiles: 命令时延档案，用来算批量取回的命令各自花了多久，默认进程共享的 latency_profiles
+        """
+        self.checks = list(checks or DEFAULT_CHECKS)
+        self.profiles = profiles or latency_profiles
+        self._lock = threading.Lock()
+        self._stats = {}  # 检查名 -> 累计次数 / 失败 / 各阶段耗时 / 超预算次数
+
+    def plugins(self, only: Optional[List[str]] = None) -> List[CheckPlugin]:
+        """要执行的插件（only 给出时按 only 的顺序）"""
+        return [CHECK_PLUGINS[name] for name in (self.checks if only is None else only)]
+
+    def command_types(self, only: Optional[List[str]] = None) -> List[str]:
+        """要执行的命令类型（去重，保持顺序）"""
+        return command_types_for(self.plugins(only))
+
+    def commands(self, vendor: str, only: Optional[List[str]] = None) -> List[str]:
+        """要执行的厂商命令，执行器连接后一次批量取回"""
+        return list(dict.fromkeys(get_vendor_command(vendor, t) for t in self.command_types(only)))
+
+    def evaluate(self, connection, vendor: str, device: Optional[str] = None, only: Optional[List[str]] = None,
+                 timings: Optional[Dict] = None) -> Dict:
+        """
+        执行各项检查
+
+        每项检查记两段耗时：collect 为取这项检查的命令输出花的时间，parse 为解析的时间。
+        输出事先批量取回时 execute_command 直接返回缓存，collect 取时延档案里这些命令这次在设备上的耗时
+
+        Args:
+            connection: 任何提供 execute_command(command) -> (是否成功, 输出) 的对象
+                        （DeviceConnection、FetchedOutputs）
+            vendor: 厂商类型
+            device: 设备标识（时延档案的键，一般是IP）
+            only: 只执行这些检查，默认 self.checks
+            timings: 传入时把每项检查的耗时写进去（result["timings"]["checks"]）
+
+        Returns:
+            result["checks"]
+        """
+        checks = {}
+        for plugin in self.plugins(only):
+            started = time.perf_counter()
+            outputs = {}
+            device_seconds = 0.0
+            for command_type in plugin.command_types:
+                command = get_vendor_command(vendor, command_type)
+                success, output = connection.execute_command(command)
+                outputs[command_type] = output if success else None
+                if success and device:
+                    device_seconds += self.profiles.last(device, command) or 0.0
+            collected = time.perf_counter()
+            try:
+                checks[plugin.name] = plugin.run(vendor, outputs)
+            except Exception as e:
+                logger.warning(f"解析{plugin.description or plugin.name}失败: {str(e)}")
+                checks[plugin.name] = plugin.failed(f"解析{plugin.description or plugin.name}失败")
+            timing = {
+                "collect": round(max(collected - started, device_seconds), 4),
+                "parse": round(time.perf_counter() - collected, 4),
+                "cost": plugin.cost,
+            }
+            timing["over_budget"] = timing["collect"] + timing["parse"] > plugin.timeout
+            if timing["over_budget"]:
+                logger.warning(f"设备 {device or '-'} 的{plugin.description or plugin.name}检查耗时 "
+                               f"{timing['collect'] + timing['parse']:.2f}秒，超过预算 {plugin.timeout}秒")
+            self._record(plugin.name, timing, checks[plugin.name].get("status") == "error")
+            if timings is not None:
+                timings[plugin.name] = timing
+        return checks
+
+    def _record(self, name: str, timing: Dict, failed: bool):
+        with self._lock:
+            stats = self._stats.setdefault(name, {"runs": 0, "errors": 0, "collect_seconds": 0.0,
+                                                  "parse_seconds": 0.0, "over_budget": 0})
+            stats["runs"] += 1
+            stats["errors"] += int(failed)
+            stats["collect_seconds"] += timing["collect"]
+            stats["parse_seconds"] += timing["parse"]
+            stats["over_budget"] += int(timing["over_budget"])
+
+    def finish(self, result: Dict, started: float, error: Optional[str] = None,
+               sink: Optional[ResultSink] = None) -> Dict:
+        """
+        检查收尾：归一化结果、记总耗时，传入 sink 时放进入库缓冲区
+
+        Args:
+            result: new_result 创建的结果
+            started: 开始检查的 time.time()
+            error: 连接 / 取输出失败的原因
+            sink: 批量入库缓冲区
+        """
+        normalize_result(result, error)
+        result["duration"] = round(time.time() - started, 2)
+        if sink is not None:
+            try:
+                sink.add(result)
+            except Exception as e:
+                logger.warning(f"检查结果放入入库缓冲区失败: {str(e)}")
+        return result
+
+    def stats(self) -> Dict[str, Dict]:
+        """各项检查累计的执行次数、失败次数、collect/parse 耗时（秒）、超预算次数"""
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+# 进程内共享的健康检查引擎
+health_engine = HealthCheckEngine()
@@ -0,0 +1,363 @@
+"""
+异步健康检查引擎（asyncio + asyncssh）
+batch_health_check 用 ThreadPoolExecutor(max_workers=5)，Nornir 最多20个线程，每个线程绝大部分时间都在等网络，
+几千台设备要跑几个小时。这里一个事件循环同时挂着成百上千个SSH会话：
+1. 全局并发上限 global_limit（同时在检查的设备总数）+ 每个站点的并发上限 per_site_limit（避免打满某个机房的出口/AAA）
+2. 每台设备登录后把所有检查命令一次写入（流水线），按提示符切回每条命令的输出（和 command_runner.run_batch 同一套切分逻辑）
+3. 输出交给统一的健康检查引擎（core.health_check.engine）解析、归一化、批量入库，结果结构和 check_single_device 完全一致
+没装 asyncssh 时退回到线程里执行同步的 check_single_device（同样受并发上限控制）
+
+用法：
+    results = asyncio.run(batch_health_check_async(devices, global_limit=500, per_site_limit=50))
+命令行：
+    python core/health_check/health_checker_async.py --all --global-limit 500 --site-limit 50
+    python core/health_check/health_checker_async.py --ip 192.168.102.11 192.168.102.22 --mode sim
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import yaml
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+INVENTORY_PATH = os.path.join(ROOT_DIR, "config", "nornir_inventory.yaml")
+
+from utils.log_setup import setup_logger
+from core.connection.command_runner import (PromptTracker, VENDOR_PAGING_COMMANDS, latency_profiles,
+                                            prompt_line_pattern)
+from core.health_check.engine import FetchedOutputs, ResultSink, health_engine, new_result
+from core.health_check.health_checker_optimized import (CHECK_MODE_REAL, CHECK_MODE_SIMULATOR, _get_simulator_data,
+                                                        check_single_device)
+
+logger = setup_logger("health_checker_async", "health_check.log")
+
+try:
+    import asyncssh
+
+    ASYNCSSH_AVAILABLE = True
+except ImportError:
+    ASYNCSSH_AVAILABLE = False
+    logger.warning("asyncssh 没装，异步健康检查退回到线程中执行同步检查")
+
+# 异步引擎配置，并发上限可用环境变量覆盖
+ASYNC_CHECK_CONFIG = {
+    "global_limit": int(os.getenv("NETDEVOPS_ASYNC_GLOBAL_LIMIT", "500")),  # 同时检查的设备总数
+    "per_site_limit": int(os.getenv("NETDEVOPS_ASYNC_SITE_LIMIT", "50")),  # 每个站点同时检查的设备数
+    "connect_timeout": 10.0,  # SSH登录超时（秒）
+    "prompt_timeout": 15.0,  # 登录后等待第一个提示符的时间（秒）
+    "read_size": 65536,  # 每次从通道读取的最大字符数
+}
+
+# 登录后识别提示符：<SW1>、[SW1]、SW1#、SW1>，name 为设备名部分
+INITIAL_PROMPT_RE = re.compile(r"(?:^|\n)[<\[]?(?P<name>[\w.\-/]+?)(?:[-(][^\n<>#\[\]]*)?[>#\]][ \t]*$")
+
+
+# ============================================================
+# SSH 会话
+# ============================================================
+
+@asynccontextmanager
+async def open_asyncssh_shell(device_info: Dict, config: Dict):
+    """
+    登录设备并打开交互式shell
+
+    Args:
+        device_info: 设备信息（host/port/username/password）
+        config: ASYNC_CHECK_CONFIG
+
+    Yields:
+        (reader, writer)：reader.read(n) 读取输出，writer.write(data) 发送命令
+    """
+    conn = await asyncio.wait_for(
+        asyncssh.connect(
+            device_info.get("host", ""),
+            port=int(device_info.get("port") or 22),
+            username=device_info.get("username"),
+            password=device_info.get("password"),
+            known_hosts=None,
+        ),
+        timeout=config["connect_timeout"],
+    )
+    try:
+        writer, reader, _ = await conn.open_session(term_type="vt100", term_size=(511, 24))
+        yield reader, writer
+    finally:
+        conn.close()
+        await conn.wait_closed()
+
+
+async def _read_until(reader, done, timeout: float, read_size: int):
+    """从 reader 读取数据交给 done(chunk)，直到 done 返回 True；超时抛 TimeoutError，通道关闭抛 ConnectionError"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise TimeoutError(f"{timeout:.1f}秒内没有读到设备提示符")
+        chunk = await asyncio.wait_for(reader.read(read_size), remaining)
+        if not chunk:
+            raise ConnectionError("设备关闭了SSH通道")
+        if done(chunk):
+            return
+
+
+async def fetch_outputs(reader, writer, commands: List[str], vendor: str, device: str,
+                        config: Dict = ASYNC_CHECK_CONFIG, profiles=None) -> Dict[str, str]:
+    """
+    在已经打开的shell里流水线执行一组命令，按提示符切回每条命令的输出
+    切不开的命令逐条补执行
+
+    Args:
+        reader/writer: open_asyncssh_shell 返回的通道
+        commands: 命令列表
+        vendor: 厂商类型（选择关闭分页的命令）
+        device: 设备标识（时延档案用）
+        config: ASYNC_CHECK_CONFIG
+        profiles: 时延档案，不传用进程内共享的 latency_profiles
+
+    Returns:
+        {command: output}
+    """
+    profiles = profiles or latency_profiles
+
+    # 1. 读到登录后的第一个提示符，识别设备名
+    banner = []
+
+    def prompt_seen(chunk):
+        banner.append(chunk.replace("\r\n", "\n").replace("\r", "\n"))
+        return INITIAL_PROMPT_RE.search("".join(banner)[-512:]) is not None
+
+    await _read_until(reader, prompt_seen, config["prompt_timeout"], config["read_size"])
+    base_prompt = INITIAL_PROMPT_RE.search("".join(banner)[-512:]).group("name")
+    pattern = prompt_line_pattern(base_prompt)
+
+    # 2. 关闭分页 + 全部命令一次写入
+    commands = list(dict.fromkeys(commands))
+    paging = VENDOR_PAGING_COMMANDS.get((vendor or "").lower(), VENDOR_PAGING_COMMANDS["default"])
+    outputs = await _run_pipelined(reader, writer, [paging] + commands, pattern, device, config, profiles)
+
+    # 3. 回显对不上的命令逐条补执行
+    for command in commands:
+        if command not in outputs:
+            outputs.update(await _run_pipelined(reader, writer, [command], pattern, device, config, profiles))
+    return {command: outputs.get(command, "") for command in commands}
+
+
+async def _run_pipelined(reader, writer, batch, pattern, device, config, profiles):
+    tracker = PromptTracker(pattern)
+    timeout = sum(profiles.read_timeout(device, command) for command in batch)
+    start = time.monotonic()
+    writer.write("".join(command + "\n" for command in batch))
+
+    def finished(chunk):
+        tracker.feed(chunk)
+        return tracker.done(len(batch))
+
+    try:
+        await _read_until(reader, finished, timeout, config["read_size"])
+    except (TimeoutError, asyncio.TimeoutError):
+        profiles.record_timeout(device, batch[-1])
+        raise
+    return tracker.split(batch, profiles=profiles, device=device, started_at=start)
+
+
+# ============================================================
+# 异步检查引擎
+# ============================================================
+
+class AsyncHealthChecker:
+    """全局 + 站点两级并发控制的异步健康检查引擎"""
+
+    def __init__(self, mode: str = CHECK_MODE_REAL, global_limit: int = None, per_site_limit: int = None,
+                 open_shell=None, persist: bool = True, config: Dict = None):
+        """
+        Args:
+            mode: 检查模式 (real/sim)
+            global_limit: 同时检查的设备总数上限
+            per_site_limit: 每个站点同时检查的设备数上限（站点取设备信息里的 site，没有的归到 default）
+            open_shell: 打开shell的异步上下文管理器 fn(device_info, config)，默认 asyncssh（基准测试可替换）
+            persist: 是否更新档案卡、写数据库
+            config: 覆盖 ASYNC_CHECK_CONFIG 中的配置
+        """
+        self.mode = mode
+        self.config = dict(ASYNC_CHECK_CONFIG, **(config or {}))
+        self.global_limit = global_limit or self.config["global_limit"]
+        self.per_site_limit = per_site_limit or self.config["per_site_limit"]
+        self.open_shell = open_shell
+        self.persist = persist
+        self._global = None
+        self._sites = {}
+
+    def _site_semaphore(self, site: str) -> asyncio.Semaphore:
+        semaphore = self._sites.get(site)
+        if semaphore is None:
+            semaphore = self._sites[site] = asyncio.Semaphore(self.per_site_limit)
+        return semaphore
+
+    async def run(self, devices: List[Dict], sink: Optional[ResultSink] = None) -> List[Dict]:
+        """
+        并发检查所有设备，结果顺序和 devices 一致
+
+        Args:
+            devices: 设备信息列表
+            sink: 批量入库缓冲区，由调用方 flush；不传且 persist=True 时整轮检查结束后统一写库
+        """
+        self._global = asyncio.Semaphore(self.global_limit)
+        self._sites = {}
+        own_sink = sink is None and self.persist
+        sink = ResultSink() if own_sink else sink
+        results = await asyncio.gather(*(self.check_device(device, sink) for device in devices))
+        if own_sink:
+            try:
+                await asyncio.to_thread(sink.flush)
+            except Exception as e:
+                logger.warning(f"检查结果批量写库失败: {str(e)}")
+        return results
+
+    async def check_device(self, device_info: Dict, sink: Optional[ResultSink] = None) -> Dict:
+        """
+        检查单台设备，结果结构和 health_checker_optimized.check_single_device 一致
+
+        Args:
+            device_info: 设备信息字典
+            sink: 批量入库缓冲区（persist=False 时不用）
+
+        Returns:
+            设备检查结果字典
+        """
+        # 站点信号量先拿、全局信号量后拿，顺序固定不会互相等待
+        async with self._site_semaphore(device_info.get("site") or "default"), self._global:
+            if self.open_shell is None and not ASYNCSSH_AVAILABLE and self.mode != CHECK_MODE_SIMULATOR:
+                return await asyncio.to_thread(check_single_device, device_info, self.mode, sink)
+            return await self._check_device(device_info, sink if self.persist else None)
+
+    async def _check_device(self, device_info: Dict, sink: Optional[ResultSink]) -> Dict:
+        start_time = time.time()
+        device_name = device_info.get("device_name", "Unknown")
+        vendor = device_info.get("vendor", "h3c").lower()
+        result = new_result(device_name, device_info.get("host", ""), vendor, self.mode)
+
+        if self.mode == CHECK_MODE_SIMULATOR:
+            result["checks"] = _get_simulator_data(device_name, vendor)
+            return health_engine.finish(result, start_time)
+
+        open_shell = self.open_shell or open_asyncssh_shell
+        try:
+            phase_started = time.perf_counter()
+            async with open_shell(device_info, self.config) as (reader, writer):
+                result["timings"]["connect"] = round(time.perf_counter() - phase_started, 4)
+                phase_started = time.perf_counter()
+                outputs = await fetch_outputs(reader, writer, health_engine.commands(vendor), vendor, result["host"],
+                                              self.config)
+                result["timings"]["prefetch"] = round(time.perf_counter() - phase_started, 4)
+        except Exception as e:
+            logger.error(f"检查设备 {device_name} 时出错: {str(e)}")
+            error = "连接失败" if isinstance(e, (OSError, asyncio.TimeoutError)) else str(e)
+            return health_engine.finish(result, start_time, error=error, sink=sink)
+
+        # 解析是纯CPU操作，直接在事件循环里做；放进入库缓冲区（要匹配档案卡）放到线程里，不阻塞其他设备的网络收发
+        result["checks"] = health_engine.evaluate(FetchedOutputs(outputs), vendor, device=result["host"],
+                                                  timings=result["timings"]["checks"])
+        if sink is not None:
+            await asyncio.to_thread(health_engine.finish, result, start_time, None, sink)
+        else:
+            health_engine.finish(result, start_time)
+        logger.info(f"设备 {device_name} 检查完成，状态: {result['status']}，耗时: {result['duration']}秒")
+        return result
+
+
+async def batch_health_check_async(devices: List[Dict], mode: str = CHECK_MODE_REAL, global_limit: int = None,
+                                   per_site_limit: int = None, persist: bool = True) -> List[Dict]:
+    """
+    异步批量健康检查（batch_health_check 的异步版本）
+
+    Args:
+        devices: 设备信息列表
+        mode: 检查模式
+        global_limit: 全局并发上限
+        per_site_limit: 每个站点的并发上限
+        persist: 是否更新档案卡、写数据库（整轮检查结束后一次事务批量写入）
+
+    Returns:
+        检查结果列表（顺序和 devices 一致）
+    """
+    checker = AsyncHealthChecker(mode=mode, global_limit=global_limit, per_site_limit=per_site_limit,
+                                 persist=persist)
+    return await checker.run(devices)
+
+
+# ============================================================
+# 命令行入口
+# ============================================================
+
+def load_inventory(filename: str = INVENTORY_PATH) -> List[Dict]:
+    """
+    从 Nornir 清单读取设备列表（字段和 web 端 get_devices 一致，另外带上 site）
+    站点取 data.site，没有时取第一个分组
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    devices = []
+    for device_name, device_info in data.items():
+        extras = device_info.get("connection_options", {}).get("netmiko", {}).get("extras", {})
+        host_data = device_info.get("data", {}) or {}
+        groups = device_info.get("groups") or []
+        devices.append({
+            "device_name": device_name,
+            "device_type": extras.get("device_type", ""),
+            "host": device_info.get("hostname", ""),
+            "username": device_info.get("username", ""),
+            "password": device_info.get("password", ""),
+            "port": extras.get("port", 22),
+            "vendor": host_data.get("vendor", "h3c"),
+            "site": host_data.get("site") or (groups[0] if groups else "default"),
+        })
+    return [device for device in devices if device["host"] and device["username"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="异步健康检查引擎")
+    parser.add_argument("--all", action="store_true", help="检查清单里的所有设备")
+    parser.add_argument("--ip", type=str, nargs="+", help="只检查指定IP的设备")
+    parser.add_argument("--inventory", default=INVENTORY_PATH, help="Nornir 设备清单路径")
+    parser.add_argument("--mode", choices=[CHECK_MODE_REAL, CHECK_MODE_SIMULATOR], default=CHECK_MODE_REAL)
+    parser.add_argument("--global-limit", type=int, default=None, help="全局并发上限")
+    parser.add_argument("--site-limit", type=int, default=None, help="每个站点的并发上限")
+    parser.add_argument("--no-save", action="store_true", help="不更新档案卡、不写数据库")
+    parser.add_argument("--output", help="检查结果写入这个JSON文件")
+    args = parser.parse_args()
+
+    devices = load_inventory(args.inventory)
+    if args.ip:
+        devices = [device for device in devices if device["host"] in args.ip]
+    elif not args.all:
+        parser.error("请指定 --all 或 --ip")
+    if not devices:
+        logger.error("未读取任何设备！请查看出错原因！")
+        return
+
+    start = time.monotonic()
+    results = asyncio.run(batch_health_check_async(
+        devices, mode=args.mode, global_limit=args.global_limit, per_site_limit=args.site_limit,
+        persist=not args.no_save,
+    ))
+    elapsed = time.monotonic() - start
+    failed = sum(1 for result in results if result.get("status") == "failed")
+    logger.info(f"异步健康检查完成：设备{len(results)}台，失败{failed}台，耗时{elapsed:.1f}秒，"
+                f"{len(results) / max(elapsed, 1e-6):.1f}台/秒")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        logger.info(f"检查结果已写入{args.output}")
+
+
+if __name__ == "__main__":
+    main()
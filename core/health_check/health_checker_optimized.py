@@ -4,11 +4,11 @@
 """
 
 import os
-import re
-import yaml
+import copy
 import sys
 import time
-from datetime import datetime
+import hashlib
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional, Tuple
 
@@ -16,8 +16,11 @@ ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fil
 sys.path.append(ROOT_DIR)
 
 from utils.log_setup import setup_logger
-from utils.models import get_global_physical_cards
-from db.database import db_manager
+from core.connection.session_pool import session_pool
+from core.connection.command_runner import run_command, prefetch_commands
+from core.parsers import parse
+from core.health_check.checks import DEFAULT_CHECKS, get_vendor_command
+from core.health_check.engine import ResultSink, health_engine, new_result
 
 logger = setup_logger("netdevops_health_check", "health_check.log")
 
@@ -43,106 +46,26 @@ TIMEOUT_CONFIG = {
     }
 }
 
-# 温度告警阈值（摄氏度）
-TEMP_WARNING_THRESHOLD = 60
-TEMP_DANGER_THRESHOLD = 80
+# 多厂商命令映射（VENDOR_COMMANDS / get_vendor_command）、温度告警阈值在 core.health_check.checks，
+# 关键端口列表在 core.health_check.engine
 
-# 关键端口列表（可配置）
-CRITICAL_PORTS = ["GE1/0/1", "GE1/0/2", "GigabitEthernet0/0/1"]
+# check_single_device 用到的命令类型：连接后一次批量取回，各项检查共用
+HEALTH_CHECK_COMMAND_TYPES = health_engine.command_types()
 
-# ============================================================
-# 多厂商命令映射
-# ============================================================
-
-VENDOR_COMMANDS = {
-    "h3c": {
-        "interface": "display interface brief",
-        "cpu": "display cpu-usage",
-        "memory": "display memory",
-        "version": "display version",
-        "routing": "display ip routing-table",
-        "arp": "display arp",
-        "mac": "display mac-address",
-        "vlan": "display vlan brief",
-        "ospf": "display ospf peer brief",
-        "bgp": "display bgp peer",
-        "environment": "display environment",
-        "power": "display power",
-        "fan": "display fan",
-        "stp": "display stp brief",
-        "link_agg": "display link-aggregation summary",
-        "config": "display current-configuration",
-    },
-    "cisco": {
-        "interface": "show ip interface brief",
-        "cpu": "show processes cpu",
-        "memory": "show memory",
-        "version": "show version",
-        "routing": "show ip route",
-        "arp": "show arp",
-        "mac": "show mac address-table",
-        "vlan": "show vlan brief",
-        "ospf": "show ip ospf neighbor",
-        "bgp": "show ip bgp summary",
-        "environment": "show environment all",
-        "power": "show power",
-        "fan": "show fans",
-        "stp": "show spanning-tree",
-        "link_agg": "show etherchannel summary",
-        "config": "show running-config",
-    },
-    "huawei": {
-        "interface": "display interface brief",
-        "cpu": "display cpu-usage",
-        "memory": "display memory",
-        "version": "display version",
-        "routing": "display ip routing-table",
-        "arp": "display arp",
-        "mac": "display mac-address",
-        "vlan": "display vlan brief",
-        "ospf": "display ospf peer brief",
-        "bgp": "display bgp peer",
-        "environment": "display environment",
-        "power": "display power",
-        "fan": "display fan",
-        "stp": "display stp brief",
-        "link_agg": "display link-aggregation summary",
-        "config": "display current-configuration",
-    },
-    "default": {
-        "interface": "display interface brief",
-        "cpu": "display cpu-usage",
-        "memory": "display memory",
-        "version": "display version",
-        "routing": "display ip routing-table",
-        "arp": "display arp",
-        "mac": "display mac-address",
-        "vlan": "display vlan brief",
-        "ospf": "display ospf peer brief",
-        "bgp": "display bgp peer",
-        "environment": "display environment",
-        "power": "display power",
-        "fan": "display fan",
-        "stp": "display stp brief",
-        "link_agg": "display link-aggregation summary",
-        "config": "display current-configuration",
-    },
+# 差量检查：先执行便宜的指纹命令，指纹没变、结果没过期就复用上次的解析结果，不再执行昂贵的命令
+# commands 为检查本身要执行的命令类型，fingerprint 为决定是否重跑的指纹命令类型，max_staleness 为结果最长复用秒数
+# 设备重启过（按 uptime 推算的开机时间变化）时所有检查都重跑
+DIFFERENTIAL_CHECKS = {
+    "routing": {"commands": ["routing"], "fingerprint": ["routing_summary", "config_changes"], "max_staleness": 3600},
+    "arp": {"commands": ["arp"], "fingerprint": ["arp_summary"], "max_staleness": 1800},
+    "environment": {"commands": ["environment", "power", "fan"], "fingerprint": ["config_changes"],
+                    "max_staleness": 900},
 }
 
-
-def get_vendor_command(vendor: str, command_type: str) -> str:
-    """
-    根据厂商类型获取对应命令
-
-    Args:
-        vendor: 厂商类型 (h3c/cisco/huawei)
-        command_type: 命令类型 (interface/cpu/memory/...)
-
-    Returns:
-        对应的CLI命令
-    """
-    vendor = vendor.lower() if vendor else "default"
-    return VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS["default"]).get(command_type, "")
+DIFFERENTIAL_CONFIG = {
+    "enabled": os.getenv("NETDEVOPS_DIFFERENTIAL_CHECKS", "0") == "1",  # check_single_device 默认是否走差量模式
+    "boot_time_tolerance": 300,  # uptime 只精确到分钟，两次推算的开机时间相差在这个秒数内视为没有重启
+}
 
 
 # ============================================================
@@ -150,7 +73,7 @@ def get_vendor_command(vendor: str, command_type: str) -> str:
 # ============================================================
 
 class DeviceConnection:
-    """设备连接管理器"""
+    """设备连接管理器（从进程共享的SSH会话池借用会话，disconnect 时归还）"""
 
     def __init__(self, device_info: Dict, mode: str = CHECK_MODE_REAL):
         """
@@ -163,6 +86,8 @@ class DeviceConnection:
         self.device_info = device_info
         self.mode = mode
         self.connection = None
+        self.lease = None
+        self.broken = False  # 执行命令出错，归还时丢弃会话
         self.timeout_config = TIMEOUT_CONFIG[mode]
 
     def connect(self) -> bool:
@@ -173,8 +98,6 @@ class DeviceConnection:
             连接是否成功
         """
         try:
-            from netmiko import ConnectHandler
-
             # 准备连接参数
             device_params = {
                 "device_type": self.device_info.get("device_type", "huawei_telnet"),
@@ -182,13 +105,16 @@ class DeviceConnection:
                 "port": self.device_info.get("port", 22),
                 "username": self.device_info.get("username", ""),
                 "password": self.device_info.get("password", ""),
-                "timeout": self.timeout_config["connection"],
-                "global_delay_factor": self.timeout_config["global_delay_factor"],
-                "fast_cli": False,
             }
 
-            # 建立连接
-            self.connection = ConnectHandler(**device_params)
+            # 借用会话（池里没有可用会话时才真正登录）
+            self.lease = session_pool.acquire(
+                device_params,
+                timeout=self.timeout_config["connection"],
+                global_delay_factor=self.timeout_config["global_delay_factor"],
+                fast_cli=False,
+            )
+            self.connection = self.lease.connection
             logger.info(f"成功连接到设备: {self.device_info.get('host')}")
             return True
 
@@ -197,13 +123,31 @@ class DeviceConnection:
             return False
 
     def disconnect(self):
-        """断开设备连接"""
-        if self.connection:
-            try:
-                self.connection.disconnect()
-                logger.info(f"已断开设备连接: {self.device_info.get('host')}")
-            except Exception as e:
-                logger.warning(f"断开连接时出错: {str(e)}")
+        """归还设备连接（出错的会话直接关闭）"""
+        if self.lease:
+            session_pool.release(self.lease, discard=self.broken)
+            logger.info(f"已归还设备连接: {self.device_info.get('host')}")
+            self.lease = None
+            self.connection = None
+
+    def prefetch(self, vendor: str, command_types: List[str]):
+        """
+        批量取回一组检查命令的输出（一次写入，按提示符切分），之后 execute_command 直接返回缓存的输出
+
+        Args:
+            vendor: 厂商类型
+            command_types: 命令类型列表 (interface/cpu/memory/...)
+        """
+        if not self.connection:
+            return
+        commands = [get_vendor_command(vendor, command_type) for command_type in command_types]
+        try:
+            self.connection = prefetch_commands(
+                self.connection, commands, device=self.device_info.get("host"), vendor=vendor
+            )
+        except Exception as e:
+            self.broken = True
+            logger.error(f"批量执行命令失败: {self.device_info.get('host')} - {str(e)}")
 
     def execute_command(self, command: str) -> Tuple[bool, str]:
         """
@@ -219,439 +163,261 @@ class DeviceConnection:
             return False, "未建立连接"
 
         try:
-            output = self.connection.send_command_timing(
-                command,
-                delay_factor=self.timeout_config["global_delay_factor"],
-                max_loops=100
-            )
+            output = run_command(self.connection, command, device=self.device_info.get("host"))
             return True, output
 
         except Exception as e:
+            self.broken = True
             logger.error(f"执行命令失败: {command} - {str(e)}")
             return False, str(e)
 
 
 # ============================================================
-# 健康检查函数
+# 主检查函数
 # ============================================================
 
-def check_interface_status(connection: DeviceConnection, vendor: str = None) -> Dict:
+def run_checks(connection, vendor: str, only: Optional[List[str]] = None, device: Optional[str] = None,
+               timings: Optional[Dict] = None) -> Dict:
     """
-    检查接口状态
+    按检查插件执行各项检查，返回 result["checks"]（解析逻辑见 core.health_check.checks）
 
     Args:
-        connection: 设备连接
+        connection: 任何提供 execute_command(command) -> (是否成功, 输出) 的对象
+                    （DeviceConnection，或异步引擎里已经取回输出的会话）
         vendor: 厂商类型
+        only: 只执行这些检查，默认 DEFAULT_CHECKS
+        device: 设备IP（按时延档案统计每项检查取输出的耗时）
+        timings: 传入时写入每项检查的 collect / parse 耗时
 
     Returns:
-        接口状态字典
+        各项检查结果字典
     """
-    command = get_vendor_command(vendor, "interface")
-    success, output = connection.execute_command(command)
+    return health_engine.evaluate(connection, vendor, device=device, only=only, timings=timings)
 
-    if not success:
-        return {"status": "error", "message": "获取接口状态失败", "interfaces": []}
 
-    # 解析接口状态
-    interfaces = []
-    up_count = 0
-    down_count = 0
+class DifferentialCache:
+    """各设备每项检查上次的指纹、开机时间和解析结果（进程内共享）"""
 
-    lines = output.split("\n")
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith("Interface") or line.startswith("-"):
-            continue
-
-        # 解析接口行（适配不同厂商格式）
-        parts = line.split()
-        if len(parts) >= 4:
-            iface_name = parts[0]
-            ip_addr = parts[1] if len(parts) > 1 else ""
-            status = parts[-1] if len(parts) > 2 else ""
-
-            # 判断接口状态
-            is_up = "UP" in status.upper() and "DOWN" not in status.upper()
-            if is_up:
-                up_count += 1
-            else:
-                down_count += 1
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # (device_name, check_name) -> {"fingerprint", "boot_time", "result", "collected_at"}
 
-            interfaces.append({
-                "name": iface_name,
-                "ip": ip_addr,
-                "status": "up" if is_up else "down",
-                "raw": line
-            })
-
-    return {
-        "status": "success",
-        "total": len(interfaces),
-        "up": up_count,
-        "down": down_count,
-        "interfaces": interfaces
-    }
-
-
-def check_cpu_usage(connection: DeviceConnection, vendor: str = None) -> Dict:
-    """
-    检查CPU使用率
+    def get(self, device_name: str, check_name: str) -> Optional[Dict]:
+        with self._lock:
+            return self._entries.get((device_name, check_name))
 
-    Args:
-        connection: 设备连接
-        vendor: 厂商类型
-
-    Returns:
-        CPU使用率字典
-    """
-    command = get_vendor_command(vendor, "cpu")
-    success, output = connection.execute_command(command)
-
-    if not success:
-        return {"status": "error", "message": "获取CPU使用率失败", "usage": 0}
+    def put(self, device_name: str, check_name: str, fingerprint: str, boot_time: Optional[float], result: Dict,
+            collected_at: float):
+        with self._lock:
+            self._entries[(device_name, check_name)] = {
+                "fingerprint": fingerprint,
+                "boot_time": boot_time,
+                "result": copy.deepcopy(result),
+                "collected_at": collected_at,
+            }
 
-    # 解析CPU使用率
-    usage = 0
-    try:
-        # H3C/华为格式: "CPU Usage: 23%"
-        match = re.search(r"CPU\s*Usage:\s*(\d+)%", output, re.IGNORECASE)
-        if match:
-            usage = int(match.group(1))
-        else:
-            # Cisco格式: "CPU utilization for five seconds: 23%"
-            match = re.search(r"five seconds:\s*(\d+)%", output, re.IGNORECASE)
-            if match:
-                usage = int(match.group(1))
+    def clear(self, device_name: Optional[str] = None):
+        """清空缓存；指定设备时只清这台设备的（设备变更后强制下次全量检查）"""
+        with self._lock:
+            if device_name is None:
+                self._entries.clear()
             else:
-                # 通用格式: 查找百分比数字
-                match = re.search(r"(\d+)%", output)
-                if match:
-                    usage = int(match.group(1))
-    except Exception as e:
-        logger.warning(f"解析CPU使用率失败: {str(e)}")
+                self._entries = {key: entry for key, entry in self._entries.items() if key[0] != device_name}
 
-    return {
-        "status": "success",
-        "usage": usage,
-        "raw": output[:200]  # 只保留前200字符
-    }
 
+# 进程内共享的差量检查缓存
+differential_cache = DifferentialCache()
 
-def check_memory_usage(connection: DeviceConnection, vendor: str = None) -> Dict:
-    """
-    检查内存使用率
 
-    Args:
-        connection: 设备连接
-        vendor: 厂商类型
-
-    Returns:
-        内存使用率字典
+def collect_fingerprints(connection, vendor: str, command_types: List[str]) -> Dict[str, Optional[str]]:
     """
-    command = get_vendor_command(vendor, "memory")
-    success, output = connection.execute_command(command)
-
-    if not success:
-        return {"status": "error", "message": "获取内存使用率失败", "usage": 0}
-
-    # 解析内存使用率
-    usage = 0
-    try:
-        # 查找 "Used: 123456 bytes (45%)" 格式
-        match = re.search(r"Used:\s*\d+\s*bytes\s*\((\d+)%\)", output, re.IGNORECASE)
-        if match:
-            usage = int(match.group(1))
-        else:
-            # 查找 "Memory Usage: 45%" 格式
-            match = re.search(r"Memory\s*Usage:\s*(\d+)%", output, re.IGNORECASE)
-            if match:
-                usage = int(match.group(1))
-            else:
-                # 通用格式: 查找百分比数字
-                match = re.search(r"(\d+)%", output)
-                if match:
-                    usage = int(match.group(1))
-    except Exception as e:
-        logger.warning(f"解析内存使用率失败: {str(e)}")
-
-    return {
-        "status": "success",
-        "usage": usage,
-        "raw": output[:200]
-    }
-
-
-def check_device_version(connection: DeviceConnection, vendor: str = None) -> Dict:
-    """
-    检查设备版本
-
-    Args:
-        connection: 设备连接
-        vendor: 厂商类型
+    执行指纹命令，输出压缩空白后取摘要
 
     Returns:
-        设备版本字典
+        命令类型 -> 摘要，命令执行失败为 None
     """
-    command = get_vendor_command(vendor, "version")
-    success, output = connection.execute_command(command)
-
-    if not success:
-        return {"status": "error", "message": "获取设备版本失败", "version": "未知"}
+    fingerprints = {}
+    for command_type in command_types:
+        success, output = connection.execute_command(get_vendor_command(vendor, command_type))
+        fingerprints[command_type] = (
+            hashlib.sha1(" ".join(output.split()).encode("utf-8")).hexdigest()[:16] if success else None
+        )
+    return fingerprints
 
-    # 解析版本信息
-    version = "未知"
-    try:
-        # H3C/华为格式: "Version 7.1.075"
-        match = re.search(r"Version\s+([\d.]+)", output, re.IGNORECASE)
-        if match:
-            version = match.group(1)
-        else:
-            # Cisco格式: "Cisco IOS Software, Version 15.2(4)M"
-            match = re.search(r"Version\s+([\d.()]+)", output, re.IGNORECASE)
-            if match:
-                version = match.group(1)
-            else:
-                # 通用格式: 查找版本号
-                match = re.search(r"v?(\d+\.\d+\.\d+)", output, re.IGNORECASE)
-                if match:
-                    version = match.group(1)
-    except Exception as e:
-        logger.warning(f"解析设备版本失败: {str(e)}")
 
-    return {
-        "status": "success",
-        "version": version,
-        "raw": output[:200]
-    }
+def _boot_time(connection, vendor: str, now: float) -> Optional[float]:
+    """按 display version 里的 uptime 推算开机时间（version 命令本来就要执行，不额外耗时）"""
+    success, output = connection.execute_command(get_vendor_command(vendor, "version"))
+    record = parse(vendor, "version", output) if success else None
+    uptime = record.uptime_seconds if record else None
+    return None if uptime is None else now - uptime
 
 
-def check_routing_table(connection: DeviceConnection, vendor: str = None) -> Dict:
+def plan_differential_checks(device_name: str, fingerprints: Dict[str, Optional[str]], boot_time: Optional[float],
+                             now: float, cache: DifferentialCache = None, checks: Dict = None) -> Dict[str, Dict]:
     """
-    检查路由表
-
-    Args:
-        connection: 设备连接
-        vendor: 厂商类型
+    决定每项差量检查是复用上次的结果还是重跑
 
     Returns:
-        路由表字典
+        检查名 -> {"reuse", "reason", "fingerprint", "age", "entry"}
     """
-    command = get_vendor_command(vendor, "routing")
-    success, output = connection.execute_command(command)
-
-    if not success:
-        return {"status": "error", "message": "获取路由表失败", "route_count": 0}
-
-    # 统计路由数量
-    route_count = 0
-    routes = []
-
-    lines = output.split("\n")
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith("Destination") or line.startswith("-") or line.startswith("Total"):
-            continue
-
-        # 判断是否为路由条目
-        if "/" in line or "Static" in line or "O " in line or "S " in line:
-            route_count += 1
-            if len(routes) < 5:  # 只保留前5条示例
-                routes.append(line[:100])
-
-    return {
-        "status": "success",
-        "route_count": route_count,
-        "routes": routes,
-        "raw": output[:500]
-    }
+    cache = cache or differential_cache
+    checks = checks or DIFFERENTIAL_CHECKS
+    tolerance = DIFFERENTIAL_CONFIG["boot_time_tolerance"]
+    plan = {}
+    for name, config in checks.items():
+        parts = [fingerprints.get(command_type) for command_type in config["fingerprint"]]
+        fingerprint = "|".join(part or "" for part in parts)
+        entry = cache.get(device_name, name)
+        age = now - entry["collected_at"] if entry else None
+        if any(part is None for part in parts):
+            reason = "指纹命令执行失败"
+        elif entry is None:
+            reason = "没有上次的结果"
+        elif (boot_time is not None and entry["boot_time"] is not None
+              and abs(boot_time - entry["boot_time"]) > tolerance):
+            reason = "设备重启过"
+        elif entry["fingerprint"] != fingerprint:
+            reason = "指纹变化"
+        elif age > config["max_staleness"]:
+            reason = "结果已过期"
+        else:
+            reason = "指纹未变化"
+        plan[name] = {"reuse": reason == "指纹未变化", "reason": reason, "fingerprint": fingerprint, "age": age,
+                      "entry": entry}
+    return plan
 
 
-def check_arp_table(connection: DeviceConnection, vendor: str = None) -> Dict:
+def run_differential_checks(connection, device_name: str, vendor: str, cache: DifferentialCache = None,
+                            checks: Dict = None, host: Optional[str] = None,
+                            timings: Optional[Dict] = None) -> Tuple[Dict, Dict]:
     """
-    检查ARP表
+    差量模式执行各项检查：
+    1. 不参与差量的命令和指纹命令一起批量取回
+    2. 按指纹、开机时间、结果年龄决定哪些昂贵的检查要重跑
+    3. 只补取要重跑的检查的命令，其余检查复用上次的解析结果
 
     Args:
-        connection: 设备连接
+        connection: DeviceConnection（需要 prefetch / execute_command）
+        device_name: 设备名称（缓存的键）
         vendor: 厂商类型
+        cache: 差量缓存，默认进程内共享的 differential_cache
+        checks: 差量检查配置，默认 DIFFERENTIAL_CHECKS
+        host: 设备IP（统计各项检查的取输出耗时）
+        timings: 传入时写入重跑的各项检查的 collect / parse 耗时（复用的检查不计）
 
     Returns:
-        ARP表字典
+        (result["checks"], result["differential"] 元数据)
     """
-    command = get_vendor_command(vendor, "arp")
-    success, output = connection.execute_command(command)
-
-    if not success:
-        return {"status": "error", "message": "获取ARP表失败", "arp_count": 0}
-
-    # 统计ARP条目数量
-    arp_count = 0
-    entries = []
-
-    lines = output.split("\n")
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith("IP Address") or line.startswith("-") or line.startswith("Total"):
+    cache = cache or differential_cache
+    checks = checks or DIFFERENTIAL_CHECKS
+    differential_types = {command_type for config in checks.values() for command_type in config["commands"]}
+    fingerprint_types = list(dict.fromkeys(t for config in checks.values() for t in config["fingerprint"]))
+
+    connection.prefetch(vendor, [t for t in HEALTH_CHECK_COMMAND_TYPES if t not in differential_types]
+                        + fingerprint_types)
+    now = time.time()
+    fingerprints = collect_fingerprints(connection, vendor, fingerprint_types)
+    boot_time = _boot_time(connection, vendor, now)
+    plan = plan_differential_checks(device_name, fingerprints, boot_time, now, cache, checks)
+
+    rerun = [name for name, item in plan.items() if not item["reuse"]]
+    if rerun:
+        connection.prefetch(vendor, [t for name in rerun for t in checks[name]["commands"]])
+    fresh = run_checks(connection, vendor, only=[name for name in DEFAULT_CHECKS if name not in plan or name in rerun],
+                       device=host, timings=timings)
+
+    results = {}
+    metadata = {"enabled": True, "reused": [], "checks": {}}
+    for name in DEFAULT_CHECKS:
+        item = plan.get(name)
+        if item is None:
+            results[name] = fresh[name]
             continue
-
-        # 判断是否为ARP条目（包含IP和MAC地址）
-        if ":" in line or "-" in line:
-            arp_count += 1
-            if len(entries) < 5:
-                entries.append(line[:100])
-
-    return {
-        "status": "success",
-        "arp_count": arp_count,
-        "entries": entries,
-        "raw": output[:500]
-    }
-
-
-def check_environment_info(connection: DeviceConnection, vendor: str = None) -> Dict:
-    """
-    检查环境信息（温度、电源、风扇）
-
-    Args:
-        connection: 设备连接
-        vendor: 厂商类型
-
-    Returns:
-        环境信息字典
-    """
-    result = {
-        "temperature": {"status": "unknown", "value": "N/A", "alert": ""},
-        "power": {"status": "unknown", "count": 0},
-        "fan": {"status": "unknown", "count": 0},
-    }
-
-    # 检查温度
-    try:
-        command = get_vendor_command(vendor, "environment")
-        success, output = connection.execute_command(command)
-
-        if success and output:
-            # 提取温度值
-            temp_match = re.search(r"(\d+)\s*°?[Cc]", output)
-            if temp_match:
-                temp_value = int(temp_match.group(1))
-                result["temperature"]["value"] = f"{temp_value}°C"
-
-                # 温度告警判断
-                if temp_value >= TEMP_DANGER_THRESHOLD:
-                    result["temperature"]["status"] = "danger"
-                    result["temperature"]["alert"] = "温度过高！"
-                elif temp_value >= TEMP_WARNING_THRESHOLD:
-                    result["temperature"]["status"] = "warning"
-                    result["temperature"]["alert"] = "温度偏高"
-                else:
-                    result["temperature"]["status"] = "normal"
-                    result["temperature"]["alert"] = "正常"
-    except Exception as e:
-        logger.warning(f"检查温度失败: {str(e)}")
-
-    # 检查电源
-    try:
-        command = get_vendor_command(vendor, "power")
-        success, output = connection.execute_command(command)
-
-        if success and output:
-            power_count = output.count("Normal") + output.count("正常")
-            result["power"]["count"] = power_count
-            result["power"]["status"] = "normal" if power_count > 0 else "abnormal"
-    except Exception as e:
-        logger.warning(f"检查电源失败: {str(e)}")
-
-    # 检查风扇
-    try:
-        command = get_vendor_command(vendor, "fan")
-        success, output = connection.execute_command(command)
-
-        if success and output:
-            fan_count = output.count("Normal") + output.count("正常")
-            result["fan"]["count"] = fan_count
-            result["fan"]["status"] = "normal" if fan_count > 0 else "abnormal"
-    except Exception as e:
-        logger.warning(f"检查风扇失败: {str(e)}")
-
-    return result
+        if item["reuse"]:
+            results[name] = copy.deepcopy(item["entry"]["result"])
+            metadata["reused"].append(name)
+        else:
+            results[name] = fresh[name]
+            if results[name].get("status") != "error":
+                cache.put(device_name, name, item["fingerprint"], boot_time, results[name], now)
+        metadata["checks"][name] = {
+            "reused": item["reuse"],
+            "reason": item["reason"],
+            "age": round(item["age"], 1) if item["reuse"] else 0.0,
+            "max_staleness": checks[name]["max_staleness"],
+        }
+    if metadata["reused"]:
+        logger.info(f"设备 {device_name} 差量检查复用了上次的结果: {', '.join(metadata['reused'])}")
+    return results, metadata
 
 
-# ============================================================
-# 主检查函数
-# ============================================================
-
-def check_single_device(device_info: Dict, mode: str = CHECK_MODE_REAL) -> Dict:
+def check_single_device(device_info: Dict, mode: str = CHECK_MODE_REAL, sink: Optional[ResultSink] = None,
+                        differential: Optional[bool] = None, checks: Optional[List[str]] = None) -> Dict:
     """
-    检查单台设备
+    检查单台设备（线程执行器：从会话池借连接，命令批量取回后交给健康检查引擎解析）
 
     Args:
         device_info: 设备信息字典
         mode: 检查模式 (real/sim)
+        sink: 批量入库缓冲区，批量检查时传入，由调用方统一 flush；不传时检查完立即写库
+        differential: 是否走差量模式（指纹没变时复用路由/ARP/环境的上次结果），默认看 DIFFERENTIAL_CONFIG
+        checks: 要执行的检查名，默认 DEFAULT_CHECKS（差量模式只支持默认检查）
 
     Returns:
-        设备检查结果字典
+        设备检查结果字典（结构见 core.health_check.engine.normalize_result）
     """
     start_time = time.time()
     device_name = device_info.get("device_name", "Unknown")
     vendor = device_info.get("vendor", "h3c").lower()
+    result = new_result(device_name, device_info.get("host", ""), vendor, mode)
+    timings = result["timings"]
 
     logger.info(f"开始检查设备: {device_name} (模式: {mode})")
 
-    # 初始化结果
-    result = {
-        "device_name": device_name,
-        "host": device_info.get("host", ""),
-        "vendor": vendor,
-        "mode": mode,
-        "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "duration": 0,
-        "status": "success",
-        "checks": {}
-    }
-
     # 模拟器模式：返回模拟数据
     if mode == CHECK_MODE_SIMULATOR:
         result["checks"] = _get_simulator_data(device_name, vendor)
-        result["duration"] = round(time.time() - start_time, 2)
+        health_engine.finish(result, start_time)
         logger.info(f"设备 {device_name} 模拟检查完成，耗时: {result['duration']}秒")
         return result
 
     # 真实设备模式：建立连接并执行检查
     connection = DeviceConnection(device_info, mode)
+    own_sink = sink is None
+    sink = ResultSink() if own_sink else sink
+    error = None
 
     try:
         # 建立连接
-        if not connection.connect():
-            result["status"] = "error"
-            result["message"] = "连接失败"
-            return result
-
-        # 执行各项检查
-        result["checks"]["interface"] = check_interface_status(connection, vendor)
-        result["checks"]["cpu"] = check_cpu_usage(connection, vendor)
-        result["checks"]["memory"] = check_memory_usage(connection, vendor)
-        result["checks"]["version"] = check_device_version(connection, vendor)
-        result["checks"]["routing"] = check_routing_table(connection, vendor)
-        result["checks"]["arp"] = check_arp_table(connection, vendor)
-        result["checks"]["environment"] = check_environment_info(connection, vendor)
-
-        # 更新设备档案卡
-        _update_device_profile(device_name, result)
-
-        # 保存到数据库
-        _save_to_database(device_name, result)
+        phase_started = time.perf_counter()
+        connected = connection.connect()
+        timings["connect"] = round(time.perf_counter() - phase_started, 4)
+        if not connected:
+            error = "连接失败"
+        # 执行各项检查（命令输出先批量取回，各项检查共用）
+        elif checks is None and (DIFFERENTIAL_CONFIG["enabled"] if differential is None else differential):
+            result["checks"], result["differential"] = run_differential_checks(
+                connection, device_name, vendor, host=result["host"], timings=timings["checks"])
+        else:
+            phase_started = time.perf_counter()
+            connection.prefetch(vendor, health_engine.command_types(checks))
+            timings["prefetch"] = round(time.perf_counter() - phase_started, 4)
+            result["checks"] = run_checks(connection, vendor, only=checks, device=result["host"],
+                                          timings=timings["checks"])
 
     except Exception as e:
         logger.error(f"检查设备 {device_name} 时出错: {str(e)}")
-        result["status"] = "error"
-        result["message"] = str(e)
+        error = str(e)
 
     finally:
         # 断开连接
         connection.disconnect()
 
-    result["duration"] = round(time.time() - start_time, 2)
-    logger.info(f"设备 {device_name} 检查完成，耗时: {result['duration']}秒")
+    health_engine.finish(result, start_time, error=error, sink=sink)
+    if own_sink:
+        _flush_sink(sink)
+    logger.info(f"设备 {device_name} 检查完成，状态: {result['status']}，耗时: {result['duration']}秒")
 
     return result
 
@@ -719,69 +485,20 @@ def _get_simulator_data(device_name: str, vendor: str) -> Dict:
     }
 
 
-def _update_device_profile(device_name: str, result: Dict):
-    """
-    更新设备档案卡
-
-    Args:
-        device_name: 设备名称
-        result: 检查结果
-    """
-    try:
-        cards = get_global_physical_cards()
-        if device_name in cards:
-            card = cards[device_name]
-            card["last_check"] = result["check_time"]
-            card["status"] = result["status"]
-
-            # 更新各项指标
-            if "interface" in result["checks"]:
-                card["interface_up"] = result["checks"]["interface"].get("up", 0)
-                card["interface_down"] = result["checks"]["interface"].get("down", 0)
-
-            if "cpu" in result["checks"]:
-                card["cpu_usage"] = result["checks"]["cpu"].get("usage", 0)
-
-            if "memory" in result["checks"]:
-                card["memory_usage"] = result["checks"]["memory"].get("usage", 0)
-
-            if "version" in result["checks"]:
-                card["version"] = result["checks"]["version"].get("version", "未知")
-
-    except Exception as e:
-        logger.warning(f"更新设备档案卡失败: {str(e)}")
-
-
-def _save_to_database(device_name: str, result: Dict):
-    """
-    保存检查结果到数据库
-
-    Args:
-        device_name: 设备名称
-        result: 检查结果
-    """
+def _flush_sink(sink: ResultSink):
+    """检查结果写库（健康检查历史 + 档案卡），失败只记日志"""
     try:
-        # 保存健康检查记录
-        db_manager.save_health_check(
-            device_name=device_name,
-            status=result["status"],
-            cpu_usage=result["checks"].get("cpu", {}).get("usage", 0),
-            memory_usage=result["checks"].get("memory", {}).get("usage", 0),
-            interface_up=result["checks"].get("interface", {}).get("up", 0),
-            interface_down=result["checks"].get("interface", {}).get("down", 0),
-            temperature=result["checks"].get("environment", {}).get("temperature", {}).get("value", "N/A"),
-            check_time=result["check_time"],
-            duration=result["duration"]
-        )
+        sink.flush()
     except Exception as e:
-        logger.warning(f"保存到数据库失败: {str(e)}")
+        logger.warning(f"检查结果批量写库失败: {str(e)}")
 
 
 # ============================================================
 # 批量检查函数
 # ============================================================
 
-def batch_health_check(devices: List[Dict], mode: str = CHECK_MODE_REAL, max_workers: int = 5) -> List[Dict]:
+def batch_health_check(devices: List[Dict], mode: str = CHECK_MODE_REAL, max_workers: int = 5,
+                       differential: Optional[bool] = None) -> List[Dict]:
     """
     批量健康检查
 
@@ -789,17 +506,20 @@ def batch_health_check(devices: List[Dict], mode: str = CHECK_MODE_REAL, max_wor
         devices: 设备信息列表
         mode: 检查模式
         max_workers: 最大并发数
+        differential: 是否走差量模式，见 check_single_device
 
     Returns:
         检查结果列表
     """
     results = []
+    # 各设备的检查记录、档案卡先放进缓冲区，全部检查完后一次事务写库
+    sink = ResultSink()
 
     # 使用线程池并发执行
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # 提交所有任务
         future_to_device = {
-            executor.submit(check_single_device, device, mode): device
+            executor.submit(check_single_device, device, mode, sink, differential): device
             for device in devices
         }
 
@@ -811,11 +531,11 @@ def batch_health_check(devices: List[Dict], mode: str = CHECK_MODE_REAL, max_wor
                 results.append(result)
             except Exception as e:
                 logger.error(f"检查设备 {device.get('device_name')} 失败: {str(e)}")
-                results.append({
-                    "device_name": device.get("device_name", "Unknown"),
-                    "status": "error",
-                    "message": str(e)
-                })
+                result = new_result(device.get("device_name", "Unknown"), device.get("host", ""),
+                                    device.get("vendor", "h3c").lower(), mode)
+                results.append(health_engine.finish(result, time.time(), error=str(e), sink=sink))
+
+    _flush_sink(sink)
 
     return results
 
@@ -0,0 +1,479 @@
+"""
+健康检查调度器
+原来的检查只有手动触发和 device_monitoring_task 的固定间隔轮询，几千台设备时要么查得太勤，要么出了问题发现得太晚。
+这里用一个按到期时间排序的堆 (next_due, 设备, 检查组) 调度每台设备的每组检查：
+1. 间隔自适应：最近降级/失败、CPU偏高、状态来回翻转（抖动）的设备缩到最短间隔，稳定的设备逐次放宽到上限
+2. 全局并发预算 max_concurrency：同时在跑的检查数到上限后，到期的条目留在堆里，晚开始的时间记为调度延迟
+3. 同一台设备同一时间只跑一组检查（只占一个会话），设备忙时条目顺延到它空出来
+4. 每次排期加随机抖动，首次排期在一个间隔内随机打散，避免所有设备同时到期
+5. 调度延迟（实际开始 - 应开始）、超时运行（一次检查比它的间隔还长）作为指标导出
+
+用法：
+    scheduler = HealthCheckScheduler(devices)
+    scheduler.start()
+    ...
+    scheduler.stats()
+    scheduler.stop()
+"""
+
+import os
+import sys
+import time
+import atexit
+import heapq
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+
+from utils.log_setup import setup_logger
+from core.health_check.engine import ResultSink, normalize_result
+
+logger = setup_logger("health_scheduler", "health_scheduler.log")
+
+# 调度器配置，可用环境变量覆盖
+SCHEDULER_CONFIG = {
+    "max_concurrency": int(os.getenv("NETDEVOPS_SCHEDULER_CONCURRENCY", "20")),  # 同时在跑的检查数上限
+    "jitter": float(os.getenv("NETDEVOPS_SCHEDULER_JITTER", "0.1")),  # 每次排期的随机抖动比例（±）
+    "backoff": 1.5,  # 结果稳定时间隔放宽的倍数
+    "high_cpu": 80.0,  # CPU使用率超过多少（%）算偏高，按最短间隔检查
+    "flap_window": 6,  # 看最近几次结果判断抖动
+    "flap_changes": 2,  # 窗口内健康状态变化几次算抖动
+    "lag_warning": 30.0,  # 调度延迟超过多少秒记一次超时并告警
+    "flush_interval": 30.0,  # 检查结果攒多久批量写一次库（秒）
+    "tick": 1.0,  # 调度线程最长多久醒一次（秒）
+}
+
+# 检查组：同组的检查一起执行，interval 为初始间隔，按结果在 [min_interval, max_interval] 之间调整
+SCHEDULE_GROUPS = {
+    "status": {"checks": ["interface", "cpu", "memory", "version"], "interval": 300, "min_interval": 60,
+               "max_interval": 1800},
+    "environment": {"checks": ["environment"], "interval": 600, "min_interval": 120, "max_interval": 3600},
+    "tables": {"checks": ["routing", "arp"], "interval": 900, "min_interval": 300, "max_interval": 3600},
+}
+
+# 健康检查历史和档案卡的端口/CPU/内存/版本字段来自这几项检查，设备凑齐之前不入库
+FULL_RESULT_CHECKS = ("interface", "cpu", "memory", "version")
+
+
+@dataclass
+class ScheduleState:
+    """一台设备一组检查的排期状态"""
+
+    interval: float  # 当前间隔（秒）
+    next_due: float = 0.0
+    generation: int = 0  # 重新排期时加一，堆里旧的条目出堆时丢弃
+    runs: int = 0
+    last_status: str = "unknown"
+    reason: str = "初始间隔"
+
+
+@dataclass
+class DeviceVolatility:
+    """一台设备一组检查最近的健康状态，用来判断是否抖动（各组看到的检查项不同，状态分开记）"""
+
+    statuses: Deque[str] = field(default_factory=deque)
+    last_volatile: float = float("-inf")  # 最近一次降级/失败/CPU偏高的时间
+
+
+class MergedResultSink:
+    """
+    调度器的入库缓冲区：每组只执行一部分检查，直接归一化会把没执行的检查补成 0 / N/A / 未知，
+    覆盖掉档案卡和最新一条历史记录（CPU/内存告警读的就是最新一条）。
+    这里把每组的检查结果合并进设备最近的检查结果再归一化入库；设备还没凑齐 FULL_RESULT_CHECKS 时只记下、不入库，
+    连接失败照常入库
+    """
+
+    def __init__(self, sink: ResultSink, full_checks=FULL_RESULT_CHECKS):
+        """
+        Args:
+            sink: 实际的入库缓冲区
+            full_checks: 凑齐这些检查后才入库
+        """
+        self.sink = sink
+        self.full_checks = full_checks
+        self._checks = {}  # 设备名 -> {检查名: 最近一次的检查结果}
+        self._lock = threading.Lock()
+
+    def add(self, result: Dict) -> Optional[Dict]:
+        name = result.get("device_name")
+        if not result.get("reachable", True):
+            return self.sink.add(result)
+        with self._lock:
+            merged = self._checks.setdefault(name, {})
+            merged.update(result.get("checks") or {})
+            checks = dict(merged)
+        if not all(check in checks for check in self.full_checks):
+            logger.debug(f"设备 {name} 还没有完整的检查结果，这次 {list(result.get('checks') or {})} 先不入库")
+            return None
+        return self.sink.add(normalize_result(dict(result, checks=checks)))
+
+    def forget(self, name: str):
+        with self._lock:
+            self._checks.pop(name, None)
+
+    def flush(self) -> int:
+        return self.sink.flush()
+
+    def __len__(self):
+        return len(self.sink)
+
+
+def _default_runner(device_info: Dict, checks: List[str], sink: ResultSink) -> Dict:
+    """默认执行器：线程执行器执行一组检查，结果放进调度器共用的入库缓冲区"""
+    from core.health_check.health_checker_optimized import CHECK_MODE_REAL, check_single_device
+
+    return check_single_device(device_info, CHECK_MODE_REAL, sink, False, checks)
+
+
+class HealthCheckScheduler:
+    """按到期时间堆调度的健康检查服务"""
+
+    def __init__(self, devices: Optional[List[Dict]] = None, runner: Callable = None, groups: Dict = None,
+                 config: Dict = None, clock: Callable[[], float] = time.monotonic, sink: ResultSink = None,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            devices: 设备信息列表（需要 device_name）
+            runner: 执行一组检查的函数 fn(device_info, checks, sink) -> 统一结构的检查结果
+            groups: 检查组配置，默认 SCHEDULE_GROUPS
+            config: 覆盖 SCHEDULER_CONFIG 中的配置
+            clock: 时钟（测试时可替换）
+            sink: 检查结果入库缓冲区，默认新建；执行器拿到的是合并各组结果的 MergedResultSink，调度线程按 flush_interval 批量写库
+            seed: 抖动用的随机种子
+        """
+        self.config = dict(SCHEDULER_CONFIG, **(config or {}))
+        self.groups = groups or SCHEDULE_GROUPS
+        self.runner = runner or _default_runner
+        self.clock = clock
+        self.sink = sink if sink is not None else ResultSink()
+        self._merged_sink = MergedResultSink(self.sink)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._heap = []  # (next_due, 序号, 设备名, 检查组, generation)
+        self._sequence = 0
+        self._devices = {}  # 设备名 -> 设备信息
+        self._states = {}  # (设备名, 检查组) -> ScheduleState
+        self._volatility = {}  # (设备名, 检查组) -> DeviceVolatility
+        self._busy = set()  # 正在检查的设备
+        self._flight = set()  # 正在执行的 (设备名, 检查组)
+        self._running = 0
+        self._executor = None
+        self._thread = None
+        self._stopping = False
+        self._last_flush = clock()
+        self._lags = deque(maxlen=1000)
+        self._stats = {
+            "dispatched": 0,
+            "completed": 0,
+            "failed_runs": 0,  # 执行器抛异常的次数
+            "deferred_busy": 0,  # 到期时设备正在检查、顺延的次数
+            "budget_waits": 0,  # 到期时并发预算用完、留在堆里的次数
+            "lag_overruns": 0,  # 调度延迟超过 lag_warning 的次数
+            "run_overruns": 0,  # 一次检查耗时超过它的间隔的次数
+            "lag_seconds_total": 0.0,
+            "lag_seconds_max": 0.0,
+        }
+        for device in devices or []:
+            self.add_device(device)
+
+    # ------------------------------------------------------------
+    # 设备管理
+    # ------------------------------------------------------------
+
+    def add_device(self, device_info: Dict):
+        """加入（或更新）一台设备，新设备的各组检查在一个间隔内随机打散首次排期"""
+        name = device_info["device_name"]
+        now = self.clock()
+        with self._lock:
+            known = name in self._devices
+            self._devices[name] = device_info
+            if known:
+                return
+            for group, config in self.groups.items():
+                self._volatility[(name, group)] = DeviceVolatility(deque(maxlen=self.config["flap_window"]))
+                state = self._states[(name, group)] = ScheduleState(interval=config["interval"])
+                self._push(name, group, state, now + self._random.uniform(0, config["interval"]))
+            self._wakeup.notify()
+
+    def remove_device(self, name: str):
+        """移除设备，堆里它的条目出堆时丢弃"""
+        with self._lock:
+            self._devices.pop(name, None)
+            for group in self.groups:
+                self._states.pop((name, group), None)
+                self._volatility.pop((name, group), None)
+        self._merged_sink.forget(name)
+
+    def _push(self, name: str, group: str, state: ScheduleState, due: float):
+        """排期（调用方持有锁）：旧条目作废，压入新条目"""
+        state.generation += 1
+        state.next_due = due
+        self._sequence += 1
+        heapq.heappush(self._heap, (due, self._sequence, name, group, state.generation))
+
+    def _jittered(self, interval: float) -> float:
+        jitter = self.config["jitter"]
+        return interval * (1 + self._random.uniform(-jitter, jitter))
+
+    # ------------------------------------------------------------
+    # 自适应间隔
+    # ------------------------------------------------------------
+
+    def _cpu_high(self, result: Dict) -> bool:
+        try:
+            return float(str(result.get("CPU_usage", "N/A")).rstrip("%")) > self.config["high_cpu"]
+        except ValueError:
+            return False
+
+    def next_interval(self, name: str, group: str, result: Optional[Dict], now: float) -> float:
+        """
+        按这次结果和这组检查最近的状态算下一次间隔（调用方持有锁）
+
+        Returns:
+            间隔秒数（未加抖动）
+        """
+        config = self.groups[group]
+        state = self._states[(name, group)]
+        volatility = self._volatility[(name, group)]
+        status = (result or {}).get("status", "failed")
+        volatility.statuses.append(status)
+        history = list(volatility.statuses)
+        changes = sum(1 for previous, current in zip(history, history[1:]) if previous != current)
+        if status in ("degraded", "failed") or (result and self._cpu_high(result)):
+            volatility.last_volatile = now
+            state.reason = "CPU偏高" if status == "healthy" else f"状态{status}"
+            interval = config["min_interval"]
+        elif changes >= self.config["flap_changes"]:
+            state.reason = "状态抖动"
+            interval = config["min_interval"]
+        else:
+            state.reason = "状态稳定，放宽间隔"
+            interval = min(config["max_interval"], max(state.interval, config["min_interval"]) * self.config["backoff"])
+        state.last_status = status
+        state.interval = interval
+        return interval
+
+    def _pull_forward(self, name: str, current: str, now: float):
+        """设备刚出现问题时，它别的检查组也提前到各自的最短间隔内（调用方持有锁）"""
+        for group, config in self.groups.items():
+            state = self._states.get((name, group))
+            if group == current or state is None or (name, group) in self._flight:
+                continue
+            due = now + self._jittered(config["min_interval"])
+            if due < state.next_due:
+                state.interval = config["min_interval"]
+                state.reason = "同设备其它检查发现问题"
+                self._push(name, group, state, due)
+
+    # ------------------------------------------------------------
+    # 调度
+    # ------------------------------------------------------------
+
+    def run_pending(self, now: Optional[float] = None) -> int:
+        """
+        把到期的条目交给执行线程池：并发预算用完时停下，设备正忙的条目顺延到它空出来
+
+        Returns:
+            这次派发的检查数
+        """
+        now = self.clock() if now is None else now
+        launched = []
+        deferred = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                if self._running >= self.config["max_concurrency"]:
+                    self._stats["budget_waits"] += 1
+                    break
+                due, sequence, name, group, generation = heapq.heappop(self._heap)
+                state = self._states.get((name, group))
+                if state is None or state.generation != generation:
+                    continue  # 设备已移除或已重新排期
+                if name in self._busy:
+                    self._stats["deferred_busy"] += 1
+                    deferred.append((due, sequence, name, group, generation))
+                    continue
+                lag = max(0.0, now - due)
+                self._record_lag(name, group, lag)
+                self._busy.add(name)
+                self._flight.add((name, group))
+                self._running += 1
+                self._stats["dispatched"] += 1
+                launched.append((name, group, self._devices[name], due))
+            for entry in deferred:
+                heapq.heappush(self._heap, entry)
+        for name, group, device_info, due in launched:
+            self._submit(name, group, device_info, due, now)
+        return len(launched)
+
+    def _record_lag(self, name: str, group: str, lag: float):
+        self._lags.append(lag)
+        self._stats["lag_seconds_total"] += lag
+        self._stats["lag_seconds_max"] = max(self._stats["lag_seconds_max"], lag)
+        if lag > self.config["lag_warning"]:
+            self._stats["lag_overruns"] += 1
+            logger.warning(f"设备 {name} 的 {group} 检查晚了 {lag:.1f}秒 才开始（并发预算不足或设备一直在忙）")
+
+    def _submit(self, name: str, group: str, device_info: Dict, due: float, now: float):
+        executor = self._executor
+        if executor is None:
+            self._execute(name, group, device_info, due, now)
+            return
+        executor.submit(self._execute, name, group, device_info, due, now)
+
+    def _execute(self, name: str, group: str, device_info: Dict, due: float, started: float):
+        result = None
+        try:
+            result = self.runner(device_info, self.groups[group]["checks"], self._merged_sink)
+        except Exception as e:
+            logger.error(f"设备 {name} 的 {group} 检查执行失败：{e}")
+            with self._lock:
+                self._stats["failed_runs"] += 1
+        self._complete(name, group, result, started)
+
+    def _complete(self, name: str, group: str, result: Optional[Dict], started: float):
+        now = self.clock()
+        with self._lock:
+            self._busy.discard(name)
+            self._flight.discard((name, group))
+            self._running -= 1
+            self._stats["completed"] += 1
+            state = self._states.get((name, group))
+            if state is not None:
+                elapsed = now - started
+                interval = self.next_interval(name, group, result, now)
+                if elapsed > interval:
+                    self._stats["run_overruns"] += 1
+                    logger.warning(f"设备 {name} 的 {group} 检查耗时 {elapsed:.1f}秒，超过间隔 {interval:.0f}秒")
+                state.runs += 1
+                self._push(name, group, state, now + self._jittered(interval))
+                if state.reason.startswith(("状态degraded", "状态failed", "CPU偏高")):
+                    self._pull_forward(name, group, now)
+            self._wakeup.notify()
+
+    def wait_idle(self, timeout: float = 10.0) -> bool:
+        """等当前派发的检查全部完成（测试和停止时用）"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._wakeup.wait(remaining)
+        return True
+
+    def flush(self) -> int:
+        """把攒下的检查结果写库"""
+        self._last_flush = self.clock()
+        try:
+            return self.sink.flush()
+        except Exception as e:
+            logger.warning(f"调度检查结果批量写库失败：{e}")
+            return 0
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                if self._stopping:
+                    break
+            self.run_pending()
+            if self.clock() - self._last_flush >= self.config["flush_interval"]:
+                self.flush()
+            with self._lock:
+                if self._stopping:
+                    break
+                wait = self.config["tick"]
+                if self._heap and self._running < self.config["max_concurrency"]:
+                    wait = min(wait, max(0.0, self._heap[0][0] - self.clock()))
+                self._wakeup.wait(wait)
+
+    def start(self):
+        """启动调度线程和执行线程池"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(max_workers=self.config["max_concurrency"],
+                                                thread_name_prefix="health-scheduler")
+            self._thread = threading.Thread(target=self._loop, name="health-scheduler", daemon=True)
+            self._thread.start()
+        logger.info(f"健康检查调度器已启动：设备{len(self._devices)}台，并发预算{self.config['max_concurrency']}")
+
+    def stop(self, wait: bool = True):
+        """停止调度：不再派发新检查，等在跑的检查结束后把结果写库"""
+        with self._lock:
+            thread, executor = self._thread, self._executor
+            self._stopping = True
+            self._thread = None
+            self._executor = None
+            self._wakeup.notify_all()
+        if thread is not None:
+            thread.join()
+        if executor is not None:
+            executor.shutdown(wait=wait)
+        self.flush()
+        logger.info("健康检查调度器已停止")
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def stats(self) -> Dict:
+        """调度统计：派发/完成数、调度延迟（平均/最大/p95）、超时次数、堆大小、各设备当前间隔"""
+        now = self.clock()
+        with self._lock:
+            stats = dict(self._stats)
+            lags = sorted(self._lags)
+            stats["running"] = self._running
+            stats["queued"] = len(self._heap)
+            stats["devices"] = len(self._devices)
+            stats["overdue"] = sum(1 for state in self._states.values() if state.next_due < now)
+            stats["schedule"] = {
+                f"{name}/{group}": {"interval": round(state.interval, 1), "next_in": round(state.next_due - now, 1),
+                                    "last_status": state.last_status, "reason": state.reason}
+                for (name, group), state in self._states.items()
+            }
+        dispatched = max(stats["dispatched"], 1)
+        stats["lag_seconds_avg"] = round(stats["lag_seconds_total"] / dispatched, 3)
+        stats["lag_seconds_p95"] = round(lags[int(len(lags) * 0.95) - 1], 3) if len(lags) >= 20 else (
+            round(lags[-1], 3) if lags else 0.0)
+        return stats
+
+
+def load_scheduled_devices() -> List[Dict]:
+    """读取 devices.yaml 里的设备，按IP绑定档案卡拿设备名和厂商（匹配不到时用IP当设备名）"""
+    from core.health_check.engine import find_card
+    from core.health_check.health_checker import read_devices_yml
+
+    devices = []
+    for device_info in read_devices_yml():
+        card = find_card(host=device_info["host"])
+        devices.append(dict(device_info, device_name=card.name if card else device_info["host"],
+                            vendor=(card.vendor if card else None) or "default"))
+    return devices
+
+
+# 进程内共享的调度器（web 端按需创建）
+health_scheduler: Optional[HealthCheckScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_health_scheduler() -> HealthCheckScheduler:
+    """取进程内共享的调度器，第一次调用时按 devices.yaml 建好（不自动启动）"""
+    global health_scheduler
+    with _scheduler_lock:
+        if health_scheduler is None:
+            health_scheduler = HealthCheckScheduler(load_scheduled_devices())
+        return health_scheduler
+
+
+@atexit.register
+def _stop_health_scheduler():
+    if health_scheduler is not None and health_scheduler.running:
+        health_scheduler.stop(wait=False)
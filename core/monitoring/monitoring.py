@@ -6,6 +6,10 @@ from utils.log_setup import setup_logger
 from db.database import db_manager
 import requests
 from core.nornir.nornir_tasks import run_concurrent_health_check
+from core.connection.command_runner import latency_profiles
+from core.parsers import parse_offloader
+from core.health_check.engine import health_engine
+from core.health_check import scheduler as health_scheduler_module
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(ROOT_DIR)
@@ -130,4 +134,82 @@ def get_prometheus_metrics():
     prometheus_output.append("# TYPE system_disk_percent gauge")
     prometheus_output.append(f"system_disk_percent {metrics['disk_percent']}")
 
+    # 数据库写回队列指标（开启写回时才输出）
+    write_behind = db_manager.get_write_behind_metrics()
+    if write_behind:
+        prometheus_output.append("# HELP db_write_behind_queue_depth 写回队列当前积压记录数")
+        prometheus_output.append("# TYPE db_write_behind_queue_depth gauge")
+        prometheus_output.append(f"db_write_behind_queue_depth {write_behind['queue_depth']}")
+
+        prometheus_output.append("# HELP db_write_behind_rows_written_total 写回队列累计写入记录数")
+        prometheus_output.append("# TYPE db_write_behind_rows_written_total counter")
+        prometheus_output.append(f"db_write_behind_rows_written_total {write_behind['rows_written']}")
+
+        prometheus_output.append("# HELP db_write_behind_batches_total 写回队列累计提交批次数")
+        prometheus_output.append("# TYPE db_write_behind_batches_total counter")
+        prometheus_output.append(f"db_write_behind_batches_total {write_behind['batches_committed']}")
+
+        prometheus_output.append("# HELP db_write_behind_commit_ms 写回队列提交耗时（毫秒）")
+        prometheus_output.append("# TYPE db_write_behind_commit_ms gauge")
+        prometheus_output.append(f'db_write_behind_commit_ms{{stat="last"}} {write_behind["last_commit_ms"]}')
+        prometheus_output.append(f'db_write_behind_commit_ms{{stat="avg"}} {write_behind["avg_commit_ms"]}')
+        prometheus_output.append(f'db_write_behind_commit_ms{{stat="max"}} {write_behind["max_commit_ms"]}')
+
+    # 设备命令响应时延（按命令汇总的指数加权均值）
+    command_latency = latency_profiles.command_summary()
+    if command_latency:
+        prometheus_output.append("# HELP device_command_latency_seconds 设备命令响应时延（秒，各设备指数加权均值按样本数加权平均）")
+        prometheus_output.append("# TYPE device_command_latency_seconds gauge")
+        for command, item in sorted(command_latency.items()):
+            label = command.replace("\\", "\\\\").replace('"', '\\"')
+            prometheus_output.append(f'device_command_latency_seconds{{command="{label}",stat="ewma"}} {item["srtt"]}')
+            prometheus_output.append(f'device_command_latency_seconds{{command="{label}",stat="max"}} {item["max"]}')
+
+    # 大输出解析下放到进程池的统计
+    offload = parse_offloader.stats()
+    prometheus_output.append("# HELP parse_offload_calls_total 命令输出解析次数（inline=当前线程，offloaded=进程池，fallback=下放失败）")
+    prometheus_output.append("# TYPE parse_offload_calls_total counter")
+    for where in ("inline", "offloaded", "fallback"):
+        prometheus_output.append(f'parse_offload_calls_total{{where="{where}"}} {offload[where]}')
+    prometheus_output.append("# HELP parse_offload_seconds_total 解析耗时（秒）：worker=进程池解析，caller=下放时调用方线程CPU时间，inline=当前线程解析，wait=下放等待")
+    prometheus_output.append("# TYPE parse_offload_seconds_total counter")
+    for stat in ("worker", "caller", "inline", "wait"):
+        prometheus_output.append(f'parse_offload_seconds_total{{stat="{stat}"}} {offload[stat + "_seconds"]:.6f}')
+    prometheus_output.append("# HELP parse_offload_gil_seconds_recovered 下放到进程池后本进程少占用的GIL时间（秒）")
+    prometheus_output.append("# TYPE parse_offload_gil_seconds_recovered counter")
+    prometheus_output.append(f"parse_offload_gil_seconds_recovered {offload['gil_seconds_recovered']:.6f}")
+
+    # 健康检查引擎：每项检查各阶段的累计耗时，看时间花在取输出还是解析上
+    check_stats = health_engine.stats()
+    prometheus_output.append("# HELP health_check_phase_seconds_total 各项检查的累计耗时（秒）：collect=取命令输出，parse=解析")
+    prometheus_output.append("# TYPE health_check_phase_seconds_total counter")
+    for check, stats in check_stats.items():
+        for phase in ("collect", "parse"):
+            prometheus_output.append(
+                f'health_check_phase_seconds_total{{check="{check}",phase="{phase}"}} {stats[phase + "_seconds"]:.6f}')
+    prometheus_output.append("# HELP health_check_runs_total 各项检查的执行次数（result=error 为失败，over_budget 为超出耗时预算）")
+    prometheus_output.append("# TYPE health_check_runs_total counter")
+    for check, stats in check_stats.items():
+        prometheus_output.append(f'health_check_runs_total{{check="{check}",result="all"}} {stats["runs"]}')
+        prometheus_output.append(f'health_check_runs_total{{check="{check}",result="error"}} {stats["errors"]}')
+        prometheus_output.append(f'health_check_runs_total{{check="{check}",result="over_budget"}} {stats["over_budget"]}')
+
+    # 健康检查调度器：调度延迟（实际开始 - 应开始）和超时次数，延迟一直涨说明并发预算不够
+    scheduler = health_scheduler_module.health_scheduler
+    if scheduler is not None:
+        sched = scheduler.stats()
+        prometheus_output.append("# HELP scheduler_lag_seconds 健康检查调度延迟（秒）")
+        prometheus_output.append("# TYPE scheduler_lag_seconds gauge")
+        for stat in ("avg", "p95", "max"):
+            prometheus_output.append(f'scheduler_lag_seconds{{stat="{stat}"}} {sched["lag_seconds_" + stat]:.3f}')
+        prometheus_output.append("# HELP scheduler_events_total 调度事件累计次数（lag_overrun=延迟超过告警线，run_overrun=检查耗时超过间隔）")
+        prometheus_output.append("# TYPE scheduler_events_total counter")
+        for event in ("dispatched", "completed", "failed_runs", "deferred_busy", "budget_waits", "lag_overruns",
+                      "run_overruns"):
+            prometheus_output.append(f'scheduler_events_total{{event="{event.rstrip("s")}"}} {sched[event]}')
+        prometheus_output.append("# HELP scheduler_queue 调度器当前状态：running=在跑，queued=堆大小，overdue=已到期未开始")
+        prometheus_output.append("# TYPE scheduler_queue gauge")
+        for stat in ("running", "queued", "overdue", "devices"):
+            prometheus_output.append(f'scheduler_queue{{stat="{stat}"}} {sched[stat]}')
+
     return "\n".join(prometheus_output)
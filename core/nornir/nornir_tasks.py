@@ -1,16 +1,14 @@
-import re
 import os
 import sys
+import time
 import logging
 from nornir import InitNornir
 from utils.log_setup import setup_logger
 from nornir.core.task import Task, Result
 from nornir_netmiko import netmiko_send_command
-from datetime import datetime
-from utils.models import get_global_physical_cards
-
-# 导入数据库
-from db.database import db_manager
+from core.connection.command_runner import run_batch
+from core.health_check.engine import FetchedOutputs, ResultSink, health_engine, new_result
+from core.health_check.health_checker_optimized import CHECK_MODE_REAL
 
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -23,265 +21,46 @@ os.chdir(ROOT_DIR)
 # 第一步：创建控制台实例
 
 
-# 第二步：定义一个检查健康的主任务，分两个子任务,对一个设备进行检查
-def check_devices_health(task: Task) -> Result:
-    def adapt_db_data(original_result):
-        """健康检查结果适配：列表→字符串，布尔→文本，适配数据库TEXT/INTEGER字段"""
-        adapted_result = original_result.copy()
-        # 1. 健康问题列表→分号分隔字符串（适配device_health_issues TEXT字段）
-        if isinstance(adapted_result.get("device_health_issues"), list):
-            adapted_result["device_health_issues"] = ";".join(adapted_result["device_health_issues"])
-        if not adapted_result.get("device_health_issues"):
-            adapted_result["device_health_issues"] = "无"
-        # 2. 可达性布尔→文本（适配reachable TEXT字段：可达/不可达）
-        if isinstance(adapted_result.get("reachable"), bool):
-            adapted_result["reachable"] = "可达" if adapted_result["reachable"] else "不可达"
-        # 3. 数字字段兜底（防止传非int，适配up/down/total_interface INTEGER字段）
-        for key in ["up_interface", "down_interface", "total_interface"]:
-            if adapted_result.get(key) is not None:
-                try:
-                    adapted_result[key] = int(adapted_result[key])
-                except (ValueError, TypeError):
-                    adapted_result[key] = 0
-        return adapted_result
+# 第二步：定义一个检查健康的主任务，对一个设备进行检查（Nornir 执行器：命令批量取回后交给健康检查引擎）
+def check_devices_health(task: Task, sink: ResultSink = None) -> Result:
     device_name = task.host.name  # 这个助手已经拿到档案卡片了，控制台已经把host实例绑定到助手上面了
     device_ip = task.host.hostname  # 从host实例中提取IP地址
+    vendor = str(task.host.get("vendor") or "h3c").lower()  # 清单 data.vendor，没配的按华三处理
     logger.info(f"正在检查设备{device_name}   ({device_ip})的健康状态.....")
-    current_card = None
-    base_result = {
-        "host": device_ip,  # 和单设备的host（IP）字段一致
-        "device_name": device_name,  # 和单设备的设备名字段一致
-        "version": "未知",
-        "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),  # 统一时间戳格式
-        "status": "unknown",  # 兼容并发的健康状态：healthy/degraded/failed
-        "check_status": "成功",  # 和单设备的检查状态（成功/失败）完全对齐
-        "up_interface": 0,  # 和单设备的UP接口数字段一致
-        "down_interface": 0,  # 和单设备的DOWN接口数字段一致
-        "total_interface": 0,  # 和单设备的总接口数字段一致
-        "CPU_usage": "N/A",  # 和单设备的CPU使用率字段一致（具体%值）
-        "memory_usage": "N/A",  # 和单设备的内存使用率字段一致（具体%值）
-        "error_message": "",  # 和单设备的错误信息字段一致
-        "device_health_issues": [],  # 保留并发的问题列表，兼容原有逻辑
-        "reachable": True,  # 保留设备可达性标识
-    }
-    try:
-        physical_cards = get_global_physical_cards()  # 获取全局卡片列表
-        # 根据IP匹配对应设备的卡片（和单设备检查逻辑完全一致）
-        current_card = next((card for card in physical_cards if card.ip_address == device_ip), None)
-        if current_card:
-            logger.info(f"并发检查-设备卡片匹配成功：{device_name}({device_ip})")
-        else:
-            logger.warning(f"并发检查-未匹配到{device_ip}的设备卡片，跳过档案卡更新")
-    except Exception as e:
-        logger.error(f"并发检查-加载全局设备卡片失败：{e}")
-        base_result["error_message"] += f"设备卡片加载失败；"
-
+    start_time = time.time()
+    result = new_result(device_name, device_ip, vendor, CHECK_MODE_REAL)
+    error = None
     try:
         # 获取底层 Netmiko 连接
+        phase_started = time.perf_counter()
         net_connect = task.host.get_connection("netmiko", task.nornir.config)
-        
-        # 使用 send_command_timing 替代 send_command，避免提示符匹配问题
-        logger.info(f"正在查询设备{device_name}的版本信息.....")
-        version_output = net_connect.send_command_timing("display version", delay_factor=3)
-        logger.info(f"查询{device_name}版本信息成功！")
-        
-        # 查询接口状态
-        logger.info(f"正在查询设备{device_name}的接口状态信息....")
-        interface_output = net_connect.send_command_timing("display interface brief", delay_factor=3)
-        logger.info(f"查询{device_name}接口状态成功！")
-        
-        # 查询CPU使用率
-        logger.info(f"正在查询设备{device_name}的CPU使用率....")
-        cpu_output = net_connect.send_command_timing("display cpu-usage", delay_factor=3)
-        logger.info(f"查询{device_name}CPU使用率成功！")
-        
-        # 查询内存使用率
-        logger.info(f"正在查询设备{device_name}的内存使用率....")
-        memory_output = net_connect.send_command_timing("display memory", delay_factor=3)
-        logger.info(f"查询{device_name}内存使用率成功！")
-        # 1.分析接口状态（简化逻辑，参考单设备检查）
-        output_inteface = interface_output
-        
-        # 添加调试日志 - 打印完整输出
-        logger.info(f"接口输出完整内容:\n{output_inteface}")
+        result["timings"]["connect"] = round(time.perf_counter() - phase_started, 4)
 
-        total_ports = 0
-        down_ports = 0
-        up_ports = 0
-        critical_ports_down = False
-        
-        # 接口名称模式：匹配 GE、FE、Vlan、LoopBack、NULL、MEth 等接口类型
-        import re
-        interface_pattern = re.compile(r'^(GE|FE|Vlan|LoopBack|NULL|MEth|XGE|Ten-GigabitEthernet)\d')
-        
-        # 直接遍历所有行
-        for line in output_inteface.split("\n"):
-            line_clean = line.strip().upper()
-            if not line_clean:
-                continue
-            
-            # 只处理真正的接口行（以接口类型开头）
-            if not interface_pattern.match(line_clean):
-                continue
-            
-            # 检查端口状态
-            if "UP" in line_clean and "DOWN" not in line_clean:
-                up_ports += 1
-                logger.debug(f"找到UP端口: {line_clean}")
-            elif "DOWN" in line_clean:
-                down_ports += 1
-                logger.debug(f"找到DOWN端口: {line_clean}")
-                if line_clean.startswith("GE1/0/1 "):
-                    critical_ports_down = True
-                    logger.info(f"端口 GE1/0/1 状态为DOWN")
-                    logger.warning(f"关键端口 GE1/0/1 已DOWN")
-        
-        total_ports = up_ports + down_ports
-        logger.info(f"接口解析完成 - UP: {up_ports}, DOWN: {down_ports}, 总计: {total_ports}")
-        base_result["up_interface"] = up_ports
-        base_result["down_interface"] = down_ports
-        base_result["total_interface"] = total_ports
-        # 清理版本信息，移除命令前缀
-        cleaned_version = version_output.strip()
-        if cleaned_version.startswith('>'):
-            # 找到第一个换行符，跳过命令行
-            first_newline = cleaned_version.find('\n')
-            if first_newline != -1:
-                cleaned_version = cleaned_version[first_newline+1:].strip()
-        base_result["version"] = cleaned_version[:100]
-
-        # 2.分析CPU使用率
-        CPU_usage = cpu_output
-        CPU_lines = CPU_usage.split("\n")
-        CPU_usage_high = False
-        cpu_usage_val = "N/A"
-        for line in CPU_lines:
-            line_clean = line.strip()
-            if not line_clean:
-                continue
-            if "seconds" in line_clean:
-                match = re.search(r"(\d+)%", line_clean)
-                if match:
-                    cpu_usage_val = f"{match.group(1)}%"
-                    if int(match.group(1)) > 88:
-                        CPU_usage_high = True
-                        logger.warning(f"设备{device_name}（{device_ip}）CPU使用率过高：{cpu_usage_val}（超过88%）")
-        base_result["CPU_usage"] = cpu_usage_val
-        
-        # 3.分析内存使用率（使用 display memory 输出格式）
-        memory_usage = memory_output
-        memory_lines = memory_usage.split("\n")
-        memory_usage_high = False
-        mem_usage_val = "N/A"
-        for line in memory_lines:
-            line_clean = line.strip()
-            if not line_clean:
-                continue
-            # 匹配Mem行的数据：Mem: Total Used Free ... FreeRatio
-            match = re.search(r"Mem:\s+(\d+)\s+(\d+)\s+\d+\s+\d+\s+\d+\s+\d+\s+(\d+\.?\d*)%", line_clean)
-            if match:
-                free_ratio = float(match.group(3))
-                mem_usage_val = f"{100 - free_ratio:.1f}%"
-                if (100 - free_ratio) > 88:
-                    memory_usage_high = True
-                    logger.warning(f"设备{device_name}（{device_ip}）内存使用率过高：{mem_usage_val}（超过88%）")
-                break
-        # 赋值给统一字段
-        base_result["memory_usage"] = mem_usage_val
-
-        # 4.判断设备是否健康
-        is_health = True
-        device_health_issues = []
-        if critical_ports_down:
-            is_health = False
-            device_health_issues.append("关键端口DOWN")
-        if total_ports > 0 and (down_ports / total_ports) > 0.3:  # 超过百分之30的端口都是down
-            is_health = False
-            device_health_issues.append(f"过多端口down ({down_ports}/{total_ports})")
-        if CPU_usage_high:
-            is_health = False
-            device_health_issues.append("CPU使用率过高，已经超过88%")
-        if memory_usage_high:
-            is_health = False
-            device_health_issues.append("内存使用率过高，已经超过88%")
-        if is_health:
-            base_result["status"] = "healthy"  # 并发健康状态
-        else:
-            base_result["status"] = "degraded"  # 并发健康状态
-        base_result["check_status"] = "成功"
-        base_result["device_health_issues"] = device_health_issues if device_health_issues else ["无"]
-        # 错误信息统一：把问题列表拼接到error_message（和单设备的error_message字段对齐）
-        # base_result["error_message"] = (
-        #     base_result["error_message"] + ";" + ";".join(device_health_issues)
-        #     if device_health_issues != ["无"]
-        #     else base_result["error_message"]
-        # )
-        # 5. 数据库日志记录（适配数据库字段类型）
-        base_result = adapt_db_data(base_result)
-        db_manager.log_check_device(base_result)
-        if current_card:  # 匹配到卡片才更新，避免报错
-            current_card.update(base_result)
-            logger.info(f"已经成功更新{device_name}({device_ip}的档案卡片！)")
-        else:
-            logger.warning(f"并未匹配到设备{device_name}({device_ip}的档案卡片，无法更新)")
-        # ========== 6. 日志收尾 → 和单设备检查的日志样式完全统一 ==========
-        logger.info(f"设备{device_name}（{device_ip}）检查完成！")
-        logger.info(f"-版本：{base_result['version']}")
-        logger.info(f"- 活跃端口（UP）/总接口数：{base_result['up_interface']}/{base_result['total_interface']}")
-        logger.info(f"- CPU使用率：{base_result['CPU_usage']} | 内存使用率：{base_result['memory_usage']}")
-        logger.info(f"- 设备健康状态：{base_result['status']} | 存在问题：{base_result['device_health_issues']}")
-
-        # ========== 7. 返回Result → 结果字典和单设备1:1统一 ==========
-        return Result(host=task.host, result=base_result, failed=False)  # 直接返回统一后的结果字典
-        # 收集结果
-        # details = {
-        #     "version_result": version_result.result if version_result.result else "",
-        #     "interface_result": interface_result.result if interface_result.result else "",
-        #     "interfaces_total": total_ports,
-        #     "interfaces_down": down_ports,
-        #     "CPU_usage_result": "告警！" if CPU_usage_high else "正常，未超过88%",
-        #     "memory_usage_result": "告警！" if memory_usage_high else "正常，未超过88%",
-        #     "device_health_issues": device_health_issues if device_health_issues else "无",
-        #     "reachable": True,
-        # }
-        # status = "healthy" if is_health else "degraded"  # 质量下降的、性能退化的
-        # logger.info(f"设备{device_name}检查完成，状态: {status}, 问题: {device_health_issues}")
-        # return Result(
-        #     host=task.host,
-        #     result={
-        #         "device_name": device_name,
-        #         "status": status,
-        #         "details": details,
-        #         "device_health_issues": device_health_issues,
-        #     },
-        # )  # task.host（Host实例）会被存入Result对象的专属属性中
+        # 各项检查的命令一次写入、按提示符切分（切不开的自动逐条补执行）
+        phase_started = time.perf_counter()
+        outputs = run_batch(net_connect, health_engine.commands(vendor), device=device_ip, vendor=vendor)
+        result["timings"]["prefetch"] = round(time.perf_counter() - phase_started, 4)
+        result["checks"] = health_engine.evaluate(FetchedOutputs(outputs), vendor, device=device_ip,
+                                                  timings=result["timings"]["checks"])
     except Exception as e:
-        # 异常处理 → 和单设备的错误处理风格、字段完全统一
-        error_msg = str(e)[:100]  # 截取前100位，和单设备一致
-        logger.error(f"设备{device_name}（{device_ip}）检查失败！原因：{error_msg}")
-        # 异常时更新统一结果字典，和单设备的失败状态对齐
-        base_result.update(
-            {
-                "status": "failed",  # 并发健康状态：失败
-                "check_status": "失败",  # 和单设备的检查状态（失败）对齐
-                "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "error_message": error_msg,  # 和单设备的error_message字段对齐
-                "reachable": False,
-                "CPU_usage": "N/A",
-                "memory_usage": "N/A",
-                "device_health_issues": ["无"],
-            }
-        )
-        # 5. 数据库日志记录（适配数据库字段类型）
-        base_result = adapt_db_data(base_result)
-        db_manager.log_check_device(base_result)
-        if current_card:
-            current_card.update(base_result)
-            logger.info(f"已经成功更新{device_name}({device_ip}的档案卡片！)")
-        else:
-            logger.warning(f"并未匹配到设备{device_name}({device_ip}的档案卡片，无法更新)")
-        # 异常返回Result，标记failed=True
-        return Result(host=task.host, result=base_result, failed=True)  # 异常也返回统一的结果字典
+        error = str(e)[:100]  # 截取前100位，和单设备一致
+        logger.error(f"设备{device_name}（{device_ip}）检查失败！原因：{error}")
+
+    # 归一化结果，检查记录和档案卡放进缓冲区，整轮检查结束后统一写库（单独执行这个任务时立即写库）
+    own_sink = sink is None
+    sink = ResultSink() if own_sink else sink
+    health_engine.finish(result, start_time, error=error, sink=sink)
+    if own_sink:
+        try:
+            sink.flush()
+        except Exception as e:
+            logger.error(f"设备{device_name}（{device_ip}）检查结果入库失败：{str(e)[:100]}")
+    logger.info(f"设备{device_name}（{device_ip}）检查完成！")
+    logger.info(f"-版本：{result['version']}")
+    logger.info(f"- 活跃端口（UP）/总接口数：{result['up_interface']}/{result['total_interface']}")
+    logger.info(f"- CPU使用率：{result['CPU_usage']} | 内存使用率：{result['memory_usage']}")
+    logger.info(f"- 设备健康状态：{result['status']} | 存在问题：{result['device_health_issues'] or '无'}")
+    return Result(host=task.host, result=result, failed=error is not None)
 
 
 # 第三步：检查设备健康的总调度员（主函数）
@@ -305,8 +84,14 @@ def run_concurrent_health_check(hosts=None):
         logger.info(f"已筛选出设备{true_device}")
 
     logger.info(f"共有{len(target_nr.inventory.hosts)}台设备并发执行！")
+    # 各设备的检查记录、档案卡先放进缓冲区，整轮检查结束后一次事务写库
+    sink = ResultSink()
     try:
-        result = target_nr.run(task=check_devices_health)
+        try:
+            result = target_nr.run(task=check_devices_health, sink=sink)
+        finally:
+            # run 中途抛异常时，已经检查完的设备的记录和档案卡也要写库，不能留在缓冲区里丢掉
+            sink.flush()
 
         standardized_results = {"success": [], "failed": []}
         for host_name, multi_results in result.items():
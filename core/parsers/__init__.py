@@ -0,0 +1,10 @@
+"""
+厂商命令输出解析器
+导入本包时注册各厂商模板，调用方只用 parse(vendor, command_type, output)
+"""
+
+from core.parsers.records import (ArpRecord, ComponentRecord, CpuRecord, InterfaceRecord, MacRecord, MemoryRecord,
+                                  RouteRecord, TemperatureRecord, VersionRecord)
+from core.parsers.registry import get_parser, normalize_vendor, parse, register
+from core.parsers import cisco, h3c, huawei  # noqa: F401  注册模板
+from core.parsers.offload import parse_offloader
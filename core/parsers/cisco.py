@@ -0,0 +1,105 @@
+"""
+思科 IOS / IOS-XE 命令输出模板
+"""
+
+import os
+import re
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from core.parsers.common import (GENERIC_CPU, GENERIC_TEMPERATURE, IFNAME, IPV4, MAC, M, VERSION,
+                                 component_template, normalize_mac)
+from core.parsers.records import (ArpRecord, CpuRecord, InterfaceRecord, MacRecord, MemoryRecord, RouteRecord)
+from core.parsers.registry import SearchTemplate, TableTemplate, register
+
+VENDOR = "cisco"
+
+# show ip interface brief：“GigabitEthernet0/1  10.0.0.1  YES NVRAM  up  up”
+INTERFACE = TableTemplate(
+    re.compile(
+        rf"^(?P<name>{IFNAME})[ \t]+(?:(?P<ip>{IPV4})|unassigned)[ \t]+\S+[ \t]+\S+[ \t]+"
+        rf"(?P<link>administratively down|up|down)[ \t]+(?P<proto>up|down)",
+        M,
+    ),
+    lambda match, previous: InterfaceRecord(match["name"], match["link"], match["proto"], match["ip"] or ""),
+)
+
+
+# show ip route：
+# “O IA     10.1.1.0/24 [110/2] via 10.0.0.2, 00:01:02, GigabitEthernet0/1”
+# “C        10.0.0.0/24 is directly connected, GigabitEthernet0/0”
+# “                     [110/2] via 10.0.0.3, 00:01:02, GigabitEthernet0/2”（等价路由续行）
+def _build_route(match, previous):
+    if match["prefix"] is None:
+        if previous is None:
+            return None
+        prefix, prefix_len, protocol = previous.prefix, previous.prefix_len, previous.protocol
+    else:
+        prefix, protocol = match["prefix"], match["code"]
+        prefix_len = int(match["len"]) if match["len"] else None
+    if match["nh"]:
+        return RouteRecord(prefix, prefix_len, protocol, int(match["pre"]), int(match["cost"]), match["nh"],
+                           match["iface"] or "")
+    return RouteRecord(prefix, prefix_len, protocol, 0, 0, "0.0.0.0", match["direct"])
+
+
+ROUTING = TableTemplate(
+    re.compile(
+        rf"^(?:(?P<code>[A-Za-z*][A-Za-z0-9*]*(?:[ \t]+[A-Z][A-Z0-9]?)?)[ \t]+(?P<prefix>{IPV4})(?:/(?P<len>\d+))?"
+        rf"|[ \t]+(?=\[))[ \t]*"
+        rf"(?:\[(?P<pre>\d+)/(?P<cost>\d+)\][ \t]+via[ \t]+(?P<nh>{IPV4})(?:,[ \t]+\d[\w:.]*)?"
+        rf"(?:,[ \t]+(?P<iface>\S+))?"
+        rf"|is directly connected,[ \t]+(?P<direct>\S+))",
+        M,
+    ),
+    _build_route,
+)
+
+# show cpu Usage：“CPU utilization for five seconds: 12%/1%; one minute: 10%; five minutes: 9%”
+CPU = SearchTemplate(
+    (re.compile(r"five seconds:\s*(\d+)%(?:/\d+%)?;\s*one minute:\s*(\d+)%;\s*five minutes:\s*(\d+)%"),
+     lambda match, output: CpuRecord(int(match.group(1)), int(match.group(2)), int(match.group(3)))),
+    GENERIC_CPU,
+)
+
+
+# show memory statistics：“Processor  7F5A3B8  852147136  254128804  598018332 ...”（Head Total Used Free）
+def _build_memory(match, output):
+    total, used = int(match.group(1)), int(match.group(2))
+    return MemoryRecord(round(used * 100 / total, 1) if total else 0.0, total, used)
+
+
+MEMORY = SearchTemplate(
+    (re.compile(r"^[ \t]*Processor[ \t]+[0-9A-Fa-f]+[ \t]+(\d+)[ \t]+(\d+)", M), _build_memory),
+)
+
+# show mac address-table：“  10    0050.7966.6800    DYNAMIC     Gi0/1”
+MAC_TABLE = TableTemplate(
+    re.compile(rf"^[ \t]*\*?[ \t]*(?P<vlan>\d+|All)[ \t]+(?P<mac>{MAC})[ \t]+(?P<type>[A-Za-z]+)[ \t]+(?P<iface>\S+)",
+               M),
+    lambda match, previous: MacRecord(normalize_mac(match["mac"]), match["vlan"], match["iface"], match["type"]),
+)
+
+# show ip arp：“Internet  10.0.0.2  12  0050.7966.6801  ARPA  GigabitEthernet0/0”
+ARP = TableTemplate(
+    re.compile(
+        rf"^Internet[ \t]+(?P<ip>{IPV4})[ \t]+\S+[ \t]+(?P<mac>{MAC})[ \t]+(?P<type>\S+)(?:[ \t]+(?P<iface>\S+))?",
+        M,
+    ),
+    lambda match, previous: ArpRecord(match["ip"], normalize_mac(match["mac"]), match["iface"] or "", "",
+                                      match["type"]),
+)
+
+COMPONENT = component_template("OK|GOOD|BAD|FAIL(?:ED)?|Normal")
+
+register(VENDOR, "interface", INTERFACE)
+register(VENDOR, "cpu", CPU)
+register(VENDOR, "memory", MEMORY)
+register(VENDOR, "version", VERSION)
+register(VENDOR, "routing", ROUTING)
+register(VENDOR, "mac", MAC_TABLE)
+register(VENDOR, "arp", ARP)
+register(VENDOR, "environment", GENERIC_TEMPERATURE)
+register(VENDOR, "power", COMPONENT)
+register(VENDOR, "fan", COMPONENT)
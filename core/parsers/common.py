@@ -0,0 +1,109 @@
+"""
+各厂商模板共用的正则片段和构造函数
+"""
+
+import os
+import re
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from core.parsers.records import (ComponentRecord, CpuRecord, MemoryRecord, RouteRecord, TemperatureRecord,
+                                  VersionRecord)
+from core.parsers.registry import SearchTemplate, TableTemplate
+
+M = re.MULTILINE
+IPV4 = r"\d{1,3}(?:\.\d{1,3}){3}"
+MAC = r"[0-9A-Fa-f]{4}[-.][0-9A-Fa-f]{4}[-.][0-9A-Fa-f]{4}"
+IFNAME = r"[A-Za-z][\w/.-]*"
+
+
+def normalize_mac(value):
+    """0050.7966.6800 / 0050-7966-6800 -> 0050-7966-6800（小写）"""
+    return value.lower().replace(".", "-")
+
+
+# ------------------------------------------------------------
+# 路由表：华三/华为同一种表格，华为多一列 Flags；等价路由的续行没有目的地址，沿用上一条
+# ------------------------------------------------------------
+
+def build_route(match, previous):
+    # 路由表动辄几十万行，这里用 groups() 一次取出，比逐个按组名取快
+    prefix, prefix_len, protocol, preference, cost, next_hop, interface = match.groups()
+    if prefix is None:
+        if previous is None:
+            return None
+        prefix, prefix_len = previous.prefix, previous.prefix_len
+    else:
+        prefix_len = int(prefix_len)
+    return RouteRecord(prefix, prefix_len, protocol, int(preference), int(cost), next_hop, interface)
+
+
+DISPLAY_ROUTE_TABLE = TableTemplate(
+    re.compile(
+        rf"^[ \t]*(?:(?P<prefix>{IPV4})/(?P<len>\d+)[ \t]+)?(?P<proto>[A-Za-z][\w-]*)[ \t]+(?P<pre>\d+)[ \t]+"
+        rf"(?P<cost>\d+)[ \t]+(?:[A-Za-z]+[ \t]+)?(?P<nh>{IPV4})[ \t]+(?P<iface>\S+)[ \t]*$",
+        M,
+    ),
+    build_route,
+)
+
+
+# ------------------------------------------------------------
+# CPU / 内存 / 版本
+# ------------------------------------------------------------
+
+def cpu_percent(pattern, flags=0):
+    """只取一个百分比的CPU规则：第一个分组为使用率"""
+    return re.compile(pattern, flags), lambda match, output: CpuRecord(int(match.group(1)))
+
+
+GENERIC_CPU = cpu_percent(r"(\d+)%")
+
+
+def memory_percent(pattern, flags=0, free=False):
+    """取一个百分比的内存规则，free=True 时这个百分比是空闲率"""
+    def build(match, output):
+        value = float(match.group(1))
+        return MemoryRecord(round(100 - value if free else value, 1))
+    return re.compile(pattern, flags), build
+
+
+_UPTIME = re.compile(r"^[ \t]*(?P<model>[^\n]*?)[ \t]+uptime is[ \t]+(?P<uptime>[^\n]+?)[ \t]*$", M)
+
+
+def build_version(match, output):
+    version = match.group(1)
+    if match.lastindex and match.lastindex >= 2 and match.group(2):
+        version = f"{version} ({match.group(2)})"
+    uptime = _UPTIME.search(output)
+    if uptime:
+        return VersionRecord(version, uptime["model"].strip(), uptime["uptime"])
+    return VersionRecord(version)
+
+
+VERSION = SearchTemplate(
+    (re.compile(r"Version[ \t]+(\d[\w.()\-]*)(?:[ \t]+\(([^)\n]+)\))?", re.IGNORECASE), build_version),
+    (re.compile(r"v?(\d+\.\d+\.\d+)", re.IGNORECASE), build_version),
+)
+
+
+# ------------------------------------------------------------
+# 环境：温度、电源、风扇
+# ------------------------------------------------------------
+
+def build_temperature(match, previous):
+    return TemperatureRecord(match["sensor"].strip().rstrip(":").strip(), int(match["value"]))
+
+
+# 通用温度：一行里的 “35 C” / “35°C” / “30 Degree Celsius”
+GENERIC_TEMPERATURE = TableTemplate(
+    re.compile(r"^(?P<sensor>[^\n]*?)(?P<value>-?\d+)[ \t]*(?:°[ \t]*C|(?:Degrees?[ \t]+)?Celsius|C\b)", M),
+    build_temperature,
+)
+
+
+def component_template(words):
+    """电源/风扇：每出现一次状态词算一个部件"""
+    pattern = re.compile(rf"(?P<status>\b(?:{words})\b|正常|异常)", re.IGNORECASE)
+    return TableTemplate(pattern, lambda match, previous: ComponentRecord(match["status"]))
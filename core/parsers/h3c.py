@@ -0,0 +1,103 @@
+"""
+华三 Comware 命令输出模板
+"""
+
+import os
+import re
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from core.parsers.common import (DISPLAY_ROUTE_TABLE, GENERIC_CPU, GENERIC_TEMPERATURE, IFNAME, IPV4, MAC, M,
+                                 VERSION, build_temperature, component_template, memory_percent, normalize_mac)
+from core.parsers.records import ArpRecord, CpuRecord, InterfaceRecord, MacRecord, MemoryRecord
+from core.parsers.registry import FallbackTemplate, SearchTemplate, TableTemplate, register
+
+VENDOR = "h3c"
+
+# display interface brief：路由模式 “Vlan1  UP  UP  10.1.1.1  --”，桥模式 “GE1/0/1  UP  1G(a)  F(a)  A  1”
+INTERFACE = TableTemplate(
+    re.compile(
+        rf"^(?P<name>{IFNAME})[ \t]+(?P<link>UP|DOWN|ADM|Stby)(?:[ \t]+(?P<proto>UP|DOWN)(?:\(s\))?)?"
+        rf"(?:[ \t]+(?P<ip>{IPV4}))?",
+        M,
+    ),
+    lambda match, previous: InterfaceRecord(match["name"], match["link"], match["proto"] or "", match["ip"] or ""),
+)
+
+# display cpu-usage：“14% in last 5 seconds / 12% in last 1 minute / 10% in last 5 minutes”
+_ONE_MINUTE = re.compile(r"(\d+)%\s+in last 1 minute")
+_FIVE_MINUTES = re.compile(r"(\d+)%\s+in last 5 minutes")
+
+
+def _build_cpu(match, output):
+    one = _ONE_MINUTE.search(output)
+    five = _FIVE_MINUTES.search(output)
+    return CpuRecord(int(match.group(1)), int(one.group(1)) if one else None, int(five.group(1)) if five else None)
+
+
+CPU = SearchTemplate(
+    (re.compile(r"(\d+)%\s+in last 5 seconds"), _build_cpu),
+    (re.compile(r"CPU\s*Usage:\s*(\d+)%", re.IGNORECASE), lambda match, output: CpuRecord(int(match.group(1)))),
+    GENERIC_CPU,
+)
+
+
+# display memory：“Mem:  382808  291956  90852  0  4  189092  23.8%”，最后一列是空闲率
+def _build_mem_line(match, output):
+    total, used, free_ratio = int(match.group(1)), int(match.group(2)), float(match.group(3))
+    return MemoryRecord(round(100 - free_ratio, 1), total, used)
+
+
+MEMORY = SearchTemplate(
+    (re.compile(r"Mem:\s+(\d+)\s+(\d+)\s+\d+\s+\d+\s+\d+\s+\d+\s+(\d+(?:\.\d+)?)%"), _build_mem_line),
+    memory_percent(r"Used:\s*\d+\s*bytes\s*\((\d+(?:\.\d+)?)%\)", re.IGNORECASE),
+    memory_percent(r"Memory\s*Usage:\s*(\d+(?:\.\d+)?)%", re.IGNORECASE),
+    memory_percent(r"FreeRatio[\s\S]*?(\d+(?:\.\d+)?)%", free=True),
+)
+
+# display mac-address：“0000-0c07-ac01   1   Learned   GE1/0/1   Y”，静态表项的状态是 “Config static”
+MAC_TABLE = TableTemplate(
+    re.compile(
+        rf"^[ \t]*(?P<mac>{MAC})[ \t]+(?P<vlan>\d+)[ \t]+(?P<type>(?:Config[ \t]+)?[A-Za-z]+)[ \t]+(?P<iface>\S+)",
+        M,
+    ),
+    lambda match, previous: MacRecord(normalize_mac(match["mac"]), match["vlan"], match["iface"], match["type"]),
+)
+
+# display arp：“10.1.1.2  0050-56c0-0001  1  GE1/0/1  1163  D”
+ARP = TableTemplate(
+    re.compile(
+        rf"^[ \t]*(?P<ip>{IPV4})[ \t]+(?P<mac>{MAC})[ \t]+(?P<vlan>\S+)[ \t]+(?P<iface>\S+)[ \t]+\S+[ \t]+"
+        rf"(?P<type>[A-Za-z]+)",
+        M,
+    ),
+    lambda match, previous: ArpRecord(match["ip"], normalize_mac(match["mac"]), match["iface"], match["vlan"],
+                                      match["type"]),
+)
+
+# display environment：“1  hotspot 1  38  0  75  85  NA”（槽位 传感器 温度 下限 告警 严重告警 ...）
+TEMPERATURE = FallbackTemplate(
+    TableTemplate(
+        re.compile(
+            r"^[ \t]*(?P<slot>\d+)[ \t]+(?P<sensor>[A-Za-z]+(?:[ \t]+\d+)?)[ \t]+(?P<value>-?\d+)[ \t]+-?\d+[ \t]+"
+            r"\d+[ \t]+\d+",
+            M,
+        ),
+        build_temperature,
+    ),
+    GENERIC_TEMPERATURE,
+)
+
+COMPONENT = component_template("Normal|Abnormal|Absent|Faulty|Fault")
+
+register(VENDOR, "interface", INTERFACE)
+register(VENDOR, "cpu", CPU)
+register(VENDOR, "memory", MEMORY)
+register(VENDOR, "version", VERSION)
+register(VENDOR, "routing", DISPLAY_ROUTE_TABLE)
+register(VENDOR, "mac", MAC_TABLE)
+register(VENDOR, "arp", ARP)
+register(VENDOR, "environment", TEMPERATURE)
+register(VENDOR, "power", COMPONENT)
+register(VENDOR, "fan", COMPONENT)
@@ -0,0 +1,91 @@
+"""
+华为 VRP 命令输出模板
+"""
+
+import os
+import re
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from core.parsers.common import (DISPLAY_ROUTE_TABLE, GENERIC_CPU, GENERIC_TEMPERATURE, IFNAME, IPV4, MAC, M,
+                                 VERSION, component_template, cpu_percent, memory_percent, normalize_mac)
+from core.parsers.records import ArpRecord, InterfaceRecord, MacRecord, MemoryRecord, TemperatureRecord
+from core.parsers.registry import FallbackTemplate, SearchTemplate, TableTemplate, register
+
+VENDOR = "huawei"
+
+# display interface brief：“GigabitEthernet0/0/1  up  up  0.01%  0.01%  0  0”，*down 为管理down，^down 为备份
+# display ip interface brief：“Vlanif10  10.1.1.1/24  up  up”
+INTERFACE = TableTemplate(
+    re.compile(
+        rf"^(?P<name>{IFNAME})(?:\([a-z]+\))?(?:[ \t]+(?:(?P<ip>{IPV4})/\d+|unassigned))?[ \t]+"
+        rf"(?P<link>[*^]?(?:up|down))(?:\([a-z]+\))?[ \t]+(?P<proto>[*^]?(?:up|down))",
+        M,
+    ),
+    lambda match, previous: InterfaceRecord(match["name"], match["link"], match["proto"], match["ip"] or ""),
+)
+
+# display cpu-usage：“CPU Usage  : 10% Max: 81%” 或 “CPU utilization for five seconds: 10%: one minute: ...”
+CPU = SearchTemplate(
+    cpu_percent(r"CPU Usage\s*:\s*(\d+)%", re.IGNORECASE),
+    cpu_percent(r"five seconds:\s*(\d+)%", re.IGNORECASE),
+    GENERIC_CPU,
+)
+
+
+# display memory：“System Total Memory Is: 1046224 bytes / Total Memory Used Is: 549660 bytes / Memory Using Percentage Is: 52%”
+def _build_mem_bytes(match, output):
+    total, used = int(match.group(1)), int(match.group(2))
+    return MemoryRecord(round(used * 100 / total, 1) if total else 0.0, total, used)
+
+
+MEMORY = SearchTemplate(
+    (re.compile(r"System Total Memory Is:\s*(\d+)[^\n]*\n[^\n]*?Total Memory Used Is:\s*(\d+)", re.IGNORECASE),
+     _build_mem_bytes),
+    memory_percent(r"Memory Using Percentage Is:\s*(\d+(?:\.\d+)?)%", re.IGNORECASE),
+    memory_percent(r"Memory\s*Usage\s*:\s*(\d+(?:\.\d+)?)%", re.IGNORECASE),
+)
+
+# display mac-address：“0025-9e80-2494  1  -  -  GE0/0/1  dynamic  0/-”，老版本没有 PEVLAN/CEVLAN 两列
+MAC_TABLE = TableTemplate(
+    re.compile(
+        rf"^[ \t]*(?P<mac>{MAC})[ \t]+(?P<vlan>\S+)(?:[ \t]+[-\d]+[ \t]+[-\d]+)?[ \t]+(?P<iface>{IFNAME})[ \t]+"
+        rf"(?P<type>[A-Za-z]+)",
+        M,
+    ),
+    lambda match, previous: MacRecord(normalize_mac(match["mac"]), match["vlan"].split("/")[0], match["iface"],
+                                      match["type"]),
+)
+
+# display arp：“10.1.1.2  5489-98f1-7d2a  20  D-0  GE0/0/1”，本机接口地址为 “I -”，VLAN 在下一行，这里不取
+ARP = TableTemplate(
+    re.compile(
+        rf"^[ \t]*(?P<ip>{IPV4})[ \t]+(?P<mac>{MAC})[ \t]+(?:\d+[ \t]+)?(?P<type>[A-Z]+(?:-\S*)?)(?:[ \t]+-)?[ \t]+"
+        rf"(?P<iface>{IFNAME})",
+        M,
+    ),
+    lambda match, previous: ArpRecord(match["ip"], normalize_mac(match["mac"]), match["iface"], "", match["type"]),
+)
+
+# display temperature all / display environment：“0  -  NORMAL  35  0  68”（槽位 卡号 状态 当前 下限 上限）
+TEMPERATURE = FallbackTemplate(
+    TableTemplate(
+        re.compile(r"^[ \t]*(?P<slot>\d+)[ \t]+\S+[ \t]+[A-Za-z]+[ \t]+(?P<value>-?\d+)[ \t]+-?\d+[ \t]+\d+", M),
+        lambda match, previous: TemperatureRecord(f"slot {match['slot']}", int(match["value"])),
+    ),
+    GENERIC_TEMPERATURE,
+)
+
+COMPONENT = component_template("Normal|Abnormal|Absent|Faulty|Fault|Supply|NotSupply")
+
+register(VENDOR, "interface", INTERFACE)
+register(VENDOR, "cpu", CPU)
+register(VENDOR, "memory", MEMORY)
+register(VENDOR, "version", VERSION)
+register(VENDOR, "routing", DISPLAY_ROUTE_TABLE)
+register(VENDOR, "mac", MAC_TABLE)
+register(VENDOR, "arp", ARP)
+register(VENDOR, "environment", TEMPERATURE)
+register(VENDOR, "power", COMPONENT)
+register(VENDOR, "fan", COMPONENT)
@@ -0,0 +1,167 @@
+"""
+大输出解析下放到进程池
+全量BGP路由表、核心交换机的MAC表动辄几十万行，在驱动SSH会话的线程里解析会长时间占住GIL，
+batch_health_check 的其它线程、Nornir 的其它任务都跟着卡住。这里按输出大小分流：
+1. 小于 threshold_bytes 的输出直接在当前线程解析（进程间传输的开销比解析本身还大）
+2. 超过阈值的输出编码成 UTF-8 字节交给 ProcessPoolExecutor，当前线程只在 future 上等待（不持有GIL）
+3. summarize() 只把条目数和前几条样例传回来，避免几十万条记录再 pickle 一遍
+4. 进程池起不来或者工作进程崩溃时退回当前线程解析，检查结果不受影响
+
+统计里 worker_seconds 是工作进程里的解析耗时（原本要在本进程里占住GIL的时间），
+caller_seconds 是调用方线程为下放消耗的CPU时间（编码/提交/取结果），两者之差就是省下来的GIL时间
+
+用法：
+    count, samples = parse_offloader.summarize("h3c", "routing", output)
+    records = parse_offloader.parse("huawei", "mac", output)
+"""
+
+import os
+import sys
+import time
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+from core.parsers.registry import parse
+
+logger = setup_logger("parse_offload", "parse_offload.log")
+
+# 解析下放配置，可用环境变量覆盖
+PARSE_OFFLOAD_CONFIG = {
+    "threshold_bytes": int(os.getenv("NETDEVOPS_PARSE_OFFLOAD_BYTES", str(512 * 1024))),  # 超过多少字节下放
+    "workers": int(os.getenv("NETDEVOPS_PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))),  # 0 表示不下放
+    # 进程里有会话池清理线程、日志线程，fork 可能把别的线程持有的锁带进子进程，默认用 forkserver
+    "start_method": os.getenv("NETDEVOPS_PARSE_START_METHOD", "forkserver"),
+}
+
+
+def _parse_in_worker(vendor, command_type, payload, samples):
+    """
+    工作进程里执行的解析
+    :param payload: UTF-8 编码的命令输出
+    :param samples: None 返回全部记录；否则只返回 (条目数, 前 samples 条记录)
+    :return: (结果, 解析耗时秒)
+    """
+    started = time.perf_counter()
+    result = parse(vendor, command_type, payload.decode("utf-8", errors="replace"))
+    if samples is not None:
+        result = (len(result), result[:samples])
+    return result, time.perf_counter() - started
+
+
+class ParseOffloader:
+    """按输出大小在当前线程 / 进程池之间分流的解析器"""
+
+    def __init__(self, threshold_bytes=None, workers=None, start_method=None):
+        """
+        :param threshold_bytes: 输出超过这个字节数才下放到进程池
+        :param workers: 进程池大小，<=0 表示全部在当前线程解析
+        :param start_method: 工作进程的启动方式（fork/forkserver/spawn）
+        """
+        self.threshold_bytes = PARSE_OFFLOAD_CONFIG["threshold_bytes"] if threshold_bytes is None else threshold_bytes
+        self.workers = PARSE_OFFLOAD_CONFIG["workers"] if workers is None else workers
+        self.start_method = start_method or PARSE_OFFLOAD_CONFIG["start_method"]
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "inline": 0,  # 当前线程解析的次数
+            "offloaded": 0,  # 下放到进程池的次数
+            "fallback": 0,  # 下放失败改为当前线程解析的次数
+            "offloaded_bytes": 0,
+            "inline_seconds": 0.0,  # 当前线程里解析的总耗时（占GIL）
+            "worker_seconds": 0.0,  # 工作进程里解析的总耗时（原本要占GIL的时间）
+            "caller_seconds": 0.0,  # 下放时调用方线程消耗的CPU时间（占GIL）
+            "wait_seconds": 0.0,  # 下放时调用方从编码到拿到结果的总耗时（大部分不占GIL）
+        }
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                try:
+                    context = multiprocessing.get_context(self.start_method)
+                except ValueError:
+                    context = multiprocessing.get_context()
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                logger.info(f"解析进程池已启动：{self.workers}个进程，下放阈值{self.threshold_bytes}字节")
+            return self._executor
+
+    def _run(self, vendor, command_type, output, samples):
+        output = output or ""
+        # 按字符数先粗筛：字节数 >= 字符数，字符数都够了就不用再编码一遍算长度
+        if self.workers <= 0 or len(output) < self.threshold_bytes // 4:
+            return self._run_inline(vendor, command_type, output, samples)
+        # 调用方线程的CPU时间近似为下放本身占用GIL的时间（编码、提交、反序列化结果），等待期间不计
+        cpu_started = time.thread_time()
+        started = time.perf_counter()
+        payload = output.encode("utf-8")
+        if len(payload) < self.threshold_bytes:
+            return self._run_inline(vendor, command_type, output, samples)
+        try:
+            future = self._get_executor().submit(_parse_in_worker, vendor, command_type, payload, samples)
+            result, worker_seconds = future.result()
+        except (BrokenProcessPool, OSError, RuntimeError) as e:
+            logger.warning(f"解析下放失败，改为当前线程解析（{command_type}，{len(payload)}字节）：{e}")
+            self._reset_executor()
+            with self._lock:
+                self._stats["fallback"] += 1
+            return self._run_inline(vendor, command_type, output, samples)
+        with self._lock:
+            self._stats["offloaded"] += 1
+            self._stats["offloaded_bytes"] += len(payload)
+            self._stats["worker_seconds"] += worker_seconds
+            self._stats["caller_seconds"] += time.thread_time() - cpu_started
+            self._stats["wait_seconds"] += time.perf_counter() - started
+        return result
+
+    def _run_inline(self, vendor, command_type, output, samples):
+        started = time.perf_counter()
+        result = parse(vendor, command_type, output)
+        if samples is not None:
+            result = (len(result), result[:samples])
+        with self._lock:
+            self._stats["inline"] += 1
+            self._stats["inline_seconds"] += time.perf_counter() - started
+        return result
+
+    def parse(self, vendor, command_type, output):
+        """解析表格类命令输出，返回全部记录（大输出的记录要 pickle 传回来，只要条目数时用 summarize）"""
+        return self._run(vendor, command_type, output, None)
+
+    def summarize(self, vendor, command_type, output, samples=5):
+        """
+        解析表格类命令输出，只返回条目数和前几条记录
+        :return: (条目数, [前 samples 条记录])
+        """
+        return self._run(vendor, command_type, output, samples)
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """关闭进程池，之后的大输出会重新拉起进程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        """下放统计：gil_seconds_recovered 为工作进程解析耗时减去本进程为下放付出的开销"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["gil_seconds_recovered"] = max(0.0, stats["worker_seconds"] - stats["caller_seconds"])
+        stats["workers"] = self.workers
+        stats["threshold_bytes"] = self.threshold_bytes
+        return stats
+
+
+# 进程内共享的解析下放器
+parse_offloader = ParseOffloader()
+atexit.register(parse_offloader.shutdown)
@@ -0,0 +1,103 @@
+"""
+解析结果的记录类型
+各厂商模板解析出来的字段统一成这些记录，检查函数只依赖记录的字段，不再关心原始输出的格式
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# uptime 里的各个时间单位（秒）：“1 year, 5 weeks, 2 days, 3 hours, 10 minutes”
+_UPTIME_UNITS = {"year": 365 * 86400, "week": 7 * 86400, "day": 86400, "hour": 3600, "minute": 60, "second": 1}
+_UPTIME_PART = re.compile(r"(\d+)\s*(year|week|day|hour|minute|second)s?", re.IGNORECASE)
+
+
+@dataclass
+class InterfaceRecord:
+    """接口简要信息（display interface brief / show ip interface brief 的一行）"""
+    name: str
+    link: str  # 物理状态：UP/DOWN/ADM/*down/administratively down ...
+    protocol: str = ""  # 协议状态，二层接口没有
+    ip: str = ""
+
+    @property
+    def is_up(self) -> bool:
+        return self.link.upper() == "UP" and self.protocol.upper() != "DOWN"
+
+
+@dataclass
+class RouteRecord:
+    """路由表条目（等价路由每个下一跳一条记录）"""
+    prefix: str
+    prefix_len: Optional[int]
+    protocol: str
+    preference: Optional[int]
+    cost: Optional[int]
+    next_hop: str
+    interface: str
+
+
+@dataclass
+class MacRecord:
+    """MAC地址表条目，mac 统一为小写 xxxx-xxxx-xxxx"""
+    mac: str
+    vlan: str
+    interface: str
+    type: str
+
+
+@dataclass
+class ArpRecord:
+    """ARP表条目，mac 统一为小写 xxxx-xxxx-xxxx"""
+    ip: str
+    mac: str
+    interface: str
+    vlan: str
+    type: str
+
+
+@dataclass
+class CpuRecord:
+    """CPU使用率（百分比）"""
+    five_seconds: Optional[int]
+    one_minute: Optional[int] = None
+    five_minutes: Optional[int] = None
+
+
+@dataclass
+class MemoryRecord:
+    """内存使用情况，usage_pct 为已用百分比"""
+    usage_pct: float
+    total: Optional[int] = None
+    used: Optional[int] = None
+
+
+@dataclass
+class VersionRecord:
+    version: str
+    model: str = ""
+    uptime: str = ""
+
+    @property
+    def uptime_seconds(self) -> Optional[int]:
+        """uptime 换算成秒，没有解析到 uptime 时为 None"""
+        parts = _UPTIME_PART.findall(self.uptime)
+        if not parts:
+            return None
+        return sum(int(value) * _UPTIME_UNITS[unit.lower()] for value, unit in parts)
+
+
+@dataclass
+class TemperatureRecord:
+    sensor: str
+    celsius: int
+
+
+@dataclass
+class ComponentRecord:
+    """电源/风扇等部件的状态"""
+    status: str
+
+    @property
+    def ok(self) -> bool:
+        return self.status.lower() in ("normal", "ok", "good", "supply", "正常")
@@ -0,0 +1,121 @@
+"""
+厂商命令输出解析器注册表
+按 (厂商, 命令类型) 注册预编译的模板，类似 TextFSM：
+1. TableTemplate：一个多行正则描述表格的一行，对整段输出 finditer，每个匹配转成一条记录
+   不 split 行、不生成逐行的临时列表，几十万行的路由表/MAC表也只扫一遍原始字符串
+2. SearchTemplate：按顺序尝试几个正则，第一个匹配上的转成一条记录（CPU/内存/版本这类单值输出）
+3. FallbackTemplate：同一条命令有几种输出格式时依次尝试
+没有注册某个厂商时退回到 h3c 的模板（VENDOR_COMMANDS 的 default 命令也是华三的 display 系列）
+
+用法：
+    routes = parse("huawei", "routing", output)   # -> [RouteRecord, ...]
+    cpu = parse("h3c", "cpu", output)              # -> CpuRecord 或 None
+"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+
+# (vendor, command_type) -> 模板
+PARSERS = {}
+
+DEFAULT_VENDOR = "h3c"
+
+# 各处出现过的厂商写法 -> 注册表里的厂商名
+VENDOR_ALIASES = {
+    "h3c": "h3c",
+    "华三h3c": "h3c",
+    "hclcloud": "h3c",
+    "hp_comware": "h3c",
+    "huawei": "huawei",
+    "华为": "huawei",
+    "huawei_telnet": "huawei",
+    "cisco": "cisco",
+    "cisco_ios": "cisco",
+    "cisco_xe": "cisco",
+}
+
+
+class TableTemplate:
+    """表格模板：pattern 的每个匹配交给 build(match, previous) 生成记录，previous 是上一条记录（等价路由的续行要用）"""
+
+    def __init__(self, pattern, build):
+        self.pattern = pattern
+        self.build = build
+
+    def parse(self, output):
+        records = []
+        previous = None
+        build = self.build
+        for match in self.pattern.finditer(output):
+            record = build(match, previous)
+            if record is not None:
+                records.append(record)
+                previous = record
+        return records
+
+
+class SearchTemplate:
+    """单值模板：按顺序尝试 (pattern, build)，返回第一个匹配生成的记录，都不匹配返回 None"""
+
+    def __init__(self, *rules):
+        self.rules = rules
+
+    def parse(self, output):
+        for pattern, build in self.rules:
+            match = pattern.search(output)
+            if match:
+                return build(match, output)
+        return None
+
+
+class FallbackTemplate:
+    """依次尝试几个模板，返回第一个非空的结果（同一命令在不同型号/版本上输出格式不同时用）"""
+
+    def __init__(self, *templates):
+        self.templates = templates
+
+    def parse(self, output):
+        result = None
+        for template in self.templates:
+            result = template.parse(output)
+            if result:
+                return result
+        return result
+
+
+def normalize_vendor(vendor):
+    vendor = (vendor or "").strip().lower()
+    return VENDOR_ALIASES.get(vendor, DEFAULT_VENDOR)
+
+
+def register(vendors, command_type, template):
+    """
+    注册模板
+    :param vendors: 厂商名或厂商名列表
+    :param command_type: 命令类型（和 VENDOR_COMMANDS 的键一致：interface/cpu/routing/...）
+    :param template: TableTemplate / SearchTemplate
+    """
+    for vendor in ([vendors] if isinstance(vendors, str) else vendors):
+        PARSERS[(vendor, command_type)] = template
+
+
+def get_parser(vendor, command_type):
+    """取模板：先按厂商找，找不到用默认厂商的，都没有抛 KeyError"""
+    template = PARSERS.get((normalize_vendor(vendor), command_type)) or PARSERS.get((DEFAULT_VENDOR, command_type))
+    if template is None:
+        raise KeyError(f"没有注册命令类型 {command_type} 的解析模板")
+    return template
+
+
+def parse(vendor, command_type, output):
+    """
+    解析命令输出
+    :param vendor: 厂商（任意写法，见 VENDOR_ALIASES）
+    :param command_type: 命令类型
+    :param output: 命令输出
+    :return: 表格类命令返回记录列表，单值命令返回一条记录或 None
+    """
+    return get_parser(vendor, command_type).parse(output or "")
@@ -0,0 +1,6 @@
+"""
+合成设备集群：压测/容量规划用的模拟设备，走真实的连接、解析、入库、告警流程
+"""
+
+from core.simulator.fleet import (FleetProfile, SimulatedSession, SyntheticDevice, SyntheticFleet, format_report,
+                                  run_fleet_round)
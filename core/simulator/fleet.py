@@ -0,0 +1,530 @@
+"""
+合成设备集群（压测/容量规划）
+health_checker_optimized 的模拟器模式直接返回随机字典，连接、批量取命令、解析、入库、告警都不经过，测不出任何东西。
+这里生成 N 台带真实厂商命令输出的模拟设备，从会话池的 connect_factory 接入，跑的是真实的整条流水线：
+1. 每台设备按种子确定厂商（H3C/华为/思科）、接口数、CPU/内存、温度、路由表和ARP表规模，少数设备是几万条路由的大表
+2. 时延：登录耗时（对数正态分布）、网络往返、设备执行时间随输出大小增长，慢设备整体乘一个系数
+3. 故障：登录失败、会话中途断开（读通道报错）按比例注入
+4. 每一轮 advance() 之后表项按 growth 增长、CPU重新抽样，模拟规模随时间变大
+5. run_fleet_round 用线程池执行健康检查，一次事务批量写库，再跑一遍告警规则，输出吞吐、时延分位数和各阶段耗时
+
+用法：
+    fleet = SyntheticFleet(FleetProfile(size=1000, time_scale=0.1))
+    with fleet.installed():
+        report = run_fleet_round(fleet, workers=50, db=DatabaseManager(db_path="/tmp/fleet.db"))
+    print(format_report(report))
+模拟设备的地址在 198.18.0.0/15（RFC 2544 基准测试网段），不会和会话池里的真实设备混在一起
+"""
+
+import os
+import sys
+import time
+import math
+import random
+import ipaddress
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+
+from utils.log_setup import setup_logger
+from core.connection.session_pool import session_pool
+from core.health_check.checks import VENDOR_COMMANDS
+
+logger = setup_logger("fleet_simulator", "fleet_simulator.log")
+
+FLEET_NETWORK = ipaddress.ip_network("198.18.0.0/15")
+
+# 厂商 -> Netmiko device_type
+VENDOR_DEVICE_TYPES = {"h3c": "hp_comware", "huawei": "huawei", "cisco": "cisco_ios"}
+
+
+@dataclass
+class FleetProfile:
+    """集群规模、时延和故障分布（时间单位：秒）"""
+
+    size: int = 100
+    vendors: Dict[str, float] = None  # 厂商权重，默认 H3C 60% / 华为 30% / 思科 10%
+    seed: int = 42
+    time_scale: float = 1.0  # 所有时延乘这个系数，0 表示不模拟时延（只测本机开销）
+    login: float = 1.5  # 登录耗时中位数
+    login_sigma: float = 0.5  # 登录耗时对数正态分布的 sigma
+    rtt: float = 0.02  # 网络往返
+    exec_base: float = 0.01  # 设备执行一条命令的固定耗时
+    exec_per_kb: float = 0.002  # 输出每 KB 增加的执行耗时
+    slow_rate: float = 0.05  # 慢设备比例
+    slow_factor: float = 5.0  # 慢设备时延倍数
+    login_failure_rate: float = 0.01  # 登录失败比例
+    drop_rate: float = 0.005  # 每次批量执行会话断开的概率
+    interfaces: int = 48  # 接口数中位数
+    down_ratio: float = 0.1  # 平均 DOWN 端口比例
+    routes: int = 200  # 路由表规模中位数
+    routes_sigma: float = 1.0
+    large_table_rate: float = 0.01  # 全量路由的大表设备比例
+    large_routes: int = 30000
+    arps: int = 100  # ARP表规模中位数
+    growth: float = 0.1  # 每轮表项增长比例
+    hot_rate: float = 0.05  # CPU 偏高（会触发告警）的设备比例
+
+    def __post_init__(self):
+        if self.vendors is None:
+            self.vendors = {"h3c": 0.6, "huawei": 0.3, "cisco": 0.1}
+
+
+# ============================================================
+# 单台模拟设备：状态 + 各厂商命令输出
+# ============================================================
+
+def _mac(rng: random.Random) -> str:
+    value = rng.getrandbits(48) & ~(1 << 40)  # 单播地址
+    text = f"{value:012x}"
+    return f"{text[:4]}-{text[4:8]}-{text[8:]}"
+
+
+def _route_prefix(index: int) -> str:
+    return f"{10 + (index >> 16) % 200}.{(index >> 8) & 255}.{index & 255}.0"
+
+
+class SyntheticDevice:
+    """一台模拟设备：按种子确定的静态属性 + 每轮变化的 CPU/表项规模"""
+
+    def __init__(self, index: int, profile: FleetProfile, rng: random.Random):
+        self.index = index
+        self.rng = rng
+        self.vendor = rng.choices(list(profile.vendors), weights=list(profile.vendors.values()))[0]
+        self.name = f"SIM-{self.vendor.upper()}-{index:05d}"
+        self.host = str(FLEET_NETWORK[index + 1])
+        self.interfaces = max(4, int(rng.gauss(profile.interfaces, profile.interfaces / 4)))
+        self.down = min(self.interfaces - 1, int(self.interfaces * rng.uniform(0, 2 * profile.down_ratio)))
+        self.hot = rng.random() < profile.hot_rate
+        self.memory = round(rng.uniform(30, 80), 1)
+        self.temperature = rng.randint(30, 55)
+        self.version = f"{rng.randint(5, 7)}.{rng.randint(0, 9)}.{rng.randint(0, 99):03d}"
+        if rng.random() < profile.large_table_rate:
+            self.routes = int(profile.large_routes * rng.uniform(0.8, 1.2))
+        else:
+            self.routes = max(4, int(profile.routes * rng.lognormvariate(0, profile.routes_sigma)))
+        self.arps = max(2, int(profile.arps * rng.lognormvariate(0, 0.8)))
+        slow = profile.slow_factor if rng.random() < profile.slow_rate else 1.0
+        self.latency = slow * profile.time_scale
+        self.login_seconds = profile.login * rng.lognormvariate(0, profile.login_sigma) * self.latency
+        self.login_fails = rng.random() < profile.login_failure_rate
+        self.cpu = 0
+        self._commands = {command: command_type for command_type, command in VENDOR_COMMANDS[self.vendor].items()}
+        self.resample()
+
+    def resample(self):
+        """每轮重新抽样的指标"""
+        self.cpu = self.rng.randint(89, 99) if self.hot else self.rng.randint(3, 45)
+
+    def grow(self, growth: float):
+        self.routes = int(math.ceil(self.routes * (1 + growth)))
+        self.arps = int(math.ceil(self.arps * (1 + growth)))
+        self.resample()
+
+    @property
+    def prompt(self) -> str:
+        return f"{self.name}#" if self.vendor == "cisco" else f"<{self.name}>"
+
+    def device_info(self) -> Dict:
+        """健康检查用的设备信息"""
+        return {
+            "device_name": self.name,
+            "host": self.host,
+            "port": 22,
+            "username": "admin",
+            "password": "admin",
+            "device_type": VENDOR_DEVICE_TYPES[self.vendor],
+            "vendor": self.vendor,
+        }
+
+    def render(self, command: str) -> str:
+        """命令 -> 输出；不认识的命令（关闭分页等）没有输出"""
+        command_type = self._commands.get(command.strip())
+        renderer = getattr(self, f"_{self.vendor}_{command_type}", None) if command_type else None
+        return renderer() if renderer else ""
+
+    def _interface_rows(self):
+        for i in range(1, self.interfaces + 1):
+            yield i, i > self.interfaces - self.down  # 最后几个口 DOWN，GE1/0/1 这类关键端口一直 UP
+
+    # ---------------- H3C ----------------
+
+    def _h3c_interface(self):
+        lines = ["Brief information on interfaces in bridge mode:", "Interface            Link Speed   Duplex Type PVID"]
+        lines += [f"GE1/0/{i:<14}{'DOWN' if down else 'UP':<5}{'auto' if down else '1G(a)':<8}"
+                  f"{'A' if down else 'F(a)':<7}A    1" for i, down in self._interface_rows()]
+        return "\n".join(lines)
+
+    def _h3c_cpu(self):
+        return (f"Slot 1 CPU 0 CPU usage:\n      {self.cpu}% in last 5 seconds\n"
+                f"      {self.cpu}% in last 1 minute\n      {self.cpu}% in last 5 minutes")
+
+    def _h3c_memory(self):
+        total = 1048576
+        used = int(total * self.memory / 100)
+        return ("             Total      Used      Free    Shared   Buffers    Cached   FreeRatio\n"
+                f"Mem:   {total:>10} {used:>9} {total - used:>9}         0         4    189092   "
+                f"{100 - self.memory:.1f}%")
+
+    def _h3c_version(self):
+        return (f"H3C Comware Software, Version {self.version}, Release 6616\n"
+                f"H3C S6850-56HF uptime is 0 weeks, {self.index % 7} days, 3 hours, 12 minutes")
+
+    def _display_routes(self, protocol, interface):
+        lines = [f"Destinations : {self.routes}        Routes : {self.routes}", "",
+                 "Destination/Mask    Proto   Pre  Cost         NextHop         Interface"]
+        lines += [f"{_route_prefix(i) + '/24':<20}{protocol:<8}10   2            10.0.0.2        {interface}"
+                  for i in range(self.routes)]
+        return "\n".join(lines)
+
+    def _h3c_routing(self):
+        return self._display_routes("O_INTRA", "Vlan10")
+
+    def _h3c_arp(self):
+        lines = ["  Type: S-Static   D-Dynamic   O-Openflow   R-Rule   M-Multiport  I-Invalid",
+                 "IP address      MAC address    VLAN/VSI name Interface                Aging Type"]
+        lines += [f"{FLEET_NETWORK[65536 + i]!s:<16}{_mac(self.rng):<15}10            GE1/0/{i % 48 + 1:<18}1163  D"
+                  for i in range(self.arps)]
+        return "\n".join(lines)
+
+    def _h3c_environment(self):
+        return (" System temperature information (degree centigrade):\n"
+                " Slot  Sensor    Temperature  Lower  Warning  Alarm  Shutdown\n"
+                f" 1     hotspot 1  {self.temperature}           0      75       85     NA")
+
+    def _h3c_power(self):
+        return " Slot 1:\n PowerID State    Mode   Current(A)  Voltage(V)  Power(W)\n 1       Normal   AC     --  --  --"
+
+    def _h3c_fan(self):
+        return " Slot 1:\n FanID    Status      Direction\n 1        Normal      Back-to-front\n 2        Normal      Back-to-front"
+
+    # ---------------- 华为 ----------------
+
+    def _huawei_interface(self):
+        lines = ["PHY: Physical", "Interface                   PHY   Protocol  InUti OutUti   inErrors  outErrors"]
+        lines += [f"GigabitEthernet0/0/{i:<9}{'down' if down else 'up':<6}{'down' if down else 'up':<10}"
+                  f"0%     0%          0          0" for i, down in self._interface_rows()]
+        return "\n".join(lines)
+
+    def _huawei_cpu(self):
+        return f"CPU Usage Stat. Cycle: 60 (Second)\nCPU Usage            : {self.cpu}% Max: 99%"
+
+    def _huawei_memory(self):
+        total = 1046224
+        return (f"System Total Memory Is: {total} bytes\nTotal Memory Used Is: {int(total * self.memory / 100)} bytes\n"
+                f"Memory Using Percentage Is: {int(self.memory)}%")
+
+    def _huawei_version(self):
+        return f"Huawei Versatile Routing Platform Software\nVRP (R) software, Version {self.version} (S5720 V200R011)"
+
+    def _huawei_routing(self):
+        return self._display_routes("OSPF", "Vlanif10")
+
+    def _huawei_arp(self):
+        lines = ["IP ADDRESS      MAC ADDRESS     EXPIRE(M) TYPE        INTERFACE   VPN-INSTANCE"]
+        lines += [f"{FLEET_NETWORK[65536 + i]!s:<16}{_mac(self.rng):<16}20        D-0         GE0/0/{i % 48 + 1}"
+                  for i in range(self.arps)]
+        return "\n".join(lines)
+
+    def _huawei_environment(self):
+        return ("SlotID  CardID    Status      Current(C)  Lower(C)  Upper(C)\n"
+                f"0       -         NORMAL      {self.temperature}          0         68")
+
+    def _huawei_power(self):
+        return "PowerNo  Present  Mode   State\nPWR1     YES      AC     Supply"
+
+    def _huawei_fan(self):
+        return "Slot 0: FAN 1 State: Normal"
+
+    # ---------------- 思科 ----------------
+
+    def _cisco_interface(self):
+        lines = ["Interface              IP-Address      OK? Method Status                Protocol"]
+        lines += [f"GigabitEthernet0/{i:<7}unassigned      YES unset  {'down' if down else 'up':<22}"
+                  f"{'down' if down else 'up'}" for i, down in self._interface_rows()]
+        return "\n".join(lines)
+
+    def _cisco_cpu(self):
+        return f"CPU utilization for five seconds: {self.cpu}%/1%; one minute: {self.cpu}%; five minutes: {self.cpu}%"
+
+    def _cisco_memory(self):
+        total = 852147136
+        used = int(total * self.memory / 100)
+        return ("                Head    Total(b)     Used(b)     Free(b)   Lowest(b)  Largest(b)\n"
+                f"Processor    7F5A3B8   {total}   {used}   {total - used}   200   100")
+
+    def _cisco_version(self):
+        return f"Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version {self.version}, RELEASE SOFTWARE"
+
+    def _cisco_routing(self):
+        lines = ["Gateway of last resort is 10.0.0.254 to network 0.0.0.0", ""]
+        lines += [f"O        {_route_prefix(i)}/24 [110/2] via 10.0.0.2, 00:01:02, GigabitEthernet0/1"
+                  for i in range(self.routes)]
+        return "\n".join(lines)
+
+    def _cisco_arp(self):
+        lines = ["Protocol  Address          Age (min)  Hardware Addr   Type   Interface"]
+        lines += [f"Internet  {FLEET_NETWORK[65536 + i]!s:<17}12   {_mac(self.rng).replace('-', '.'):<16}ARPA   Vlan10"
+                  for i in range(self.arps)]
+        return "\n".join(lines)
+
+    def _cisco_environment(self):
+        return f"SYSTEM TEMPERATURE is OK\nInlet Temperature Value: {self.temperature} Degree Celsius"
+
+    def _cisco_power(self):
+        return "SW  PID                 Serial#     Status\n1A  PWR-C1-350WAC       DCB1234     OK"
+
+    def _cisco_fan(self):
+        return "FAN 1 is OK\nFAN 2 is OK"
+
+
+# ============================================================
+# 模拟会话（Netmiko 连接需要的那几个方法）
+# ============================================================
+
+class SimulatedSession:
+    """
+    模拟的 SSH 会话：写入的命令排队执行，输出在 (到达 + 执行耗时 + 回程) 之后才能读到，
+    执行耗时 = exec_base + 输出大小 * exec_per_kb，乘设备的时延系数
+    """
+
+    RETURN = "\n"
+
+    def __init__(self, device: SyntheticDevice, profile: FleetProfile):
+        self.device = device
+        self.profile = profile
+        self.host = device.host
+        self.base_prompt = device.name
+        self.alive = True
+        self.dropped = False  # 会话已断开：之后读通道报错
+        self.scheduled = []  # [(可读时间, 文本)]
+        self.busy_until = 0.0
+
+    def _execute(self, command: str, arrive: float) -> str:
+        output = self.device.render(command)
+        exec_time = (self.profile.exec_base + len(output) / 1024 * self.profile.exec_per_kb) * self.device.latency
+        self.busy_until = max(self.busy_until, arrive) + exec_time
+        return output
+
+    def write_channel(self, data: str):
+        if self.dropped:
+            raise OSError("Socket is closed")
+        arrive = time.monotonic() + self.profile.rtt * self.device.latency / 2
+        for command in data.split(self.RETURN)[:-1]:
+            output = self._execute(command, arrive)
+            text = f"{command}\n{output}\n{self.device.prompt}" if output else f"{command}\n{self.device.prompt}"
+            self.scheduled.append((self.busy_until + self.profile.rtt * self.device.latency / 2, text))
+        if self.device.rng.random() < self.profile.drop_rate:
+            self.dropped = True
+
+    def read_channel(self) -> str:
+        if self.dropped:
+            self.alive = False
+            raise OSError("Socket is closed")
+        now = time.monotonic()
+        ready = [text for at, text in self.scheduled if at <= now]
+        self.scheduled = [(at, text) for at, text in self.scheduled if at > now]
+        return "".join(ready)
+
+    def clear_buffer(self):
+        self.scheduled.clear()
+
+    def send_command(self, command, expect_string=None, read_timeout=10.0, **kwargs) -> str:
+        if self.dropped:
+            self.alive = False
+            raise OSError("Socket is closed")
+        now = time.monotonic()
+        output = self._execute(command, now + self.profile.rtt * self.device.latency / 2)
+        wait = self.busy_until + self.profile.rtt * self.device.latency / 2 - now
+        if wait > read_timeout:
+            time.sleep(read_timeout)
+            raise TimeoutError(f"Pattern not detected: {self.device.prompt} in output.")
+        if wait > 0:
+            time.sleep(wait)
+        return output
+
+    def send_command_timing(self, command, **kwargs) -> str:
+        return self.send_command(command, read_timeout=float("inf"))
+
+    def is_alive(self) -> bool:
+        return self.alive and not self.dropped
+
+    def disconnect(self):
+        self.alive = False
+
+
+# ============================================================
+# 集群
+# ============================================================
+
+class SyntheticFleet:
+    """N 台模拟设备 + 会话工厂"""
+
+    def __init__(self, profile: Optional[FleetProfile] = None):
+        self.profile = profile or FleetProfile()
+        self.round = 0
+        self.devices = [SyntheticDevice(i, self.profile, random.Random(f"{self.profile.seed}-{i}"))
+                        for i in range(self.profile.size)]
+        self._by_host = {device.host: device for device in self.devices}
+        self.logins = Counter()  # 登录次数：ok / failed
+
+    def device_infos(self) -> List[Dict]:
+        return [device.device_info() for device in self.devices]
+
+    def connect(self, host=None, **params) -> SimulatedSession:
+        """会话池的 connect_factory：模拟登录耗时，按设备的故障设定登录失败"""
+        device = self._by_host.get(host)
+        if device is None:
+            raise ConnectionRefusedError(f"{host} 不是模拟设备")
+        if device.login_seconds > 0:
+            time.sleep(device.login_seconds)
+        if device.login_fails:
+            self.logins["failed"] += 1
+            raise TimeoutError(f"TCP connection to device failed: {host}:22")
+        self.logins["ok"] += 1
+        return SimulatedSession(device, self.profile)
+
+    def advance(self):
+        """进入下一轮：表项按 growth 增长，CPU 重新抽样"""
+        self.round += 1
+        for device in self.devices:
+            device.grow(self.profile.growth)
+
+    def table_sizes(self) -> Dict:
+        return {"routes": sum(device.routes for device in self.devices),
+                "routes_max": max((device.routes for device in self.devices), default=0),
+                "arps": sum(device.arps for device in self.devices)}
+
+    def install_alert_rules(self, db, threshold: float = 85) -> int:
+        """每台设备一条 CPU 告警规则（不发邮件）"""
+        for device in self.devices:
+            db.add_alert_rule(f"{device.name} CPU", "cpu", ">", threshold, device_name=device.name)
+        return len(self.devices)
+
+    @contextmanager
+    def installed(self, pool=None):
+        """会话池新建会话时改为登录模拟设备；退出时恢复，并关掉池里这些模拟设备的会话"""
+        pool = pool or session_pool
+        original = pool.connect_factory
+        pool.connect_factory = self.connect
+        try:
+            yield self
+        finally:
+            pool.connect_factory = original
+            pool.close_idle(self._by_host)
+
+
+# ============================================================
+# 跑一轮：健康检查 -> 批量入库 -> 告警
+# ============================================================
+
+def _percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(values)
+
+    def at(q):
+        return round(ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)], 4)
+
+    return {"p50": at(0.5), "p95": at(0.95), "p99": at(0.99), "max": round(ordered[-1], 4)}
+
+
+def run_fleet_round(fleet: SyntheticFleet, workers: int = 50, db=None, alerts: bool = True) -> Dict:
+    """
+    用线程执行器对整个集群做一轮健康检查（会话池 -> 批量取命令 -> 解析 -> 批量入库），然后跑一遍告警规则
+
+    Args:
+        fleet: 已经 installed() 的模拟集群
+        workers: 检查线程数
+        db: 写入的数据库，默认进程共享的 db_manager
+        alerts: 是否跑告警规则
+
+    Returns:
+        本轮报告：吞吐、单台时延分位数、各阶段平均耗时、结果分布、入库和告警耗时
+    """
+    from core.alert.alert_engine import AlertEngine
+    from core.health_check.engine import ResultSink
+    from core.health_check.health_checker_optimized import CHECK_MODE_REAL, check_single_device
+
+    sink = ResultSink(update_cards=False, db=db)
+    pool_before = session_pool.stats()
+    latencies = []
+
+    def check(device_info):
+        started = time.perf_counter()
+        result = check_single_device(device_info, CHECK_MODE_REAL, sink, False)
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(check, fleet.device_infos()))
+    check_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    written = sink.flush()
+    persist_seconds = time.perf_counter() - started
+
+    alert_seconds, triggered = 0.0, 0
+    if alerts:
+        started = time.perf_counter()
+        triggered = AlertEngine(db=db).check_all_rules()
+        alert_seconds = time.perf_counter() - started
+
+    phases = {"connect": [], "prefetch": []}
+    parse = Counter()
+    for result in results:
+        timings = result.get("timings", {})
+        for phase, values in phases.items():
+            if phase in timings:
+                values.append(timings[phase])
+        for name, check_timing in timings.get("checks", {}).items():
+            parse[name] += check_timing.get("parse", 0.0)
+    pool_after = session_pool.stats()
+    checked = max(len(results), 1)
+
+    report = {
+        "round": fleet.round,
+        "devices": len(results),
+        "workers": workers,
+        "check_seconds": round(check_seconds, 3),
+        "throughput": round(len(results) / check_seconds, 1) if check_seconds else 0.0,
+        "latency": _percentiles(latencies),
+        "phases": {phase: round(sum(values) / len(values), 4) if values else 0.0 for phase, values in phases.items()},
+        "parse_ms": {name: round(total * 1000 / checked, 3) for name, total in parse.most_common()},
+        "status": dict(Counter(result["status"] for result in results)),
+        "persist_seconds": round(persist_seconds, 3),
+        "rows_written": written,
+        "alert_seconds": round(alert_seconds, 3),
+        "alerts": triggered,
+        "sessions": {key: pool_after[key] - pool_before[key] for key in ("created", "reused", "reconnects")},
+        "tables": fleet.table_sizes(),
+    }
+    logger.info(f"模拟集群第{fleet.round}轮：{report['devices']}台，{report['check_seconds']}秒，"
+                f"{report['throughput']}台/秒，p95 {report['latency']['p95']}秒")
+    return report
+
+
+def format_report(report: Dict) -> str:
+    """一轮报告的文本形式"""
+    latency = report["latency"]
+    lines = [
+        f"第{report['round']}轮  设备{report['devices']}台  线程{report['workers']}  "
+        f"路由{report['tables']['routes']}条（最大单台{report['tables']['routes_max']}）  ARP{report['tables']['arps']}条",
+        f"  检查    {report['check_seconds']:>9.2f} s   吞吐 {report['throughput']:.1f} 台/秒",
+        f"  单台时延  p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s  "
+        f"max {latency['max']:.3f}s",
+        f"  阶段均值  登录/借会话 {report['phases']['connect']:.3f}s  批量取命令 {report['phases']['prefetch']:.3f}s",
+        "  解析均值  " + "  ".join(f"{name} {ms:.2f}ms" for name, ms in report["parse_ms"].items()),
+        f"  结果    {report['status']}",
+        f"  会话    新建{report['sessions']['created']}  复用{report['sessions']['reused']}  "
+        f"重连{report['sessions']['reconnects']}",
+        f"  入库    {report['persist_seconds']:.3f} s（{report['rows_written']}条）",
+        f"  告警    {report['alert_seconds']:.3f} s（触发{report['alerts']}条）",
+    ]
+    return "\n".join(lines)
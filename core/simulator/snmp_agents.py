@@ -0,0 +1,329 @@
+"""
+本地 SNMP 模拟设备（拓扑发现压测用）
+TopologyBuilder 的多层扫描只能对着真实园区网测，这里在本机起几百个 SNMPv2c agent，走真实的 SNMPCollector：
+1. 按层级扇出生成园区树（核心 -> 汇聚 -> 接入 ...），层与层之间加少量冗余上联，每台设备有 LLDP 邻居、接口、ARP 表
+2. 每台设备一个 UDP agent，地址取 127.x.y.z（Linux 上整个 127.0.0.0/8 都是本机地址），端口统一，
+   LLDP 管理地址就是邻居 agent 的地址，多层扫描可以一层层扩展下去
+3. agent 用 pysnmp 的协议层编解码，支持 GET / GETNEXT / GETBULK，每个请求按 latency 延迟应答，模拟设备 SNMP 处理时间；
+   unreachable 里的设备不应答（模拟不可达/ACL 拦截，用来测单设备超时）
+4. 所有 agent 跑在一个后台线程的事件循环里
+
+用法：
+    campus = CampusTopology(fanout=(1, 4, 8, 8))
+    with SnmpAgentFarm(campus, latency=0.005) as farm:
+        await builder.build_topology_bfs(campus.seed_ip, collector_factory=farm.collector_factory(), max_depth=4)
+需要 pysnmp（和 SNMPCollector 一样）
+"""
+
+import os
+import sys
+import bisect
+import random
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT_DIR)
+
+from utils.log_setup import setup_logger
+
+try:
+    from pysnmp.proto import api
+    from pyasn1.codec.ber import decoder, encoder
+
+    PMOD = api.protoModules[api.protoVersion2c]
+    PYSNMP_AVAILABLE = True
+except ImportError:
+    PYSNMP_AVAILABLE = False
+
+logger = setup_logger("snmp_simulator", "topology.log")
+
+# 和 SNMPCollector 采集的 OID 一致
+SYS_DESCR = (1, 3, 6, 1, 2, 1, 1, 1, 0)
+SYS_NAME = (1, 3, 6, 1, 2, 1, 1, 5, 0)
+IF_DESCR = (1, 3, 6, 1, 2, 1, 2, 2, 1, 2)
+IF_STATUS = (1, 3, 6, 1, 2, 1, 2, 2, 1, 8)
+ARP_PHYS = (1, 3, 6, 1, 2, 1, 4, 22, 1, 2)
+LLDP_REM_PORT_ID = (1, 0, 8802, 1, 1, 2, 1, 4, 1, 1, 7)
+LLDP_REM_SYS_NAME = (1, 0, 8802, 1, 1, 2, 1, 4, 1, 1, 9)
+LLDP_REM_MAN_ADDR_IF_ID = (1, 0, 8802, 1, 1, 2, 1, 4, 2, 1, 4)
+
+DEFAULT_PORT = 16161
+LAYER_NAMES = ["CORE", "AGG", "DIST", "ACC", "EDGE", "LEAF"]
+LAYER_DESCR = {
+    0: "Huawei Versatile Routing Platform Software, NE40E Router",
+    1: "H3C Comware Platform Software, H3C S7506E Switch",
+}
+DEFAULT_DESCR = "H3C Comware Platform Software, H3C S5130 Switch"
+
+
+@dataclass
+class SimDevice:
+    """一台模拟设备"""
+
+    ip: str
+    name: str
+    layer: int
+    descr: str
+    neighbors: List[Tuple[str, int]] = field(default_factory=list)  # (邻居IP, 本端端口号)
+    arps: int = 0
+
+
+class CampusTopology:
+    """按层级扇出生成的园区网，地址从 127.1.0.1 开始顺序分配"""
+
+    def __init__(self, fanout: Sequence[int] = (1, 4, 8, 8), redundancy: float = 0.3, arps: int = 20, seed: int = 7):
+        """
+        Args:
+            fanout: 每层的扇出，第一项是核心设备数，之后每项是上一层每台设备下挂的设备数
+            redundancy: 每台设备额外连一台上一层设备（双上联）的概率
+            arps: 每台接入层设备的终端 ARP 表项数
+            seed: 随机种子
+        """
+        rng = random.Random(seed)
+        self.devices: Dict[str, SimDevice] = {}
+        self.levels: List[List[str]] = []
+        previous: List[str] = []
+        for layer, count in enumerate(fanout):
+            parents = previous or [None]
+            current = []
+            for parent in parents:
+                for _ in range(count):
+                    device = self._new_device(layer)
+                    current.append(device.ip)
+                    if parent:
+                        self._connect(parent, device.ip)
+                        if len(previous) > 1 and rng.random() < redundancy:
+                            self._connect(rng.choice([ip for ip in previous if ip != parent]), device.ip)
+            # 核心设备之间全互联
+            if layer == 0:
+                for i, left in enumerate(current):
+                    for right in current[i + 1:]:
+                        self._connect(left, right)
+            self.levels.append(current)
+            previous = current
+        for ip in self.levels[-1]:
+            self.devices[ip].arps = arps
+
+    @property
+    def seed_ip(self) -> str:
+        return self.levels[0][0]
+
+    def _new_device(self, layer: int) -> SimDevice:
+        index = len(self.devices) + 1
+        ip = f"127.1.{index // 250}.{index % 250 + 1}"
+        name = f"{LAYER_NAMES[min(layer, len(LAYER_NAMES) - 1)]}-{index:04d}"
+        device = SimDevice(ip=ip, name=name, layer=layer, descr=LAYER_DESCR.get(layer, DEFAULT_DESCR))
+        self.devices[ip] = device
+        return device
+
+    def _connect(self, left: str, right: str):
+        a, b = self.devices[left], self.devices[right]
+        a.neighbors.append((right, len(a.neighbors) + 1))
+        b.neighbors.append((left, len(b.neighbors) + 1))
+
+    def reachable_within(self, max_depth: int) -> int:
+        """从种子设备出发、max_depth 层以内能扫描到的设备数（和 build_topology_bfs 的深度语义一致）"""
+        seen, frontier = {self.seed_ip}, [self.seed_ip]
+        for _ in range(max_depth - 1):
+            frontier = [ip for current in frontier for ip, _ in self.devices[current].neighbors if ip not in seen]
+            seen.update(frontier)
+        return len(seen)
+
+    def mib(self, ip: str) -> List[Tuple[Tuple[int, ...], object]]:
+        """一台设备的 MIB（按 OID 排好序的 (oid, 值) 列表）"""
+        device = self.devices[ip]
+        rows = [
+            (SYS_DESCR, PMOD.OctetString(device.descr)),
+            (SYS_NAME, PMOD.OctetString(device.name)),
+        ]
+        ports = max(len(device.neighbors), 1) + 4
+        for port in range(1, ports + 1):
+            rows.append((IF_DESCR + (port,), PMOD.OctetString(f"GigabitEthernet1/0/{port}")))
+            rows.append((IF_STATUS + (port,), PMOD.Integer(1 if port <= len(device.neighbors) + 2 else 2)))
+        for remote_index, (neighbor_ip, local_port) in enumerate(device.neighbors, start=1):
+            neighbor = self.devices[neighbor_ip]
+            remote_port = next(port for ip, port in neighbor.neighbors if ip == device.ip)
+            index = (0, local_port, remote_index)
+            rows.append((LLDP_REM_PORT_ID + index, PMOD.OctetString(f"GigabitEthernet1/0/{remote_port}")))
+            rows.append((LLDP_REM_SYS_NAME + index, PMOD.OctetString(neighbor.name)))
+            # 管理地址在索引里：时间戳.本端端口.远端索引.地址类型(1=IPv4).地址长度.地址
+            address = tuple(int(part) for part in neighbor_ip.split("."))
+            rows.append((LLDP_REM_MAN_ADDR_IF_ID + index + (1, 4) + address, PMOD.Integer(remote_port)))
+        octets = tuple(int(part) for part in device.ip.split("."))
+        for host in range(device.arps):
+            mac = bytes([0x00, 0x1A, octets[2], octets[3], host // 256, host % 256])
+            rows.append((ARP_PHYS + (ports, 10, octets[3], host // 250, host % 250 + 1), PMOD.OctetString(mac)))
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+
+class _AgentProtocol(asyncio.DatagramProtocol):
+    """一个 SNMPv2c agent：只读，支持 GET / GETNEXT / GETBULK"""
+
+    def __init__(self, farm: "SnmpAgentFarm", mib: List[Tuple[Tuple[int, ...], object]]):
+        self.farm = farm
+        self.oids = [oid for oid, _ in mib]
+        self.values = [value for _, value in mib]
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            response = self.respond(data)
+        except Exception as e:  # 解不开的报文直接丢掉，和真实设备一样
+            logger.debug(f"模拟 agent 丢弃无法解析的报文：{e}")
+            return
+        if response is None:
+            return
+        self.farm.requests += 1
+        if self.farm.latency > 0:
+            asyncio.get_running_loop().call_later(self.farm.latency, self._send, response, addr)
+        else:
+            self._send(response, addr)
+
+    def _send(self, response, addr):
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(response, addr)
+
+    def _exact(self, oid):
+        position = bisect.bisect_left(self.oids, oid)
+        if position < len(self.oids) and self.oids[position] == oid:
+            return self.values[position]
+        return PMOD.NoSuchObject("")
+
+    def _next(self, oid):
+        position = bisect.bisect_right(self.oids, oid)
+        if position < len(self.oids):
+            return self.oids[position], self.values[position]
+        return oid, PMOD.EndOfMibView("")
+
+    def respond(self, data) -> Optional[bytes]:
+        if int(api.decodeMessageVersion(data)) != api.protoVersion2c:
+            return None
+        request, _ = decoder.decode(data, asn1Spec=PMOD.Message())
+        if str(PMOD.apiMessage.getCommunity(request)) != self.farm.community:
+            return None
+        request_pdu = PMOD.apiMessage.getPDU(request)
+        response = PMOD.apiMessage.getResponse(request)
+        response_pdu = PMOD.apiMessage.getPDU(response)
+        var_binds = []
+        if request_pdu.isSameTypeWith(PMOD.GetRequestPDU()):
+            for oid, _ in PMOD.apiPDU.getVarBinds(request_pdu):
+                var_binds.append((oid, self._exact(tuple(oid))))
+        elif request_pdu.isSameTypeWith(PMOD.GetNextRequestPDU()):
+            for oid, _ in PMOD.apiPDU.getVarBinds(request_pdu):
+                next_oid, value = self._next(tuple(oid))
+                var_binds.append((PMOD.ObjectIdentifier(next_oid), value))
+        elif request_pdu.isSameTypeWith(PMOD.GetBulkRequestPDU()):
+            non_repeaters = int(PMOD.apiBulkPDU.getNonRepeaters(request_pdu))
+            repetitions = max(int(PMOD.apiBulkPDU.getMaxRepetitions(request_pdu)), 1)
+            requested = [tuple(oid) for oid, _ in PMOD.apiBulkPDU.getVarBinds(request_pdu)]
+            for oid in requested[:non_repeaters]:
+                next_oid, value = self._next(oid)
+                var_binds.append((PMOD.ObjectIdentifier(next_oid), value))
+            cursors = requested[non_repeaters:]
+            for _ in range(repetitions):
+                if not cursors:
+                    break
+                for i, oid in enumerate(cursors):
+                    next_oid, value = self._next(oid)
+                    cursors[i] = next_oid
+                    var_binds.append((PMOD.ObjectIdentifier(next_oid), value))
+        else:
+            return None
+        PMOD.apiPDU.setVarBinds(response_pdu, var_binds)
+        return encoder.encode(response)
+
+
+class SnmpAgentFarm:
+    """在后台线程的事件循环里为园区网的每台设备起一个 UDP agent"""
+
+    def __init__(self, campus: CampusTopology, port: int = DEFAULT_PORT, community: str = "public",
+                 latency: float = 0.0, unreachable: Sequence[str] = ()):
+        """
+        Args:
+            campus: 园区网拓扑
+            port: 所有 agent 监听的 UDP 端口
+            community: 团体名，不匹配的请求不应答
+            latency: 每个请求的应答延迟（秒）
+            unreachable: 不起 agent 的设备IP（请求石沉大海，模拟不可达）
+        """
+        if not PYSNMP_AVAILABLE:
+            raise RuntimeError("SNMP 模拟器需要 pysnmp")
+        self.campus = campus
+        self.port = port
+        self.community = community
+        self.latency = latency
+        self.unreachable = set(unreachable)
+        self.requests = 0
+        self._loop = None
+        self._thread = None
+        self._transports = []
+
+    def start(self):
+        ready = threading.Event()
+        errors = []
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(self._bind_all())
+            except Exception as e:
+                errors.append(e)
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+            for transport in self._transports:
+                transport.close()
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name="snmp-agent-farm", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        logger.info(f"SNMP 模拟器已启动：{len(self._transports)}个 agent，端口{self.port}，应答延迟{self.latency}s")
+        return self
+
+    async def _bind_all(self):
+        loop = asyncio.get_running_loop()
+        for ip in self.campus.devices:
+            if ip in self.unreachable:
+                continue
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda ip=ip: _AgentProtocol(self, self.campus.mib(ip)), local_addr=(ip, self.port)
+            )
+            self._transports.append(transport)
+
+    def stop(self):
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+        self._loop = self._thread = None
+        self._transports = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def collector_factory(self, timeout: float = 1.0, retries: int = 0):
+        """给 build_topology_bfs 用的采集器工厂：真实的 SNMPCollector，连到模拟器的端口，共用一个 SnmpEngine"""
+        from core.topology.snmp_collector import SNMPCollector, SnmpEngine
+
+        engine = SnmpEngine()
+
+        def factory(ip):
+            return SNMPCollector(ip, community=self.community, port=self.port, timeout=timeout, retries=retries,
+                                 snmp_engine=engine)
+
+        return factory
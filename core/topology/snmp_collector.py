@@ -26,6 +26,7 @@ try:
         usmDESPrivProtocol, usmAesCfb128Protocol,
     )
     from pysnmp.proto.rfc1902 import OctetString
+    from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchObject, NoSuchInstance
     # 适配：把驼峰命名映射成下划线命名，方便后面代码用
     get_cmd = getCmd
     next_cmd = nextCmd
@@ -35,6 +36,9 @@ except ImportError:
     PYSNMP_AVAILABLE = False
     logger.warning("pysnmp 没装，SNMP 功能用不了")
 
+# 遍历子树时每个 GETBULK 请求取回的条数
+WALK_MAX_REPETITIONS = 10
+
 # ============================================================
 # 常用 OID 定义
 # ============================================================
@@ -95,6 +99,7 @@ class SNMPCollector:
 
     def __init__(self, ip, community='public', port=161, version='v2c',
                  timeout=3, retries=2,
+                 snmp_engine=None,
                  # v3 专用参数
                  username='', auth_protocol='none', auth_password='',
                  priv_protocol='none', priv_password=''):
@@ -106,6 +111,7 @@ class SNMPCollector:
         :param version: SNMP版本 v2c/v3
         :param timeout: 超时秒数
         :param retries: 重试次数
+        :param snmp_engine: 共用的 SnmpEngine，多层扫描时一批采集器共用一个，省掉每台设备初始化引擎的开销
         :param username: v3 用户名
         :param auth_protocol: v3 认证协议 md5/sha/none
         :param auth_password: v3 认证密码
@@ -118,7 +124,7 @@ class SNMPCollector:
         self.version = version
         self.timeout = timeout
         self.retries = retries
-        self.snmp_engine = None
+        self.snmp_engine = snmp_engine
         self.auth_data = None
         self.transport_target = None
 
@@ -137,7 +143,8 @@ class SNMPCollector:
 
     def _setup_snmp(self):
         """配置 SNMP 连接参数"""
-        self.snmp_engine = SnmpEngine()
+        if self.snmp_engine is None:
+            self.snmp_engine = SnmpEngine()
 
         if self.version == 'v2c':
             # v2c 用团体名（暗号）认证
@@ -218,7 +225,8 @@ class SNMPCollector:
                 self.auth_data,
                 self.transport_target,
                 ContextData(),
-                ObjectType(ObjectIdentity(oid))
+                ObjectType(ObjectIdentity(oid)),
+                lookupMib=False,  # 只用数字 OID，不做 MIB 名称解析（解析开销比收发报文还大）
             )
 
             if error_indication:
@@ -239,16 +247,19 @@ class SNMPCollector:
         """遍历 OID 子树，返回 (oid, value) 列表"""
         results = []
         try:
-            # pysnmp 6.x 需要用循环调用 next_cmd，而不是 async for
+            # pysnmp 6.x 需要用循环调用 bulk_cmd，而不是 async for
+            # v2c/v3 都支持 GETBULK，一次取 WALK_MAX_REPETITIONS 条，比逐条 GETNEXT 少很多来回
             current_oid = ObjectType(ObjectIdentity(oid))
             while True:
-                error_indication, error_status, error_index, var_binds = await next_cmd(
+                error_indication, error_status, error_index, var_binds = await bulk_cmd(
                     self.snmp_engine,
                     self.auth_data,
                     self.transport_target,
                     ContextData(),
+                    0, WALK_MAX_REPETITIONS,
                     current_oid,
-                    lexicographicMode=False
+                    lexicographicMode=False,
+                    lookupMib=False,
                 )
 
                 if error_indication:
@@ -261,13 +272,20 @@ class SNMPCollector:
                 if not var_binds:
                     break
 
-                for var_bind in var_binds:
+                # next_cmd 返回的是按行组织的 varBindTable（每行一个 ObjectType 列表），兼容直接返回 ObjectType 的写法
+                rows = [row if isinstance(row, (list, tuple)) else [row] for row in var_binds]
+                for var_bind in (item for row in rows for item in row):
                     oid_str = str(var_bind[0])
-                    # 检查是否还在目标 OID 范围内
-                    if not oid_str.startswith(oid.rstrip('.')):
+                    # 检查是否还在目标 OID 范围内（后面加点，避免 ...1.2 匹配到 ...1.20）
+                    if not oid_str.startswith(oid.rstrip('.') + '.'):
+                        return results
+                    # 走到 MIB 末尾时设备回 endOfMibView，OID 原样返回，不停下来会一直循环
+                    if isinstance(var_bind[1], (EndOfMibView, NoSuchObject, NoSuchInstance)):
+                        return results
+                    if results and oid_str == results[-1][0]:
                         return results
                     results.append((oid_str, var_bind[1]))
-                    current_oid = ObjectType(var_bind[0])
+                    current_oid = ObjectType(ObjectIdentity(var_bind[0]))
         except Exception as e:
             logger.error(f"SNMP WALK 异常 [{self.ip}]: {e}")
 
@@ -346,11 +364,16 @@ class SNMPCollector:
         name_dict = { _extract_index(oid): str(val) for oid, val in rem_sys_name_list }
         port_dict = { _extract_index(oid): str(val) for oid, val in rem_port_id_list }
 
-        # 管理地址的索引更长，取最后5段
+        # 管理地址在索引里：lldpRemTimeMark.lldpRemLocalPortNum.lldpRemIndex.地址类型.地址长度.地址
+        # 前3段和邻居表的索引对应，地址类型1（IPv4）、长度4时后面4段就是 IP
         addr_dict = {}
+        prefix_len = len(OID_LLDP_REM_MAN_ADDR.split('.'))
         for oid, val in rem_man_addr_list:
-            key = _extract_index(oid, segments=5)
-            if isinstance(val, bytes):
+            index = oid.split('.')[prefix_len:]
+            key = '.'.join(index[:3])
+            if len(index) >= 9 and index[3] == '1' and index[4] == '4':
+                addr_dict[key] = '.'.join(index[5:9])
+            elif isinstance(val, bytes):
                 addr_dict[key] = '.'.join(str(b) for b in val)
             else:
                 addr_dict[key] = str(val)
@@ -6,6 +6,8 @@
 
 import sys
 import os
+import asyncio
+from collections import deque
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(ROOT_DIR)
@@ -14,6 +16,12 @@ from utils.log_setup import setup_logger
 
 logger = setup_logger("topology_builder", "topology.log")
 
+# 多层扫描配置，可用环境变量覆盖
+TOPOLOGY_SCAN_CONFIG = {
+    "concurrency": int(os.getenv("NETDEVOPS_TOPOLOGY_CONCURRENCY", "16")),  # 同一层同时采集的设备数
+    "device_timeout": float(os.getenv("NETDEVOPS_TOPOLOGY_DEVICE_TIMEOUT", "30")),  # 单台设备采集超时（秒）
+}
+
 
 class TopologyBuilder:
     """
@@ -228,10 +236,12 @@ class TopologyBuilder:
 
     async def build_topology_bfs(self, seed_ip, community='public', max_depth=3, snmp_version='v2c',
                                   username='', auth_protocol='none', auth_password='',
-                                  priv_protocol='none', priv_password=''):
+                                  priv_protocol='none', priv_password='',
+                                  collector_factory=None, concurrency=None, device_timeout=None):
         """
         广度优先扫描全网拓扑
         从种子设备开始，逐层发现邻居的邻居，直到没有新设备
+        同一层的设备并发采集（信号量限流），单台设备超时不拖累整层
 
         :param seed_ip: 种子设备IP
         :param community: SNMP团体名（v2c用）
@@ -242,67 +252,116 @@ class TopologyBuilder:
         :param auth_password: v3认证密码
         :param priv_protocol: v3加密协议
         :param priv_password: v3加密密码
+        :param collector_factory: 采集器工厂 ip -> 有 collect_all() 的采集器，默认按上面的 SNMP 参数创建 SNMPCollector
+        :param concurrency: 同时采集的设备数，默认 TOPOLOGY_SCAN_CONFIG["concurrency"]
+        :param device_timeout: 单台设备采集超时（秒），默认 TOPOLOGY_SCAN_CONFIG["device_timeout"]
+        :return: 扫描到的设备采集数据 {ip: collected_data}
         """
-        from core.topology.snmp_collector import SNMPCollector
-        import asyncio
-
         logger.info(f"开始广度优先扫描，种子设备：{seed_ip}，最大深度：{max_depth}")
 
-        # 待扫描队列：(设备IP, 深度)
-        queue = [(seed_ip, 0)]
+        if collector_factory is None:
+            collector_factory = self._snmp_collector_factory(
+                community, snmp_version, username, auth_protocol, auth_password, priv_protocol, priv_password,
+            )
+        all_devices_data = await self._scan_bfs(seed_ip, max_depth, collector_factory, concurrency, device_timeout)
 
-        while queue:
-            current_ip, depth = queue.pop(0)  # FIFO，广度优先
+        # 扫描完成，更新网络层级
+        self._update_layers()
 
-            # 跳过已访问的设备
-            if current_ip in self.visited:
-                continue
+        logger.info(f"广度优先扫描完成：{len(self.nodes)} 个节点，{len(self.links)} 条链路")
+        return all_devices_data
 
-            # 超过最大深度就停
-            if depth >= max_depth:
-                logger.info(f"达到最大深度 {max_depth}，停止扫描 [{current_ip}]")
-                continue
+    def _snmp_collector_factory(self, community, snmp_version, username, auth_protocol, auth_password,
+                                priv_protocol, priv_password):
+        """按 SNMP 参数创建 SNMPCollector 的工厂，同一次扫描的采集器共用一个 SnmpEngine"""
+        from core.topology import snmp_collector
+        from core.topology.snmp_collector import SNMPCollector
 
-            # 标记为已访问
-            self.visited.add(current_ip)
-            logger.info(f"扫描设备 [{current_ip}]，当前深度：{depth}")
+        engine = snmp_collector.SnmpEngine() if snmp_collector.PYSNMP_AVAILABLE else None
+
+        def factory(ip):
+            # 根据版本传不同参数
+            if snmp_version == 'v3':
+                return SNMPCollector(
+                    ip, version='v3', snmp_engine=engine,
+                    username=username,
+                    auth_protocol=auth_protocol,
+                    auth_password=auth_password,
+                    priv_protocol=priv_protocol,
+                    priv_password=priv_password,
+                )
+            return SNMPCollector(ip, community=community, snmp_engine=engine)
 
-            try:
-                # 创建采集器，根据版本传不同参数
-                if snmp_version == 'v3':
-                    collector = SNMPCollector(
-                        current_ip, version='v3',
-                        username=username,
-                        auth_protocol=auth_protocol,
-                        auth_password=auth_password,
-                        priv_protocol=priv_protocol,
-                        priv_password=priv_password,
-                    )
-                else:
-                    collector = SNMPCollector(current_ip, community=community)
-
-                # 采集这台设备的所有信息
-                collected_data = await collector.collect_all()
+        return factory
+
+    async def _scan_bfs(self, seed_ip, max_depth, collector_factory, concurrency=None, device_timeout=None):
+        """
+        按层同步的广度优先扫描：一层的设备一起采集，整层采完再展开下一层
+        设备IP在入队时就记进 visited，冗余上联指向同一台设备也只会采集一次
+
+        :return: 扫描到的设备采集数据 {ip: collected_data}
+        """
+        concurrency = concurrency or TOPOLOGY_SCAN_CONFIG["concurrency"]
+        device_timeout = device_timeout or TOPOLOGY_SCAN_CONFIG["device_timeout"]
+        semaphore = asyncio.Semaphore(concurrency)
+        all_devices_data = {}
+
+        frontier = deque()
+        if seed_ip not in self.visited and max_depth > 0:
+            self.visited.add(seed_ip)
+            frontier.append(seed_ip)
+
+        depth = 0
+        while frontier:
+            level = [frontier.popleft() for _ in range(len(frontier))]
+            logger.info(f"扫描第 {depth} 层：{len(level)} 台设备，并发 {concurrency}")
+            results = await asyncio.gather(*(
+                self._collect_device(ip, collector_factory, semaphore, device_timeout) for ip in level
+            ))
+
+            # 按入队顺序合并结果，拓扑和串行扫描一致
+            for current_ip, collected_data in zip(level, results):
+                if collected_data is None:
+                    continue
+                all_devices_data[current_ip] = collected_data
 
                 # 把这台设备的信息加入拓扑
                 self._add_device_to_topology(current_ip, collected_data)
 
-                # 把这台设备的邻居加入待扫描队列
-                neighbors = collected_data.get('lldp_neighbors', [])
-                for neighbor in neighbors:
+                # 把这台设备的邻居加入下一层
+                if depth + 1 >= max_depth:
+                    continue
+                for neighbor in collected_data.get('lldp_neighbors', []):
                     neighbor_ip = neighbor.get('remote_ip', '')
                     if neighbor_ip and neighbor_ip not in self.visited:
-                        queue.append((neighbor_ip, depth + 1))
+                        self.visited.add(neighbor_ip)
+                        frontier.append(neighbor_ip)
                         logger.info(f"发现新邻居 [{neighbor_ip}]，加入扫描队列（深度 {depth + 1}）")
 
-            except Exception as e:
-                logger.error(f"扫描设备 [{current_ip}] 失败：{e}")
-                continue
+            depth += 1
+            if depth >= max_depth:
+                logger.info(f"达到最大深度 {max_depth}，停止扫描")
 
-        # 扫描完成，更新网络层级
-        self._update_layers()
+        return all_devices_data
 
-        logger.info(f"广度优先扫描完成：{len(self.nodes)} 个节点，{len(self.links)} 条链路")
+    async def _collect_device(self, device_ip, collector_factory, semaphore, device_timeout):
+        """采集一台设备，失败或超时返回 None"""
+        async with semaphore:
+            logger.info(f"扫描设备 [{device_ip}]")
+            try:
+                collector = collector_factory(device_ip)
+                collected_data = await asyncio.wait_for(collector.collect_all(), timeout=device_timeout)
+                device_info = collected_data.get('device_info', {})
+                # SNMP 请求全部超时时 collect_all 不抛异常，只返回空数据，按采集失败处理，别把邻居节点的名字覆盖成空
+                if not device_info.get('sys_name') and not device_info.get('sys_descr'):
+                    logger.error(f"扫描设备 [{device_ip}] 失败：SNMP 无应答")
+                    return None
+                return collected_data
+            except asyncio.TimeoutError:
+                logger.error(f"扫描设备 [{device_ip}] 超时（{device_timeout}秒），跳过")
+            except Exception as e:
+                logger.error(f"扫描设备 [{device_ip}] 失败：{e}")
+            return None
 
     def _add_device_to_topology(self, device_ip, collected_data):
         """
@@ -486,68 +545,25 @@ class TopologyBuilder:
 
         logger.info(f"MAC 双向匹配完成，新增 {new_links_count} 条链路")
 
-    def build_topology_with_mac_fallback(self, seed_ip, community='public', max_depth=3,
-                                          snmp_version='v2c', username='', auth_protocol='none',
-                                          auth_password='', priv_protocol='none', priv_password=''):
+    async def build_topology_with_mac_fallback(self, seed_ip, community='public', max_depth=3,
+                                                snmp_version='v2c', username='', auth_protocol='none',
+                                                auth_password='', priv_protocol='none', priv_password='',
+                                                collector_factory=None, concurrency=None, device_timeout=None):
         """
         带 MAC 回退的拓扑发现
         先用 LLDP 发现链路，如果 LLDP 失效，用 MAC 表推导
+        参数同 build_topology_bfs
 
         这是创新点的核心算法！
         """
-        from core.topology.snmp_collector import SNMPCollector
-        import asyncio
-
         logger.info(f"开始带 MAC 回退的拓扑发现，种子：{seed_ip}")
 
         # 1. 先做 BFS 扫描，收集所有设备的数据
-        all_devices_data = {}  # {ip: collected_data}
-
-        queue = [(seed_ip, 0)]
-        while queue:
-            current_ip, depth = queue.pop(0)
-
-            if current_ip in self.visited:
-                continue
-            if depth >= max_depth:
-                continue
-
-            self.visited.add(current_ip)
-
-            try:
-                # 创建采集器
-                if snmp_version == 'v3':
-                    collector = SNMPCollector(
-                        current_ip, version='v3',
-                        username=username, auth_protocol=auth_protocol,
-                        auth_password=auth_password, priv_protocol=priv_protocol,
-                        priv_password=priv_password,
-                    )
-                else:
-                    collector = SNMPCollector(current_ip, community=community)
-
-                # 采集数据
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    collected_data = loop.run_until_complete(collector.collect_all())
-                finally:
-                    loop.close()
-                all_devices_data[current_ip] = collected_data
-
-                # 把设备加入拓扑
-                self._add_device_to_topology(current_ip, collected_data)
-
-                # 把邻居加入队列
-                neighbors = collected_data.get('lldp_neighbors', [])
-                for neighbor in neighbors:
-                    neighbor_ip = neighbor.get('remote_ip', '')
-                    if neighbor_ip and neighbor_ip not in self.visited:
-                        queue.append((neighbor_ip, depth + 1))
-
-            except Exception as e:
-                logger.error(f"扫描设备 [{current_ip}] 失败：{e}")
-                continue
+        if collector_factory is None:
+            collector_factory = self._snmp_collector_factory(
+                community, snmp_version, username, auth_protocol, auth_password, priv_protocol, priv_password,
+            )
+        all_devices_data = await self._scan_bfs(seed_ip, max_depth, collector_factory, concurrency, device_timeout)
 
         # 2. 用 MAC 双向匹配算法补充链路
         logger.info("LLDP 扫描完成，开始 MAC 双向匹配...")
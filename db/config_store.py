@@ -0,0 +1,187 @@
+"""
+配置版本的内容寻址存储（content-addressed store）
+current-configuration 每台设备 50~500KB，两次备份之间通常只改几行，原来每个版本都存一份完整文本。
+这里按内容的 sha256 存储（config_blobs 表）：
+1. 内容完全相同的版本直接复用已有的 blob，不再重复存储
+2. 新内容存成相对上一个版本的行级差量（delta），zlib 压缩后入库
+3. 差量链每隔 KEYFRAME_INTERVAL 个版本存一次完整快照（keyframe），限制还原时要回放的差量数量；
+   差量比完整快照还大时也直接存完整快照
+4. 还原时从最近的 keyframe 开始依次回放差量，结果按哈希缓存（内容寻址，缓存永远不会过期）
+"""
+
+import os
+import sys
+import json
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+from utils.diff_engine import diff_opcodes
+
+logger = setup_logger("config_store.py", "database.log")
+
+# 每隔多少个差量存一次完整快照
+KEYFRAME_INTERVAL = 20
+# zlib 压缩级别
+COMPRESS_LEVEL = 6
+# 还原结果缓存条数
+CACHE_SIZE = 64
+
+KIND_FULL = "full"
+KIND_DELTA = "delta"
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def make_delta(base_lines, new_lines):
+    """
+    计算行级差量：["c", i1, i2] 表示复制基准版本的 base_lines[i1:i2]，["i", [行...]] 表示插入新行
+    差异由 utils.diff_engine 计算（去掉相同头尾后 patience + Myers，配置通常只改中间几行）
+    """
+    ops = []
+    for tag, i1, i2, j1, j2 in diff_opcodes(base_lines, new_lines):
+        if tag == "equal":
+            ops.append(["c", i1, i2])
+        elif j2 > j1:  # replace / insert；delete 不需要记录
+            ops.append(["i", new_lines[j1:j2]])
+    return ops
+
+
+def apply_delta(base_lines, ops):
+    lines = []
+    for op in ops:
+        if op[0] == "c":
+            lines.extend(base_lines[op[1]:op[2]])
+        else:
+            lines.extend(op[1])
+    return lines
+
+
+class ConfigBlobStore:
+    """config_blobs 表的读写封装"""
+
+    def __init__(self, db, keyframe_interval=KEYFRAME_INTERVAL, cache_size=CACHE_SIZE):
+        """
+        :param db: DatabaseManager 实例
+        :param keyframe_interval: 差量链最大长度，超过就存完整快照
+        :param cache_size: 还原结果的LRU缓存条数
+        """
+        self.db = db
+        self.keyframe_interval = keyframe_interval
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _cache_get(self, blob_hash):
+        with self._cache_lock:
+            content = self._cache.get(blob_hash)
+            if content is not None:
+                self._cache.move_to_end(blob_hash)
+            return content
+
+    def _cache_put(self, blob_hash, content):
+        with self._cache_lock:
+            self._cache[blob_hash] = content
+            self._cache.move_to_end(blob_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _get_row(self, conn, blob_hash):
+        return conn.execute(
+            "SELECT hash, kind, base_hash, data, chain_depth FROM config_blobs WHERE hash = ?", (blob_hash,)
+        ).fetchone()
+
+    def put(self, conn, content, base_hash=None):
+        """
+        存储一份配置内容，返回它的哈希（调用方负责提交事务）
+        还原缓存在这里不更新：事务回滚后缓存里会留下库里不存在的版本，提交成功后由调用方 remember()
+        :param conn: 当前事务使用的连接
+        :param content: 配置文本
+        :param base_hash: 差量的基准（通常是同一设备上一个版本的哈希），不传则存完整快照
+        """
+        blob_hash = content_hash(content)
+        if self._get_row(conn, blob_hash) is not None:
+            logger.debug(f"配置内容已存在，复用blob {blob_hash[:12]}")
+            return blob_hash
+
+        raw = content.encode("utf-8")
+        full_data = zlib.compress(raw, COMPRESS_LEVEL)
+        kind, data, depth, stored_base = KIND_FULL, full_data, 0, None
+        base = self._get_row(conn, base_hash) if base_hash else None
+        if base is not None and base["chain_depth"] + 1 < self.keyframe_interval:
+            base_lines = self.get(base_hash, conn=conn).splitlines(keepends=True)
+            ops = make_delta(base_lines, content.splitlines(keepends=True))
+            delta_data = zlib.compress(json.dumps(ops, ensure_ascii=False).encode("utf-8"), COMPRESS_LEVEL)
+            if len(delta_data) < len(full_data):
+                kind, data, depth, stored_base = KIND_DELTA, delta_data, base["chain_depth"] + 1, base_hash
+
+        conn.execute(
+            """
+            INSERT INTO config_blobs (hash, kind, base_hash, data, raw_size, stored_size, chain_depth)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (blob_hash, kind, stored_base, sqlite3.Binary(data), len(raw), len(data), depth),
+        )
+        logger.debug(f"配置blob入库：{blob_hash[:12]} {kind} 原始{len(raw)}字节 -> 存储{len(data)}字节")
+        return blob_hash
+
+    def remember(self, blob_hash, content):
+        """put() 所在的事务提交成功后调用，把刚存的内容放进还原缓存"""
+        self._cache_put(blob_hash, content)
+
+    def get(self, blob_hash, conn=None):
+        """
+        按哈希还原配置内容：从最近的完整快照开始回放差量链；不存在返回None
+        :param conn: 调用方事务里的连接（可能读到还没提交的blob，这时还原结果不进缓存）
+        """
+        content = self._cache_get(blob_hash)
+        if content is not None:
+            return content
+        in_transaction = conn is not None
+        conn = conn or self.db.conn
+
+        # 沿 base_hash 往回找，直到完整快照或缓存命中
+        chain = []
+        current = blob_hash
+        lines = None
+        while current is not None:
+            cached = self._cache_get(current)
+            if cached is not None:
+                lines = cached.splitlines(keepends=True)
+                break
+            row = self._get_row(conn, current)
+            if row is None:
+                if not chain:
+                    return None
+                raise sqlite3.DatabaseError(f"配置差量链断裂：缺少blob {current}")
+            if row["kind"] == KIND_FULL:
+                lines = zlib.decompress(row["data"]).decode("utf-8").splitlines(keepends=True)
+                break
+            chain.append(row)
+            current = row["base_hash"]
+
+        for row in reversed(chain):
+            ops = json.loads(zlib.decompress(row["data"]).decode("utf-8"))
+            lines = apply_delta(lines, ops)
+        content = "".join(lines)
+        if not in_transaction:
+            self._cache_put(blob_hash, content)
+        return content
+
+    def stats(self):
+        """存储统计：blob数、完整快照/差量数、原始总大小、实际存储大小"""
+        row = self.db.conn.execute(
+            """
+            SELECT COUNT(*) AS blobs, SUM(kind = 'full') AS keyframes, SUM(kind = 'delta') AS deltas,
+                   COALESCE(SUM(raw_size), 0) AS raw_bytes, COALESCE(SUM(stored_size), 0) AS stored_bytes
+            FROM config_blobs
+            """
+        ).fetchone()
+        return dict(row)
@@ -0,0 +1,132 @@
+"""
+SQLite 连接池
+每个线程持有自己独立的连接（threading.local），连接创建时统一开启 WAL 日志并设置 synchronous / busy_timeout，
+替代原来所有线程（Flask 请求线程、ThreadPoolExecutor、Nornir 并发线程、告警引擎线程）共用一个连接的做法：
+1. 共用连接时，写操作全部串行在一个连接上，不同线程的事务会互相交错（A线程的commit把B线程写了一半的数据也提交了）
+2. WAL 模式下读写互不阻塞，多个读连接可以和一个写连接同时工作
+3. busy_timeout 让写锁冲突时等待重试，而不是直接抛 "database is locked"
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+
+logger = setup_logger("connection_pool.py", "database.log")
+
+# 每个新连接都会执行的PRAGMA（顺序执行）
+# journal_mode=WAL：读写并发，写操作不阻塞读
+# synchronous=NORMAL：WAL模式下只在checkpoint时fsync，断电最多丢最后一个事务，不会损坏数据库
+# busy_timeout：遇到写锁时最多等待的毫秒数
+# temp_store / cache_size：排序、临时表放内存，页缓存约16MB
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "cache_size": -16000,
+}
+
+# 内存数据库每个连接都是独立的库，不能按线程拆分，只能共用一个连接
+MEMORY_DB_PATHS = (":memory:", "")
+
+
+class SQLiteConnectionPool:
+    """按线程分配连接的SQLite连接池"""
+
+    def __init__(self, db_path, pragmas=None, timeout=30.0):
+        """
+        :param db_path: 数据库文件路径
+        :param pragmas: 连接创建时执行的PRAGMA，不传使用DEFAULT_PRAGMAS
+        :param timeout: sqlite3.connect 的锁等待超时（秒）
+        """
+        self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # 线程ID -> 连接，用于统一关闭和回收已退出线程的连接
+        self._shared_conn = None  # 内存数据库专用
+        self._closed = False
+
+    def _create_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for key, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {key}={value}")
+        return conn
+
+    def _prune_dead_threads(self):
+        """关闭已经退出的线程遗留的连接（线程池回收线程后，这些连接不会再被使用）"""
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._connections if i not in alive]:
+            try:
+                self._connections.pop(ident).close()
+            except sqlite3.Error:
+                pass
+
+    def get_connection(self):
+        """获取当前线程的连接，没有就新建一个"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("连接池已关闭")
+        if self.db_path in MEMORY_DB_PATHS:
+            with self._lock:
+                if self._shared_conn is None:
+                    self._shared_conn = self._create_connection()
+                return self._shared_conn
+
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        conn = self._create_connection()
+        with self._lock:
+            self._prune_dead_threads()
+            self._connections[threading.get_ident()] = conn
+        self._local.conn = conn
+        logger.debug(f"线程[{threading.current_thread().name}]新建数据库连接，当前连接数：{len(self._connections)}")
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        事务上下文：正常退出提交，异常回滚
+        用法：
+            with pool.transaction() as conn:
+                conn.executemany(sql, rows)
+        """
+        conn = self.get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def stats(self):
+        """连接池状态（连接数、日志模式），用于监控"""
+        conn = self.get_connection()
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        with self._lock:
+            count = len(self._connections) if self._shared_conn is None else 1
+        return {"connections": count, "journal_mode": journal_mode, "db_path": self.db_path}
+
+    def close_all(self):
+        """关闭池里所有连接"""
+        with self._lock:
+            conns = list(self._connections.values())
+            self._connections.clear()
+            if self._shared_conn is not None:
+                conns.append(self._shared_conn)
+                self._shared_conn = None
+            self._closed = True
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
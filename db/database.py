@@ -5,35 +5,168 @@ import sys
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 from utils.log_setup import setup_logger
+from utils.diff_engine import DiffCache, diff_texts
+from db.connection_pool import SQLiteConnectionPool
+from db.write_behind import WriteBehindWriter
+from db.rollup import RollupManager
+from db.config_store import ConfigBlobStore
+from db.pagination import KeysetIterator, DEFAULT_BATCH_SIZE
+from db.migrations import apply_migrations, get_schema_version
+from db.search import FleetSearch, SCOPE_CONFIG, SCOPE_COMMAND
 import sqlite3
 import logging
 import json
+from contextlib import contextmanager
 
 # 导入时间datetime模块，使记录可以按天数查询
 from datetime import timedelta
 
 DB_PATH = os.path.join(ROOT_DIR, "netdevops.db")
+# 写回批量入库（可选）：设置环境变量 NETDEVOPS_DB_WRITE_BEHIND=1 开启
+WRITE_BEHIND_ENABLED = os.getenv("NETDEVOPS_DB_WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_CONFIG = {
+    "max_queue": 10000,  # 队列容量，满了写入方阻塞
+    "batch_size": 200,  # 攒够多少条提交一次
+    "flush_interval": 1.0,  # 最多等待多少秒提交一次
+}
+
+# 档案卡写入/更新的SQL，单条和批量（executemany）共用
+CARD_INSERT_SQL = """
+INSERT OR REPLACE INTO physical_device_cards 
+(device_id, name, ip_address, vendor, check_status, up_interfaces, down_interface, 
+ total_interfaces, cpu_usage, memory_usage, reachable, version, status, 
+ last_check_time, create_time, up_count, down_count, total_count, cpu_pct, mem_pct)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+CARD_UPDATE_SQL = """
+UPDATE physical_device_cards 
+SET check_status=?, up_interfaces=?, down_interface=?, total_interfaces=?, 
+    cpu_usage=?, memory_usage=?, reachable=?, version=?, status=?, last_check_time=?,
+    up_count=?, down_count=?, total_count=?, cpu_pct=?, mem_pct=?
+WHERE device_id = ?
+"""
+# 健康检查历史写入的SQL，单条和批量（executemany）共用
+HEALTH_RECORD_INSERT_SQL = """
+INSERT INTO health_check_records 
+(host, device_name, version, check_time, status, check_status,
+up_interface, down_interface, total_interface, CPU_usage, memory_usage,
+error_message, device_health_issues, reachable, cpu_pct, mem_pct)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
 logger = setup_logger("database.py", "database.log")
 
 
+def to_percent(value):
+    """把 "23%" / "45.0%" / 23 这类使用率转成float，"N/A" 等无法解析的返回None（写入数值指标列用）"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return float(str(value).strip().rstrip("%"))
+    except (TypeError, ValueError):
+        return None
+
+
+def to_int(value):
+    """把 20 / "20" 这类计数转成int，"未知" 等无法解析的返回None"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
 class DatabaseManager:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, use_pool=True):
+        """
+        :param db_path: 数据库路径，不传使用项目根目录的netdevops.db
+        :param use_pool: 是否使用按线程分配的连接池（WAL模式）；False为旧的单连接模式，仅用于基准对比
+        """
         self.path = db_path if db_path else DB_PATH
-        self.conn = None
+        self.use_pool = use_pool
+        self.pool = None
+        self._conn = None
+        self.write_behind = None
+        self.rollups = RollupManager(self)
+        self.config_store = ConfigBlobStore(self)
+        self.fleet_search = FleetSearch(self)
+        self.diff_cache = DiffCache()
         self.connect()
         self.create_tables()
+        self.migrate()
         logger.debug(f"数据库初始化成功（成功建立连接，插入表格），路径：{self.path}")
 
+    @property
+    def conn(self):
+        """当前线程使用的连接：连接池模式下每个线程拿到自己的连接"""
+        if self.pool is not None:
+            return self.pool.get_connection()
+        return self._conn
+
+    @contextmanager
+    def transaction(self):
+        """事务上下文：正常退出提交，异常回滚（连接池模式和单连接模式通用）"""
+        if self.pool is not None:
+            with self.pool.transaction() as conn:
+                yield conn
+            return
+        try:
+            yield self._conn
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+
     def connect(self):
         try:
-            self.conn = sqlite3.connect(self.path, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
+            if self.use_pool:
+                self.pool = SQLiteConnectionPool(self.path)
+                self.pool.get_connection()
+            else:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._conn.row_factory = sqlite3.Row
             logger.debug("成功建立数据库连接！")
         except sqlite3.Error as e:
             error_msg = str(e)
             logger.error(f"数据库连接出现错误 {error_msg[:100]}")
             raise
 
+    # ============================================================
+    # 写回批量入库（可选）
+    # ============================================================
+
+    def enable_write_behind(self, **kwargs):
+        """
+        开启写回队列：log_check_device / log_backup / save_command_history / add_alert_history / log_system_metrics
+        不再逐条提交，而是由后台写线程批量 executemany 提交。查询会有最多 flush_interval 秒的延迟可见
+        :param kwargs: 覆盖 WRITE_BEHIND_CONFIG 里的配置
+        """
+        if self.pool is None:
+            raise RuntimeError("写回队列需要连接池模式（use_pool=True）")
+        if self.write_behind is not None:
+            return self.write_behind
+        config = {**WRITE_BEHIND_CONFIG, **kwargs}
+        self.write_behind = WriteBehindWriter(self.pool, **config)
+        self.write_behind.start()
+        return self.write_behind
+
+    def disable_write_behind(self):
+        """关闭写回队列（会先写完队列里剩余的记录）"""
+        if self.write_behind is not None:
+            self.write_behind.close()
+            self.write_behind = None
+
+    def flush_writes(self):
+        """等待写回队列里已有的记录全部入库（未开启写回时什么也不做）"""
+        if self.write_behind is not None:
+            self.write_behind.flush()
+
+    def get_write_behind_metrics(self):
+        """写回队列指标：队列深度、提交批次数、提交耗时等；未开启返回None"""
+        if self.write_behind is None:
+            return None
+        return self.write_behind.get_metrics()
+
     def create_tables(self):
         sql_commands = [
             # 设备信息表
@@ -63,7 +196,9 @@ class DatabaseManager:
                 start_time TIMESTAMP NOT NULL,      -- 开始时间
                 end_time TIMESTAMP,                 -- 结束时间
                 duration REAL,                      -- 耗时（秒）
-                checksum TEXT,                      -- 文件校验和（可选）
+                checksum TEXT,                      -- 备份内容的sha256（备份仓库里的对象名）
+                dedup INTEGER,                      -- 1: 内容和仓库里已有的对象相同，没有新增存储
+                stored_size INTEGER,                -- 本次备份新增的磁盘占用（压缩后字节数，去重命中为0）
                 FOREIGN KEY (hostname) REFERENCES devices (hostname)
             );
             """,
@@ -87,7 +222,10 @@ class DatabaseManager:
             -- 1:1对应base_result错误/问题/可达性字段（2个数据库适配调整）
             error_message TEXT DEFAULT '',         -- 错误信息，对应base_result["error_message"]
             device_health_issues TEXT DEFAULT '',  -- 健康问题列表（适配：列表转分号分隔字符串，如"端口down;CPU过高"）
-            reachable TEXT DEFAULT '可达'          -- 设备可达性（适配：布尔转文本，可达/不可达，对应base_result["reachable"]）
+            reachable TEXT DEFAULT '可达',         -- 设备可达性（适配：布尔转文本，可达/不可达，对应base_result["reachable"]）
+            -- 数值指标列（写入时由CPU_usage/memory_usage解析，N/A为NULL），聚合、告警比较都用这两列
+            cpu_pct REAL,
+            mem_pct REAL
             );
             """,
             # 新增：系统指标表
@@ -124,7 +262,13 @@ class DatabaseManager:
                 version TEXT DEFAULT '未知', -- 设备版本
                 status TEXT DEFAULT 'unknown', -- 健康状态：unknown/healthy/degraded/failed（父类NetworkResource的status）
                 last_check_time TEXT DEFAULT '未检查', -- 最后检查时间
-                create_time TEXT NOT NULL     -- 档案卡创建时间
+                create_time TEXT NOT NULL,    -- 档案卡创建时间
+                -- 数值指标列（写入时由上面的文本列解析，无法解析为NULL），全网汇总统计用
+                up_count INTEGER,
+                down_count INTEGER,
+                total_count INTEGER,
+                cpu_pct REAL,
+                mem_pct REAL
             );
             """,
             # 新增：配置版本管理表（中优先级 #6）
@@ -139,9 +283,23 @@ class DatabaseManager:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 created_by TEXT DEFAULT 'system',   -- 创建者（system/user）
                 comment TEXT,                       -- 版本备注
+                blob_hash TEXT,                     -- 内容在config_blobs里的sha256（有值时config_content为空）
                 FOREIGN KEY (hostname) REFERENCES devices (hostname)
             );
             """,
+            # 配置内容寻址存储：完整快照或相对base_hash的差量，zlib压缩（由 db/config_store.py 维护）
+            """
+            CREATE TABLE IF NOT EXISTS config_blobs (
+                hash TEXT PRIMARY KEY,              -- 配置内容的sha256
+                kind TEXT NOT NULL,                 -- full：完整快照；delta：差量
+                base_hash TEXT,                     -- 差量的基准blob
+                data BLOB NOT NULL,                 -- zlib压缩后的内容/差量
+                raw_size INTEGER NOT NULL,          -- 原始配置字节数
+                stored_size INTEGER NOT NULL,       -- 实际存储字节数
+                chain_depth INTEGER DEFAULT 0,      -- 距离最近完整快照的差量个数
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """,
             # 新增：配置合规检查规则表
             """
             CREATE TABLE IF NOT EXISTS compliance_rules (
@@ -274,6 +432,46 @@ class DatabaseManager:
                 FOREIGN KEY (rule_id) REFERENCES alert_rules (id)
             );
             """,
+            # 健康检查时序汇总表：5m/1h/1d 三级，每台设备每个时间桶一行（由 db/rollup.py 维护）
+            """
+            CREATE TABLE IF NOT EXISTS health_check_rollups (
+                bucket TEXT NOT NULL,                  -- 粒度：5m / 1h / 1d
+                bucket_start TEXT NOT NULL,            -- 时间桶起点（YYYY-MM-DD HH:MM:SS）
+                device_name TEXT NOT NULL,
+                samples INTEGER NOT NULL,              -- 桶内检查次数
+                healthy_count INTEGER DEFAULT 0,       -- status=healthy 的次数
+                reachable_count INTEGER DEFAULT 0,     -- 可达的次数
+                reachability_ratio REAL,               -- 可达率
+                cpu_count INTEGER DEFAULT 0,           -- 有效CPU样本数（N/A不计）
+                cpu_min REAL, cpu_max REAL, cpu_avg REAL,
+                mem_count INTEGER DEFAULT 0,           -- 有效内存样本数
+                mem_min REAL, mem_max REAL, mem_avg REAL,
+                up_min INTEGER, up_max INTEGER, up_avg REAL,
+                down_min INTEGER, down_max INTEGER, down_avg REAL,
+                UNIQUE (bucket, device_name, bucket_start)
+            );
+            """,
+            # 系统指标时序汇总表
+            """
+            CREATE TABLE IF NOT EXISTS system_metrics_rollups (
+                bucket TEXT NOT NULL,
+                bucket_start TEXT NOT NULL,
+                samples INTEGER NOT NULL,
+                cpu_min REAL, cpu_max REAL, cpu_avg REAL,
+                mem_min REAL, mem_max REAL, mem_avg REAL,
+                UNIQUE (bucket, bucket_start)
+            );
+            """,
+            # 汇总水位线：每个数据源每一级已经汇总到的时间（不含）
+            """
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                source TEXT NOT NULL,                  -- health / system
+                bucket TEXT NOT NULL,                  -- 5m / 1h / 1d
+                watermark TEXT NOT NULL,
+                updated_at TEXT,
+                PRIMARY KEY (source, bucket)
+            );
+            """,
             # 用户配置表：存储用户设置（邮箱等）
             """
             CREATE TABLE IF NOT EXISTS user_settings (
@@ -297,6 +495,14 @@ class DatabaseManager:
             self.conn.rollback()
             raise
 
+    def migrate(self):
+        """
+        数据库迁移：在建表之后执行，按版本号顺序执行 db/migrations.py 里还没执行过的迁移
+        已执行的版本记录在 schema_version 表里，每个迁移只会执行一次
+        """
+        applied = apply_migrations(self)
+        logger.debug(f"数据库迁移完成，本次执行{len(applied)}个迁移，当前版本：{get_schema_version(self.conn)}")
+
     # 向系统指示表中填入数据
     def log_system_metrics(self, metrics_dict):
         try:
@@ -309,6 +515,9 @@ class DatabaseManager:
             VALUES ({placeholders})
             """
             values = list(metrics_dict.values())
+            if self.write_behind is not None:
+                self.write_behind.submit(sql, values)
+                return
             cursor = self.conn.cursor()
             cursor.execute(sql, values)
             self.conn.commit()
@@ -321,12 +530,20 @@ class DatabaseManager:
 
     # 向备份记录表格中填入数据
     def log_backup(
-        self, hostname, backup_path, status="success", error_message=None, start_time=None, end_time=None, backup_size=0
+        self, hostname, backup_path, status="success", error_message=None, start_time=None, end_time=None, backup_size=0,
+        checksum=None, dedup=None, stored_size=None,
     ):
+        """
+        :param backup_size: 备份内容的原始字节数
+        :param checksum: 备份内容的sha256（存进备份仓库的备份才有）
+        :param dedup: 内容是否和仓库里已有的对象相同
+        :param stored_size: 本次新增的磁盘占用
+        """
         sql = """
         INSERT INTO backup_records 
-        (hostname, backup_path, backup_size, status, error_message, start_time, end_time, duration)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        (hostname, backup_path, backup_size, status, error_message, start_time, end_time, duration,
+         checksum, dedup, stored_size)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         if start_time is None:
             start_time = datetime.now()
@@ -335,7 +552,13 @@ class DatabaseManager:
         duration = None
         if start_time and end_time:
             duration = (end_time - start_time).total_seconds()
-        params = (hostname, backup_path, backup_size, status, error_message, start_time, end_time, duration)
+        if dedup is not None:
+            dedup = int(bool(dedup))
+        params = (hostname, backup_path, backup_size, status, error_message, start_time, end_time, duration,
+                  checksum, dedup, stored_size)
+        if self.write_behind is not None:
+            self.write_behind.submit(sql, params)
+            return
         cursor = self.conn.cursor()
         try:
             cursor.execute(sql, params)
@@ -348,51 +571,119 @@ class DatabaseManager:
             self.conn.rollback()
             raise
 
-    # 从数据库拿备份历史信息
-    def get_recent_backups(self, hostname=None, limit=None, days=None):
+    def get_backup_by_path(self, backup_path):
+        """按逻辑路径查最新一条成功的备份记录（下载时用来找备份仓库里的对象），没有返回None"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """
+            SELECT * FROM backup_records WHERE backup_path = ? AND status = 'success'
+            ORDER BY id DESC LIMIT 1
+            """,
+            (backup_path,),
+        )
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    def select_backup_set(self, date=None, since=None, until=None, hostnames=None, ids=None, latest=False):
+        """
+        选出一批成功的备份记录（打包下载用），按设备名、备份时间排序
+        :param date: 某一天的备份，如 "2026-10-17"
+        :param since: 备份时间下限（含），ISO 格式
+        :param until: 备份时间上限（不含），ISO 格式
+        :param hostnames: 设备名列表
+        :param ids: 备份记录ID列表
+        :param latest: 每台设备只保留（符合条件的）最新一次备份
+        """
+        conditions, params = ["status = 'success'"], []
+        if date:
+            day = datetime.strptime(date, "%Y-%m-%d")
+            conditions.append("start_time >= ? AND start_time < ?")
+            params += [day.strftime("%Y-%m-%d"), (day + timedelta(days=1)).strftime("%Y-%m-%d")]
+        if since:
+            conditions.append("start_time >= ?")
+            params.append(since)
+        if until:
+            conditions.append("start_time < ?")
+            params.append(until)
+        if hostnames:
+            conditions.append(f"hostname IN ({','.join('?' * len(hostnames))})")
+            params += list(hostnames)
+        if ids:
+            conditions.append(f"id IN ({','.join('?' * len(ids))})")
+            params += [int(record_id) for record_id in ids]
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT id, hostname, backup_path, backup_size, start_time, checksum FROM backup_records
+            WHERE {' AND '.join(conditions)} ORDER BY hostname, start_time, id
+            """,
+            params,
+        )
+        records = [dict(row) for row in cursor.fetchall()]
+        if latest:
+            newest = {record["hostname"]: record for record in records}
+            records = [record for record in records if newest[record["hostname"]] is record]
+        return records
+
+    def get_backup_savings(self, days=None):
+        """
+        备份仓库节省的磁盘空间：原来每次备份存一份完整文本，现在去重+压缩
+        没有 stored_size 的老记录（直接写文件的备份）按原始大小计入
+        :param days: 只统计最近多少天，不传统计全部
+        :return: backups/dedup_hits/raw_bytes/stored_bytes/saved_bytes/saved_pct
+        """
         sql = """
-        SELECT * FROM backup_records 
-        WHERE 1=1
+        SELECT COUNT(*) AS backups,
+               COALESCE(SUM(dedup), 0) AS dedup_hits,
+               COALESCE(SUM(backup_size), 0) AS raw_bytes,
+               COALESCE(SUM(COALESCE(stored_size, backup_size)), 0) AS stored_bytes
+        FROM backup_records WHERE status = 'success'
         """
         params = []
-        if hostname:
-            sql += " AND hostname = ?"
-            params.append(hostname)
         if days and days > 0:
-            start_time = datetime.now() - timedelta(days=days)
             sql += " AND start_time >= ?"
-            params.append(start_time.isoformat())
-        sql += " ORDER BY start_time DESC"
-        if limit and limit > 0:
-            sql += " LIMIT ?"
-            params.append(limit)
+            params.append((datetime.now() - timedelta(days=days)).isoformat())
         cursor = self.conn.cursor()
+        cursor.execute(sql, params)
+        result = dict(cursor.fetchone())
+        result["saved_bytes"] = result["raw_bytes"] - result["stored_bytes"]
+        result["saved_pct"] = round(result["saved_bytes"] * 100 / result["raw_bytes"], 2) if result["raw_bytes"] else 0.0
+        return result
+
+    # 从数据库拿备份历史信息
+    def get_recent_backups(self, hostname=None, limit=None, days=None):
         try:
-            cursor.execute(sql, params)
-            results = cursor.fetchall()
-            records = [dict(record) for record in results]
-            for record in records:
-                for key in ["start_time", "end_time"]:
-                    if record[key] and isinstance(record[key], datetime):
-                        record[key] = record[key].isoformat()
-                        # .isoformat() 是时间对象的专属方法,转换成字符串
+            records = list(self.iter_recent_backups(hostname=hostname, days=days, limit=limit))
             logger.debug(f"成功查询到{len(records)}条备份记录")
             return records
         except sqlite3.Error as e:
             logger.error(f"查询备份记录失败: {e}")
             raise
 
-    # 向健康检查表格填入数据
-    def log_check_device(self, adapted_result):
-        sql = """
-        INSERT INTO health_check_records 
-        (host, device_name, version, check_time, status, check_status,
-        up_interface, down_interface, total_interface, CPU_usage, memory_usage,
-        error_message, device_health_issues, reachable)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        # 对应SQL的字段值（顺序和SQL里的字段完全一致！）
-        values = (
+    def iter_recent_backups(self, hostname=None, days=None, cursor=None, limit=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        逐批读取备份记录（按 start_time, id 倒序的键集分页），参数同 get_recent_backups
+        :param cursor: 上一页的游标（迭代结束后从返回的迭代器 next_cursor 取下一页游标）
+        :param limit: 页大小，不传读完所有匹配记录
+        :param batch_size: 每批 fetchmany 的行数
+        """
+        conditions, params = [], []
+        if hostname:
+            conditions.append("hostname = ?")
+            params.append(hostname)
+        if days and days > 0:
+            start_time = datetime.now() - timedelta(days=days)
+            conditions.append("start_time >= ?")
+            params.append(start_time.isoformat())
+        return KeysetIterator(
+            self, "backup_records", "*", "start_time", conditions, params,
+            cursor=cursor, limit=limit, batch_size=batch_size,
+        )
+
+    @staticmethod
+    def _check_record_params(adapted_result):
+        """健康检查记录对应SQL的字段值（顺序和 HEALTH_RECORD_INSERT_SQL 里的字段完全一致！）"""
+        return (
             adapted_result["host"],
             adapted_result["device_name"],
             adapted_result["version"],
@@ -407,7 +698,17 @@ class DatabaseManager:
             adapted_result["error_message"],
             adapted_result["device_health_issues"],
             adapted_result["reachable"],
+            to_percent(adapted_result["CPU_usage"]),
+            to_percent(adapted_result["memory_usage"]),
         )
+
+    # 向健康检查表格填入数据
+    def log_check_device(self, adapted_result):
+        sql = HEALTH_RECORD_INSERT_SQL
+        values = self._check_record_params(adapted_result)
+        if self.write_behind is not None:
+            self.write_behind.submit(sql, values)
+            return True
         cursor = self.conn.cursor()
         try:
             # 连接数据库（SQLite自动创建连接，增删改查后必须提交+关闭）
@@ -421,6 +722,28 @@ class DatabaseManager:
             self.conn.rollback()
             return False
 
+    def batch_log_check_devices(self, adapted_results):
+        """
+        批量写入健康检查记录（一轮检查结束后一个事务 executemany，开启写回时交给写回线程攒批）
+        :param adapted_results: 适配过数据库字段的检查结果列表（见 core.health_check.engine.to_db_record）
+        :return: 写入（或提交给写回线程）的条数
+        """
+        if not adapted_results:
+            return 0
+        params = [self._check_record_params(record) for record in adapted_results]
+        if self.write_behind is not None:
+            for values in params:
+                self.write_behind.submit(HEALTH_RECORD_INSERT_SQL, values)
+            return len(params)
+        try:
+            with self.transaction() as conn:
+                conn.executemany(HEALTH_RECORD_INSERT_SQL, params)
+        except sqlite3.Error as e:
+            logger.error(f"健康检查历史批量入库失败（{len(params)}条，已回滚）：{str(e)[:100]}")
+            raise
+        logger.info(f"健康检查历史批量入库完成：{len(params)}条")
+        return len(params)
+
     # 从数据库拿历史健康检查状态信息
     def get_health_check_history(self, device_name=None, limit=None, days=None):
         """
@@ -429,38 +752,92 @@ class DatabaseManager:
         :param limit: 返回最新的N条记录，默认10条
         :return: 健康检查历史记录列表（字典格式）
         """
-        # 基础SQL，WHERE 1=1方便拼接条件
-        sql = """
-        SELECT * FROM health_check_records 
-        WHERE 1=1
+        try:
+            records = list(self.iter_health_check_history(device_name=device_name, days=days, limit=limit))
+            logger.debug(f"成功查询到{len(records)}条健康检查历史记录")
+            return records
+        except sqlite3.Error as e:
+            logger.error(f"查询健康检查历史记录失败: {e}")
+            raise
+
+    def iter_health_check_history(self, device_name=None, days=None, cursor=None, limit=None, batch_size=DEFAULT_BATCH_SIZE):
         """
-        params = []
-        # 拼接设备名条件（精准查单设备，适配档案卡单独的历史按钮）
+        逐批读取健康检查历史（按 check_time, id 倒序的键集分页），内存占用和结果条数无关
+        :param cursor: 上一页的游标（迭代结束后从返回的迭代器 next_cursor 取下一页游标）
+        :param limit: 页大小，不传读完所有匹配记录
+        :param batch_size: 每批 fetchmany 的行数
+        """
+        conditions, params = [], []
         if device_name:
-            sql += " AND device_name = ?"
+            conditions.append("device_name = ?")
             params.append(device_name)
         if days and days > 0:
             start_time = datetime.now() - timedelta(days=days)
-            sql += " AND check_time >= ?"
+            conditions.append("check_time >= ?")
             params.append(start_time.isoformat())
-        # 按检查时间倒序，限制返回条数（最新的在最前面）
-        sql += " ORDER BY check_time DESC"
-        if limit and limit > 0:
-            sql += " LIMIT ?"
-            params.append(limit)
-        cursor = self.conn.cursor()
+        return KeysetIterator(
+            self, "health_check_records", "*", "check_time", conditions, params,
+            cursor=cursor, limit=limit, batch_size=batch_size,
+        )
+
+    # ============================================================
+    # 时序汇总（5m/1h/1d）与保留策略，实现见 db/rollup.py
+    # ============================================================
+
+    def run_rollups(self, now=None):
+        """执行一轮汇总和原始数据清理（定时任务每5分钟调用一次）"""
+        return self.rollups.run(now=now)
+
+    def get_health_trend(self, device_name=None, days=7, granularity=None):
+        """
+        健康检查趋势：按时间桶返回CPU/内存最小/最大/平均值、端口UP/DOWN数、可达率
+        :param device_name: 设备名（可选，不传返回所有设备）
+        :param days: 查询最近N天，跨度越长自动使用越粗的汇总粒度
+        :param granularity: 强制指定粒度 5m/1h/1d
+        """
         try:
-            # 执行查询，参数化防SQL注入
-            cursor.execute(sql, params)
-            results = cursor.fetchall()
-            # 把查询结果转成字典（和备份历史一致的格式）
-            records = [dict(record) for record in results]
-            # 日志打印查询结果数
-            logger.debug(f"成功查询到{len(records)}条健康检查历史记录")
-            return records
+            return self.rollups.get_series("health", days=days, key=device_name, granularity=granularity)
         except sqlite3.Error as e:
-            # 异常日志+抛错，和备份历史的异常处理一致
-            logger.error(f"查询健康检查历史记录失败: {e}")
+            logger.error(f"查询健康检查趋势失败: {e}")
+            raise
+
+    def get_system_metrics_trend(self, days=1, granularity=None):
+        """系统指标趋势（CPU/内存最小/最大/平均值），粒度规则同 get_health_trend"""
+        try:
+            return self.rollups.get_series("system", days=days, granularity=granularity)
+        except sqlite3.Error as e:
+            logger.error(f"查询系统指标趋势失败: {e}")
+            raise
+
+    def get_health_summary(self, days=7):
+        """每台设备近N天的健康汇总（样本数、健康率、可达率、CPU/内存均值峰值），从汇总表计算"""
+        try:
+            return self.rollups.summarize_health(days=days)
+        except sqlite3.Error as e:
+            logger.error(f"查询健康汇总失败: {e}")
+            raise
+
+    def get_health_issue_counts(self, days=7, top=10):
+        """
+        近N天健康问题出现次数TOP N（device_health_issues 是分号分隔的字符串，拆开后计数）
+        :return: [(问题, 次数), ...]
+        """
+        sql = """
+        SELECT device_health_issues, COUNT(*) AS times FROM health_check_records
+        WHERE check_time >= ? AND device_health_issues NOT IN ('', '无')
+        GROUP BY device_health_issues
+        """
+        start_time = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            counts = {}
+            for row in self.conn.execute(sql, (start_time,)):
+                for issue in row["device_health_issues"].split(";"):
+                    issue = issue.strip()
+                    if issue:
+                        counts[issue] = counts.get(issue, 0) + row["times"]
+            return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top]
+        except sqlite3.Error as e:
+            logger.error(f"统计健康问题失败: {e}")
             raise
 
     # 往空白表里填单条档案卡数据
@@ -469,15 +846,21 @@ class DatabaseManager:
         单张物理设备档案卡写入数据库
         :param card_dict: PhysicalDevice对象转的字典（含所有字段）
         """
-        sql = """
-        INSERT OR REPLACE INTO physical_device_cards 
-        (device_id, name, ip_address, vendor, check_status, up_interfaces, down_interface, 
-         total_interfaces, cpu_usage, memory_usage, reachable, version, status, 
-         last_check_time, create_time)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(CARD_INSERT_SQL, self._card_insert_params(card_dict))
+            self.conn.commit()
+            logger.info(f"档案卡写入数据库成功：设备[{card_dict['name']}]")
+        except sqlite3.Error as e:
+            error_msg = str(e)
+            logger.error(f"档案卡写入数据库失败 {card_dict['name']}：{error_msg[:100]}")
+            self.conn.rollback()
+            raise
+
+    @classmethod
+    def _card_insert_params(cls, card_dict):
         # 按表字段顺序取值，和PhysicalDevice属性严格对齐
-        params = (
+        return (
             card_dict["id"],
             card_dict["name"],
             card_dict["ip_address"],
@@ -493,28 +876,99 @@ class DatabaseManager:
             card_dict.get("status", "unknown"),
             card_dict.get("last_check", "未检查"),
             card_dict["create_time"],
+        ) + cls._card_numeric_values(card_dict)
+
+    @classmethod
+    def _card_update_params(cls, card_dict):
+        return (
+            card_dict.get("check_status", "未知"),
+            card_dict.get("up_interfaces", "未知"),
+            card_dict.get("down_interface", "未知"),
+            card_dict.get("total_interfaces", "未知"),
+            card_dict.get("cpu_usage", "N/A"),
+            card_dict.get("memory_usage", "N/A"),
+            card_dict.get("reachable", "未检测"),
+            card_dict.get("version", "未知"),
+            card_dict.get("status", "unknown"),
+            card_dict.get("last_check_time", "未检查"),  # 修正：使用正确的字段名
+            *cls._card_numeric_values(card_dict),
+            card_dict["id"],  # 更新条件：主键device_id（SW1/SW2）
         )
-        cursor = self.conn.cursor()
+
+    @staticmethod
+    def _card_numeric_values(card_dict):
+        """档案卡数值指标列的值：(up_count, down_count, total_count, cpu_pct, mem_pct)"""
+        return (
+            to_int(card_dict.get("up_interfaces")),
+            to_int(card_dict.get("down_interface")),
+            to_int(card_dict.get("total_interfaces")),
+            to_percent(card_dict.get("cpu_usage")),
+            to_percent(card_dict.get("memory_usage")),
+        )
+
+    def get_fleet_metrics(self):
+        """
+        全网汇总指标（直接在SQL里聚合档案卡的数值列）：设备数、平均/最高CPU和内存、接口UP/DOWN总数
+        没有上报CPU/内存的设备（N/A）不参与平均值计算
+        """
+        sql = """
+        SELECT COUNT(*) AS device_count,
+               COUNT(cpu_pct) AS cpu_reported,
+               ROUND(AVG(cpu_pct), 2) AS avg_cpu,
+               MAX(cpu_pct) AS max_cpu,
+               COUNT(mem_pct) AS memory_reported,
+               ROUND(AVG(mem_pct), 2) AS avg_memory,
+               MAX(mem_pct) AS max_memory,
+               COALESCE(SUM(up_count), 0) AS up_interfaces,
+               COALESCE(SUM(down_count), 0) AS down_interfaces,
+               COALESCE(SUM(total_count), 0) AS total_interfaces,
+               SUM(status = 'healthy') AS healthy_devices
+        FROM physical_device_cards
+        """
         try:
-            cursor.execute(sql, params)
-            self.conn.commit()
-            logger.info(f"档案卡写入数据库成功：设备[{card_dict['name']}]")
+            return dict(self.conn.execute(sql).fetchone())
         except sqlite3.Error as e:
-            error_msg = str(e)
-            logger.error(f"档案卡写入数据库失败 {card_dict['name']}：{error_msg[:100]}")
-            self.conn.rollback()
+            logger.error(f"查询全网汇总指标失败：{str(e)[:100]}")
+            raise
+
+    def get_latest_device_metrics(self, device_name=None, host=None):
+        """
+        某台设备最新一次健康检查的数值指标（告警引擎用），按设备名或IP查询
+        :return: {"device_name", "host", "check_time", "cpu_pct", "mem_pct", "up_interface", "down_interface"}，没有记录返回None
+        """
+        if device_name:
+            condition, value = "device_name = ?", device_name
+        elif host:
+            condition, value = "host = ?", host
+        else:
+            return None
+        sql = f"""
+        SELECT device_name, host, check_time, cpu_pct, mem_pct, up_interface, down_interface
+        FROM health_check_records WHERE {condition}
+        ORDER BY check_time DESC, id DESC LIMIT 1
+        """
+        try:
+            row = self.conn.execute(sql, (value,)).fetchone()
+            return dict(row) if row else None
+        except sqlite3.Error as e:
+            logger.error(f"查询设备最新指标失败：{str(e)[:100]}")
             raise
 
     def batch_add_physical_cards(self, card_list):
         """
         批量写入物理设备档案卡（适配你从YAML加载的档案卡列表）
+        一次事务内 executemany，失败整体回滚
         :param card_list: PhysicalDevice对象转的字典列表
         """
         if not card_list:
             logger.warning("无档案卡可批量写入数据库")
             return
-        for card in card_list:  # card是字典，card_list是列表元素是字典,原来的档案卡列表元素是对象
-            self.add_physical_card(card)
+        try:
+            with self.transaction() as conn:
+                conn.executemany(CARD_INSERT_SQL, [self._card_insert_params(card) for card in card_list])
+        except sqlite3.Error as e:
+            logger.error(f"档案卡批量写入数据库失败（{len(card_list)}张，已回滚）：{str(e)[:100]}")
+            raise
         logger.info(f"批量写入数据库完成！共{len(card_list)}张物理设备档案卡存入数据库")
 
     def get_all_physical_cards(self):
@@ -542,28 +996,9 @@ class DatabaseManager:
         更新数据库中的物理设备档案卡（健康检查后调用，实现持久化）
         :param card_dict: 更新后的PhysicalDevice对象转的字典
         """
-        sql = """
-        UPDATE physical_device_cards 
-        SET check_status=?, up_interfaces=?, down_interface=?, total_interfaces=?, 
-            cpu_usage=?, memory_usage=?, reachable=?, version=?, status=?, last_check_time=?
-        WHERE device_id = ?
-        """
-        params = (
-            card_dict.get("check_status", "未知"),
-            card_dict.get("up_interfaces", "未知"),
-            card_dict.get("down_interface", "未知"),
-            card_dict.get("total_interfaces", "未知"),
-            card_dict.get("cpu_usage", "N/A"),
-            card_dict.get("memory_usage", "N/A"),
-            card_dict.get("reachable", "未检测"),
-            card_dict.get("version", "未知"),
-            card_dict.get("status", "unknown"),
-            card_dict.get("last_check_time", "未检查"),  # 修正：使用正确的字段名
-            card_dict["id"],  # 更新条件：主键device_id（SW1/SW2）
-        )
         cursor = self.conn.cursor()
         try:
-            cursor.execute(sql, params)
+            cursor.execute(CARD_UPDATE_SQL, self._card_update_params(card_dict))
             self.conn.commit()
             logger.info(f"档案卡更新成功：设备[{card_dict['name']}]")
         except sqlite3.Error as e:
@@ -572,9 +1007,33 @@ class DatabaseManager:
             self.conn.rollback()
             raise
 
+    def batch_update_physical_cards(self, card_list):
+        """
+        批量更新档案卡（并发健康检查结束后一次性写入，一个事务 executemany）
+        :param card_list: 更新后的PhysicalDevice对象转的字典列表
+        :return: 实际更新的行数
+        """
+        if not card_list:
+            return 0
+        try:
+            with self.transaction() as conn:
+                cursor = conn.executemany(CARD_UPDATE_SQL, [self._card_update_params(card) for card in card_list])
+                updated = cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"档案卡批量更新失败（{len(card_list)}张，已回滚）：{str(e)[:100]}")
+            raise
+        logger.info(f"档案卡批量更新完成：提交{len(card_list)}张，更新{updated}行")
+        return updated
+
     def close(self):
-        if self.conn:
-            self.conn.close()
+        self.disable_write_behind()
+        if self.pool is not None:
+            self.pool.close_all()
+            self.pool = None
+            logger.debug("数据库连接池已经关闭所有连接")
+        elif self._conn:
+            self._conn.close()
+            self._conn = None
             logger.debug("数据库已经关闭连接")
 
     def __del__(self):
@@ -597,28 +1056,31 @@ class DatabaseManager:
         import hashlib
         config_hash = hashlib.md5(config_content.encode('utf-8')).hexdigest()
 
-        # 获取当前最大版本号
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT MAX(version_number) FROM config_versions WHERE hostname = ?", (hostname,))
-        result = cursor.fetchone()
-        max_version = result[0] if result[0] else 0
-        new_version = max_version + 1
-
         sql = """
-        INSERT INTO config_versions (hostname, config_content, config_hash, version_number, backup_path, created_by, comment)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO config_versions (hostname, config_content, config_hash, version_number, backup_path, created_by, comment, blob_hash)
+        VALUES (?, '', ?, ?, ?, ?, ?, ?)
         """
-        params = (hostname, config_content, config_hash, new_version, backup_path, created_by, comment)
-
         try:
-            cursor.execute(sql, params)
-            self.conn.commit()
-            version_id = cursor.lastrowid
+            with self.transaction() as conn:
+                # 获取当前最大版本号，以及上一个版本的blob（作为差量基准）
+                latest = conn.execute(
+                    "SELECT version_number, blob_hash FROM config_versions WHERE hostname = ? ORDER BY version_number DESC LIMIT 1",
+                    (hostname,),
+                ).fetchone()
+                new_version = latest["version_number"] + 1 if latest else 1
+                base_hash = latest["blob_hash"] if latest else None
+                # 内容相同直接复用已有blob，否则存成相对上一个版本的差量
+                blob_hash = self.config_store.put(conn, config_content, base_hash=base_hash)
+                params = (hostname, config_hash, new_version, backup_path, created_by, comment, blob_hash)
+                version_id = conn.execute(sql, params).lastrowid
+                # 全文检索只索引每台设备的最新版本
+                self.fleet_search.index_config(conn, hostname, version_id, new_version, blob_hash, config_content)
+            # 提交成功后才放进还原缓存
+            self.config_store.remember(blob_hash, config_content)
             logger.info(f"配置版本保存成功：设备={hostname}，版本={new_version}，ID={version_id}")
             return version_id
         except sqlite3.Error as e:
             logger.error(f"保存配置版本失败：{e}")
-            self.conn.rollback()
             raise
 
     def get_config_versions(self, hostname, limit=10):
@@ -652,13 +1114,15 @@ class DatabaseManager:
         :param version_id: 版本ID
         :return: 配置内容
         """
-        sql = "SELECT config_content FROM config_versions WHERE id = ?"
+        sql = "SELECT config_content, blob_hash FROM config_versions WHERE id = ?"
         cursor = self.conn.cursor()
         try:
             cursor.execute(sql, (version_id,))
             result = cursor.fetchone()
             if result:
-                return result[0]
+                if result["blob_hash"]:
+                    return self.config_store.get(result["blob_hash"])
+                return result["config_content"]
             return None
         except sqlite3.Error as e:
             logger.error(f"获取配置内容失败：{e}")
@@ -671,38 +1135,27 @@ class DatabaseManager:
         :param version_id2: 版本ID2
         :return: 对比结果
         """
+        return self.diff_cache.get_or_compute(
+            ("config", version_id1, version_id2), lambda: self._compare_configs(version_id1, version_id2)
+        )
+
+    def _compare_configs(self, version_id1, version_id2):
         config1 = self.get_config_content(version_id1)
         config2 = self.get_config_content(version_id2)
 
         if config1 is None or config2 is None:
             return None
 
-        # 简单的diff对比
-        lines1 = config1.splitlines()
-        lines2 = config2.splitlines()
-
-        added = []
-        removed = []
-        unchanged = []
-
-        # 使用difflib进行对比
-        import difflib
-        diff = list(difflib.unified_diff(lines1, lines2, lineterm=''))
-
-        for line in diff:
-            if line.startswith('+') and not line.startswith('+++'):
-                added.append(line[1:])
-            elif line.startswith('-') and not line.startswith('---'):
-                removed.append(line[1:])
-
+        result = diff_texts(config1, config2)
         return {
             'version_id1': version_id1,
             'version_id2': version_id2,
-            'added': added,
-            'removed': removed,
-            'total_added': len(added),
-            'total_removed': len(removed),
-            'is_identical': len(added) == 0 and len(removed) == 0
+            'added': result['added'],
+            'removed': result['removed'],
+            'hunks': result['hunks'],
+            'total_added': len(result['added']),
+            'total_removed': len(result['removed']),
+            'is_identical': result['is_identical']
         }
 
     # ============================================================
@@ -1052,16 +1505,23 @@ class DatabaseManager:
     # 命令执行历史相关方法
     # ============================================================
 
-    def save_command_history(self, device_name, device_ip, command, command_category, result, status='success', error_message=None, execution_time=None):
-        """保存命令执行历史"""
+    def save_command_history(self, device_name, device_ip, command, command_category, result, status='success', error_message=None, execution_time=None, sync=False):
+        """
+        保存命令执行历史
+        开启写回队列时默认放入队列并返回None；调用方需要记录ID时传 sync=True 立即写入
+        """
         sql = """
         INSERT INTO command_history
         (device_name, device_ip, command, command_category, result, status, error_message, execution_time)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """
+        params = (device_name, device_ip, command, command_category, result, status, error_message, execution_time)
+        if self.write_behind is not None and not sync:
+            self.write_behind.submit(sql, params)
+            return None
         cursor = self.conn.cursor()
         try:
-            cursor.execute(sql, (device_name, device_ip, command, command_category, result, status, error_message, execution_time))
+            cursor.execute(sql, params)
             self.conn.commit()
             return cursor.lastrowid
         except sqlite3.Error as e:
@@ -1071,33 +1531,43 @@ class DatabaseManager:
 
     def get_command_history(self, device_name=None, command=None, limit=50):
         """获取命令执行历史"""
-        conditions = []
-        params = []
+        try:
+            return list(self.iter_command_history(device_name=device_name, command=command, limit=limit))
+        except sqlite3.Error as e:
+            logger.error(f"查询命令历史失败：{e}")
+            raise
 
+    def iter_command_history(self, device_name=None, command=None, cursor=None, limit=None, batch_size=DEFAULT_BATCH_SIZE):
+        """逐批读取命令执行历史（按 created_at, id 倒序的键集分页，不含完整结果）"""
+        conditions, params = [], []
         if device_name:
             conditions.append("device_name = ?")
             params.append(device_name)
         if command:
             conditions.append("command = ?")
             params.append(command)
+        columns = "id, device_name, device_ip, command, command_category, status, execution_time, created_at"
+        return KeysetIterator(
+            self, "command_history", columns, "created_at", conditions, params,
+            cursor=cursor, limit=limit, batch_size=batch_size,
+        )
 
-        where_clause = " AND ".join(conditions) if conditions else "1=1"
-        sql = f"""
-        SELECT id, device_name, device_ip, command, command_category, status, execution_time, created_at
-        FROM command_history
-        WHERE {where_clause}
-        ORDER BY created_at DESC
-        LIMIT ?
-        """
-        params.append(limit)
+    # ============================================================
+    # 全网全文检索（配置 + 命令输出），实现见 db/search.py
+    # ============================================================
 
-        cursor = self.conn.cursor()
+    def search(self, query, scopes=(SCOPE_CONFIG, SCOPE_COMMAND), device_name=None, limit=50, raw=False):
+        """
+        在各设备最新配置和命令执行结果里检索
+        :param query: 检索内容（默认短语匹配，raw=True 时为FTS5查询表达式）
+        :param scopes: 检索范围 config / command
+        :param device_name: 只查某台设备（可选）
+        :param limit: 每个范围最多返回的条数
+        """
         try:
-            cursor.execute(sql, params)
-            results = cursor.fetchall()
-            return [dict(r) for r in results]
+            return self.fleet_search.search(query, scopes=scopes, device_name=device_name, limit=limit, raw=raw)
         except sqlite3.Error as e:
-            logger.error(f"查询命令历史失败：{e}")
+            logger.error(f"全文检索失败：{e}")
             raise
 
     def get_command_history_detail(self, history_id):
@@ -1113,27 +1583,28 @@ class DatabaseManager:
             raise
 
     def compare_command_results(self, history_id_1, history_id_2):
-        """对比两次命令执行结果"""
+        """对比两次命令执行结果（结果按ID对缓存，命令历史写入后不会修改）"""
+        return self.diff_cache.get_or_compute(
+            ("command", history_id_1, history_id_2),
+            lambda: self._compare_command_results(history_id_1, history_id_2),
+        )
+
+    def _compare_command_results(self, history_id_1, history_id_2):
         result1 = self.get_command_history_detail(history_id_1)
         result2 = self.get_command_history_detail(history_id_2)
 
         if not result1 or not result2:
             return None
 
-        # 简单的行级对比
-        lines1 = result1['result'].splitlines() if result1['result'] else []
-        lines2 = result2['result'].splitlines() if result2['result'] else []
-
-        added = [line for line in lines2 if line not in lines1]
-        removed = [line for line in lines1 if line not in lines2]
-
+        diff = diff_texts(result1['result'], result2['result'])
         return {
             'result1': result1,
             'result2': result2,
-            'added': added,
-            'removed': removed,
-            'added_count': len(added),
-            'removed_count': len(removed),
+            'added': diff['added'],
+            'removed': diff['removed'],
+            'hunks': diff['hunks'],
+            'added_count': len(diff['added']),
+            'removed_count': len(diff['removed']),
         }
 
     # ============================================================
@@ -1217,17 +1688,23 @@ class DatabaseManager:
             raise
 
     def add_alert_history(self, rule_id, device_name, device_ip, metric_type,
-                          metric_value, threshold_value, severity, message):
-        """添加告警历史"""
+                          metric_value, threshold_value, severity, message, sync=False):
+        """
+        添加告警历史
+        开启写回队列时默认放入队列并返回None；调用方需要告警ID时传 sync=True 立即写入
+        """
         sql = """
         INSERT INTO alert_history
         (rule_id, device_name, device_ip, metric_type, metric_value, threshold_value, severity, message)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """
+        params = (rule_id, device_name, device_ip, metric_type, metric_value, threshold_value, severity, message)
+        if self.write_behind is not None and not sync:
+            self.write_behind.submit(sql, params)
+            return None
         cursor = self.conn.cursor()
         try:
-            cursor.execute(sql, (rule_id, device_name, device_ip, metric_type,
-                                 metric_value, threshold_value, severity, message))
+            cursor.execute(sql, params)
             self.conn.commit()
             return cursor.lastrowid
         except sqlite3.Error as e:
@@ -1237,32 +1714,25 @@ class DatabaseManager:
 
     def get_alert_history(self, limit=50, severity=None, is_resolved=None):
         """获取告警历史"""
-        conditions = []
-        params = []
+        try:
+            return list(self.iter_alert_history(severity=severity, is_resolved=is_resolved, limit=limit))
+        except sqlite3.Error as e:
+            logger.error(f"获取告警历史失败：{e}")
+            raise
 
+    def iter_alert_history(self, severity=None, is_resolved=None, cursor=None, limit=None, batch_size=DEFAULT_BATCH_SIZE):
+        """逐批读取告警历史（按 created_at, id 倒序的键集分页）"""
+        conditions, params = [], []
         if severity:
             conditions.append("severity = ?")
             params.append(severity)
         if is_resolved is not None:
             conditions.append("is_resolved = ?")
             params.append(is_resolved)
-
-        where_clause = " AND ".join(conditions) if conditions else "1=1"
-        sql = f"""
-        SELECT * FROM alert_history
-        WHERE {where_clause}
-        ORDER BY created_at DESC
-        LIMIT ?
-        """
-        params.append(limit)
-
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute(sql, params)
-            return [dict(r) for r in cursor.fetchall()]
-        except sqlite3.Error as e:
-            logger.error(f"获取告警历史失败：{e}")
-            raise
+        return KeysetIterator(
+            self, "alert_history", "*", "created_at", conditions, params,
+            cursor=cursor, limit=limit, batch_size=batch_size,
+        )
 
     def resolve_alert(self, alert_id):
         """标记告警为已解决"""
@@ -1335,3 +1805,5 @@ class DatabaseManager:
 
 
 db_manager = DatabaseManager()
+if WRITE_BEHIND_ENABLED:
+    db_manager.enable_write_behind()
@@ -0,0 +1,212 @@
+"""
+数据库版本化迁移
+schema_version 表记录已经执行过的迁移版本号，DatabaseManager 每次启动时按版本号顺序执行还没执行过的迁移：
+1. 每个迁移在一个 BEGIN IMMEDIATE 事务里执行，连同版本号一起提交，失败整体回滚，下次启动重试
+2. 拿到写锁后再读一次当前版本，多个进程同时启动也只会有一个执行迁移
+3. 新增表结构变更时，在 MIGRATIONS 末尾追加一个新版本，不要修改已经发布的迁移
+迁移函数签名为 fn(db, conn)：db 是 DatabaseManager（需要用到 config_store 等组件时），conn 是当前事务的连接
+"""
+
+import os
+import sys
+import sqlite3
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+from db.search import create_search_schema
+
+logger = setup_logger("migrations.py", "database.log")
+
+
+def add_column(conn, table, column, definition):
+    """给表补一列（已存在就跳过）：新建的数据库在 CREATE TABLE 里就已经带上了这一列"""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def percent_sql(column):
+    """把 '23%' / '45.0%' / 'N/A' 这类文本转成数值的SQL表达式，无法解析的为NULL（只用于回填老数据）"""
+    return f"CASE WHEN TRIM({column}) GLOB '[0-9]*' THEN CAST(REPLACE(TRIM({column}), '%', '') AS REAL) END"
+
+
+def integer_sql(column):
+    """把 '20' / '未知' 这类文本转成整数的SQL表达式，无法解析的为NULL"""
+    return f"CASE WHEN TRIM({column}) GLOB '[0-9]*' THEN CAST(TRIM({column}) AS INTEGER) END"
+
+
+# ============================================================
+# 迁移步骤
+# ============================================================
+
+# 每个历史查询方法的过滤/排序字段都要有对应的复合索引，否则数据量一大就是全表扫描
+# tests/test_query_plans.py 会对每个查询方法跑 EXPLAIN QUERY PLAN，防止以后改SQL时索引失效
+HISTORY_INDEXES = [
+    # get_health_check_history：device_name 过滤 + check_time 排序/范围
+    "CREATE INDEX IF NOT EXISTS idx_health_device_time ON health_check_records (device_name, check_time)",
+    "CREATE INDEX IF NOT EXISTS idx_health_time ON health_check_records (check_time)",
+    # get_recent_backups：hostname 过滤 + start_time 排序/范围
+    "CREATE INDEX IF NOT EXISTS idx_backup_host_time ON backup_records (hostname, start_time)",
+    "CREATE INDEX IF NOT EXISTS idx_backup_time ON backup_records (start_time)",
+    # get_alert_history：severity / is_resolved 过滤 + created_at 排序
+    "CREATE INDEX IF NOT EXISTS idx_alert_severity_resolved_time ON alert_history (severity, is_resolved, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_alert_severity_time ON alert_history (severity, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_alert_resolved_time ON alert_history (is_resolved, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_alert_time ON alert_history (created_at)",
+    # get_command_history：device_name / command 过滤 + created_at 排序
+    "CREATE INDEX IF NOT EXISTS idx_command_device_time ON command_history (device_name, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_command_command_time ON command_history (command, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_command_time ON command_history (created_at)",
+    # get_config_versions / save_config_version：hostname + version_number
+    "CREATE INDEX IF NOT EXISTS idx_config_host_version ON config_versions (hostname, version_number)",
+    # get_compliance_results：hostname + check_time
+    "CREATE INDEX IF NOT EXISTS idx_compliance_host_time ON compliance_results (hostname, check_time)",
+    "CREATE INDEX IF NOT EXISTS idx_compliance_time ON compliance_results (check_time)",
+    # system_metrics 按时间范围查询
+    "CREATE INDEX IF NOT EXISTS idx_system_metrics_time ON system_metrics (timestamp)",
+    # 汇总表：全网按时间桶查询（单设备查询走 UNIQUE(bucket, device_name, bucket_start) 自带的索引）
+    "CREATE INDEX IF NOT EXISTS idx_health_rollup_time ON health_check_rollups (bucket, bucket_start)",
+]
+
+
+def migrate_history_indexes(db, conn):
+    for sql in HISTORY_INDEXES:
+        conn.execute(sql)
+
+
+def migrate_config_blob_store(db, conn):
+    """config_versions 增加 blob_hash 列，老版本直接存在 config_content 里的全文搬进 config_blobs"""
+    add_column(conn, "config_versions", "blob_hash", "TEXT")
+    rows = conn.execute(
+        """
+        SELECT id, hostname, config_content FROM config_versions
+        WHERE blob_hash IS NULL ORDER BY hostname, version_number
+        """
+    ).fetchall()
+    previous = {}  # hostname -> 上一个版本的blob_hash，按版本号顺序存成差量链
+    for row in rows:
+        blob_hash = db.config_store.put(conn, row["config_content"], base_hash=previous.get(row["hostname"]))
+        previous[row["hostname"]] = blob_hash
+        conn.execute("UPDATE config_versions SET blob_hash = ?, config_content = '' WHERE id = ?", (blob_hash, row["id"]))
+    if rows:
+        logger.info(f"已把{len(rows)}个配置版本迁移到内容寻址存储")
+
+
+def migrate_typed_metric_columns(db, conn):
+    """
+    健康检查记录、档案卡增加数值类型的指标列（写入时由 DatabaseManager 解析填充），并回填老数据
+    原来的 TEXT 列（"23%"、"N/A"、"未知"）保留给页面展示，聚合/比较统一用新列
+    """
+    add_column(conn, "health_check_records", "cpu_pct", "REAL")
+    add_column(conn, "health_check_records", "mem_pct", "REAL")
+    conn.execute(
+        f"UPDATE health_check_records SET cpu_pct = {percent_sql('CPU_usage')}, mem_pct = {percent_sql('memory_usage')}"
+    )
+    for column, definition in (
+        ("up_count", "INTEGER"), ("down_count", "INTEGER"), ("total_count", "INTEGER"),
+        ("cpu_pct", "REAL"), ("mem_pct", "REAL"),
+    ):
+        add_column(conn, "physical_device_cards", column, definition)
+    conn.execute(
+        f"""
+        UPDATE physical_device_cards SET
+            up_count = {integer_sql('up_interfaces')}, down_count = {integer_sql('down_interface')},
+            total_count = {integer_sql('total_interfaces')},
+            cpu_pct = {percent_sql('cpu_usage')}, mem_pct = {percent_sql('memory_usage')}
+        """
+    )
+    # 告警引擎按设备IP取最新一条记录
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_health_host_time ON health_check_records (host, check_time)")
+
+
+def migrate_fleet_search(db, conn):
+    """建全文检索索引（FTS5），命令历史由触发器同步；各设备最新配置版本灌进配置索引"""
+    create_search_schema(conn)
+    rows = conn.execute(
+        """
+        SELECT v.id, v.hostname, v.version_number, v.blob_hash FROM config_versions v
+        WHERE v.version_number = (SELECT MAX(version_number) FROM config_versions WHERE hostname = v.hostname)
+        """
+    ).fetchall()
+    for row in rows:
+        content = db.config_store.get(row["blob_hash"], conn=conn) or ""
+        db.fleet_search.index_config(conn, row["hostname"], row["id"], row["version_number"], row["blob_hash"], content)
+
+
+def migrate_backup_repository(db, conn):
+    """备份记录增加去重命中、新增磁盘占用两列（checksum 列原来就有，现在由备份仓库填充），补建下载/回收要用的索引"""
+    add_column(conn, "backup_records", "dedup", "INTEGER")
+    add_column(conn, "backup_records", "stored_size", "INTEGER")
+    # 下载时按逻辑路径找对象；清理对象前按 checksum 统计引用
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_backup_path ON backup_records (backup_path)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_backup_checksum ON backup_records (checksum)")
+
+
+# (版本号, 说明, 迁移函数)，版本号严格递增
+MIGRATIONS = [
+    (1, "历史表补建二级索引", migrate_history_indexes),
+    (2, "配置版本改为内容寻址存储", migrate_config_blob_store),
+    (3, "健康检查记录/档案卡增加数值指标列", migrate_typed_metric_columns),
+    (4, "配置/命令输出全文检索索引", migrate_fleet_search),
+    (5, "备份仓库：备份记录增加去重/存储大小", migrate_backup_repository),
+]
+
+
+# ============================================================
+# 执行器
+# ============================================================
+
+def ensure_version_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,       -- 迁移版本号
+            description TEXT,                  -- 迁移说明
+            applied_at TEXT NOT NULL           -- 执行时间
+        )
+        """
+    )
+    conn.commit()
+
+
+def get_schema_version(conn):
+    """当前数据库的迁移版本号，一个迁移都没执行过返回0"""
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(db, migrations=None):
+    """
+    按版本号顺序执行还没执行过的迁移
+    :param db: DatabaseManager 实例
+    :param migrations: 迁移列表，不传使用 MIGRATIONS（测试时可注入）
+    :return: 本次执行的版本号列表
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    conn = db.conn
+    ensure_version_table(conn)
+    applied = []
+    for version, description, func in migrations:
+        if version <= get_schema_version(conn):
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # 拿到写锁后再确认一次，其他进程可能刚刚执行完这个迁移
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            func(db, conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"数据库迁移[{version}]{description}失败：{str(e)[:100]}")
+            raise
+        applied.append(version)
+        logger.info(f"数据库迁移[{version}]{description}完成")
+    return applied
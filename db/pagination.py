@@ -0,0 +1,113 @@
+"""
+历史记录的键集分页（keyset pagination）
+原来的历史查询都是 fetchall() 一次性把结果转成字典列表，全网 days=7 不加 limit 时内存随结果线性增长，
+OFFSET 分页越往后越慢。这里按 (时间列, id) 倒序分页：
+1. 每批用 WHERE (时间列, id) < (上一批最后一行) 定位，直接走 (过滤列, 时间列) 复合索引，翻到第几页都一样快
+2. 每批最多 batch_size 行，用 fetchmany 逐步读取，迭代器同一时刻只持有一批数据
+3. 游标是最后一行 [时间, id] 的 base64 JSON，接口把它原样交给前端，下一页带回来即可
+"""
+
+import os
+import sys
+import json
+import base64
+import binascii
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+
+logger = setup_logger("pagination.py", "database.log")
+
+# 每批从数据库读取的行数
+DEFAULT_BATCH_SIZE = 500
+
+
+def encode_cursor(time_value, row_id):
+    """把 (时间, id) 编码成URL安全的游标字符串"""
+    raw = json.dumps([time_value, row_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """解析游标，格式不对抛 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        time_value, row_id = json.loads(raw.decode("utf-8"))
+        return time_value, int(row_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"无效的分页游标：{token}") from e
+
+
+class KeysetIterator:
+    """
+    按 (时间列, id) 倒序逐批读取的迭代器
+    迭代结束后 next_cursor 为下一页的游标；已经没有更多数据时为None
+    """
+
+    def __init__(self, db, table, columns, time_column, conditions=None, params=None,
+                 cursor=None, limit=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        :param db: DatabaseManager 实例（每批都从 db.conn 取当前线程的连接）
+        :param table: 表名
+        :param columns: SELECT 的列（必须包含 id 和时间列）
+        :param time_column: 排序用的时间列
+        :param conditions: WHERE 条件列表（AND 连接）
+        :param params: 条件对应的参数
+        :param cursor: 上一页返回的游标，不传从最新的记录开始
+        :param limit: 最多返回多少行（即页大小），None 表示不限
+        :param batch_size: 每批读取的行数
+        """
+        self.db = db
+        self.time_column = time_column
+        self.conditions = list(conditions or [])
+        self.params = list(params or [])
+        self.limit = limit if limit and limit > 0 else None
+        self.batch_size = max(1, batch_size)
+        self.last_key = decode_cursor(cursor) if cursor else None
+        self.next_cursor = None
+        self._sql = f"SELECT {columns} FROM {table} WHERE {{where}} ORDER BY {time_column} DESC, id DESC LIMIT ?"
+        self._rows = self._generate()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._rows)
+
+    def _query(self, batch_limit):
+        conditions = list(self.conditions)
+        params = list(self.params)
+        if self.last_key is not None:
+            conditions.append(f"({self.time_column}, id) < (?, ?)")
+            params.extend(self.last_key)
+        where = " AND ".join(conditions) if conditions else "1=1"
+        cursor = self.db.conn.cursor()
+        cursor.execute(self._sql.format(where=where), params + [batch_limit])
+        return cursor
+
+    def _generate(self):
+        returned = 0
+        while True:
+            batch_limit = self.batch_size
+            if self.limit is not None:
+                batch_limit = min(batch_limit, self.limit - returned)
+            cursor = self._query(batch_limit)
+            fetched = 0
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    record = dict(row)
+                    self.last_key = (record[self.time_column], record["id"])
+                    fetched += 1
+                    returned += 1
+                    yield record
+            if fetched < batch_limit:
+                return  # 数据已经读完
+            if self.limit is not None and returned >= self.limit:
+                # 页满了：再探测一行，确认确实还有下一页才返回游标
+                if self._query(1).fetchone() is not None:
+                    self.next_cursor = encode_cursor(*self.last_key)
+                return
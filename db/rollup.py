@@ -0,0 +1,397 @@
+"""
+时序汇总（rollup）与原始数据保留策略
+health_check_records 和 system_metrics 只增不减，仪表盘和AI周报每次都要重新读原始记录。
+这里维护 5分钟 / 1小时 / 1天 三级汇总表：
+1. 5m 由原始记录聚合，1h 由 5m 聚合，1d 由 1h 聚合（按样本数加权求平均），每级只处理已经结束的时间桶
+2. 每级用水位线（rollup_state 表）记录已经汇总到哪里，重复执行是幂等的（INSERT OR REPLACE）
+3. 清理原始数据 / 低级汇总时，只删除已经被上一级汇总过的部分，不会丢数据
+4. 长时间范围的查询按跨度自动选择汇总粒度，水位线之后还没汇总的尾巴直接从原始记录现算
+时间统一按数据库里存的本地时间字符串处理（strftime('%s') 与 'unixepoch' 互逆，不做时区换算）
+"""
+
+import os
+import sys
+import sqlite3
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+
+logger = setup_logger("rollup.py", "database.log")
+
+# 汇总级别：(名称, 桶宽秒数, 由哪一级聚合而来，None表示原始记录)
+ROLLUP_LEVELS = [
+    ("5m", 300, None),
+    ("1h", 3600, "5m"),
+    ("1d", 86400, "1h"),
+]
+BUCKET_SECONDS = {name: seconds for name, seconds, _ in ROLLUP_LEVELS}
+
+# 各级数据保留天数，None表示永久保留；原始数据保留天数可用环境变量 NETDEVOPS_RAW_RETENTION_DAYS 调整
+RETENTION_DAYS = {
+    "raw": int(os.getenv("NETDEVOPS_RAW_RETENTION_DAYS", "30")),
+    "5m": 14,
+    "1h": 180,
+    "1d": None,
+}
+
+# 查询跨度不超过N天时使用对应粒度（依次判断），更长的跨度用天级汇总
+GRANULARITY_BY_RANGE = [(1, "5m"), (14, "1h")]
+
+# 只汇总结束超过这么多秒的时间桶，给写回队列/慢设备的迟到记录留余量
+GRACE_SECONDS = 60
+
+# 清理时每批删除的行数，避免长时间占用写锁
+PRUNE_BATCH_SIZE = 5000
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_expr(column, seconds):
+    """把时间列截断到桶起点的SQL表达式（结果格式 YYYY-MM-DD HH:MM:SS）"""
+    return f"datetime(CAST(strftime('%s', {column}) AS INTEGER) / {seconds} * {seconds}, 'unixepoch')"
+
+
+def floor_time(dt, seconds):
+    """Python端的桶截断，和 bucket_expr 的结果一致"""
+    elapsed = int((dt - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=elapsed // seconds * seconds)
+
+
+# 每个数据源的原始表、汇总表和聚合SQL
+# raw_select：从原始记录聚合；rollup_select：从下一级汇总再聚合
+# 两条SQL的输出列都和 columns 的顺序一致，内层子查询先算出桶起点 bkt，避免和汇总表的 bucket_start 列重名
+SOURCES = {
+    "health": {
+        "raw_table": "health_check_records",
+        "time_column": "check_time",
+        "time_format": "%Y-%m-%d %H:%M:%S",
+        "rollup_table": "health_check_rollups",
+        "key_column": "device_name",
+        "columns": (
+            "bucket_start", "device_name", "samples", "healthy_count", "reachable_count", "reachability_ratio",
+            "cpu_count", "cpu_min", "cpu_max", "cpu_avg", "mem_count", "mem_min", "mem_max", "mem_avg",
+            "up_min", "up_max", "up_avg", "down_min", "down_max", "down_avg",
+        ),
+        "raw_select": """
+            SELECT bkt, device_name, COUNT(*), SUM(status = 'healthy'), SUM(reachable = '可达'),
+                   AVG(reachable = '可达'),
+                   COUNT(cpu), MIN(cpu), MAX(cpu), AVG(cpu), COUNT(mem), MIN(mem), MAX(mem), AVG(mem),
+                   MIN(up_interface), MAX(up_interface), AVG(up_interface),
+                   MIN(down_interface), MAX(down_interface), AVG(down_interface)
+            FROM (
+                SELECT {bucket} AS bkt, device_name, status, reachable, up_interface, down_interface,
+                       cpu_pct AS cpu, mem_pct AS mem
+                FROM health_check_records
+                WHERE check_time >= ? AND check_time < ? {filter}
+            )
+            GROUP BY device_name, bkt
+        """,
+        "rollup_select": """
+            SELECT bkt, device_name, SUM(samples), SUM(healthy_count), SUM(reachable_count),
+                   CAST(SUM(reachable_count) AS REAL) / SUM(samples),
+                   SUM(cpu_count), MIN(cpu_min), MAX(cpu_max), SUM(cpu_avg * cpu_count) / NULLIF(SUM(cpu_count), 0),
+                   SUM(mem_count), MIN(mem_min), MAX(mem_max), SUM(mem_avg * mem_count) / NULLIF(SUM(mem_count), 0),
+                   MIN(up_min), MAX(up_max), SUM(up_avg * samples) / SUM(samples),
+                   MIN(down_min), MAX(down_max), SUM(down_avg * samples) / SUM(samples)
+            FROM (
+                SELECT {bucket} AS bkt, *
+                FROM health_check_rollups
+                WHERE bucket = ? AND bucket_start >= ? AND bucket_start < ? {filter}
+            )
+            GROUP BY device_name, bkt
+        """,
+    },
+    "system": {
+        "raw_table": "system_metrics",
+        "time_column": "timestamp",
+        "time_format": "%Y-%m-%dT%H:%M:%S",  # system_metrics 存的是 isoformat
+        "rollup_table": "system_metrics_rollups",
+        "key_column": None,
+        "columns": ("bucket_start", "samples", "cpu_min", "cpu_max", "cpu_avg", "mem_min", "mem_max", "mem_avg"),
+        "raw_select": """
+            SELECT bkt, COUNT(*), MIN(cpu_percent), MAX(cpu_percent), AVG(cpu_percent),
+                   MIN(memory_percent), MAX(memory_percent), AVG(memory_percent)
+            FROM (
+                SELECT {bucket} AS bkt, cpu_percent, memory_percent
+                FROM system_metrics
+                WHERE timestamp >= ? AND timestamp < ? {filter}
+            )
+            GROUP BY bkt
+        """,
+        "rollup_select": """
+            SELECT bkt, SUM(samples), MIN(cpu_min), MAX(cpu_max), SUM(cpu_avg * samples) / SUM(samples),
+                   MIN(mem_min), MAX(mem_max), SUM(mem_avg * samples) / SUM(samples)
+            FROM (
+                SELECT {bucket} AS bkt, *
+                FROM system_metrics_rollups
+                WHERE bucket = ? AND bucket_start >= ? AND bucket_start < ? {filter}
+            )
+            GROUP BY bkt
+        """,
+    },
+}
+
+
+class RollupManager:
+    """维护汇总表、执行保留策略、按跨度选择粒度查询"""
+
+    def __init__(self, db, retention=None, grace_seconds=GRACE_SECONDS):
+        """
+        :param db: DatabaseManager 实例（使用它的按线程连接）
+        :param retention: 覆盖 RETENTION_DAYS 里的保留天数，如 {"raw": 7}
+        :param grace_seconds: 时间桶结束多少秒后才汇总
+        """
+        self.db = db
+        self.retention = {**RETENTION_DAYS, **(retention or {})}
+        self.grace_seconds = grace_seconds
+
+    # ------------------------------------------------------------
+    # 水位线
+    # ------------------------------------------------------------
+
+    def get_watermark(self, source, level):
+        """返回该级已经汇总到的时间（不含），没有汇总过返回None"""
+        row = self.db.conn.execute(
+            "SELECT watermark FROM rollup_state WHERE source = ? AND bucket = ?", (source, level)
+        ).fetchone()
+        return datetime.strptime(row[0], TIME_FORMAT) if row else None
+
+    def _set_watermark(self, conn, source, level, watermark):
+        conn.execute(
+            "INSERT OR REPLACE INTO rollup_state (source, bucket, watermark, updated_at) VALUES (?, ?, ?, ?)",
+            (source, level, watermark.strftime(TIME_FORMAT), datetime.now().strftime(TIME_FORMAT)),
+        )
+
+    def _earliest(self, source, lower):
+        """源数据里最早的时间，用于第一次汇总时确定起点"""
+        spec = SOURCES[source]
+        if lower is None:
+            sql = f"SELECT MIN({spec['time_column']}) FROM {spec['raw_table']}"
+            row = self.db.conn.execute(sql).fetchone()
+        else:
+            sql = f"SELECT MIN(bucket_start) FROM {spec['rollup_table']} WHERE bucket = ?"
+            row = self.db.conn.execute(sql, (lower,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        return datetime.fromisoformat(row[0][:19])
+
+    # ------------------------------------------------------------
+    # 汇总
+    # ------------------------------------------------------------
+
+    def _aggregate_sql(self, source, level, lower, extra_filter=""):
+        spec = SOURCES[source]
+        seconds = BUCKET_SECONDS[level]
+        if lower is None:
+            template = spec["raw_select"]
+            bucket = bucket_expr(spec["time_column"], seconds)
+        else:
+            template = spec["rollup_select"]
+            bucket = bucket_expr("bucket_start", seconds)
+        return template.format(bucket=bucket, filter=extra_filter)
+
+    def _aggregate_params(self, source, lower, start, end):
+        if lower is None:
+            time_format = SOURCES[source]["time_format"]
+            return [start.strftime(time_format), end.strftime(time_format)]
+        return [lower, start.strftime(TIME_FORMAT), end.strftime(TIME_FORMAT)]
+
+    def _rollup_level(self, source, level, seconds, lower, now):
+        """把 [水位线, 已结束的最后一个桶) 之间的数据汇总到 level，返回写入的桶数"""
+        end = floor_time(now - timedelta(seconds=self.grace_seconds), seconds)
+        if lower is not None:
+            lower_watermark = self.get_watermark(source, lower)
+            if lower_watermark is None:
+                return 0
+            end = min(end, floor_time(lower_watermark, seconds))
+        start = self.get_watermark(source, level)
+        if start is None:
+            earliest = self._earliest(source, lower)
+            if earliest is None:
+                return 0
+            start = floor_time(earliest, seconds)
+        if start >= end:
+            return 0
+
+        spec = SOURCES[source]
+        columns = ", ".join(spec["columns"])
+        sql = (
+            f"INSERT OR REPLACE INTO {spec['rollup_table']} (bucket, {columns}) "
+            f"SELECT ?, * FROM ({self._aggregate_sql(source, level, lower)})"
+        )
+        params = [level] + self._aggregate_params(source, lower, start, end)
+        with self.db.transaction() as conn:
+            cursor = conn.execute(sql, params)
+            self._set_watermark(conn, source, level, end)
+        logger.debug(f"[{source}] {level}汇总：{start} ~ {end}，写入{cursor.rowcount}个时间桶")
+        return cursor.rowcount
+
+    def run(self, now=None):
+        """
+        执行一轮汇总 + 保留策略清理（定时任务调用，重复执行安全）
+        :param now: 当前时间，测试时可注入
+        :return: {"health": {"5m": 写入桶数, ...}, "system": {...}, "pruned": {...}}
+        """
+        now = now or datetime.now()
+        self.db.flush_writes()  # 写回队列里还没入库的记录先落盘
+        summary = {}
+        for source in SOURCES:
+            summary[source] = {}
+            for level, seconds, lower in ROLLUP_LEVELS:
+                try:
+                    summary[source][level] = self._rollup_level(source, level, seconds, lower, now)
+                except sqlite3.Error as e:
+                    logger.error(f"[{source}] {level}汇总失败：{str(e)[:100]}")
+                    summary[source][level] = 0
+        summary["pruned"] = self.prune(now)
+        logger.info(f"时序汇总完成：{summary}")
+        return summary
+
+    # ------------------------------------------------------------
+    # 保留策略
+    # ------------------------------------------------------------
+
+    def _delete_in_batches(self, sql, params):
+        """分批删除，每批单独提交，避免一次大删除长时间锁库"""
+        total = 0
+        while True:
+            with self.db.transaction() as conn:
+                deleted = conn.execute(sql, params + [PRUNE_BATCH_SIZE]).rowcount
+            total += deleted
+            if deleted < PRUNE_BATCH_SIZE:
+                return total
+
+    def prune(self, now=None):
+        """
+        按保留天数清理原始记录和各级汇总
+        只删除已经被上一级汇总覆盖的数据（截止时间取 保留期限 和 上一级水位线 中较早的一个）
+        :return: {"health:raw": 删除行数, "health:5m": ..., ...}
+        """
+        now = now or datetime.now()
+        pruned = {}
+        for source, spec in SOURCES.items():
+            # 每一级的数据由它的上一级“接手”：raw -> 5m -> 1h -> 1d
+            next_level = {lower or "raw": level for level, _, lower in ROLLUP_LEVELS}
+            for level in ["raw"] + [name for name, _, _ in ROLLUP_LEVELS]:
+                days = self.retention.get(level)
+                if days is None:
+                    continue
+                cutoff = now - timedelta(days=days)
+                if level in next_level:
+                    covered = self.get_watermark(source, next_level[level])
+                    if covered is None:
+                        continue
+                    cutoff = min(cutoff, covered)
+                if level == "raw":
+                    table, column = spec["raw_table"], spec["time_column"]
+                    sql = (
+                        f"DELETE FROM {table} WHERE id IN "
+                        f"(SELECT id FROM {table} WHERE {column} < ? LIMIT ?)"
+                    )
+                    params = [cutoff.strftime(spec["time_format"])]
+                else:
+                    table = spec["rollup_table"]
+                    sql = (
+                        f"DELETE FROM {table} WHERE rowid IN "
+                        f"(SELECT rowid FROM {table} WHERE bucket = ? AND bucket_start < ? LIMIT ?)"
+                    )
+                    params = [level, cutoff.strftime(TIME_FORMAT)]
+                try:
+                    pruned[f"{source}:{level}"] = self._delete_in_batches(sql, params)
+                except sqlite3.Error as e:
+                    logger.error(f"[{source}] {level}数据清理失败：{str(e)[:100]}")
+        return pruned
+
+    # ------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------
+
+    def pick_granularity(self, days):
+        """按查询跨度选粒度；保留期不够覆盖跨度时自动换更粗的粒度"""
+        for max_days, level in GRANULARITY_BY_RANGE:
+            retention = self.retention.get(level)
+            if days <= max_days and (retention is None or retention >= days):
+                return level
+        return ROLLUP_LEVELS[-1][0]
+
+    def get_series(self, source, days=7, key=None, granularity=None, now=None):
+        """
+        按时间桶返回汇总序列（升序）
+        已汇总的部分读汇总表，水位线之后的尾巴（包括当前未结束的桶）直接从原始记录现算
+        :param source: "health" 或 "system"
+        :param key: 设备名（仅health），不传返回所有设备
+        :param granularity: "5m"/"1h"/"1d"，不传按 days 自动选择
+        :return: 字典列表，字段见 SOURCES[source]["columns"]
+        """
+        spec = SOURCES[source]
+        level = granularity or self.pick_granularity(days)
+        seconds = BUCKET_SECONDS[level]
+        now = now or datetime.now()
+        start = floor_time(now - timedelta(days=days), seconds)
+        watermark = self.get_watermark(source, level)
+        columns = spec["columns"]
+
+        points = []
+        if watermark is not None and watermark > start:
+            sql = f"SELECT {', '.join(columns)} FROM {spec['rollup_table']} WHERE bucket = ? AND bucket_start >= ?"
+            params = [level, start.strftime(TIME_FORMAT)]
+            if key is not None:
+                sql += f" AND {spec['key_column']} = ?"
+                params.append(key)
+            sql += " ORDER BY bucket_start"
+            points.extend(dict(row) for row in self.db.conn.execute(sql, params))
+
+        # 尾巴：从水位线（或查询起点）到现在，直接在原始记录上按同样的桶宽聚合
+        tail_start = max(watermark, start) if watermark is not None else start
+        tail_end = floor_time(now, seconds) + timedelta(seconds=seconds)
+        extra_filter = f"AND {spec['key_column']} = ?" if key is not None else ""
+        sql = self._aggregate_sql(source, level, None, extra_filter) + " ORDER BY bkt"
+        params = self._aggregate_params(source, None, tail_start, tail_end)
+        if key is not None:
+            params.append(key)
+        points.extend(dict(zip(columns, row)) for row in self.db.conn.execute(sql, params))
+        return points
+
+    def summarize_health(self, days=7, now=None):
+        """
+        每台设备在整个时间范围内的汇总（AI周报用），由时间桶按样本数加权合并
+        :return: {设备名: {"samples", "healthy_ratio", "reachability_ratio", "cpu_avg", "cpu_max", ...}}
+        """
+        level = self.pick_granularity(days)
+        if level == "5m":
+            level = "1h"  # 周报只需要整体数字，用更粗的粒度读更少的行
+        totals = {}
+        for point in self.get_series("health", days=days, granularity=level, now=now):
+            t = totals.setdefault(point["device_name"], {
+                "samples": 0, "healthy": 0, "reachable": 0, "cpu_count": 0, "cpu_sum": 0.0, "cpu_max": None,
+                "mem_count": 0, "mem_sum": 0.0, "mem_max": None, "down_sum": 0.0, "down_max": None,
+            })
+            t["samples"] += point["samples"]
+            t["healthy"] += point["healthy_count"] or 0
+            t["reachable"] += point["reachable_count"] or 0
+            t["down_sum"] += (point["down_avg"] or 0) * point["samples"]
+            for prefix in ("cpu", "mem"):
+                if point[f"{prefix}_count"]:
+                    t[f"{prefix}_count"] += point[f"{prefix}_count"]
+                    t[f"{prefix}_sum"] += point[f"{prefix}_avg"] * point[f"{prefix}_count"]
+            for field in ("cpu_max", "mem_max", "down_max"):
+                if point[field] is not None:
+                    t[field] = point[field] if t[field] is None else max(t[field], point[field])
+
+        summary = {}
+        for device_name, t in totals.items():
+            summary[device_name] = {
+                "samples": t["samples"],
+                "healthy_ratio": round(t["healthy"] / t["samples"], 4),
+                "reachability_ratio": round(t["reachable"] / t["samples"], 4),
+                "cpu_avg": round(t["cpu_sum"] / t["cpu_count"], 2) if t["cpu_count"] else None,
+                "cpu_max": t["cpu_max"],
+                "mem_avg": round(t["mem_sum"] / t["mem_count"], 2) if t["mem_count"] else None,
+                "mem_max": t["mem_max"],
+                "down_interface_avg": round(t["down_sum"] / t["samples"], 2),
+                "down_interface_max": t["down_max"],
+            }
+        return summary
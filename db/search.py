@@ -0,0 +1,254 @@
+"""
+全网配置 / 命令输出全文检索（SQLite FTS5）
+回答 "哪些设备配置了 snmp-agent community read public"、"这个MAC在哪台设备的 display mac-address 里出现过"
+原来只能把所有 config_content / command_history.result 读进Python逐个查找。这里建两个FTS5索引：
+1. command_history_fts：外部内容表（content=command_history），由触发器在插入/删除/更新时自动同步，
+   写回队列批量写入的记录同样会被索引
+2. config_fts：每台设备只索引最新的配置版本（回答的是“现在哪些设备有这条配置”），
+   save_config_version 在同一个事务里更新；内容没变的新版本只更新版本号，不重建索引
+默认把查询词当作短语匹配（自动加引号），不会因为 - : 等字符触发FTS语法错误；需要 AND/OR/NEAR 时用 raw=True
+SQLite 没有编译 FTS5 时 FTS5_AVAILABLE 为 False，检索退化为 LIKE / 逐个配置查找，结果一致但慢
+"""
+
+import os
+import sys
+import sqlite3
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+
+logger = setup_logger("search.py", "database.log")
+
+# 片段高亮标记和长度（词数）
+SNIPPET_OPEN = "【"
+SNIPPET_CLOSE = "】"
+SNIPPET_TOKENS = 16
+# 退化模式下片段前后保留的字符数
+FALLBACK_CONTEXT = 40
+
+SCOPE_CONFIG = "config"
+SCOPE_COMMAND = "command"
+
+
+def _check_fts5():
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+FTS5_AVAILABLE = _check_fts5()
+
+
+def to_phrase(query):
+    """把用户输入转成FTS5短语查询（双引号内的双引号要写两遍）"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def fallback_snippet(text, query):
+    """退化模式下的片段：命中位置前后各取一段，和FTS5的snippet格式保持一致"""
+    pos = text.lower().find(query.lower())
+    if pos < 0:
+        return ""
+    start = max(0, pos - FALLBACK_CONTEXT)
+    end = min(len(text), pos + len(query) + FALLBACK_CONTEXT)
+    return (
+        ("..." if start > 0 else "")
+        + text[start:pos] + SNIPPET_OPEN + text[pos:pos + len(query)] + SNIPPET_CLOSE + text[pos + len(query):end]
+        + ("..." if end < len(text) else "")
+    )
+
+
+def create_search_schema(conn):
+    """建检索用的表、FTS索引和同步触发器，并把已有数据灌进索引（由迁移调用，幂等）"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS config_search_docs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,   -- 同时作为 config_fts 的 rowid
+            hostname TEXT UNIQUE NOT NULL,          -- 每台设备一行，只索引最新版本
+            version_id INTEGER NOT NULL,
+            version_number INTEGER NOT NULL,
+            blob_hash TEXT                          -- 当前索引内容的哈希，内容没变就不重建索引
+        )
+        """
+    )
+    if not FTS5_AVAILABLE:
+        logger.warning("当前SQLite未编译FTS5，全文检索将退化为逐条查找")
+        return
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS config_fts USING fts5(content)")
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS command_history_fts
+        USING fts5(command, result, content='command_history', content_rowid='id')
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS command_history_fts_insert AFTER INSERT ON command_history BEGIN
+            INSERT INTO command_history_fts (rowid, command, result) VALUES (new.id, new.command, new.result);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS command_history_fts_delete AFTER DELETE ON command_history BEGIN
+            INSERT INTO command_history_fts (command_history_fts, rowid, command, result)
+            VALUES ('delete', old.id, old.command, old.result);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS command_history_fts_update AFTER UPDATE OF command, result ON command_history BEGIN
+            INSERT INTO command_history_fts (command_history_fts, rowid, command, result)
+            VALUES ('delete', old.id, old.command, old.result);
+            INSERT INTO command_history_fts (rowid, command, result) VALUES (new.id, new.command, new.result);
+        END
+        """
+    )
+    # 外部内容表重建索引：把 command_history 里已有的记录全部索引一遍
+    conn.execute("INSERT INTO command_history_fts (command_history_fts) VALUES ('rebuild')")
+
+
+class FleetSearch:
+    """全网检索：维护配置索引，执行检索"""
+
+    def __init__(self, db):
+        """
+        :param db: DatabaseManager 实例
+        """
+        self.db = db
+
+    def index_config(self, conn, hostname, version_id, version_number, blob_hash, content):
+        """
+        设备保存新配置版本后更新索引（和保存版本在同一个事务里，调用方负责提交）
+        :param content: 配置全文；内容哈希和已索引的一样时不会用到
+        """
+        row = conn.execute("SELECT id, blob_hash FROM config_search_docs WHERE hostname = ?", (hostname,)).fetchone()
+        if row is None:
+            doc_id = conn.execute(
+                "INSERT INTO config_search_docs (hostname, version_id, version_number, blob_hash) VALUES (?, ?, ?, ?)",
+                (hostname, version_id, version_number, blob_hash),
+            ).lastrowid
+            changed = True
+        else:
+            doc_id = row["id"]
+            changed = row["blob_hash"] != blob_hash
+            conn.execute(
+                "UPDATE config_search_docs SET version_id = ?, version_number = ?, blob_hash = ? WHERE id = ?",
+                (version_id, version_number, blob_hash, doc_id),
+            )
+        if changed and FTS5_AVAILABLE:
+            conn.execute("DELETE FROM config_fts WHERE rowid = ?", (doc_id,))
+            conn.execute("INSERT INTO config_fts (rowid, content) VALUES (?, ?)", (doc_id, content))
+
+    def search(self, query, scopes=(SCOPE_CONFIG, SCOPE_COMMAND), device_name=None, limit=50, raw=False):
+        """
+        全网检索
+        :param query: 检索内容，默认按短语匹配
+        :param scopes: 检索范围：config（各设备最新配置）/ command（命令执行结果）
+        :param device_name: 只查某台设备（可选）
+        :param limit: 每个范围最多返回的条数
+        :param raw: True 时 query 直接作为 FTS5 查询表达式（支持 AND / OR / NEAR / 前缀*）
+        :return: 结果列表，每条含 type、device_name、版本或命令信息、snippet
+        """
+        query = (query or "").strip()
+        if not query:
+            return []
+        results = []
+        if SCOPE_CONFIG in scopes:
+            results.extend(self._search_configs(query, device_name, limit, raw))
+        if SCOPE_COMMAND in scopes:
+            results.extend(self._search_commands(query, device_name, limit, raw))
+        return results
+
+    def _search_configs(self, query, device_name, limit, raw):
+        if not FTS5_AVAILABLE:
+            return self._fallback_configs(query, device_name, limit)
+        sql = f"""
+        SELECT d.hostname, d.version_id, d.version_number,
+               snippet(config_fts, 0, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '...', {SNIPPET_TOKENS}) AS snippet
+        FROM config_fts JOIN config_search_docs d ON d.id = config_fts.rowid
+        WHERE config_fts MATCH ? {"AND d.hostname = ?" if device_name else ""}
+        ORDER BY rank LIMIT ?
+        """
+        params = [query if raw else to_phrase(query)] + ([device_name] if device_name else []) + [limit]
+        return [
+            {
+                "type": SCOPE_CONFIG,
+                "device_name": row["hostname"],
+                "version_id": row["version_id"],
+                "version_number": row["version_number"],
+                "snippet": row["snippet"],
+            }
+            for row in self.db.conn.execute(sql, params)
+        ]
+
+    def _search_commands(self, query, device_name, limit, raw):
+        if not FTS5_AVAILABLE:
+            return self._fallback_commands(query, device_name, limit)
+        sql = f"""
+        SELECT h.id, h.device_name, h.device_ip, h.command, h.created_at,
+               snippet(command_history_fts, 1, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '...', {SNIPPET_TOKENS}) AS snippet
+        FROM command_history_fts JOIN command_history h ON h.id = command_history_fts.rowid
+        WHERE command_history_fts MATCH ? {"AND h.device_name = ?" if device_name else ""}
+        ORDER BY rank LIMIT ?
+        """
+        params = [query if raw else to_phrase(query)] + ([device_name] if device_name else []) + [limit]
+        return [self._command_result(row, row["snippet"]) for row in self.db.conn.execute(sql, params)]
+
+    @staticmethod
+    def _command_result(row, snippet):
+        return {
+            "type": SCOPE_COMMAND,
+            "device_name": row["device_name"],
+            "device_ip": row["device_ip"],
+            "history_id": row["id"],
+            "command": row["command"],
+            "created_at": row["created_at"],
+            "snippet": snippet,
+        }
+
+    # ------------------------------------------------------------
+    # 没有FTS5时的退化实现
+    # ------------------------------------------------------------
+
+    def _fallback_configs(self, query, device_name, limit):
+        sql = "SELECT hostname, version_id, version_number, blob_hash FROM config_search_docs"
+        params = []
+        if device_name:
+            sql += " WHERE hostname = ?"
+            params.append(device_name)
+        results = []
+        for row in self.db.conn.execute(sql, params).fetchall():
+            content = self.db.config_store.get(row["blob_hash"]) or ""
+            snippet = fallback_snippet(content, query)
+            if snippet:
+                results.append({
+                    "type": SCOPE_CONFIG,
+                    "device_name": row["hostname"],
+                    "version_id": row["version_id"],
+                    "version_number": row["version_number"],
+                    "snippet": snippet,
+                })
+                if len(results) >= limit:
+                    break
+        return results
+
+    def _fallback_commands(self, query, device_name, limit):
+        sql = "SELECT id, device_name, device_ip, command, created_at, result FROM command_history WHERE result LIKE ?"
+        params = [f"%{query}%"]
+        if device_name:
+            sql += " AND device_name = ?"
+            params.append(device_name)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        return [
+            self._command_result(row, fallback_snippet(row["result"], query))
+            for row in self.db.conn.execute(sql, params)
+        ]
@@ -0,0 +1,178 @@
+"""
+写回（write-behind）批量入库队列
+健康检查、备份记录、命令历史、告警历史、系统指标原来每条记录都单独 INSERT + commit，
+一次500台设备的Nornir并发检查就要 fsync 500多次。开启写回后：
+1. 业务线程只把 (SQL, 参数) 放进有界内存队列，立即返回
+2. 唯一的写线程攒够 batch_size 条或等满 flush_interval 秒后，用 executemany 在一个事务里批量提交
+3. 进程退出时（atexit）自动把队列里剩余的记录全部写完
+4. 提供队列深度、提交耗时等指标，接入 /metrics
+"""
+
+import os
+import sys
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from itertools import groupby
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+
+logger = setup_logger("write_behind.py", "database.log")
+
+# 队列里的控制标记
+_FLUSH = object()
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """有界队列 + 单写线程的批量写入器"""
+
+    def __init__(self, pool, max_queue=10000, batch_size=200, flush_interval=1.0):
+        """
+        :param pool: SQLiteConnectionPool，写线程从中拿自己的连接
+        :param max_queue: 队列容量，满了以后 submit 会阻塞（反压），避免内存无限增长
+        :param batch_size: 攒够多少条记录就提交一次
+        :param flush_interval: 最多等待多少秒就提交一次（即使没攒够）
+        """
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "rows_submitted": 0,
+            "rows_written": 0,
+            "rows_failed": 0,
+            "batches_committed": 0,
+            "max_queue_depth": 0,
+            "last_commit_ms": 0.0,
+            "max_commit_ms": 0.0,
+            "total_commit_ms": 0.0,
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        logger.info(f"写回队列已启动：batch_size={self.batch_size}，flush_interval={self.flush_interval}秒")
+
+    def submit(self, sql, params):
+        """放入一条待写记录（队列满时阻塞等待）"""
+        if not self.is_running():
+            raise RuntimeError("写回队列未启动")
+        self._queue.put((sql, params))
+        depth = self._queue.qsize()
+        with self._metrics_lock:
+            self._metrics["rows_submitted"] += 1
+            if depth > self._metrics["max_queue_depth"]:
+                self._metrics["max_queue_depth"] = depth
+
+    def flush(self):
+        """立即提交队列里已有的记录，并等待写完"""
+        if not self.is_running():
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self):
+        """停止写线程：先把队列里剩余的记录全部写完再退出"""
+        if not self.is_running():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+        logger.info(f"写回队列已停止，累计写入{self._metrics['rows_written']}条记录")
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_metrics(self):
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        batches = metrics["batches_committed"]
+        metrics["queue_depth"] = self._queue.qsize()
+        metrics["avg_commit_ms"] = round(metrics.pop("total_commit_ms") / batches, 3) if batches else 0.0
+        return metrics
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            markers = 0
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    markers += 1
+                elif item is _FLUSH:
+                    markers += 1
+                else:
+                    batch.append(item)
+                if stopping or item is _FLUSH or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if stopping:
+                # 停止前把队列剩余的记录也一起带走
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP or item is _FLUSH:
+                        markers += 1
+                    else:
+                        batch.append(item)
+            if batch:
+                self._commit(batch)
+            for _ in range(len(batch) + markers):
+                self._queue.task_done()
+
+    def _commit(self, batch):
+        """同一条SQL的相邻记录合并成一次 executemany，整批在一个事务里提交"""
+        conn = self.pool.get_connection()
+        start = time.perf_counter()
+        try:
+            for sql, group in groupby(batch, key=lambda item: item[0]):
+                conn.executemany(sql, [params for _, params in group])
+            conn.commit()
+            written, failed = len(batch), 0
+        except sqlite3.Error as e:
+            # 整批失败时回滚，逐条重写，把坏记录隔离出来，不连累同批的其他记录
+            conn.rollback()
+            logger.error(f"批量提交失败，改为逐条写入：{str(e)[:100]}")
+            written, failed = 0, 0
+            for sql, params in batch:
+                try:
+                    conn.execute(sql, params)
+                    conn.commit()
+                    written += 1
+                except sqlite3.Error as row_error:
+                    conn.rollback()
+                    failed += 1
+                    logger.error(f"丢弃无法写入的记录：{str(row_error)[:100]}")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._metrics_lock:
+            self._metrics["rows_written"] += written
+            self._metrics["rows_failed"] += failed
+            self._metrics["batches_committed"] += 1
+            self._metrics["last_commit_ms"] = round(elapsed_ms, 3)
+            self._metrics["max_commit_ms"] = round(max(self._metrics["max_commit_ms"], elapsed_ms), 3)
+            self._metrics["total_commit_ms"] += elapsed_ms
+        logger.debug(f"写回队列提交{written}条记录，耗时{elapsed_ms:.1f}ms")
@@ -0,0 +1,98 @@
+import io
+import os
+import sys
+import tarfile
+import zipfile
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.backup.archive import BackupArchive, build_entries, parse_range, _crc_cache
+from core.backup.repository import BackupRepository
+from db.database import DatabaseManager
+import pytest
+
+
+@pytest.fixture
+def backup_set(tmp_path):
+    """三台设备各两晚的备份，SW2 两晚内容相同"""
+    repository = BackupRepository(root=str(tmp_path / "repo"), codec="zlib", chunk_size=512)
+    db = DatabaseManager(db_path=str(tmp_path / "test.db"))
+    contents = {}
+    for day in (16, 17):
+        night = datetime(2026, 10, day, 2, 0, 0)
+        for i in range(3):
+            text = f"sysname SW{i}\n" + "".join(f"interface GE1/0/{p}\n description day{day if i < 2 else 0}\n"
+                                                for p in range(100 * (i + 1)))
+            stored = repository.store(f"10.0.0.{i}", text, timestamp=night)
+            db.log_backup(hostname=f"SW{i}", backup_path=stored.backup_path, start_time=night, end_time=night,
+                          backup_size=stored.raw_size, checksum=stored.checksum, dedup=stored.dedup,
+                          stored_size=stored.stored_size)
+            contents[f"SW{i}/{os.path.basename(stored.backup_path)}"] = text.encode("utf-8")
+    yield db, repository, contents
+    db.close()
+
+
+# 测试备份集打包：zip/tar 长度事先算出、任意区间续传拼起来和整包一致，tar.gz 可以正常解开
+class TestBackupArchive:
+    def test_select_backup_set(self, backup_set):
+        db, _, _ = backup_set
+        assert len(db.select_backup_set(date="2026-10-17")) == 3
+        latest = db.select_backup_set(hostnames=["SW0", "SW2"], latest=True)
+        assert [(r["hostname"], str(r["start_time"])[:10]) for r in latest] == [("SW0", "2026-10-17"),
+                                                                                 ("SW2", "2026-10-17")]
+
+    @pytest.mark.parametrize("fmt", ["zip", "tar"])
+    def test_length_and_resume(self, backup_set, fmt):
+        db, repository, contents = backup_set
+        entries = build_entries(db.select_backup_set(), repository)
+        archive = BackupArchive(entries, fmt=fmt, repository=repository, chunk_size=512)
+        full = b"".join(archive.iter_bytes())
+        assert len(full) == archive.length
+        # 模拟断线续传（比如服务重启后）：按不规则的区间分段下载，CRC 缓存清空也要拼得一模一样
+        pieces, start = [], 0
+        for cut in (1, 700, 5000, archive.length // 2, archive.length - 10, archive.length):
+            _crc_cache.clear()
+            resumed = BackupArchive(build_entries(db.select_backup_set(), repository), fmt=fmt,
+                                    repository=repository, chunk_size=512)
+            pieces.append(b"".join(resumed.iter_bytes(start, cut - 1)))
+            start = cut
+        assert b"".join(pieces) == full
+
+        if fmt == "zip":
+            with zipfile.ZipFile(io.BytesIO(full)) as zf:
+                assert zf.testzip() is None
+                assert {name: zf.read(name) for name in zf.namelist()} == contents
+        else:
+            with tarfile.open(fileobj=io.BytesIO(full)) as tf:
+                assert {m.name: tf.extractfile(m).read() for m in tf.getmembers()} == contents
+
+    def test_tar_gz_streams(self, backup_set):
+        db, repository, contents = backup_set
+        archive = BackupArchive(build_entries(db.select_backup_set(), repository), fmt="tar.gz", repository=repository)
+        assert archive.length is None and not archive.resumable
+        with tarfile.open(fileobj=io.BytesIO(b"".join(archive.iter_bytes())), mode="r:gz") as tf:
+            assert {m.name: tf.extractfile(m).read() for m in tf.getmembers()} == contents
+
+    def test_legacy_paths_outside_root_skipped(self, tmp_path):
+        outside = tmp_path / "secret.txt"
+        outside.write_text("secret")
+        records = [
+            {"id": 1, "hostname": "SW1", "backup_path": None, "checksum": None, "start_time": None},
+            {"id": 2, "hostname": "SW1", "backup_path": str(outside), "checksum": None, "start_time": None},
+            {"id": 3, "hostname": "SW1", "backup_path": "backupN1/../../etc/passwd", "checksum": None,
+             "start_time": None},
+        ]
+        repository = BackupRepository(root=str(tmp_path / "repo"), codec="zlib")
+        assert build_entries(records, repository) == []
+
+    def test_parse_range(self):
+        assert parse_range("bytes=100-", 1000) == (100, 999)
+        assert parse_range("bytes=-100", 1000) == (900, 999)
+        assert parse_range("bytes=0-5000", 1000) == (0, 999)
+        assert parse_range("bytes=1000-", 1000) is False
+        assert parse_range("bytes=0-1,5-6", 1000) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
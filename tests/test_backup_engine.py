@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.backup.backup_engine import BackupEngine
+from db.database import DatabaseManager
+import pytest
+
+
+class FakeBackup:
+    """每台设备备份耗时 delay 秒；fail 里的设备前 N 次失败；记录每个站点同时在跑的最大数"""
+
+    def __init__(self, delay=0.05, fail=None):
+        self.delay = delay
+        self.fail = dict(fail or {})
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.calls = []
+
+    def __call__(self, params):
+        host = params["host"]
+        assert "site" not in params and "device_name" not in params
+        site = host.split(".")[2]
+        with self.lock:
+            self.calls.append((host, time.monotonic()))
+            self.running[site] = self.running.get(site, 0) + 1
+            self.peak[site] = max(self.peak.get(site, 0), self.running[site])
+        time.sleep(self.delay)
+        with self.lock:
+            self.running[site] -= 1
+            if self.fail.get(host, 0) > 0:
+                self.fail[host] -= 1
+                raise TimeoutError("连接超时")
+        return f"backupN1/{host}.txt"
+
+
+def devices(count, sites=2):
+    return [{"device_name": f"SW{i}", "host": f"10.0.{i % sites}.{i}", "site": f"site{i % sites}", "vendor": "h3c"}
+            for i in range(count)]
+
+
+# 测试并发备份引擎：站点并发限制、重试不阻塞其他设备、最终结果写库
+class TestBackupEngine:
+    def test_site_limit_and_concurrency(self):
+        backup = FakeBackup(delay=0.05)
+        engine = BackupEngine(backup, global_limit=6, per_site_limit=2, per_vendor_limit=10, record=False)
+        started = time.perf_counter()
+        results = engine.run(devices(12))
+        elapsed = time.perf_counter() - started
+        assert [result["device_name"] for result in results] == [f"SW{i}" for i in range(12)]
+        assert all(result["status"] == "成功" for result in results)
+        assert max(backup.peak.values()) == 2
+        assert elapsed < 12 * 0.05 / 2  # 两个站点各2台并发，远快于串行
+
+    def test_devices_without_site_reach_global_limit(self):
+        # devices.yml / nornir 清单里没有 site、vendor，不能都挤进同一个站点的名额
+        backup = FakeBackup(delay=0.05)
+        engine = BackupEngine(backup, global_limit=8, per_site_limit=2, per_vendor_limit=2, record=False)
+        results = engine.run([{"host": f"10.0.0.{i}"} for i in range(16)])
+        assert all(result["status"] == "成功" for result in results)
+        assert backup.peak["0"] == 8
+
+    def test_retry_queue_does_not_block_other_devices(self):
+        backup = FakeBackup(delay=0.01, fail={"10.0.0.0": 1, "10.0.1.1": 5})
+        progress = []
+        engine = BackupEngine(backup, global_limit=4, per_site_limit=4, max_retries=2, retry_delay=0.3, backoff=1,
+                              record=False, on_progress=progress.append)
+        results = engine.run(devices(8))
+        assert results[0]["status"] == "成功" and results[0]["attempts"] == 2
+        assert results[1]["status"] == "失败" and results[1]["attempts"] == 3 and "连接超时" in results[1]["error"]
+        # 其他设备在第一次重试开始之前就已经备份完
+        first_retry = [at for host, at in backup.calls if host == "10.0.0.0"][1]
+        others = [at for host, at in backup.calls if host not in ("10.0.0.0", "10.0.1.1")]
+        assert max(others) < first_retry
+        final = engine.progress()
+        assert (final["succeeded"], final["failed"], final["retries"]) == (7, 1, 3)
+        assert progress[-1]["done"] == 8
+
+    def test_final_results_recorded(self, tmp_path):
+        db = DatabaseManager(db_path=str(tmp_path / "test.db"))
+        try:
+            backup = FakeBackup(delay=0, fail={"10.0.1.1": 9})
+            BackupEngine(backup, max_retries=1, retry_delay=0, db=db).run(devices(2))
+            rows = {row["hostname"]: row for row in db.get_recent_backups()}
+            assert rows["SW0"]["status"] == "success" and rows["SW0"]["backup_path"] == "backupN1/10.0.0.0.txt"
+            assert rows["SW1"]["status"] == "failed" and len(rows) == 2
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,51 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.backup.backup_engine import BackupEngine
+from core.backup.repository import BackupRepository
+from db.database import DatabaseManager
+import pytest
+
+
+@pytest.fixture
+def repository(tmp_path):
+    return BackupRepository(root=str(tmp_path / "repo"), codec="zlib", chunk_size=1024)
+
+
+# 测试备份仓库：相同内容只存一次，边读边解压还原，备份记录带上校验和和去重命中
+class TestBackupRepository:
+    def test_dedup_and_stream_roundtrip(self, repository):
+        output = "".join(f"GE1/0/{i}  UP  UP  --\n" for i in range(500))
+        first = repository.store("10.0.0.1", output)
+        second = repository.store("10.0.0.2", output)
+        assert first.checksum == second.checksum and len(first.checksum) == 64
+        assert not first.dedup and 0 < first.stored_size < first.raw_size
+        assert second.dedup and second.stored_size == 0
+        assert second.backup_path.startswith("backupN1/10.0.0.2__配置__")
+        chunks = list(repository.open_stream(first.checksum))
+        assert len(chunks) > 1 and b"".join(chunks).decode("utf-8") == output
+        assert os.listdir(repository.tmp_dir) == []
+        assert repository.delete(first.checksum) == first.stored_size and not repository.exists(first.checksum)
+
+    def test_engine_records_checksum_and_savings(self, repository, tmp_path):
+        db = DatabaseManager(db_path=str(tmp_path / "test.db"))
+        try:
+            backup = lambda params: repository.store(params["host"], "same config\n" * 200)
+            devices = [{"device_name": f"SW{i}", "host": f"10.0.0.{i}"} for i in range(3)]
+            BackupEngine(backup, global_limit=1, db=db).run(devices)
+            rows = sorted(db.get_recent_backups(), key=lambda row: row["hostname"])
+            assert len({row["checksum"] for row in rows}) == 1
+            assert [row["dedup"] for row in rows].count(0) == 1
+            record = db.get_backup_by_path(rows[0]["backup_path"])
+            assert repository.read(record["checksum"]) == b"same config\n" * 200
+            savings = db.get_backup_savings()
+            assert savings["backups"] == 3 and savings["dedup_hits"] == 2
+            assert savings["raw_bytes"] == 3 * 2400 and savings["stored_bytes"] < 2400
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,82 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.backup.repository import BackupRepository
+from core.backup.retention import BackupRetention, RetentionPolicy, plan_device
+from db.database import DatabaseManager
+import pytest
+
+NOW = datetime(2026, 10, 18, 12, 0, 0)
+
+
+def record(record_id, days_ago, checksum, hours=2, status="success"):
+    started = NOW - timedelta(days=days_ago)
+    return {"id": record_id, "status": status, "checksum": checksum, "backup_path": f"backupN1/{record_id}.txt",
+            "start_time": started.replace(hour=hours, minute=0, second=0)}
+
+
+# 测试分级保留策略：7天全留、90天每天一份、更早每月一份，最新一次和最近一次内容变化始终保留
+class TestRetentionPlan:
+    def test_tiers(self):
+        records = [
+            record(1, 200, "a"), record(2, 199, "a"),  # 同一个月，只留后一份
+            record(3, 40, "a", hours=1), record(4, 40, "a", hours=5),  # 同一天，只留后一份
+            record(5, 30, "b"),  # 内容变化，但不是最近一次变化
+            record(6, 3, "c", hours=1), record(7, 3, "c", hours=5),  # 7天内全部保留
+            record(8, 120, "x", status="failed"), record(9, 1, "x", status="failed"),
+        ]
+        records.sort(key=lambda r: (r["start_time"], r["id"]))
+        keep, delete = plan_device(records, NOW, RetentionPolicy(keep_all_days=7, daily_days=90, failed_days=90))
+        assert keep == {2: "monthly", 4: "daily", 5: "daily", 6: "all", 7: "all"}
+        assert sorted(r["id"] for r in delete) == [1, 3, 8]
+
+    def test_latest_change_kept_even_when_old(self):
+        records = [record(1, 300, "a"), record(2, 299, "b"), record(3, 298, "b")]
+        keep, _ = plan_device(records, NOW, RetentionPolicy())
+        assert keep == {2: "changed", 3: "monthly"}
+
+
+class TestBackupRetention:
+    def test_dry_run_then_delete_in_batches(self, tmp_path):
+        repository = BackupRepository(root=str(tmp_path / "repo"), codec="zlib")
+        db = DatabaseManager(db_path=str(tmp_path / "test.db"))
+        try:
+            objects = {}
+            for days_ago in range(120, -1, -1):  # 两台设备，每晚一次，每10天改一次配置
+                night = (NOW - timedelta(days=days_ago)).replace(hour=2, minute=0, second=0)
+                for host in ("SW1", "SW2"):
+                    content = f"sysname {host}\nversion {days_ago // 10}\n" * 50
+                    stored = repository.store(host, content, timestamp=night)
+                    objects.setdefault(stored.checksum, stored)
+                    db.log_backup(hostname=host, backup_path=stored.backup_path, start_time=night, end_time=night,
+                                  backup_size=stored.raw_size, checksum=stored.checksum, dedup=stored.dedup,
+                                  stored_size=stored.stored_size)
+            retention = BackupRetention(db=db, repository=repository, batch_size=7, grace_seconds=0)
+
+            preview = retention.run(dry_run=True, now=NOW)
+            assert preview["scanned"] == 242 and len(db.get_recent_backups()) == 242
+            assert all(repository.exists(checksum) for checksum in objects)
+            assert preview["deleted_objects"] > 0 and preview["reclaimed_bytes"] > 0
+
+            report = retention.run(now=NOW)
+            for key in ("deleted_records", "deleted_objects", "reclaimed_bytes", "kept"):
+                assert report[key] == preview[key]
+            remaining = db.get_recent_backups()
+            assert len(remaining) == report["kept"] == 242 - report["deleted_records"]
+            # 剩下的每条记录引用的对象都还在，没有记录引用的对象都已删除
+            referenced = {row["checksum"] for row in remaining}
+            assert all(repository.exists(checksum) for checksum in referenced)
+            gone = set(objects) - referenced
+            assert len(gone) == report["deleted_objects"]
+            assert not any(repository.exists(checksum) for checksum in gone)
+            assert report["reclaimed_bytes"] == sum(objects[checksum].stored_size for checksum in gone)
+            assert retention.run(now=NOW)["deleted_records"] == 0
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
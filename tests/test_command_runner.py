@@ -0,0 +1,158 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.connection.command_runner import (LatencyProfiles, LatencyStats, prefetch_commands, prompt_line_pattern,
+                                            run_batch, run_command, split_pipelined_output)
+import pytest
+
+
+class FakeConnection:
+    """代替 Netmiko 连接：send_command 按设定的耗时推进时钟，prompt_ok=False 时模拟等不到提示符"""
+
+    host = "10.0.0.1"
+
+    def __init__(self, prompt_ok=True):
+        self.prompt_ok = prompt_ok
+        self.calls = []
+
+    def send_command(self, command, expect_string=None, read_timeout=10.0):
+        self.calls.append(("prompt", command, read_timeout))
+        if not self.prompt_ok:
+            raise TimeoutError("Pattern not detected")
+        return f"{command} output"
+
+    def send_command_timing(self, command, delay_factor=None):
+        self.calls.append(("timing", command, delay_factor))
+        return f"{command} output"
+
+    def clear_buffer(self):
+        self.calls.append(("clear", None, None))
+
+
+DEVICE_OUTPUTS = {
+    "screen-length disable": "",
+    "display version": "H3C Comware Software, Version 7.1.075\nH3C S6850 uptime is 1 day",
+    "display cpu-usage": "Slot 1 CPU 0 CPU usage:\n      14% in last 5 seconds",
+    "display interface brief": "Interface  Link Speed\nGE1/0/1    UP   1G\nGE1/0/2    DOWN auto",
+}
+
+
+class FakePipelinedDevice(FakeConnection):
+    """模拟设备按顺序执行一次写入的多条命令：回显 + 输出 + 提示符，分小块读出"""
+
+    base_prompt = "SW1"
+    RETURN = "\n"
+
+    def __init__(self, chunk_size=7, echo_ok=True):
+        super().__init__()
+        self.chunk_size = chunk_size
+        self.echo_ok = echo_ok
+        self.pending = ""
+        self.writes = 0
+
+    def write_channel(self, data):
+        self.writes += 1
+        for command in data.split(self.RETURN)[:-1]:
+            echo = command if self.echo_ok else command.upper()
+            output = DEVICE_OUTPUTS.get(command, f"{command} output")
+            self.pending += f"{echo}\r\n{output}\r\n" if output else f"{echo}\r\n"
+            self.pending += "<SW1>"
+
+    def read_channel(self):
+        chunk, self.pending = self.pending[:self.chunk_size], self.pending[self.chunk_size:]
+        return chunk
+
+    def send_command(self, command, expect_string=None, read_timeout=10.0):
+        self.calls.append(("prompt", command, read_timeout))
+        return DEVICE_OUTPUTS.get(command, f"{command} output")
+
+
+@pytest.fixture
+def profiles():
+    return LatencyProfiles({"prompt_failures_before_timing": 2, "timing_mode_ttl": 60})
+
+
+# 测试提示符驱动的命令执行：时延档案、自适应超时、等不到提示符时的兜底
+class TestCommandRunner:
+    def test_latency_stats_ewma_and_timeout_bounds(self):
+        stats = LatencyStats()
+        assert stats.timeout() == 30.0  # 没有样本用默认值
+        for _ in range(20):
+            stats.record(0.1)
+        assert stats.srtt == pytest.approx(0.1) and stats.rttvar < 0.01
+        assert stats.timeout() == 5.0  # 设备很快时不低于下限
+        for _ in range(50):
+            stats.record(60)
+        assert stats.timeout() == 120.0  # 不超过上限
+
+    def test_prompt_mode_records_per_command_latency(self, profiles):
+        conn = FakeConnection()
+        assert run_command(conn, "display version", profiles=profiles) == "display version output"
+        run_command(conn, "display cpu-usage", profiles=profiles)
+        assert [call[0] for call in conn.calls] == ["prompt", "prompt"]
+        assert conn.calls[0][2] == 30.0  # 第一次没有样本
+        # 有样本后超时收紧到下限
+        assert profiles.read_timeout("10.0.0.1", "display version") == 5.0
+        snapshot = profiles.snapshot()["10.0.0.1"]
+        assert snapshot["overall"]["samples"] == 2 and set(snapshot["commands"]) == {"display version", "display cpu-usage"}
+        assert profiles.command_summary()["display version"]["samples"] == 1
+
+    def test_falls_back_to_timing_and_switches_mode(self, profiles):
+        conn = FakeConnection(prompt_ok=False)
+        assert run_command(conn, "display memory", profiles=profiles) == "display memory output"
+        assert [call[0] for call in conn.calls] == ["prompt", "clear", "timing"]
+        assert not profiles.use_timing("10.0.0.1")
+
+        run_command(conn, "display memory", profiles=profiles)
+        assert profiles.use_timing("10.0.0.1")
+        # 进入定时读取模式后不再先白等一次提示符
+        conn.calls.clear()
+        run_command(conn, "display version", profiles=profiles)
+        assert [call[0] for call in conn.calls] == ["timing"]
+        assert profiles.snapshot()["10.0.0.1"]["commands"]["display memory"]["timeouts"] == 2
+
+
+# 测试流水线批量执行：一次写入、按提示符切分、切不开时逐条补执行
+class TestPipelinedBatch:
+    def test_split_by_prompt_lines(self):
+        buffer = "display version\nVersion 7.1\n<SW1>display cpu-usage\n14% in last 5 seconds\n[SW1]"
+        outputs = split_pipelined_output(buffer, ["display version", "display cpu-usage"], prompt_line_pattern("SW1"))
+        assert outputs == {"display version": "Version 7.1", "display cpu-usage": "14% in last 5 seconds"}
+        # 输出里出现别的设备名的尖括号行不算提示符
+        buffer = "display arp\n<SW10> not a prompt\n<SW1>"
+        assert split_pipelined_output(buffer, ["display arp"], prompt_line_pattern("SW1")) == {
+            "display arp": "<SW10> not a prompt"}
+
+    def test_one_write_for_all_commands(self, profiles):
+        conn = FakePipelinedDevice()
+        commands = ["display version", "display cpu-usage", "display interface brief", "display version"]
+        outputs = run_batch(conn, commands, vendor="h3c", profiles=profiles)
+        assert conn.writes == 1 and not [call for call in conn.calls if call[0] == "prompt"]
+        assert list(outputs) == ["display version", "display cpu-usage", "display interface brief"]
+        assert outputs["display interface brief"] == DEVICE_OUTPUTS["display interface brief"]
+        assert profiles.snapshot()["10.0.0.1"]["commands"]["display cpu-usage"]["samples"] == 1
+
+    def test_prefetched_session_shares_outputs(self, profiles):
+        conn = FakePipelinedDevice()
+        session = prefetch_commands(conn, ["display version", "display cpu-usage"], profiles=profiles)
+        assert run_command(session, "display cpu-usage") == DEVICE_OUTPUTS["display cpu-usage"]
+        assert run_command(session, "display cpu-usage") == DEVICE_OUTPUTS["display cpu-usage"]
+        # 没有批量取回的命令照常发给设备
+        assert run_command(session, "display arp", profiles=profiles) == "display arp output"
+        assert conn.writes == 1 and [call[1] for call in conn.calls if call[0] == "prompt"] == ["display arp"]
+        # 再次批量取回时只补取新命令，合并到同一个会话
+        assert prefetch_commands(session, ["display version", "display interface brief"], profiles=profiles) is session
+        assert conn.writes == 2 and set(session.outputs) == {"display version", "display cpu-usage",
+                                                             "display interface brief"}
+
+    def test_unmatched_echo_falls_back_to_sequential(self, profiles):
+        conn = FakePipelinedDevice(echo_ok=False)
+        outputs = run_batch(conn, ["display version", "display cpu-usage"], profiles=profiles)
+        assert outputs["display version"] == DEVICE_OUTPUTS["display version"]
+        assert [call[1] for call in conn.calls if call[0] == "prompt"] == ["display version", "display cpu-usage"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,448 @@
+import os
+import sys
+import random
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from db.database import DatabaseManager
+from db.migrations import MIGRATIONS, apply_migrations, get_schema_version
+from utils.diff_engine import diff_opcodes, diff_lines
+import pytest
+
+
+def make_check_record(device_name="SW1", check_time="2026-06-01 10:00:00", cpu="23%", memory="45.0%"):
+    return {
+        "host": "10.0.0.1",
+        "device_name": device_name,
+        "version": "7.1.075",
+        "check_time": check_time,
+        "status": "healthy",
+        "check_status": "成功",
+        "up_interface": 20,
+        "down_interface": 4,
+        "total_interface": 24,
+        "CPU_usage": cpu,
+        "memory_usage": memory,
+        "error_message": "",
+        "device_health_issues": "无",
+        "reachable": "可达",
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(db_path=str(tmp_path / "test.db"))
+    yield manager
+    manager.close()
+
+
+# 测试连接池：每个线程拿到自己的连接，并且开启了WAL
+class TestConnectionPool:
+    def test_wal_enabled(self, db):
+        assert db.pool.stats()["journal_mode"].lower() == "wal"
+
+    def test_each_thread_gets_own_connection(self, db):
+        main_conn = db.conn
+        assert db.conn is main_conn  # 同一线程复用同一个连接
+        other = {}
+        t = threading.Thread(target=lambda: other.setdefault("conn", db.conn))
+        t.start()
+        t.join()
+        assert other["conn"] is not main_conn
+
+    def test_concurrent_writes_no_errors(self, db):
+        results = []
+
+        def worker(i):
+            for n in range(30):
+                results.append(db.log_check_device(make_check_record(device_name=f"SW{i}")))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert all(results)
+        assert len(db.get_health_check_history()) == 8 * 30
+
+
+# 测试写回队列：批量提交、flush、关闭时写完剩余记录
+class TestWriteBehind:
+    def test_flush_writes_everything(self, db):
+        db.enable_write_behind(batch_size=50, flush_interval=5)
+        for i in range(120):
+            assert db.log_check_device(make_check_record(device_name=f"SW{i}"))
+        db.save_command_history("SW1", "10.0.0.1", "display version", "system", "ok")
+        db.flush_writes()
+        assert len(db.get_health_check_history()) == 120
+        metrics = db.get_write_behind_metrics()
+        assert metrics["rows_written"] == 121
+        assert metrics["queue_depth"] == 0
+        assert metrics["batches_committed"] < 121  # 确实是批量提交
+
+    def test_close_drains_queue(self, tmp_path):
+        path = str(tmp_path / "drain.db")
+        manager = DatabaseManager(db_path=path)
+        manager.enable_write_behind(batch_size=1000, flush_interval=60)
+        for i in range(30):
+            manager.log_check_device(make_check_record(device_name=f"SW{i}"))
+        manager.close()
+        reopened = DatabaseManager(db_path=path)
+        assert len(reopened.get_health_check_history()) == 30
+        reopened.close()
+
+    def test_sync_returns_id(self, db):
+        db.enable_write_behind()
+        history_id = db.save_command_history("SW1", "10.0.0.1", "display version", "system", "ok", sync=True)
+        assert history_id is not None
+        assert db.get_command_history_detail(history_id)["result"] == "ok"
+
+
+# 测试时序汇总：5m/1h/1d 三级聚合、水位线幂等、保留策略只删已汇总的数据、按跨度自动选粒度
+class TestRollups:
+    NOW = datetime(2026, 6, 3, 12, 0, 0)
+
+    def fill(self, db, start, count, step_minutes=1, device_name="SW1"):
+        for i in range(count):
+            t = start + timedelta(minutes=i * step_minutes)
+            cpu = "N/A" if i % 10 == 9 else f"{i % 50}%"
+            db.log_check_device(make_check_record(device_name, t.strftime("%Y-%m-%d %H:%M:%S"), cpu=cpu))
+
+    def rollup_rows(self, db, bucket):
+        sql = "SELECT * FROM health_check_rollups WHERE bucket = ? ORDER BY device_name, bucket_start"
+        return [dict(r) for r in db.conn.execute(sql, (bucket,))]
+
+    def test_levels_match_raw_aggregates(self, db):
+        start = datetime(2026, 6, 1, 0, 0, 0)
+        self.fill(db, start, 48 * 60, step_minutes=1)  # 两天，每分钟一条
+        db.run_rollups(now=self.NOW)
+
+        five = self.rollup_rows(db, "5m")
+        assert len(five) == 48 * 12
+        assert five[0]["samples"] == 5 and five[0]["cpu_min"] == 0 and five[0]["cpu_max"] == 4
+        days = self.rollup_rows(db, "1d")
+        assert [d["bucket_start"] for d in days] == ["2026-06-01 00:00:00", "2026-06-02 00:00:00"]
+        day = days[0]
+        cpu_values = [i % 50 for i in range(24 * 60) if i % 10 != 9]
+        assert day["samples"] == 24 * 60
+        assert day["cpu_count"] == len(cpu_values)
+        assert day["cpu_avg"] == pytest.approx(sum(cpu_values) / len(cpu_values))
+        assert day["reachability_ratio"] == 1.0
+        assert day["up_avg"] == 20 and day["down_max"] == 4
+
+    def test_rerun_is_idempotent(self, db):
+        self.fill(db, datetime(2026, 6, 3, 10, 0, 0), 60)
+        first = db.run_rollups(now=self.NOW)
+        assert first["health"]["5m"] == 12
+        second = db.run_rollups(now=self.NOW)
+        assert second["health"]["5m"] == 0
+        assert sum(r["samples"] for r in self.rollup_rows(db, "5m")) == 60
+
+    def test_prune_keeps_unrolled_raw(self, tmp_path):
+        manager = DatabaseManager(db_path=str(tmp_path / "prune.db"))
+        manager.rollups.retention["raw"] = 1
+        self.fill(manager, datetime(2026, 5, 20, 0, 0, 0), 10, step_minutes=60)
+        manager.rollups.prune(now=self.NOW)  # 还没汇总过，一条都不能删
+        assert len(manager.get_health_check_history()) == 10
+        result = manager.run_rollups(now=self.NOW)
+        assert result["pruned"]["health:raw"] == 10
+        assert manager.get_health_check_history() == []
+        assert sum(r["samples"] for r in self.rollup_rows(manager, "1d")) == 10
+        manager.close()
+
+    def test_trend_picks_granularity_and_includes_tail(self, db):
+        now = datetime.now()
+        self.fill(db, now - timedelta(hours=3), 120, step_minutes=1, device_name="SW1")
+        self.fill(db, now - timedelta(hours=3), 120, step_minutes=1, device_name="SW2")
+        db.run_rollups(now=now - timedelta(hours=2))  # 只汇总了前一个小时，后面的要从原始记录现算
+        assert db.rollups.pick_granularity(1) == "5m"
+        assert db.rollups.pick_granularity(7) == "1h"
+        assert db.rollups.pick_granularity(90) == "1d"
+        points = db.get_health_trend(device_name="SW1", days=1)
+        assert {p["device_name"] for p in points} == {"SW1"}
+        assert sum(p["samples"] for p in points) == 120
+        starts = [p["bucket_start"] for p in points]
+        assert starts == sorted(starts) and len(set(starts)) == len(starts)
+        summary = db.get_health_summary(days=7)
+        assert summary["SW2"]["samples"] == 120
+        assert summary["SW2"]["healthy_ratio"] == 1.0
+
+    def test_system_metrics_rollup(self, db):
+        for i in range(30):
+            t = datetime(2026, 6, 3, 10, 0, 0) + timedelta(minutes=i)
+            db.log_system_metrics({
+                "timestamp": t.isoformat(), "cpu_percent": float(i), "memory_percent": 50.0,
+                "memory_used_gb": 4.0, "memory_total_gb": 8.0, "disk_percent": 30.0, "disk_used_gb": 30.0,
+                "disk_total_gb": 100.0, "network_bytes_sent": 0, "network_bytes_recv": 0,
+                "network_packets_sent": 0, "network_packets_recv": 0,
+            })
+        result = db.run_rollups(now=self.NOW)
+        assert result["system"]["5m"] == 6
+        hour = db.conn.execute("SELECT * FROM system_metrics_rollups WHERE bucket = '1h'").fetchone()
+        assert hour["samples"] == 30 and hour["cpu_max"] == 29 and hour["cpu_avg"] == pytest.approx(14.5)
+
+
+def make_config(lines=2000, seed=0):
+    rng = random.Random(seed)
+    body = []
+    for i in range(lines):
+        body.append(f"interface GigabitEthernet1/0/{i}\n description link-{rng.randint(0, 9999)}\n#\n")
+    return "sysname SW1\n#\n" + "".join(body) + "return\n"
+
+
+def mutate(config, rng):
+    lines = config.splitlines(keepends=True)
+    for _ in range(rng.randint(1, 5)):
+        pos = rng.randrange(len(lines))
+        action = rng.choice(("replace", "insert", "delete"))
+        if action == "replace":
+            lines[pos] = f" description changed-{rng.randint(0, 99999)}\n"
+        elif action == "insert":
+            lines.insert(pos, f" undo shutdown {rng.randint(0, 99999)}\r\n")
+        elif len(lines) > 10:
+            del lines[pos]
+    return "".join(lines)
+
+
+# 测试配置版本内容寻址存储：差量还原、相同内容复用、完整快照间隔、老数据迁移
+class TestConfigStore:
+    def test_versions_roundtrip(self, db):
+        rng = random.Random(42)
+        config = make_config()
+        expected = {}
+        for _ in range(45):
+            expected[db.save_config_version("SW1", config)] = config
+            config = mutate(config, rng)
+        db.config_store._cache.clear()
+        for version_id, content in expected.items():
+            assert db.get_config_content(version_id) == content
+        stats = db.config_store.stats()
+        assert stats["keyframes"] == 3  # 第1、21、41个版本是完整快照
+        assert stats["stored_bytes"] < sum(len(c.encode()) for c in expected.values()) / 20
+
+    def test_identical_content_reuses_blob(self, db):
+        config = make_config(lines=100)
+        first = db.save_config_version("SW1", config)
+        db.save_config_version("SW1", config + "# changed\n")
+        third = db.save_config_version("SW1", config)
+        assert db.config_store.stats()["blobs"] == 2
+        versions = {v["id"]: v for v in db.get_config_versions("SW1")}
+        assert versions[first]["version_number"] == 1 and versions[third]["version_number"] == 3
+        assert db.get_config_content(third) == config
+        assert db.compare_configs(first, third)["is_identical"]
+
+    def test_rolled_back_put_not_cached(self, db):
+        config = make_config(lines=50)
+        with pytest.raises(RuntimeError):
+            with db.transaction() as conn:
+                blob_hash = db.config_store.put(conn, config)
+                raise RuntimeError("rollback")
+        assert db.config_store._cache_get(blob_hash) is None
+        assert db.config_store.get(blob_hash) is None
+
+    def test_legacy_rows_are_migrated(self, tmp_path):
+        path = str(tmp_path / "legacy.db")
+        manager = DatabaseManager(db_path=path)
+        for n, content in enumerate(["a\nb\n", "a\nc\n"], start=1):
+            manager.conn.execute(
+                "INSERT INTO config_versions (hostname, config_content, config_hash, version_number) VALUES (?, ?, ?, ?)",
+                ("SW1", content, "md5", n),
+            )
+        manager.conn.execute("DELETE FROM schema_version")  # 模拟迁移框架之前的老数据库
+        manager.conn.commit()
+        manager.close()
+        reopened = DatabaseManager(db_path=path)
+        rows = reopened.conn.execute("SELECT id, config_content, blob_hash FROM config_versions ORDER BY id").fetchall()
+        assert all(r["blob_hash"] and r["config_content"] == "" for r in rows)
+        assert [reopened.get_config_content(r["id"]) for r in rows] == ["a\nb\n", "a\nc\n"]
+        reopened.close()
+
+
+# 测试键集分页：按游标翻页不重不漏（包括检查时间相同的记录），最后一页没有游标
+class TestKeysetPagination:
+    def test_pages_cover_all_rows(self, db):
+        for i in range(53):
+            # 每3条记录共用同一个检查时间，验证 (check_time, id) 作为分页键能区分并列记录
+            db.log_check_device(make_check_record(check_time=f"2026-06-01 10:{i // 3:02d}:00"))
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = db.iter_health_check_history(cursor=cursor, limit=10, batch_size=4)
+            seen.extend(row["id"] for row in page)
+            pages += 1
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert pages == 6
+        assert seen == [row["id"] for row in db.get_health_check_history()]
+        assert len(set(seen)) == 53
+
+    def test_exact_page_has_no_next_cursor(self, db):
+        for n in range(10):
+            db.save_command_history("SW1", "10.0.0.1", f"display cmd{n}", "system", "ok")
+        page = db.iter_command_history(limit=10)
+        assert len(list(page)) == 10
+        assert page.next_cursor is None
+
+    def test_invalid_cursor(self, db):
+        with pytest.raises(ValueError):
+            db.iter_alert_history(cursor="not-a-cursor")
+
+
+# 测试版本化迁移：按顺序只执行一次、失败整体回滚、数值指标列写入时填充并可直接在SQL里聚合
+class TestMigrations:
+    def test_fresh_database_is_at_latest_version(self, db):
+        assert get_schema_version(db.conn) == MIGRATIONS[-1][0]
+        assert apply_migrations(db) == []
+
+    def test_failed_migration_rolls_back(self, db):
+        latest = MIGRATIONS[-1][0]
+
+        def broken(db, conn):
+            conn.execute("CREATE TABLE half_done (id INTEGER)")
+            conn.execute("INSERT INTO no_such_table VALUES (1)")
+
+        def ok(db, conn):
+            conn.execute("CREATE TABLE added_later (id INTEGER)")
+
+        with pytest.raises(Exception):
+            apply_migrations(db, MIGRATIONS + [(latest + 1, "坏迁移", broken)])
+        tables = {r[0] for r in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert "half_done" not in tables
+        assert get_schema_version(db.conn) == latest
+        assert apply_migrations(db, MIGRATIONS + [(latest + 1, "修好的迁移", ok)]) == [latest + 1]
+
+    def test_typed_metrics_backfilled_and_written(self, db):
+        db.conn.execute(
+            "INSERT INTO health_check_records (host, device_name, check_time, CPU_usage, memory_usage) "
+            "VALUES ('10.0.0.9', 'OLD', '2026-06-01 09:00:00', ' 17%', 'N/A')"
+        )
+        db.conn.execute("DELETE FROM schema_version WHERE version >= 3")
+        db.conn.commit()
+        apply_migrations(db)
+        old = db.get_latest_device_metrics(host="10.0.0.9")
+        assert old["cpu_pct"] == 17.0 and old["mem_pct"] is None
+        db.log_check_device(make_check_record("NEW", cpu="23%", memory="45.5%"))
+        new = db.get_latest_device_metrics(device_name="NEW")
+        assert new["cpu_pct"] == 23.0 and new["mem_pct"] == 45.5
+
+    def test_fleet_metrics_in_sql(self, db):
+        for n, (cpu, up) in enumerate([("10%", 20), ("30%", "4"), ("N/A", "未知")]):
+            db.add_physical_card({
+                "id": f"SW{n}", "name": f"SW{n}", "ip_address": f"10.0.0.{n}", "create_time": "2026-06-01",
+                "cpu_usage": cpu, "memory_usage": "50%", "up_interfaces": up, "status": "healthy",
+            })
+        fleet = db.get_fleet_metrics()
+        assert fleet["device_count"] == 3 and fleet["cpu_reported"] == 2
+        assert fleet["avg_cpu"] == 20.0 and fleet["max_cpu"] == 30.0
+        assert fleet["up_interfaces"] == 24 and fleet["healthy_devices"] == 3
+
+
+def make_card(n, **fields):
+    card = {"id": f"SW{n}", "name": f"SW{n}", "ip_address": f"10.0.{n // 250}.{n % 250}", "create_time": "2026-06-01"}
+    card.update(fields)
+    return card
+
+
+# 测试档案卡批量写入/更新：一个事务 executemany，任意一张失败整批回滚
+class TestPhysicalCardBatch:
+    def test_batch_add_and_update(self, db):
+        db.batch_add_physical_cards([make_card(n) for n in range(300)])
+        assert len(db.get_all_physical_cards()) == 300
+        updated = db.batch_update_physical_cards([
+            make_card(n, cpu_usage=f"{n % 100}%", up_interfaces=n, status="healthy", last_check_time="2026-06-02")
+            for n in range(0, 300, 3)
+        ] + [make_card(9999)])  # 不存在的设备不影响其他更新
+        assert updated == 100
+        fleet = db.get_fleet_metrics()
+        assert fleet["healthy_devices"] == 100 and fleet["cpu_reported"] == 100
+        row = db.conn.execute(
+            "SELECT cpu_pct, up_count, last_check_time FROM physical_device_cards WHERE device_id = 'SW3'"
+        ).fetchone()
+        assert tuple(row) == (3.0, 3, "2026-06-02")
+
+    def test_batch_add_rolls_back_on_error(self, db):
+        with pytest.raises(sqlite3.IntegrityError):
+            db.batch_add_physical_cards([make_card(1), make_card(2, name=None)])
+        assert db.get_all_physical_cards() == []
+
+
+# 测试全网全文检索：命令输出插入即被索引，配置只索引最新版本，查询词里的特殊字符按短语处理
+class TestFleetSearch:
+    def test_command_output_indexed_on_insert(self, db):
+        mac_table = "MAC Address    VLAN/VSI   Learned-From\n5489-98a1-0001 10         GE1/0/3\n"
+        db.save_command_history("SW1", "10.0.0.1", "display mac-address", "system", mac_table)
+        db.save_command_history("SW2", "10.0.0.2", "display mac-address", "system", "5489-98a1-0002 10 GE1/0/4\n")
+        results = db.search("5489-98a1-0001", scopes=("command",))
+        assert [r["device_name"] for r in results] == ["SW1"]
+        assert "【" in results[0]["snippet"]
+
+    def test_write_behind_rows_are_indexed(self, db):
+        db.enable_write_behind()
+        db.save_command_history("SW3", "10.0.0.3", "display arp", "system", "10.1.1.1 aaaa-bbbb-cccc")
+        db.flush_writes()
+        assert db.search("aaaa-bbbb-cccc")[0]["device_name"] == "SW3"
+
+    def test_only_latest_config_is_indexed(self, db):
+        db.save_config_version("SW1", "sysname SW1\nsnmp-agent community read public\n")
+        db.save_config_version("SW2", "sysname SW2\nsnmp-agent community read public\n")
+        latest = db.save_config_version("SW2", "sysname SW2\nsnmp-agent community read cipher xxx\n")
+        results = db.search("snmp-agent community read public", scopes=("config",))
+        assert [r["device_name"] for r in results] == ["SW1"]
+        results = db.search('cipher', scopes=("config",), device_name="SW2")
+        assert results[0]["version_id"] == latest and results[0]["version_number"] == 2
+
+    def test_raw_fts_query(self, db):
+        db.save_command_history("SW1", "10.0.0.1", "display interface brief", "interface", "GE1/0/1 up\nGE1/0/2 down\n")
+        assert db.search("GE1 AND down", raw=True)[0]["device_name"] == "SW1"
+        assert db.search('quote " inside') == []
+
+
+# 测试差异对比引擎：操作码能还原出新内容、重复行走 Myers、hunk 与 diff -u 一致、对比结果按ID对缓存
+class TestDiffEngine:
+    def test_opcodes_rebuild_new_lines(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            old = [rng.choice(["#", " undo shutdown", "a", "b", "c"]) for _ in range(rng.randint(0, 50))]
+            new = list(old)
+            for _ in range(rng.randint(0, 6)):
+                if new and rng.random() < 0.5:
+                    del new[rng.randrange(len(new))]
+                else:
+                    new.insert(rng.randint(0, len(new)), rng.choice(["#", "x", "y"]))
+            rebuilt = []
+            for tag, i1, i2, j1, j2 in diff_opcodes(old, new, max_cost=rng.choice([2, 1000])):
+                if tag == "equal":
+                    assert old[i1:i2] == new[j1:j2]
+                rebuilt.extend(new[j1:j2])
+            assert rebuilt == new
+
+    def test_hunks_match_unified_diff(self):
+        old = [f"line{i}" for i in range(30)]
+        new = list(old)
+        new[2] = "changed"
+        new.insert(20, "inserted")
+        result = diff_lines(old, new)
+        assert [h["header"] for h in result["hunks"]] == ["@@ -1,6 +1,6 @@", "@@ -18,6 +18,7 @@"]
+        assert result["added"] == ["changed", "inserted"] and result["removed"] == ["line2"]
+        assert diff_lines(old, list(old))["is_identical"]
+
+    def test_compare_command_results_cached(self, db):
+        routes = [f"10.{i // 256}.{i % 256}.0/24 OSPF 10 2 D 10.0.0.1 Vlanif10" for i in range(5000)]
+        first = db.save_command_history("SW1", "10.0.0.1", "display ip routing-table", "route",
+                                        "\n".join(routes), sync=True)
+        routes[100] = "192.168.1.0/24 Static 60 0 RD 10.0.0.254 Vlanif20"
+        second = db.save_command_history("SW1", "10.0.0.1", "display ip routing-table", "route",
+                                         "\n".join(routes), sync=True)
+        result = db.compare_command_results(first, second)
+        assert result["added_count"] == 1 and result["removed_count"] == 1
+        assert result["hunks"][0]["lines"][3] == "-10.0.100.0/24 OSPF 10 2 D 10.0.0.1 Vlanif10"
+        assert db.compare_command_results(first, second) is result
+        assert db.diff_cache.hits == 1
+        assert db.compare_command_results(first, 999999) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
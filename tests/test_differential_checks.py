@@ -0,0 +1,63 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.health_check.health_checker_optimized import (DIFFERENTIAL_CHECKS, DifferentialCache, get_vendor_command,
+                                                        run_differential_checks)
+
+
+class FakeDevice:
+    """代替 DeviceConnection：记录实际发给设备的命令，输出可以在两次检查之间修改"""
+
+    def __init__(self):
+        self.sent = []
+        self.outputs = {
+            "display version": "H3C Comware Software, Version 7.1.070\nH3C S6850 uptime is 0 weeks, 1 day, 2 hours",
+            "display interface brief": "GE1/0/1              UP   UP       10.0.0.1\n",
+            "display ip routing-table": "0.0.0.0/0           Static 60   0            10.1.1.254      Vlan1\n",
+            "display ip routing-table statistics": "Total 1 Active 1 Added 1 Deleted 0",
+            "display arp": "10.1.1.2        0050-56c0-0001 1             GE1/0/1                  1163  D\n",
+            "display arp count": "Total number of entries: 1",
+        }
+
+    def prefetch(self, vendor, command_types):
+        self.sent.extend(get_vendor_command(vendor, command_type) for command_type in command_types)
+
+    def execute_command(self, command):
+        return True, self.outputs.get(command, "")
+
+
+def test_unchanged_fingerprints_reuse_expensive_checks():
+    cache = DifferentialCache()
+    device = FakeDevice()
+    first, meta = run_differential_checks(device, "SW1", "h3c", cache=cache)
+    assert meta["reused"] == [] and first["routing"]["route_count"] == 1
+    assert "display ip routing-table" in device.sent
+
+    device.sent.clear()
+    device.outputs["display ip routing-table"] = ""  # 复用时不应再解析这个输出
+    second, meta = run_differential_checks(device, "SW1", "h3c", cache=cache)
+    assert meta["reused"] == ["routing", "arp", "environment"]
+    assert meta["checks"]["routing"]["reason"] == "指纹未变化"
+    assert second["routing"] == first["routing"] and second["arp"]["arp_count"] == 1
+    assert not {"display ip routing-table", "display arp", "display environment"} & set(device.sent)
+    assert "display interface brief" in device.sent
+
+
+def test_changed_fingerprint_reboot_and_staleness_rerun():
+    cache = DifferentialCache()
+    device = FakeDevice()
+    run_differential_checks(device, "SW1", "h3c", cache=cache)
+
+    device.outputs["display arp count"] = "Total number of entries: 2"
+    _, meta = run_differential_checks(device, "SW1", "h3c", cache=cache)
+    assert meta["reused"] == ["routing", "environment"] and meta["checks"]["arp"]["reason"] == "指纹变化"
+
+    device.outputs["display version"] = "H3C Comware Software, Version 7.1.070\nH3C S6850 uptime is 0 weeks, 0 days, 0 hours, 3 minutes"
+    _, meta = run_differential_checks(device, "SW1", "h3c", cache=cache)
+    assert meta["reused"] == [] and meta["checks"]["routing"]["reason"] == "设备重启过"
+
+    checks = {name: dict(config, max_staleness=-1) for name, config in DIFFERENTIAL_CHECKS.items()}
+    _, meta = run_differential_checks(device, "SW1", "h3c", cache=cache, checks=checks)
+    assert meta["reused"] == [] and meta["checks"]["environment"]["reason"] == "结果已过期"
@@ -0,0 +1,54 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.simulator import FleetProfile, SyntheticFleet, run_fleet_round
+from db.database import DatabaseManager
+import pytest
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / "fleet.db"))
+    yield db
+    db.close()
+
+
+# 测试合成集群：模拟设备的输出要能被真实解析流水线解析，结果写库、触发告警
+def test_fleet_round_drives_real_pipeline(db):
+    profile = FleetProfile(size=12, time_scale=0, login_failure_rate=0, drop_rate=0, hot_rate=0, large_table_rate=0,
+                           vendors={"h3c": 1, "huawei": 1, "cisco": 1})
+    fleet = SyntheticFleet(profile)
+    assert {device.vendor for device in fleet.devices} == {"h3c", "huawei", "cisco"}
+    broken, hot = fleet.devices[0], fleet.devices[1]
+    broken.login_fails = True
+    hot.hot = True
+    hot.resample()
+    fleet.install_alert_rules(db)
+
+    with fleet.installed():
+        report = run_fleet_round(fleet, workers=4, db=db)
+    assert report["devices"] == 12 and report["rows_written"] == 12
+    assert report["status"].get("failed") == 1 and report["alerts"] == 1
+    assert report["sessions"]["created"] == 11
+
+    rows = {row["device_name"]: row for row in db.get_health_check_history(limit=20)}
+    assert rows[broken.name]["status"] == "failed"
+    for device in fleet.devices[1:]:
+        row = rows[device.name]
+        assert (row["up_interface"], row["down_interface"]) == (device.interfaces - device.down, device.down)
+        assert row["cpu_pct"] == device.cpu and row["mem_pct"] == pytest.approx(device.memory, abs=1)
+        assert row["version"].startswith(device.version)
+
+
+def test_tables_grow_between_rounds():
+    fleet = SyntheticFleet(FleetProfile(size=5, time_scale=0, growth=0.5))
+    before = fleet.table_sizes()
+    fleet.advance()
+    after = fleet.table_sizes()
+    assert fleet.round == 1 and after["routes"] >= before["routes"] * 1.5 and after["arps"] >= before["arps"] * 1.5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
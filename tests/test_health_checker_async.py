@@ -0,0 +1,107 @@
+import os
+import sys
+import asyncio
+from contextlib import asynccontextmanager
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.health_check.health_checker_async import AsyncHealthChecker
+import pytest
+
+OUTPUTS = {
+    "display interface brief": "Interface            Link Protocol Primary IP      Description\n"
+                               "GE1/0/1              UP   UP       10.0.0.1\n"
+                               "GE1/0/2              DOWN DOWN     --",
+    "display cpu-usage": "Slot 1 CPU 0 CPU usage:\n      14% in last 5 seconds",
+    "display version": "H3C Comware Software, Version 7.1.075, Alpha 7571",
+}
+
+
+class FakeShell:
+    """模拟设备shell：登录后输出提示符，按顺序执行写入的命令，每条命令回显 + 输出 + 提示符"""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.queue = asyncio.Queue()
+        self.queue.put_nowait("\r\n<SW1>")
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        loop = asyncio.get_running_loop()
+        for i, command in enumerate(data.split("\n")[:-1]):
+            output = OUTPUTS.get(command, "")
+            text = f"{command}\r\n{output}\r\n<SW1>" if output else f"{command}\r\n<SW1>"
+            loop.call_later(self.delay * (i + 1), self.queue.put_nowait, text)
+
+    async def read(self, n):
+        return await self.queue.get()
+
+
+class ShellFactory:
+    """记录同时打开的shell数（全局 / 按站点）"""
+
+    def __init__(self):
+        self.active = {}
+        self.peak = {}
+        self.shells = []
+
+    @asynccontextmanager
+    async def __call__(self, device_info, config):
+        site = device_info.get("site", "default")
+        self.active[site] = self.active.get(site, 0) + 1
+        self.active["*"] = self.active.get("*", 0) + 1
+        for key in (site, "*"):
+            self.peak[key] = max(self.peak.get(key, 0), self.active[key])
+        shell = FakeShell()
+        self.shells.append(shell)
+        try:
+            await asyncio.sleep(0.01)  # 登录耗时
+            yield shell, shell
+        finally:
+            self.active[site] -= 1
+            self.active["*"] -= 1
+
+
+def make_devices(count, sites=("bj", "sh")):
+    return [{"device_name": f"SW{i}", "host": f"10.0.{i // 250}.{i % 250}", "vendor": "h3c",
+             "site": sites[i % len(sites)]} for i in range(count)]
+
+
+# 测试异步健康检查引擎：结果结构、一次写入全部命令、全局/站点并发上限
+class TestAsyncHealthChecker:
+    def test_result_schema_and_single_write(self):
+        factory = ShellFactory()
+        checker = AsyncHealthChecker(open_shell=factory, persist=False)
+        results = asyncio.run(checker.run(make_devices(3)))
+        assert [r["device_name"] for r in results] == ["SW0", "SW1", "SW2"]
+        result = results[0]
+        assert result["check_status"] == "成功" and result["mode"] == "real"
+        assert set(result["checks"]) == {"interface", "cpu", "memory", "version", "routing", "arp", "environment"}
+        assert result["checks"]["interface"]["up"] == 1 and result["checks"]["interface"]["down"] == 1
+        assert result["checks"]["cpu"]["usage"] == 14 and result["CPU_usage"] == "14%"
+        # 统一结构：按同一套规则判定健康问题，每项检查都有分阶段耗时
+        assert result["status"] == "degraded" and "过多端口down (1/2)" in result["device_health_issues"]
+        assert set(result["timings"]["checks"]) == set(result["checks"]) and "prefetch" in result["timings"]
+        assert all(shell.writes == 1 for shell in factory.shells)
+
+    def test_global_and_site_limits(self):
+        factory = ShellFactory()
+        checker = AsyncHealthChecker(open_shell=factory, persist=False, global_limit=6, per_site_limit=2)
+        results = asyncio.run(checker.run(make_devices(40, sites=("bj", "sh", "gz", "sz"))))
+        assert len(results) == 40 and all(r["check_status"] == "成功" for r in results)
+        assert factory.peak["*"] <= 6 and all(factory.peak[site] <= 2 for site in ("bj", "sh", "gz", "sz"))
+
+    def test_connection_error_reported(self):
+        @asynccontextmanager
+        async def refuse(device_info, config):
+            raise ConnectionRefusedError("refused")
+            yield
+
+        checker = AsyncHealthChecker(open_shell=refuse, persist=False)
+        result = asyncio.run(checker.run(make_devices(1)))[0]
+        assert result["status"] == "failed" and result["error_message"] == "连接失败" and not result["reachable"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
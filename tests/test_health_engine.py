@@ -0,0 +1,116 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.connection.command_runner import LatencyProfiles
+from core.health_check import engine
+from core.health_check.checks import COST_CHEAP, CHECK_PLUGINS, CheckPlugin, register_check
+from core.health_check.engine import FetchedOutputs, HealthCheckEngine, ResultSink, new_result, normalize_result
+from db.database import DatabaseManager
+import pytest
+
+OUTPUTS = {
+    "display interface brief": "Interface            Link Protocol Primary IP      Description\n"
+                               "GE1/0/1              UP   UP       10.0.0.1\n"
+                               "GE1/0/3              UP   UP       --\n"
+                               "GE1/0/4              DOWN DOWN     --",
+    "display cpu-usage": "Slot 1 CPU 0 CPU usage:\n      91% in last 5 seconds",
+    "display memory": "             Total      Used      Free    Shared   Buffers    Cached   FreeRatio\n"
+                      "Mem:        382808    291956     90852         0         4    189092       23.8%",
+    "display version": "H3C Comware Software, Version 7.1.075, Alpha 7571",
+}
+
+
+@pytest.fixture
+def profiles():
+    return LatencyProfiles()
+
+
+# 测试检查插件 + 引擎：按插件解析、分阶段计时、统一结果结构
+class TestHealthCheckEngine:
+    def test_evaluate_times_each_check(self, profiles):
+        profiles.record("10.0.0.1", "display cpu-usage", 0.8)  # 批量取回时记下的这条命令的设备耗时
+        health_engine = HealthCheckEngine(checks=["interface", "cpu", "memory", "version"], profiles=profiles)
+        timings = {}
+        checks = health_engine.evaluate(FetchedOutputs(OUTPUTS), "h3c", device="10.0.0.1", timings=timings)
+        assert checks["interface"]["up"] == 2 and checks["cpu"]["usage"] == 91 and checks["memory"]["usage"] == 76.2
+        assert set(timings) == {"interface", "cpu", "memory", "version"}
+        assert timings["cpu"]["collect"] == 0.8 and timings["cpu"]["cost"] == COST_CHEAP
+        assert not timings["cpu"]["over_budget"]
+        assert health_engine.stats()["cpu"]["runs"] == 1
+
+    def test_registered_plugin_runs_and_failures_are_isolated(self, profiles):
+        def broken(vendor, outputs):
+            raise ValueError("unexpected format")
+
+        register_check(CheckPlugin("broken", ("version",), broken, description="测试检查", timeout=0))
+        try:
+            health_engine = HealthCheckEngine(checks=["version", "broken", "routing"], profiles=profiles)
+            timings = {}
+            checks = health_engine.evaluate(FetchedOutputs(OUTPUTS), "h3c", timings=timings)
+        finally:
+            CHECK_PLUGINS.pop("broken")
+        assert checks["version"]["version"] == "7.1.075"
+        assert checks["broken"] == {"status": "error", "message": "解析测试检查失败"}
+        # 命令输出没取回：返回插件声明的默认字段
+        assert checks["routing"]["status"] == "error" and checks["routing"]["route_count"] == 0
+        assert timings["broken"]["over_budget"] and health_engine.stats()["broken"]["errors"] == 1
+
+    def test_normalize_result(self, profiles):
+        health_engine = HealthCheckEngine(checks=["interface", "cpu", "memory", "version"], profiles=profiles)
+        result = new_result("SW1", "10.0.0.1", "h3c", "real")
+        result["checks"] = health_engine.evaluate(FetchedOutputs(OUTPUTS), "h3c")
+        normalize_result(result)
+        assert (result["up_interface"], result["down_interface"], result["total_interface"]) == (2, 1, 3)
+        assert result["CPU_usage"] == "91%" and result["memory_usage"] == "76.2%" and result["version"] == "7.1.075"
+        assert result["status"] == "degraded" and result["check_status"] == "成功" and result["reachable"]
+        assert result["device_health_issues"] == ["过多端口down (1/3)", "CPU使用率过高，已经超过88%"]
+
+        failed = normalize_result(new_result("SW2", "10.0.0.2", "h3c", "real"), error="连接失败")
+        assert failed["status"] == "failed" and failed["check_status"] == "失败" and not failed["reachable"]
+        assert failed["CPU_usage"] == "N/A" and failed["error_message"] == "连接失败"
+
+
+# 测试批量入库：健康检查历史一个事务写入
+def test_result_sink_batches_history(tmp_path, monkeypatch):
+    db = DatabaseManager(db_path=str(tmp_path / "test.db"))
+    monkeypatch.setattr(engine, "db_manager", db)
+    try:
+        sink = ResultSink(update_cards=False)
+        for i in range(3):
+            result = new_result(f"SW{i}", f"10.0.0.{i}", "h3c", "real")
+            result["checks"] = {"cpu": {"status": "success", "usage": 10 * i}}
+            engine.health_engine.finish(result, 0, sink=sink)
+        sink.add(normalize_result(new_result("SW9", "10.0.0.9", "h3c", "real"), error="连接失败"))
+        assert len(sink) == 4 and sink.flush() == 4 and len(sink) == 0
+        rows = db.get_health_check_history(limit=10)
+        assert {row["device_name"] for row in rows} == {"SW0", "SW1", "SW2", "SW9"}
+        failed = next(row for row in rows if row["device_name"] == "SW9")
+        assert failed["reachable"] == "不可达" and failed["status"] == "failed" and failed["device_health_issues"] == "无"
+    finally:
+        db.close()
+
+
+# 测试历史记录写库失败：记录放回缓冲区，档案卡照常写库
+def test_result_sink_flushes_cards_when_history_fails():
+    class FailingDb:
+        def batch_log_check_devices(self, records):
+            raise RuntimeError("database is locked")
+
+    class Cards:
+        flushed = 0
+
+        def flush(self):
+            self.flushed += 1
+
+    cards = Cards()
+    sink = ResultSink(card_buffer=cards, update_cards=False, db=FailingDb())
+    sink.add(normalize_result(new_result("SW1", "10.0.0.1", "h3c", "real"), error="连接失败"))
+    with pytest.raises(RuntimeError):
+        sink.flush()
+    assert cards.flushed == 1 and len(sink) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
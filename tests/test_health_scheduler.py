@@ -0,0 +1,141 @@
+import os
+import sys
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.health_check.engine import ResultSink
+from core.health_check.scheduler import SCHEDULE_GROUPS, HealthCheckScheduler
+from core.simulator import FleetProfile, SyntheticFleet
+from db.database import DatabaseManager
+import pytest
+
+GROUPS = {
+    "status": {"checks": ["interface", "cpu"], "interval": 100, "min_interval": 10, "max_interval": 400},
+    "tables": {"checks": ["routing"], "interval": 200, "min_interval": 50, "max_interval": 800},
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSink:
+    def flush(self):
+        return 0
+
+
+def make_scheduler(devices, runner, groups=GROUPS, **config):
+    clock = FakeClock()
+    config = dict({"jitter": 0, "max_concurrency": 10, "lag_warning": 5}, **config)
+    scheduler = HealthCheckScheduler([{"device_name": name} for name in devices], runner=runner, groups=groups,
+                                     config=config, clock=clock, sink=FakeSink(), seed=1)
+    return scheduler, clock
+
+
+def result(status="healthy", cpu="10%"):
+    return {"status": status, "CPU_usage": cpu}
+
+
+# 测试调度器：自适应间隔、同设备互斥、并发预算、调度延迟
+class TestHealthCheckScheduler:
+    def test_stable_devices_back_off_and_degraded_shrink(self):
+        statuses = {"SW1": result(), "SW2": result()}
+        scheduler, clock = make_scheduler(["SW1", "SW2"], lambda device, checks, sink: statuses[device["device_name"]])
+        clock.now = 200
+        # 未启动时同步执行；同一台设备一次只派发一组，另一组留到下一轮
+        assert scheduler.run_pending() == 2 and scheduler.run_pending() == 2
+        schedule = scheduler.stats()["schedule"]
+        assert schedule["SW1/status"]["interval"] == 150 and schedule["SW1/tables"]["interval"] == 300
+
+        statuses["SW2"] = result(cpu="95%")
+        clock.now = 400
+        scheduler.run_pending()
+        schedule = scheduler.stats()["schedule"]
+        assert schedule["SW1/status"]["interval"] == 225
+        assert schedule["SW2/status"]["interval"] == 10 and schedule["SW2/status"]["reason"] == "CPU偏高"
+        # 同设备的其它检查组提前到最短间隔
+        assert schedule["SW2/tables"]["next_in"] <= 50
+
+    def test_flapping_device_stays_at_min_interval(self):
+        sequence = iter(["healthy", "degraded", "healthy", "healthy"])
+        scheduler, clock = make_scheduler(["SW1"], lambda device, checks, sink: result(next(sequence)),
+                                          groups={"status": GROUPS["status"]}, flap_changes=2)
+        for _ in range(3):
+            clock.now += 1000
+            scheduler.run_pending()
+        state = scheduler.stats()["schedule"]["SW1/status"]
+        assert state["interval"] == 10 and state["reason"] == "状态抖动"
+
+    def test_budget_and_device_exclusion_record_lag(self):
+        release = threading.Event()
+        lock = threading.Lock()
+        active, started, overlaps = set(), [], []
+
+        def runner(device, checks, sink):
+            name = device["device_name"]
+            with lock:
+                overlaps.extend([name] if name in active else [])
+                active.add(name)
+                started.append(name)
+            release.wait(5)
+            with lock:
+                active.discard(name)
+            return result()
+
+        scheduler, clock = make_scheduler(["SW1", "SW2", "SW3"], runner, max_concurrency=2)
+        scheduler.start()
+        try:
+            clock.now = 1000
+            scheduler.run_pending()
+            stats = scheduler.stats()
+            # 并发预算2，每台设备同时只跑一组检查
+            assert stats["running"] == 2
+            assert stats["lag_overruns"] == 2 and stats["lag_seconds_max"] > 5
+            release.set()
+            # 到期的6组检查陆续跑完，之后的排期都在 1000 之后
+            for _ in range(50):
+                if scheduler.stats()["completed"] == 6:
+                    break
+                threading.Event().wait(0.05)
+        finally:
+            release.set()
+            scheduler.stop()
+        assert scheduler.stats()["completed"] == len(started) == 6 and not overlaps
+
+
+# 测试默认执行器走真实检查流程：环境/表项组只执行部分检查，入库的记录仍然是完整的端口/CPU/内存/版本
+def test_partial_groups_keep_full_rows(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / "test.db"))
+    fleet = SyntheticFleet(FleetProfile(size=3, time_scale=0, login_failure_rate=0, drop_rate=0, hot_rate=0,
+                                        large_table_rate=0, vendors={"h3c": 1, "huawei": 1}))
+    clock = FakeClock()
+    scheduler = HealthCheckScheduler(fleet.device_infos(), groups=SCHEDULE_GROUPS, clock=clock, seed=1,
+                                     config={"jitter": 0}, sink=ResultSink(update_cards=False, db=db))
+    try:
+        with fleet.installed():
+            for _ in range(4):
+                clock.now += 4000
+                while scheduler.run_pending():
+                    pass
+        scheduler.flush()
+        rows = db.get_health_check_history(limit=100)
+        assert len(rows) >= len(fleet.devices)
+        devices = {device.name: device for device in fleet.devices}
+        for row in rows:
+            device = devices[row["device_name"]]
+            assert row["cpu_pct"] == device.cpu and row["total_interface"] == device.interfaces
+            assert row["version"].startswith(device.version)
+        # 各组状态分开记，环境组和状态组的结果不同也不算抖动
+        schedule = scheduler.stats()["schedule"]
+        assert not any(state["reason"] == "状态抖动" for state in schedule.values())
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
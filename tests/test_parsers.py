@@ -0,0 +1,132 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.parsers import InterfaceRecord, RouteRecord, get_parser, parse
+import pytest
+
+
+H3C_INTERFACE = """Brief information on interfaces in route mode:
+Link: ADM - administratively down; Stby - standby
+Protocol: (s) - spoofing
+Interface            Link Protocol Primary IP      Description
+InLoop0              UP   UP(s)    --
+Vlan1                UP   UP       10.1.1.1        uplink
+
+Brief information on interfaces in bridge mode:
+Interface            Link Speed   Duplex Type PVID Description
+GE1/0/1              UP   1G(a)   F(a)   A    1
+GE1/0/2              ADM  auto    A      A    1
+"""
+
+HUAWEI_INTERFACE = """PHY: Physical
+*down: administratively down
+Interface                   PHY   Protocol  InUti OutUti   inErrors  outErrors
+GigabitEthernet0/0/1        up    up           0%     0%          0          0
+GigabitEthernet0/0/2        *down down         0%     0%          0          0
+"""
+
+CISCO_INTERFACE = """Interface              IP-Address      OK? Method Status                Protocol
+GigabitEthernet0/0     10.0.0.1        YES NVRAM  up                    up
+GigabitEthernet0/1     unassigned      YES NVRAM  administratively down down
+"""
+
+H3C_ROUTES = """Destinations : 3        Routes : 4
+
+Destination/Mask    Proto  Pre  Cost         NextHop         Interface
+0.0.0.0/0           Static 60   0            10.1.1.254      Vlan1
+10.2.0.0/16         O_INTRA 10  2            10.1.1.2        Vlan1
+                    O_INTRA 10  2            10.1.1.3        Vlan2
+127.0.0.0/8         Direct 0    0            127.0.0.1       InLoop0
+"""
+
+HUAWEI_ROUTES = """Route Flags: R - relay, D - download to fib
+Destination/Mask    Proto   Pre  Cost      Flags NextHop         Interface
+        0.0.0.0/0   Static  60   0          RD   10.1.1.254      Vlanif10
+       10.2.0.0/16  OSPF    10   2           D   10.1.1.2        Vlanif10
+"""
+
+CISCO_ROUTES = """Gateway of last resort is 10.0.0.254 to network 0.0.0.0
+
+S*    0.0.0.0/0 [1/0] via 10.0.0.254
+      10.0.0.0/8 is variably subnetted, 3 subnets, 2 masks
+C        10.0.0.0/24 is directly connected, GigabitEthernet0/0
+O IA     10.1.1.0/24 [110/2] via 10.0.0.2, 00:01:02, GigabitEthernet0/1
+                     [110/2] via 10.0.0.3, 00:01:02, GigabitEthernet0/2
+"""
+
+
+@pytest.mark.parametrize("vendor, output, expected", [
+    ("h3c", H3C_INTERFACE, [("InLoop0", True), ("Vlan1", True), ("GE1/0/1", True), ("GE1/0/2", False)]),
+    ("huawei", HUAWEI_INTERFACE, [("GigabitEthernet0/0/1", True), ("GigabitEthernet0/0/2", False)]),
+    ("cisco", CISCO_INTERFACE, [("GigabitEthernet0/0", True), ("GigabitEthernet0/1", False)]),
+])
+def test_interface_brief(vendor, output, expected):
+    records = parse(vendor, "interface", output)
+    assert [(r.name, r.is_up) for r in records] == expected
+
+
+def test_route_tables_with_ecmp_continuation():
+    h3c = parse("h3c", "routing", H3C_ROUTES)
+    assert len(h3c) == 4
+    assert h3c[2] == RouteRecord("10.2.0.0", 16, "O_INTRA", 10, 2, "10.1.1.3", "Vlan2")
+
+    huawei = parse("huawei", "routing", HUAWEI_ROUTES)
+    assert [(r.prefix, r.prefix_len, r.next_hop) for r in huawei] == [("0.0.0.0", 0, "10.1.1.254"),
+                                                                      ("10.2.0.0", 16, "10.1.1.2")]
+
+    cisco = parse("cisco", "routing", CISCO_ROUTES)
+    assert [(r.prefix, r.protocol, r.next_hop, r.interface) for r in cisco] == [
+        ("0.0.0.0", "S*", "10.0.0.254", ""),
+        ("10.0.0.0", "C", "0.0.0.0", "GigabitEthernet0/0"),
+        ("10.1.1.0", "O IA", "10.0.0.2", "GigabitEthernet0/1"),
+        ("10.1.1.0", "O IA", "10.0.0.3", "GigabitEthernet0/2"),
+    ]
+
+
+def test_mac_and_arp_tables_normalize_mac():
+    h3c_mac = parse("h3c", "mac", "0050-56C0-0001   10   Config static   BAGG1   N\n")
+    huawei_mac = parse("huawei", "mac", "0025-9e80-2494 1           -      -      GE0/0/1         dynamic   0/-\n")
+    cisco_mac = parse("cisco", "mac", "  10    0050.7966.6800    DYNAMIC     Gi0/1\n")
+    assert [(r.mac, r.vlan, r.interface) for r in h3c_mac + huawei_mac + cisco_mac] == [
+        ("0050-56c0-0001", "10", "BAGG1"), ("0025-9e80-2494", "1", "GE0/0/1"), ("0050-7966-6800", "10", "Gi0/1")]
+
+    arp = parse("cisco", "arp", "Internet  10.0.0.2   12   0050.7966.6801  ARPA   GigabitEthernet0/0\n")
+    assert (arp[0].ip, arp[0].mac, arp[0].interface) == ("10.0.0.2", "0050-7966-6801", "GigabitEthernet0/0")
+
+
+@pytest.mark.parametrize("vendor, cpu_output, memory_output, usage", [
+    ("h3c", "Slot 1 CPU 0 CPU usage:\n      14% in last 5 seconds\n      12% in last 1 minute\n",
+     "Mem:        382808    291956     90852         0         4    189092       23.8%\n", 76.2),
+    ("huawei", "CPU Usage            : 14% Max: 81%\n",
+     "System Total Memory Is: 1000 bytes\nTotal Memory Used Is: 762 bytes\n", 76.2),
+    ("cisco", "CPU utilization for five seconds: 14%/1%; one minute: 10%; five minutes: 9%\n",
+     "Processor    7F5A3B8   1000   762   238   200   100\n", 76.2),
+])
+def test_cpu_and_memory(vendor, cpu_output, memory_output, usage):
+    assert parse(vendor, "cpu", cpu_output).five_seconds == 14
+    assert parse(vendor, "memory", memory_output).usage_pct == usage
+
+
+def test_unknown_vendor_falls_back_to_h3c_templates():
+    assert get_parser("hp_comware", "interface") is get_parser("h3c", "interface")
+    assert parse("ruijie", "interface", "GE1/0/1   DOWN  DOWN  --\n") == [InterfaceRecord("GE1/0/1", "DOWN", "DOWN")]
+    assert parse("h3c", "cpu", "") is None
+    with pytest.raises(KeyError):
+        get_parser("h3c", "vlan")
+
+
+def test_offloader_routes_large_outputs_to_process_pool():
+    from core.parsers.offload import ParseOffloader
+
+    offloader = ParseOffloader(threshold_bytes=len(H3C_ROUTES) - 1, workers=1)
+    try:
+        count, samples = offloader.summarize("h3c", "routing", H3C_ROUTES, samples=2)
+        assert count == 4 and samples == parse("h3c", "routing", H3C_ROUTES)[:2]
+        assert offloader.parse("h3c", "interface", H3C_INTERFACE[:40]) == parse("h3c", "interface", H3C_INTERFACE[:40])
+        stats = offloader.stats()
+        assert (stats["offloaded"], stats["inline"], stats["fallback"]) == (1, 1, 0)
+        assert stats["worker_seconds"] > 0 and stats["offloaded_bytes"] == len(H3C_ROUTES)
+    finally:
+        offloader.shutdown()
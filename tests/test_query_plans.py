@@ -0,0 +1,108 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from db.database import DatabaseManager
+from db.pagination import encode_cursor
+import pytest
+
+# 历史表查询计划回归测试：
+# 对每个查询方法的每种过滤组合，抓取它实际执行的SQL，跑 EXPLAIN QUERY PLAN，
+# 只要出现全表扫描（SCAN 表名 且没有走索引）或者为排序建临时B树，就判定失败
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(db_path=str(tmp_path / "plan.db"))
+    yield manager
+    manager.close()
+
+
+def capture_selects(db, func, *args, **kwargs):
+    """执行查询方法，返回它发出的所有SELECT语句（参数已展开）"""
+    statements = []
+    conn = db.conn
+    conn.set_trace_callback(statements.append)
+    try:
+        func(*args, **kwargs)
+    finally:
+        conn.set_trace_callback(None)
+    return [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+
+def assert_uses_index(db, statements):
+    assert statements, "没有抓到任何SELECT语句"
+    for sql in statements:
+        plan = [row[3] for row in db.conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        for step in plan:
+            full_scan = step.startswith("SCAN") and "INDEX" not in step
+            assert not full_scan, f"查询退化为全表扫描：{step}\nSQL：{sql}"
+            assert "TEMP B-TREE" not in step, f"排序没有走索引：{step}\nSQL：{sql}"
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"device_name": "SW1"}, {"days": 7}, {"device_name": "SW1", "days": 7, "limit": 10}, {"limit": 10}],
+)
+def test_health_check_history_plan(db, kwargs):
+    assert_uses_index(db, capture_selects(db, db.get_health_check_history, **kwargs))
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"hostname": "SW1"}, {"days": 7}, {"hostname": "SW1", "days": 7, "limit": 10}, {"limit": 10}],
+)
+def test_recent_backups_plan(db, kwargs):
+    assert_uses_index(db, capture_selects(db, db.get_recent_backups, **kwargs))
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"severity": "critical"}, {"is_resolved": 0}, {"severity": "warning", "is_resolved": 1}],
+)
+def test_alert_history_plan(db, kwargs):
+    assert_uses_index(db, capture_selects(db, db.get_alert_history, **kwargs))
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"device_name": "SW1"}, {"command": "display version"}, {"device_name": "SW1", "command": "display arp"}],
+)
+def test_command_history_plan(db, kwargs):
+    assert_uses_index(db, capture_selects(db, db.get_command_history, **kwargs))
+
+
+@pytest.mark.parametrize(
+    "method, kwargs",
+    [
+        ("iter_health_check_history", {"device_name": "SW1"}),
+        ("iter_health_check_history", {"days": 7}),
+        ("iter_recent_backups", {"hostname": "SW1"}),
+        ("iter_command_history", {"command": "display version"}),
+        ("iter_alert_history", {"severity": "critical", "is_resolved": 0}),
+    ],
+)
+def test_keyset_page_plan(db, method, kwargs):
+    # 带游标的翻页查询也必须走索引
+    cursor = encode_cursor("2026-06-01 10:00:00", 100)
+    iterator = getattr(db, method)(cursor=cursor, limit=20, **kwargs)
+    assert_uses_index(db, capture_selects(db, list, iterator))
+
+
+@pytest.mark.parametrize("kwargs", [{"device_name": "SW1"}, {"host": "10.0.0.1"}])
+def test_latest_device_metrics_plan(db, kwargs):
+    assert_uses_index(db, capture_selects(db, db.get_latest_device_metrics, **kwargs))
+
+
+def test_config_versions_plan(db):
+    assert_uses_index(db, capture_selects(db, db.get_config_versions, "SW1"))
+
+
+def test_compliance_results_plan(db):
+    assert_uses_index(db, capture_selects(db, db.get_compliance_results, hostname="SW1"))
+    assert_uses_index(db, capture_selects(db, db.get_compliance_results))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
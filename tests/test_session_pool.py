@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.connection.session_pool import SSHSessionPool
+import pytest
+
+DEVICE = {"device_type": "huawei", "host": "10.0.0.1", "username": "admin", "password": "admin",
+          "device_name": "SW1", "vendor": "huawei"}
+
+
+class FakeConnection:
+    """代替 Netmiko 连接：记录登录参数，可以手动让它“断开”"""
+
+    def __init__(self, **params):
+        self.params = params
+        self.alive = True
+        self.closed = False
+
+    def is_alive(self):
+        return self.alive
+
+    def disconnect(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool():
+    created = []
+
+    def factory(**params):
+        conn = FakeConnection(**params)
+        created.append(conn)
+        return conn
+
+    manager = SSHSessionPool(max_per_device=2, idle_timeout=0, probe_after=0.05, acquire_timeout=1,
+                             connect_factory=factory)
+    manager.created = created
+    yield manager
+    manager.close_all()
+
+
+# 测试SSH会话池：复用、最大会话数、失效重连、异常丢弃、空闲淘汰
+class TestSessionPool:
+    def test_reuses_session_and_strips_inventory_fields(self, pool):
+        for _ in range(5):
+            with pool.session(DEVICE, timeout=10) as conn:
+                assert conn.params["timeout"] == 10 and "device_name" not in conn.params
+        # 超时参数不同、用 ip 写法的同一台设备也复用同一个会话
+        with pool.session({"device_type": "huawei", "ip": "10.0.0.1", "username": "admin"}, timeout=2):
+            pass
+        assert len(pool.created) == 1
+        assert pool.stats()["reused"] == 5
+
+    def test_max_sessions_per_device(self, pool):
+        first = pool.acquire(DEVICE)
+        second = pool.acquire(DEVICE)
+        with pytest.raises(TimeoutError):
+            pool.acquire(DEVICE)
+
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.acquire(DEVICE)))
+        waiter.start()
+        time.sleep(0.05)
+        pool.release(first)
+        waiter.join(timeout=1)
+        assert got and got[0] is first
+        pool.release(second)
+        pool.release(got[0])
+        assert len(pool.created) == 2
+
+    def test_dead_session_reconnects_transparently(self, pool):
+        with pool.session(DEVICE) as conn:
+            first = conn
+        first.alive = False
+        time.sleep(0.06)  # 超过 probe_after，借出前会探测
+        with pool.session(DEVICE) as conn:
+            assert conn is not first
+        assert first.closed and pool.stats()["reconnects"] == 1
+        # check_alive 总是探测
+        pool.created[-1].alive = False
+        assert pool.check_alive(DEVICE)
+        assert len(pool.created) == 3
+
+    def test_error_discards_session(self, pool):
+        with pytest.raises(OSError):
+            with pool.session(DEVICE) as conn:
+                raise OSError("Socket is closed")
+        assert conn.closed
+        with pool.session(DEVICE) as conn2:
+            assert conn2 is not conn
+        assert pool.stats()["discarded"] == 1
+
+    def test_idle_eviction(self, pool):
+        pool.idle_timeout = 0.01
+        with pool.session(DEVICE) as conn:
+            pass
+        time.sleep(0.02)
+        assert pool.evict_idle() == 1
+        assert conn.closed and pool.stats()["idle"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
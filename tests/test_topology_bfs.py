@@ -0,0 +1,95 @@
+import os
+import sys
+import asyncio
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from core.topology.topology_builder import TopologyBuilder
+from core.simulator.snmp_agents import PYSNMP_AVAILABLE, CampusTopology, SnmpAgentFarm
+import pytest
+
+# 核心 C 下挂 A1、A2，接入 E1 双上联到 A1 和 A2，E2 挂在 E1 下面；SLOW 不应答
+LINKS = {
+    "10.0.0.1": ["10.0.1.1", "10.0.1.2", "10.0.9.9"],
+    "10.0.1.1": ["10.0.0.1", "10.0.2.1"],
+    "10.0.1.2": ["10.0.0.1", "10.0.2.1"],
+    "10.0.2.1": ["10.0.1.1", "10.0.1.2", "10.0.3.1"],
+    "10.0.3.1": ["10.0.2.1"],
+    "10.0.9.9": ["10.0.0.1"],
+}
+
+
+class FakeCollector:
+    """按 LINKS 返回 LLDP 邻居，记录每台设备被采集的次数和同时在采集的设备数"""
+
+    def __init__(self, ip, stats):
+        self.ip = ip
+        self.stats = stats
+
+    async def collect_all(self):
+        stats = self.stats
+        stats["calls"][self.ip] = stats["calls"].get(self.ip, 0) + 1
+        stats["active"] += 1
+        stats["peak"] = max(stats["peak"], stats["active"])
+        try:
+            await asyncio.sleep(10 if self.ip == "10.0.9.9" else 0.05)
+        finally:
+            stats["active"] -= 1
+        return {
+            "device_info": {"ip": self.ip, "sys_descr": "H3C S5130 Switch", "sys_name": f"SW-{self.ip}"},
+            "vendor": "h3c",
+            "lldp_neighbors": [{"remote_name": f"SW-{ip}", "remote_ip": ip, "remote_port": "", "local_port": ""}
+                               for ip in LINKS[self.ip]],
+            "arp_table": [], "mac_table": [], "route_table": [], "local_ports": [],
+        }
+
+
+def fake_factory():
+    stats = {"calls": {}, "active": 0, "peak": 0}
+    return (lambda ip: FakeCollector(ip, stats)), stats
+
+
+# 测试多层扫描：同一层并发采集、信号量限流、双上联的设备只采一次、单台设备超时不拖累整层
+class TestTopologyBfs:
+    def test_level_concurrency_dedupe_and_timeout(self):
+        factory, stats = fake_factory()
+        builder = TopologyBuilder()
+        collected = asyncio.run(builder.build_topology_bfs("10.0.0.1", max_depth=4, collector_factory=factory,
+                                                           concurrency=2, device_timeout=0.5))
+        assert set(collected) == {"10.0.0.1", "10.0.1.1", "10.0.1.2", "10.0.2.1", "10.0.3.1"}
+        assert all(count == 1 for count in stats["calls"].values())
+        assert stats["peak"] == 2
+        assert builder.nodes["10.0.2.1"]["name"] == "SW-10.0.2.1"
+        assert ("10.0.1.2", "10.0.2.1") in builder._link_set
+
+    def test_max_depth(self):
+        factory, stats = fake_factory()
+        builder = TopologyBuilder()
+        collected = asyncio.run(builder.build_topology_bfs("10.0.0.1", max_depth=2, collector_factory=factory,
+                                                           device_timeout=0.5))
+        assert set(collected) == {"10.0.0.1", "10.0.1.1", "10.0.1.2"}
+        assert "10.0.2.1" in builder.nodes and "10.0.2.1" not in stats["calls"]
+
+    def test_mac_fallback_uses_same_scan(self):
+        factory, stats = fake_factory()
+        builder = TopologyBuilder()
+        asyncio.run(builder.build_topology_with_mac_fallback("10.0.0.1", max_depth=4, collector_factory=factory,
+                                                             device_timeout=0.5))
+        assert set(stats["calls"]) == set(LINKS) and all(count == 1 for count in stats["calls"].values())
+
+    @pytest.mark.skipif(not PYSNMP_AVAILABLE, reason="需要 pysnmp")
+    def test_snmp_agent_farm(self):
+        campus = CampusTopology(fanout=(1, 3, 4), arps=3)
+        unreachable = campus.levels[-1][0]
+        with SnmpAgentFarm(campus, port=16162, latency=0.002, unreachable=[unreachable]) as farm:
+            builder = TopologyBuilder()
+            collected = asyncio.run(builder.build_topology_bfs(
+                campus.seed_ip, max_depth=3, collector_factory=farm.collector_factory(timeout=0.5),
+                device_timeout=5,
+            ))
+        assert len(collected) == campus.reachable_within(3) - 1 and unreachable not in collected
+        assert builder.nodes[campus.levels[1][0]]["name"] == campus.devices[campus.levels[1][0]].name
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
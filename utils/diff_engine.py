@@ -0,0 +1,325 @@
+"""
+行级差异对比引擎（配置版本对比、命令结果对比、配置差量存储共用）
+原来命令结果对比用 [l for l in lines2 if l not in lines1]，是 O(n·m) 的列表查找，
+10万行的路由表要跑几分钟；配置对比用 difflib.unified_diff，大文件同样很慢。这里：
+1. 两边完全相同直接返回；需要对比的行先映射成整数（相同内容的行编号相同），后面只比较整数
+2. 去掉相同的头尾（直接比较字符串，不做编号），中间部分用 patience 算法：
+   只在两边都只出现一次的行上找最长递增子序列作为锚点，锚点之间的区间递归处理（用显式栈，不受递归深度限制）
+3. 区间里找不到唯一行时（大量重复的 "#"、" undo shutdown"）用 Myers O(ND) 算法，
+   编辑距离超过 max_cost 就把整个区间当作替换，保证最坏情况下也不会卡住
+4. 输出和 difflib.SequenceMatcher.get_opcodes 相同格式的操作码，再按上下文行数分组成 hunk
+对比结果用 DiffCache 按 (版本ID1, 版本ID2) 缓存：配置版本、命令历史记录写入后不会再修改，缓存不需要失效
+"""
+
+import os
+import sys
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.log_setup import setup_logger
+
+logger = setup_logger("diff_engine.py", "diff_engine.log")
+
+# hunk 前后保留的上下文行数（和 diff -u 一致）
+DEFAULT_CONTEXT = 3
+# Myers 算法允许的最大编辑距离，超过就把区间整体当作替换
+MYERS_MAX_COST = 1000
+# 对比结果缓存条数
+DIFF_CACHE_SIZE = 128
+
+
+def _intern(a_lines, b_lines):
+    """把两边的行映射成整数编号，后续比较不再比较字符串"""
+    ids = {}
+    a = [ids.setdefault(line, len(ids)) for line in a_lines]
+    b = [ids.setdefault(line, len(ids)) for line in b_lines]
+    return a, b
+
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    """在两边都只出现一次的行里找最长递增子序列（patience 排序），返回锚点 [(i, j), ...]"""
+    a_slice, b_slice = a[alo:ahi], b[blo:bhi]
+    a_count, b_count = Counter(a_slice), Counter(b_slice)
+    b_pos = {value: blo + j for j, value in enumerate(b_slice) if b_count[value] == 1}
+    candidates = [
+        (alo + i, b_pos[value]) for i, value in enumerate(a_slice) if a_count[value] == 1 and value in b_pos
+    ]
+    if not candidates:
+        return []
+
+    tails = []       # tails[n]：长度为 n+1 的递增子序列的最小结尾 j
+    tail_index = []  # 对应 candidates 下标
+    previous = [None] * len(candidates)
+    for index, (_, j) in enumerate(candidates):
+        # 大部分行顺序不变，j 比当前最长序列的结尾还大时直接接在后面
+        pos = len(tails) if not tails or j > tails[-1] else bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[pos] = j
+            tail_index[pos] = index
+        previous[index] = tail_index[pos - 1] if pos else None
+
+    anchors = []
+    index = tail_index[-1]
+    while index is not None:
+        anchors.append(candidates[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _myers(a, b, alo, ahi, blo, bhi, max_cost):
+    """
+    Myers 贪心算法求区间内的最长公共子序列，返回匹配的 (i, j) 列表
+    编辑距离超过 max_cost 返回空列表（调用方把整个区间当作替换）
+    """
+    n, m = ahi - alo, bhi - blo
+    max_d = min(n + m, max_cost)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []  # 每一步开始前 v[-d-1..d+1] 的快照，用于回溯
+    found = False
+    for d in range(max_d + 1):
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                found = True
+                break
+        if found:
+            break
+    if not found:
+        return []
+
+    matches = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        snapshot = trace[d]  # 下标 k 对应 snapshot[k + d + 1]
+        k = x - y
+        if k == -d or (k != d and snapshot[k - 1 + d + 1] < snapshot[k + 1 + d + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = snapshot[prev_k + d + 1]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            matches.append((alo + x, blo + y))
+        x, y = prev_x, prev_y
+    return matches
+
+
+def _find_blocks(a, b, alo, ahi, blo, bhi, max_cost):
+    """返回区间内所有匹配块 (i, j, 长度)，按 i 排序，i、j 同时递增"""
+    blocks = []
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        start_a, start_b = alo, blo
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        if alo > start_a:
+            blocks.append((start_a, start_b, alo - start_a))
+        end_a = ahi
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+        if end_a > ahi:
+            blocks.append((ahi, bhi, end_a - ahi))
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            prev_a, prev_b = alo, blo
+            run_a, run_b, run = anchors[0][0], anchors[0][1], 0
+            for i, j in anchors:
+                if i > prev_a and j > prev_b:
+                    stack.append((prev_a, i, prev_b, j))
+                # 连续的锚点合并成一个匹配块
+                if i != run_a + run or j != run_b + run:
+                    blocks.append((run_a, run_b, run))
+                    run_a, run_b, run = i, j, 0
+                run += 1
+                prev_a, prev_b = i + 1, j + 1
+            blocks.append((run_a, run_b, run))
+            stack.append((prev_a, ahi, prev_b, bhi))
+        else:
+            blocks.extend((i, j, 1) for i, j in _myers(a, b, alo, ahi, blo, bhi, max_cost))
+    blocks.sort()
+    return blocks
+
+
+def diff_opcodes(a_lines, b_lines, max_cost=MYERS_MAX_COST):
+    """
+    计算两组行的差异
+    :param a_lines: 旧内容的行列表
+    :param b_lines: 新内容的行列表
+    :param max_cost: Myers 算法允许的最大编辑距离
+    :return: [(tag, i1, i2, j1, j2), ...]，tag 为 equal / replace / delete / insert，格式同 difflib
+    """
+    if a_lines == b_lines:
+        return [("equal", 0, len(a_lines), 0, len(b_lines))] if a_lines else []
+    # 相同的头尾直接比较字符串，只有中间部分需要编号
+    n, m = len(a_lines), len(b_lines)
+    prefix = 0
+    limit = min(n, m)
+    while prefix < limit and a_lines[prefix] == b_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a_lines[n - 1 - suffix] == b_lines[m - 1 - suffix]:
+        suffix += 1
+    a, b = _intern(a_lines[prefix:n - suffix], b_lines[prefix:m - suffix])
+    blocks = [(prefix + i, prefix + j, size) for i, j, size in _find_blocks(a, b, 0, len(a), 0, len(b), max_cost)]
+    if prefix:
+        blocks.insert(0, (0, 0, prefix))
+    if suffix:
+        blocks.append((n - suffix, m - suffix, suffix))
+
+    opcodes = []
+    i = j = 0
+    # 末尾加一个长度为0的哨兵块，把最后一段差异也输出
+    for bi, bj, size in blocks + [(n, m, 0)]:
+        if i < bi or j < bj:
+            tag = "replace" if i < bi and j < bj else ("delete" if i < bi else "insert")
+            opcodes.append((tag, i, bi, j, bj))
+        if size:
+            if opcodes and opcodes[-1][0] == "equal":
+                _, ei1, _, ej1, _ = opcodes[-1]
+                opcodes[-1] = ("equal", ei1, bi + size, ej1, bj + size)
+            else:
+                opcodes.append(("equal", bi, bi + size, bj, bj + size))
+        i, j = bi + size, bj + size
+    return opcodes
+
+
+def group_hunks(opcodes, context=DEFAULT_CONTEXT):
+    """把操作码按上下文行数分组，每组是一个 hunk（同 difflib.SequenceMatcher.get_grouped_opcodes）"""
+    if not opcodes or all(op[0] == "equal" for op in opcodes):
+        return []
+    codes = list(opcodes)
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # 中间相同的部分超过两倍上下文，就在这里切开成两个 hunk
+        if tag == "equal" and i2 - i1 > context * 2:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def _range_header(start, length):
+    """unified diff 的范围写法：长度为0时起始行号减一"""
+    if length == 1:
+        return f"{start + 1}"
+    if length == 0:
+        return f"{start},0"
+    return f"{start + 1},{length}"
+
+
+def diff_lines(a_lines, b_lines, context=DEFAULT_CONTEXT, max_cost=MYERS_MAX_COST):
+    """
+    对比两组行，返回新增/删除的行和带上下文的 hunk
+    :return: {"added", "removed", "hunks", "is_identical"}；
+             hunks 每项为 {"header": "@@ -1,4 +1,5 @@", "lines": [" 上下文", "-删除", "+新增"]}
+    """
+    opcodes = diff_opcodes(a_lines, b_lines, max_cost=max_cost)
+    added = []
+    removed = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag in ("replace", "delete"):
+            removed.extend(a_lines[i1:i2])
+        if tag in ("replace", "insert"):
+            added.extend(b_lines[j1:j2])
+
+    hunks = []
+    for group in group_hunks(opcodes, context):
+        first, last = group[0], group[-1]
+        header = (
+            f"@@ -{_range_header(first[1], last[2] - first[1])} "
+            f"+{_range_header(first[3], last[4] - first[3])} @@"
+        )
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line for line in a_lines[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                lines.extend("-" + line for line in a_lines[i1:i2])
+            if tag in ("replace", "insert"):
+                lines.extend("+" + line for line in b_lines[j1:j2])
+        hunks.append({"header": header, "lines": lines})
+
+    return {
+        "added": added,
+        "removed": removed,
+        "hunks": hunks,
+        "is_identical": not added and not removed,
+    }
+
+
+def diff_texts(text1, text2, context=DEFAULT_CONTEXT, max_cost=MYERS_MAX_COST):
+    """对比两段文本（按行），结果同 diff_lines"""
+    return diff_lines((text1 or "").splitlines(), (text2 or "").splitlines(), context=context, max_cost=max_cost)
+
+
+class DiffCache:
+    """对比结果的LRU缓存，key 由调用方决定（如 ("config", 版本ID1, 版本ID2)）"""
+
+    def __init__(self, size=DIFF_CACHE_SIZE):
+        self.size = size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        """
+        命中缓存直接返回，否则调用 compute() 计算并缓存
+        compute 返回 None（如记录不存在）时不缓存
+        """
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        result = compute()
+        if result is None:
+            return None
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
@@ -1,5 +1,6 @@
 import os
 import sys
+import threading
 from time import strftime
 import yaml
 from datetime import datetime  # 从这个模块里面引入一个核心类
@@ -110,10 +111,11 @@ class PhysicalDevice(NetworkResource):
         )
         return base_dict
 
-    def update(self, check_results):
+    def update(self, check_results, card_buffer=None):
         """
         用设备健康检查结果更新档案卡属性
         :param check_results: 检查结果字典（即check_single_device返回的results）
+        :param card_buffer: CardUpdateBuffer（可选）；传入时只放进缓冲区，由调用方在整轮检查结束后统一写库
         """
         # 基础检查状态
         self.check_status = check_results.get("check_status", "未知")
@@ -130,6 +132,9 @@ class PhysicalDevice(NetworkResource):
         self.down_interface = check_results.get("down_interface", 0)  # 已修正笔误
         self.total_interfaces = check_results.get("total_interface", 0)
         logger.info(f"设备[{self.name}]档案卡已更新为最新检查结果")
+        if card_buffer is not None:
+            card_buffer.add(self)
+            return
         update_dict = self.to_dict()  # 这里已经拿到的是最新的了
         db_manager.update_physical_card(update_dict)
         logger.info(f"已成功更新数据里的{self.name}数据")
@@ -158,6 +163,37 @@ class PhysicalDevice(NetworkResource):
         )
 
 
+class CardUpdateBuffer:
+    """
+    档案卡更新缓冲区：并发健康检查时每台设备检查完只把档案卡放进来，
+    整轮检查结束后 flush() 一次事务批量写库（原来每台设备单独一个 UPDATE + commit）
+    同一台设备多次放入只保留最后一次，多个检查线程可以同时 add
+    """
+
+    def __init__(self):
+        self._cards = {}
+        self._lock = threading.Lock()
+
+    def add(self, card):
+        with self._lock:
+            self._cards[card.id] = card
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cards)
+
+    def flush(self):
+        """把缓冲的档案卡批量写入数据库，返回写入的张数；写库失败时保留缓冲内容，异常抛给调用方"""
+        with self._lock:
+            cards = list(self._cards.values())
+            if not cards:
+                return 0
+            db_manager.batch_update_physical_cards([card.to_dict() for card in cards])
+            self._cards.clear()
+        logger.info(f"档案卡缓冲区已写库：{len(cards)}张")
+        return len(cards)
+
+
 class CloudVPC(NetworkResource):
     """云VPC资源"""
 
@@ -3,6 +3,7 @@ from datetime import datetime
 import sys
 import os
 import time
+from urllib.parse import quote
 
 import requests
 
@@ -14,12 +15,19 @@ from db.database import db_manager
 
 # 导入下载模块
 from flask import jsonify, Flask, render_template, request, send_from_directory, send_file
+from flask import Response, stream_with_context
 from flask_socketio import SocketIO, emit
 
 # 1.jsonify就是为了返回JSON格式的数据
 from core.health_check.health_checker import check_single_device
 from core.backup.backup_handler import backup_single_device
+from core.backup.backup_engine import BackupEngine
+from core.backup.repository import StoredBackup, get_backup_repository
+from core.backup.archive import ARCHIVE_FORMATS, BackupArchive, build_entries, parse_range
+from core.backup.retention import RETENTION_CONFIG, BackupRetention, run_backup_retention
+from core.health_check.health_checker_async import load_inventory
 import yaml
+import json
 
 # 引入AI这个全局实例
 from core.AI.report_generator import deepseek_assistant
@@ -71,8 +79,10 @@ AUTO_SEND_HOUR = 9     # 早上9点发送
 AUTO_SEND_MINUTE = 0   # 0分发送
 AI_REPORT_DAYS = 7     # AI报告分析天数
 
-# 引入netmiko测试连接
-from netmiko import ConnectHandler
+# 设备SSH会话池：各接口按设备复用已登录的会话（新增设备时的连通性测试仍然单独登录，验证账号密码）
+from core.connection.session_pool import session_pool
+from core.connection.command_runner import run_command
+from core.health_check.scheduler import get_health_scheduler
 
 # 引入多线程模块
 import threading
@@ -151,16 +161,9 @@ def get_devices_status():
     devices = get_devices()
 
     def check_device_status(dev):
-        try:
-            dev_copy = dev.copy()
-            if "device_name" in dev_copy:
-                del dev_copy["device_name"]
-                del dev_copy["vendor"]
-            connection = ConnectHandler(**dev_copy, timeout=2)
-            connection.disconnect()
-            return {"device_name": dev["device_name"], "status": "在线"}
-        except Exception as e:
-            return {"device_name": dev["device_name"], "status": "离线"}
+        # 池里有会话时只探测一次，不用重新登录
+        status = "在线" if session_pool.check_alive(dev, timeout=2) else "离线"
+        return {"device_name": dev["device_name"], "status": status}
 
     # 并发测试所有设备
     from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -173,6 +176,16 @@ def get_devices_status():
     return jsonify({"code": 0, "data": results})
 
 
+# 全网汇总指标：平均/最高CPU和内存、接口UP/DOWN总数（在SQL里直接聚合档案卡的数值列）
+@app.route("/api/v1/fleet/metrics")
+def get_fleet_metrics():
+    try:
+        return jsonify({"code": 0, "msg": "success", "data": db_manager.get_fleet_metrics()})
+    except Exception as e:
+        logger.error(f"获取全网汇总指标失败：{e}")
+        return jsonify({"code": 1, "msg": str(e)[:100], "data": None}), 500
+
+
 # 第一个API接口：对设备的健康检查
 @app.route("/api/health/<device_name>")
 def device_health(device_name):
@@ -197,33 +210,8 @@ def device_health(device_name):
         if "device_name" in target_device_copy:
             del target_device_copy["device_name"]
             del target_device_copy["vendor"]
+        # 检查记录和档案卡由健康检查引擎统一入库，这里不再单独写一遍历史
         result = check_single_device(target_device_copy)
-
-        # 保存健康检查历史记录到数据库
-        try:
-            # 构造数据库需要的格式
-            # 注意：字段名必须和数据库表字段名完全一致
-            adapted_result = {
-                "host": target_device.get("host", ""),
-                "device_name": device_name,
-                "version": result.get("version", "未知"),
-                "check_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "status": result.get("status", "unknown"),
-                "check_status": "成功",
-                "up_interface": result.get("up_interface", 0),
-                "down_interface": result.get("down_interface", 0),
-                "total_interface": result.get("total_interface", 0),
-                "CPU_usage": str(result.get("CPU_usage", "N/A")),  # 注意：字段名是大写CPU_usage
-                "memory_usage": str(result.get("memory_usage", "N/A")),
-                "error_message": result.get("error_message", ""),
-                "device_health_issues": ";".join(result.get("health_issues", [])) if result.get("health_issues") else "",
-                "reachable": "可达" if result.get("status") != "failed" else "不可达",
-            }
-            db_manager.log_check_device(adapted_result)
-            logger.info(f"健康检查历史已保存：{device_name}")
-        except Exception as e:
-            logger.warning(f"保存健康检查历史失败：{e}")
-
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": f"检查时出现错误！{e}"}), 500
@@ -257,20 +245,24 @@ def device_backup(device_name):
         # 1.下面是你备份的函数吧，你调用的时候，他会先建立连接这个时候**device_info解包的时候，连接库不认识device_name这个参数
         start_time = datetime.now()
         # 接收备份函数返回的实际文件路径
-        backup_path = backup_single_device(target_device_copy)
+        stored = backup_single_device(target_device_copy)
         end_time = datetime.now()
         
-        # 如果返回的不是字符串（备份失败），抛出异常
-        if not isinstance(backup_path, str):
+        # 如果返回的不是备份结果（备份失败），抛出异常
+        if not isinstance(stored, StoredBackup):
             raise Exception("备份函数未返回有效路径")
-        # 向数据库表中插入数据
+        backup_path = stored.backup_path
+        # 向数据库表中插入数据（校验和、去重命中、新增磁盘占用一起记录）
         db_manager.log_backup(
             hostname=device_name,
             backup_path=backup_path,
             status="success",
             start_time=start_time,
             end_time=end_time,
-            backup_size=1024,
+            backup_size=stored.raw_size,
+            checksum=stored.checksum,
+            dedup=stored.dedup,
+            stored_size=stored.stored_size,
         )
         return jsonify(
             {
@@ -304,63 +296,55 @@ def device_backup(device_name):
 
 
 # 批量备份所有设备
+# 最近一次（或正在进行的）批量备份，供进度接口查询
+backup_engine_state = {"engine": None}
+
+
 @app.route("/api/backup/all", methods=["POST"])
 def batch_backup_all():
-    """批量备份所有设备配置"""
+    """批量备份所有设备配置（并发备份，全局/站点/厂商并发受限，失败的设备进重试队列）"""
     devices = get_devices()
     if not devices:
         return jsonify({"code": 1, "msg": "没有设备", "data": None}), 400
+    try:
+        sites = {device["device_name"]: device["site"] for device in load_inventory(CONFIG_PATH)}
+    except Exception as e:
+        logger.warning(f"读取设备站点失败，全部按同一站点限流：{e}")
+        sites = {}
+    for device in devices:
+        device["site"] = sites.get(device["device_name"], "default")
 
-    success_count = 0
-    failed_count = 0
-    results = []
-
-    for dev in devices:
-        device_name = dev["device_name"]
-        try:
-            dev_copy = dev.copy()
-            if "device_name" in dev_copy:
-                del dev_copy["device_name"]
-                del dev_copy["vendor"]
-
-            start_time = datetime.now()
-            backup_path = backup_single_device(dev_copy)
-            end_time = datetime.now()
-
-            if isinstance(backup_path, str):
-                db_manager.log_backup(
-                    hostname=device_name,
-                    backup_path=backup_path,
-                    status="success",
-                    start_time=start_time,
-                    end_time=end_time,
-                )
-                success_count += 1
-                results.append({"device": device_name, "status": "成功"})
-            else:
-                raise Exception("备份失败")
-        except Exception as e:
-            db_manager.log_backup(
-                hostname=device_name,
-                backup_path="N/A",
-                status="failed",
-                error_message=str(e)[:100],
-                start_time=datetime.now(),
-            )
-            failed_count += 1
-            results.append({"device": device_name, "status": "失败", "error": str(e)[:50]})
+    engine = BackupEngine()
+    backup_engine_state["engine"] = engine
+    results = engine.run(devices)
 
+    success_count = sum(1 for result in results if result["status"] == "成功")
+    failed_count = len(results) - success_count
     return jsonify({
         "code": 0,
         "msg": f"批量备份完成: {success_count} 成功, {failed_count} 失败",
         "data": {
             "success": success_count,
             "failed": failed_count,
-            "results": results
+            "progress": engine.progress(),
+            "results": [
+                {"device": result["device_name"], "status": result["status"], "attempts": result["attempts"],
+                 "backup_path": result["backup_path"], **({"error": result["error"][:50]} if result["error"] else {})}
+                for result in results
+            ],
         }
     })
 
 
+@app.route("/api/backup/all/progress")
+def batch_backup_progress():
+    """批量备份进度：total/done/succeeded/failed/running/retry_pending"""
+    engine = backup_engine_state["engine"]
+    if engine is None:
+        return jsonify({"code": 1, "msg": "还没有执行过批量备份", "data": None}), 404
+    return jsonify({"code": 0, "msg": "获取成功", "data": engine.progress()})
+
+
 def check_internal_service_health():
     return "healthy", "API服务运行正常"
 
@@ -384,6 +368,55 @@ def api_service_status():
         return jsonify({"status": "API基本服务连接失败", "message": "API服务运行异常", "error": error[:100]}), 500
 
 
+# 历史记录接口公用：分页参数 + 流式JSON输出
+def get_page_args(default_limit):
+    """
+    读取分页参数：page_size 优先于老的 limit（0 表示不限条数），cursor 为上一页返回的 next_cursor
+    :return: (cursor, limit)
+    """
+    cursor = request.args.get("cursor", default=None, type=str) or None
+    page_size = request.args.get("page_size", default=None, type=int)
+    limit = page_size if page_size is not None else request.args.get("limit", default=default_limit, type=int)
+    return cursor, (limit if limit and limit > 0 else None)
+
+
+def stream_history_response(rows, envelope, list_key, count_key=None):
+    """
+    把 db_manager.iter_* 返回的迭代器逐条序列化输出，内存占用和结果条数无关
+    先取第一条再开始响应：游标错误、SQL错误在这一步抛出，调用方还能返回正常的错误码
+    :param rows: KeysetIterator，输出完后把它的 next_cursor 写进响应
+    :param envelope: 响应里的固定字段（如 {"status": "success"}）
+    :param list_key: 记录列表的字段名
+    :param count_key: 本页条数的字段名（可选）
+    """
+    first = next(rows, None)
+
+    def generate():
+        yield json.dumps(envelope, ensure_ascii=False)[:-1] + f', "{list_key}": ['
+        count = 0
+        error = None
+        try:
+            if first is not None:
+                yield json.dumps(first, ensure_ascii=False, default=str)
+                count = 1
+            for row in rows:
+                yield "," + json.dumps(row, ensure_ascii=False, default=str)
+                count += 1
+        except Exception as e:
+            # 响应头已经发出，只能记录日志并尽量输出合法的JSON
+            error = str(e)[:100]
+            logger.error(f"流式输出历史记录中断：{error}")
+        # 中断时这一页不完整：带上 error、不给 next_cursor，客户端不会把它当成正常的一页接着往下翻
+        tail = {"next_cursor": None if error else rows.next_cursor}
+        if error:
+            tail["error"] = error
+        if count_key:
+            tail[count_key] = count
+        yield "], " + json.dumps(tail, ensure_ascii=False)[1:]
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
 # 第四个API接口查看设备备份历史
 @app.route("/api/backup/history/")
 @app.route("/api/backup/history/<device_name>")
@@ -391,10 +424,11 @@ def backup_history(device_name=None):
     # 点击查询所有历史记录的时候，URL让他拼接成days = 0,limit = 0,
     try:
         days = request.args.get("days", default=7, type=int)
-        limit = request.args.get("limit", default=20, type=int)
-        # 原代码：recoard = ...  # 拼写错误：recoard 应为 record
-        record = db_manager.get_recent_backups(hostname=device_name, limit=limit, days=days)
-        return jsonify({"status": "success", "history_record": len(record), "history": record})
+        cursor, limit = get_page_args(default_limit=20)
+        rows = db_manager.iter_recent_backups(hostname=device_name, days=days, cursor=cursor, limit=limit)
+        return stream_history_response(rows, {"status": "success"}, "history", count_key="history_record")
+    except ValueError as e:
+        return jsonify({"status": "failed", "error_msg": str(e)[:100], "history_record": 0}), 400
     except Exception as e:
         error_msg = str(e)
         return (
@@ -1126,11 +1160,12 @@ def check_physical_device_cards():
 @app.route("/api/health/history/<device_name>")
 def get_device_health_history(device_name=None):
     try:
-        limit = request.args.get("limit", default=20, type=int)
         days = request.args.get("days", default=7, type=int)
-        # 原代码：recoard = ...  # 拼写错误：recoard 应为 record
-        record = db_manager.get_health_check_history(device_name=device_name, limit=limit, days=days)
-        return jsonify({"status": "success", "history_record": len(record), "history": record})
+        cursor, limit = get_page_args(default_limit=20)
+        rows = db_manager.iter_health_check_history(device_name=device_name, days=days, cursor=cursor, limit=limit)
+        return stream_history_response(rows, {"status": "success"}, "history", count_key="history_record")
+    except ValueError as e:
+        return jsonify({"status": "failed", "error_msg": str(e)[:100], "history_record": 0}), 400
     except Exception as e:
         error_msg = str(e)
         return (
@@ -1145,6 +1180,23 @@ def get_device_health_history(device_name=None):
         )
 
 
+# 健康检查趋势：长时间范围从汇总表读取，按跨度自动选择 5m/1h/1d 粒度
+@app.route("/api/health/trend/")
+@app.route("/api/health/trend/<device_name>")
+def get_device_health_trend(device_name=None):
+    try:
+        days = request.args.get("days", default=7, type=int)
+        granularity = request.args.get("granularity", default=None, type=str)
+        if granularity not in (None, "5m", "1h", "1d"):
+            return jsonify({"status": "failed", "error_msg": "granularity 只能是 5m/1h/1d"}), 400
+        granularity = granularity or db_manager.rollups.pick_granularity(days)
+        points = db_manager.get_health_trend(device_name=device_name, days=days, granularity=granularity)
+        return jsonify({"status": "success", "granularity": granularity, "point_count": len(points), "points": points})
+    except Exception as e:
+        error_msg = str(e)
+        return jsonify({"status": "failed", "error_msg": error_msg[:100], "point_count": 0}), 500
+
+
 # 第十九个API接口：用AI分析单个设备健康检查结果
 ALONE_HEALTH_REPORT_CACHE = {}
 
@@ -1493,6 +1545,29 @@ def init_scheduler():
         logger.info(
             f"【定时任务】添加健康报告任务成功（每周{AUTO_SEND_WEEKDAY} {AUTO_SEND_HOUR}:{AUTO_SEND_MINUTE}）"
         )
+        # 时序汇总：每5分钟把健康检查/系统指标汇总到 5m/1h/1d 汇总表，并按保留天数清理原始数据
+        scheduler.add_job(
+            func=db_manager.run_rollups,
+            trigger="interval",
+            minutes=5,
+            id="db_rollups_every_5min",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        logger.info("【定时任务】添加时序汇总任务成功（每5分钟）")
+        # 备份保留策略：每天凌晨按 7天全留 / 90天每天一份 / 更早每月一份 清理旧备份和不再引用的备份对象
+        scheduler.add_job(
+            func=run_backup_retention,
+            trigger="cron",
+            hour=RETENTION_CONFIG["hour"],
+            minute=RETENTION_CONFIG["minute"],
+            id="backup_retention_daily",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        logger.info(f"【定时任务】添加备份保留策略任务成功（每天{RETENTION_CONFIG['hour']}:{RETENTION_CONFIG['minute']:02d}）")
         scheduler.start()
         # 返回实例 → 把这个“有任务、已启动”的实例交出去
         logging.info("【定时任务】调度器启动成功，后台开始计时")
@@ -1537,7 +1612,23 @@ def download_backup_file():
         real_backup_file = os.path.join(ROOT_DIR, backup_dir)
         logger.info(f"完整文件路径: {real_backup_file}")
         
-        # 看他是否存在，判断它是否是一个文件，不是文件夹
+        # 存在备份仓库里的备份：按逻辑路径查到校验和，边读边解压返回
+        if not os.path.isfile(real_backup_file):
+            record = db_manager.get_backup_by_path(backup_dir)
+            repository = get_backup_repository()
+            if record and repository.exists(record.get("checksum")):
+                file_name = os.path.basename(backup_dir)
+                headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_name)}",
+                           "Cache-Control": "no-cache"}
+                if record.get("backup_size"):
+                    headers["Content-Length"] = str(record["backup_size"])
+                return Response(
+                    stream_with_context(repository.open_stream(record["checksum"])),
+                    mimetype="text/plain; charset=utf-8",
+                    headers=headers,
+                )
+
+        # 看他是否存在，判断它是否是一个文件，不是文件夹（备份仓库之前直接写在 backupN1/ 下的老备份）
         if not os.path.exists(real_backup_file) or not os.path.isfile(real_backup_file):
             # 列出backupN1目录中的文件供调试
             backup_dir_path = os.path.join(ROOT_DIR, "backupN1")
@@ -1562,6 +1653,77 @@ def download_backup_file():
         return jsonify({"code": 500, "msg": f"下载失败：{str(e)}", "data": None}), 500
 
 
+# 手动执行备份保留策略，dry_run=1 时只返回会删除多少记录、能释放多少空间
+@app.route("/api/v1/backup/retention", methods=["POST"])
+def run_backup_retention_api():
+    dry_run = request.args.get("dry_run", "1") in ("1", "true")
+    try:
+        report = BackupRetention().run(dry_run=dry_run)
+        return jsonify({"code": 0, "msg": "演练完成，未删除任何备份" if dry_run else "清理完成", "data": report})
+    except Exception as e:
+        logger.error(f"备份保留策略执行失败：{str(e)[:200]}")
+        return jsonify({"code": 500, "msg": f"执行失败：{str(e)[:100]}", "data": None}), 500
+
+
+def _split_args(name):
+    """?devices=SW1,SW2&devices=SW3 这类参数拆成列表"""
+    values = []
+    for value in request.args.getlist(name):
+        values += [item.strip() for item in value.split(",") if item.strip()]
+    return values
+
+
+# 打包下载一批备份（zip / tar / tar.gz），边生成边返回；zip / tar 支持 Range 断点续传
+@app.route("/api/v1/backup/archive", methods=["GET"])
+def download_backup_archive():
+    fmt = request.args.get("format", "zip")
+    if fmt not in ARCHIVE_FORMATS:
+        return jsonify({"code": 400, "msg": f"不支持的格式：{fmt}（可选 {'/'.join(ARCHIVE_FORMATS)}）", "data": None}), 400
+    try:
+        records = db_manager.select_backup_set(
+            date=request.args.get("date"),
+            since=request.args.get("since"),
+            until=request.args.get("until"),
+            hostnames=_split_args("devices"),
+            ids=_split_args("ids"),
+            latest=request.args.get("latest") in ("1", "true"),
+        )
+        archive = BackupArchive(build_entries(records), fmt=fmt)
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": f"参数错误：{str(e)[:100]}", "data": None}), 400
+    if not archive.entries:
+        return jsonify({"code": 404, "msg": "没有符合条件的备份", "data": None}), 404
+
+    label = request.args.get("date") or datetime.now().strftime("%Y%m%d-%H%M%S")
+    file_name = f"backups-{label}.{fmt}"
+    etag = archive.etag
+    headers = {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_name)}",
+        "ETag": f'"{etag}"',
+        "Accept-Ranges": "bytes" if archive.resumable else "none",
+        "Cache-Control": "no-cache",
+    }
+    status, start, end = 200, 0, None
+    if archive.resumable:
+        byte_range = parse_range(request.headers.get("Range"), archive.length)
+        # If-Range 对不上（备份集变了）时忽略 Range，整包重新下载
+        if_range = request.headers.get("If-Range")
+        if byte_range is not None and if_range and if_range.strip('"') != etag:
+            byte_range = None
+        if byte_range is False:
+            headers["Content-Range"] = f"bytes */{archive.length}"
+            return Response(status=416, headers=headers)
+        if byte_range:
+            start, end = byte_range
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{archive.length}"
+        headers["Content-Length"] = str((archive.length if end is None else end + 1) - start)
+    logger.info(f"打包下载{len(archive.entries)}个备份（{fmt}），区间{start}-{end if end is not None else '结尾'}")
+    return Response(
+        stream_with_context(archive.iter_bytes(start, end)), status=status, mimetype=archive.mimetype, headers=headers
+    )
+
+
 # 厂商映射表
 VENDOR_MAP = {"华三H3C": "hp_comware", "思科Cisco": "cisco_ios", "华为Huawei": "huawei"}
 # 引入校验ipv4的工具函数
@@ -1940,50 +2102,48 @@ def execute_custom_command():
         logger.info(f"用户执行自定义命令：设备={device_name}，命令={normalized_cmd}")
         start_time = datetime.now()
 
-        connection = ConnectHandler(**device_copy, timeout=10)
-        try:
-            output = connection.send_command_timing(normalized_cmd, delay_factor=2)
-            end_time = datetime.now()
-            execution_time = (end_time - start_time).total_seconds()
+        with session_pool.session(device_copy, timeout=10) as connection:
+            output = run_command(connection, normalized_cmd)
+        end_time = datetime.now()
+        execution_time = (end_time - start_time).total_seconds()
 
-            logger.info(f"命令执行成功：设备={device_name}，耗时={execution_time:.2f}秒")
+        logger.info(f"命令执行成功：设备={device_name}，耗时={execution_time:.2f}秒")
 
-            # 自动保存到命令历史
-            try:
-                # 从白名单获取命令分类
-                command_category = 'unknown'
-                for cat, cmds in COMMAND_WHITELIST.get(vendor, {}).items():
-                    if normalized_cmd in cmds:
-                        command_category = cat
-                        break
-
-                history_id = db_manager.save_command_history(
-                    device_name=device_name,
-                    device_ip=target_device.get('host', ''),
-                    command=normalized_cmd,
-                    command_category=command_category,
-                    result=output,
-                    status='success',
-                    execution_time=execution_time,
-                )
-                logger.info(f"命令历史已保存，ID={history_id}")
-            except Exception as e:
-                logger.warning(f"保存命令历史失败：{e}")
+        # 自动保存到命令历史
+        try:
+            # 从白名单获取命令分类
+            command_category = 'unknown'
+            for cat, cmds in COMMAND_WHITELIST.get(vendor, {}).items():
+                if normalized_cmd in cmds:
+                    command_category = cat
+                    break
+
+            history_id = db_manager.save_command_history(
+                device_name=device_name,
+                device_ip=target_device.get('host', ''),
+                command=normalized_cmd,
+                command_category=command_category,
+                result=output,
+                status='success',
+                execution_time=execution_time,
+                sync=True,  # 前端要用history_id做对比/下载，必须立即写入
+            )
+            logger.info(f"命令历史已保存，ID={history_id}")
+        except Exception as e:
+            logger.warning(f"保存命令历史失败：{e}")
 
-            return jsonify({
-                "code": 0,
-                "msg": "命令执行成功",
-                "data": {
-                    "device_name": device_name,
-                    "command": normalized_cmd,
-                    "output": output,
-                    "execution_time": f"{execution_time:.2f}秒",
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "history_id": history_id,
-                }
-            })
-        finally:
-            connection.disconnect()
+        return jsonify({
+            "code": 0,
+            "msg": "命令执行成功",
+            "data": {
+                "device_name": device_name,
+                "command": normalized_cmd,
+                "output": output,
+                "execution_time": f"{execution_time:.2f}秒",
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "history_id": history_id,
+            }
+        })
 
     except Exception as e:
         logger.error(f"执行自定义命令失败：{str(e)}")
@@ -2053,21 +2213,18 @@ def batch_execute_command():
             device_copy.pop("vendor", None)
 
             try:
-                connection = ConnectHandler(**device_copy, timeout=10)
-                try:
+                with session_pool.session(device_copy, timeout=10) as connection:
                     start_time = datetime.now()
-                    output = connection.send_command_timing(normalized_cmd, delay_factor=2)
+                    output = run_command(connection, normalized_cmd)
                     end_time = datetime.now()
                     execution_time = (end_time - start_time).total_seconds()
 
-                    return {
-                        "device_name": device["device_name"],
-                        "status": "成功",
-                        "output": output,
-                        "execution_time": f"{execution_time:.2f}秒",
-                    }
-                finally:
-                    connection.disconnect()
+                return {
+                    "device_name": device["device_name"],
+                    "status": "成功",
+                    "output": output,
+                    "execution_time": f"{execution_time:.2f}秒",
+                }
             except Exception as e:
                 return {
                     "device_name": device["device_name"],
@@ -2116,29 +2273,57 @@ def batch_execute_command():
 def get_command_history_list():
     """
     获取命令执行历史列表
-    参数：device_name（可选）, command（可选）, limit（可选，默认50）
+    参数：device_name（可选）, command（可选）, limit / page_size（可选，默认50）, cursor（可选，上一页的next_cursor）
     """
     try:
         device_name = request.args.get('device_name')
         command = request.args.get('command')
-        limit = int(request.args.get('limit', 50))
+        cursor, limit = get_page_args(default_limit=50)
 
-        history = db_manager.get_command_history(
+        rows = db_manager.iter_command_history(
             device_name=device_name,
             command=command,
+            cursor=cursor,
             limit=limit,
         )
-
-        return jsonify({
-            "code": 0,
-            "msg": "success",
-            "data": history
-        })
+        return stream_history_response(rows, {"code": 0, "msg": "success"}, "data")
+    except ValueError as e:
+        return jsonify({"code": 1, "msg": str(e), "data": None}), 400
     except Exception as e:
         logger.error(f"获取命令历史失败：{e}")
         return jsonify({"code": 1, "msg": str(e), "data": None}), 500
 
 
+# 全网全文检索：在各设备最新配置和命令执行结果里查找
+@app.route("/api/v1/search", methods=["GET"])
+def fleet_search():
+    """
+    全网检索
+    参数：q（必填）, scope（config/command/all，默认all）, device_name（可选）, limit（可选，默认50）,
+         raw（可选，1表示q是FTS5查询表达式，支持 AND/OR/NEAR/前缀*）
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"code": 1, "msg": "请提供检索内容 q", "data": None}), 400
+        scope = request.args.get('scope', 'all')
+        scopes = ("config", "command") if scope == "all" else (scope,)
+        if not set(scopes) <= {"config", "command"}:
+            return jsonify({"code": 1, "msg": "scope 只能是 config/command/all", "data": None}), 400
+        results = db_manager.search(
+            query,
+            scopes=scopes,
+            device_name=request.args.get('device_name') or None,
+            limit=request.args.get('limit', 50, type=int),
+            raw=request.args.get('raw') == '1',
+        )
+        return jsonify({"code": 0, "msg": "success", "data": {"query": query, "total": len(results), "results": results}})
+    except Exception as e:
+        # raw 模式下FTS5语法错误也走这里
+        logger.error(f"全网检索失败：{e}")
+        return jsonify({"code": 1, "msg": str(e)[:100], "data": None}), 500
+
+
 # 获取命令历史详情
 @app.route("/api/v1/command/history/<int:history_id>", methods=["GET"])
 def get_command_history_detail(history_id):
@@ -2466,15 +2651,17 @@ def delete_alert_rule(rule_id):
 def get_alert_history():
     """获取告警历史"""
     try:
-        limit = int(request.args.get('limit', 50))
+        cursor, limit = get_page_args(default_limit=50)
         severity = request.args.get('severity')
         is_resolved = request.args.get('is_resolved')
 
         if is_resolved is not None:
             is_resolved = int(is_resolved)
 
-        history = db_manager.get_alert_history(limit=limit, severity=severity, is_resolved=is_resolved)
-        return jsonify({"code": 0, "msg": "success", "data": history})
+        rows = db_manager.iter_alert_history(severity=severity, is_resolved=is_resolved, cursor=cursor, limit=limit)
+        return stream_history_response(rows, {"code": 0, "msg": "success"}, "data")
+    except ValueError as e:
+        return jsonify({"code": 1, "msg": str(e), "data": None}), 400
     except Exception as e:
         logger.error(f"获取告警历史失败：{e}")
         return jsonify({"code": 1, "msg": str(e), "data": None}), 500
@@ -2554,23 +2741,19 @@ def query_all_devices():
             }
 
             try:
-                from netmiko import ConnectHandler
-                connection = ConnectHandler(
-                    ip=device_ip,
-                    username=username,
-                    password=password,
-                    device_type='huawei',
-                    timeout=10,
-                )
-
-                for cmd in commands:
-                    try:
-                        output = connection.send_command_timing(cmd, delay_factor=3)
-                        device_result['commands'][cmd] = output
-                    except Exception as e:
-                        device_result['commands'][cmd] = f"执行失败：{str(e)}"
-
-                connection.disconnect()
+                device_params = {
+                    'ip': device_ip,
+                    'username': username,
+                    'password': password,
+                    'device_type': 'huawei',
+                }
+                with session_pool.session(device_params, timeout=10) as connection:
+                    for cmd in commands:
+                        try:
+                            output = run_command(connection, cmd)
+                            device_result['commands'][cmd] = output
+                        except Exception as e:
+                            device_result['commands'][cmd] = f"执行失败：{str(e)}"
             except Exception as e:
                 device_result['status'] = 'failed'
                 device_result['error'] = str(e)
@@ -3058,14 +3241,14 @@ def device_monitoring_task(interval=60):
 
             for device in devices:
                 try:
-                    # 测试连接
+                    # 测试连接：复用池里的会话，只探测存活，不再每轮重新登录
                     device_copy = device.copy()
                     device_copy.pop("device_name", None)
                     device_copy.pop("vendor", None)
 
                     start_time = datetime.now()
-                    connection = ConnectHandler(**device_copy, timeout=5)
-                    connection.disconnect()
+                    with session_pool.session(device_copy, probe=True, timeout=5):
+                        pass
                     end_time = datetime.now()
                     response_time = (end_time - start_time).total_seconds()
 
@@ -3198,6 +3381,44 @@ def stop_monitoring():
         return jsonify({"code": 1, "msg": f"停止失败：{str(e)}", "data": None}), 500
 
 
+# ============================================================
+# 健康检查调度器 API：按到期时间堆调度，问题设备查得勤、稳定设备逐步放宽
+# ============================================================
+
+@app.route("/api/v1/health/scheduler/start", methods=["POST"])
+def start_health_scheduler():
+    """启动健康检查调度器（设备来自 devices.yaml）"""
+    try:
+        scheduler = get_health_scheduler()
+        scheduler.start()
+        return jsonify({"code": 0, "msg": f"调度器已启动，共{scheduler.stats()['devices']}台设备", "data": None})
+    except Exception as e:
+        logger.error(f"启动健康检查调度器失败：{e}")
+        return jsonify({"code": 1, "msg": f"启动失败：{str(e)}", "data": None}), 500
+
+
+@app.route("/api/v1/health/scheduler/stop", methods=["POST"])
+def stop_health_scheduler():
+    """停止健康检查调度器，在跑的检查结束后结果写库"""
+    try:
+        get_health_scheduler().stop()
+        return jsonify({"code": 0, "msg": "调度器已停止", "data": None})
+    except Exception as e:
+        logger.error(f"停止健康检查调度器失败：{e}")
+        return jsonify({"code": 1, "msg": f"停止失败：{str(e)}", "data": None}), 500
+
+
+@app.route("/api/v1/health/scheduler/status", methods=["GET"])
+def health_scheduler_status():
+    """调度器状态：调度延迟、超时次数、各设备各检查组的当前间隔和下次检查时间"""
+    try:
+        scheduler = get_health_scheduler()
+        return jsonify({"code": 0, "msg": "获取成功", "data": dict(scheduler.stats(), running=scheduler.running)})
+    except Exception as e:
+        logger.error(f"获取健康检查调度器状态失败：{e}")
+        return jsonify({"code": 1, "msg": f"获取失败：{str(e)}", "data": None}), 500
+
+
 # ============================================================
 # 配置对比与回滚 API（中优先级 #6）
 # ============================================================